@@ -1,7 +1,16 @@
 """Utility scripts and helpers for the Diana project."""
 
-# Expose the notes_tools namespace for convenience when these utilities are
-# used as a package.
-from . import notes_tools  # noqa: F401  (re-exported for package discovery)
+from __future__ import annotations
+
+import importlib
+from typing import Any
 
 __all__ = ["notes_tools"]
+
+
+def __getattr__(name: str) -> Any:
+    # ``notes_tools`` is imported on first access rather than with the package,
+    # so ``python -m scripts.<tool> --help`` does not pay for it.
+    if name == "notes_tools":
+        return importlib.import_module(f"{__name__}.notes_tools")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
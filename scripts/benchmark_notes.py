@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Microbenchmark the note parsing, tag resolution, memo-processing and dump hot paths.
+
+Usage examples::
+
+    python scripts/benchmark_notes.py
+    python scripts/benchmark_notes.py --scale full --save benchmarks/baseline.json
+    python scripts/benchmark_notes.py --compare benchmarks/baseline.json --threshold 0.2
+    python scripts/benchmark_notes.py --filter 'parse_remote_note*' --threshold-for 'TagMappingContext*=0.5'
+    python scripts/benchmark_notes.py --scale full --filter '*[[]notes=100000]'
+
+Every case runs offline against seeded synthetic data (see
+:mod:`notes_tools.benchmarks`). ``--scale quick`` covers 10 and 1,000 notes
+with 10 and 100 tags, and ``--scale full`` covers 10 to 100,000 notes with 10
+to 1,000 tags. ``--save`` records the results as a JSON baseline and merges
+them into an existing file. ``--compare`` checks the run against a baseline
+and exits with status 1 when a case is slower than its threshold allows.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Iterable
+
+from notes_tools.benchmarks import (
+    DEFAULT_THRESHOLD,
+    SCALES,
+    baseline_map,
+    compare,
+    format_results,
+    load_baseline,
+    measure,
+    save_baseline,
+    suite,
+)
+from notes_tools.codec import JSON
+
+
+def _override(value: str) -> tuple[str, float]:
+    pattern, separator, threshold = value.rpartition("=")
+    try:
+        if not separator or not pattern:
+            raise ValueError
+        return pattern, float(threshold)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected PATTERN=THRESHOLD, got {value!r}") from None
+
+
+def _counts(value: str) -> tuple[int, ...]:
+    try:
+        counts = tuple(int(part) for part in value.split(",") if part.strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {value!r}") from None
+    if not counts or min(counts) < 1:
+        raise argparse.ArgumentTypeError(f"expected positive counts, got {value!r}")
+    return counts
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--scale",
+        choices=sorted(SCALES),
+        default="quick",
+        help="Note and tag counts to run (default: %(default)s)",
+    )
+    parser.add_argument("--notes", type=_counts, help="Comma-separated note counts, overriding --scale")
+    parser.add_argument("--tags", type=_counts, help="Comma-separated tag-catalog sizes, overriding --scale")
+    parser.add_argument(
+        "--filter",
+        dest="filters",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="Only run cases whose name matches this glob (repeatable)",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (default: %(default)s)")
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.05,
+        metavar="SECONDS",
+        help="Loop fast cases until one run takes this long (default: %(default)s)",
+    )
+    parser.add_argument("--save", metavar="PATH", help="Write (merge) the results into a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare the results with a JSON baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed slowdown before a case counts as a regression, 0.25 = 25%% (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--threshold-for",
+        dest="overrides",
+        type=_override,
+        action="append",
+        default=[],
+        metavar="PATTERN=THRESHOLD",
+        help="Threshold for the cases matching a glob (repeatable; the last match wins)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON instead of a table")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    return args
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        try:
+            baseline = load_baseline(args.compare)
+        except (OSError, ValueError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 2
+    note_counts, tag_counts = SCALES[args.scale]
+    results = []
+    for case in suite(args.notes or note_counts, args.tags or tag_counts, args.filters):
+        results.append(measure(case, repeat=args.repeat, min_time=args.min_time))
+        if not args.json:
+            print(f"  {case.name}", file=sys.stderr)
+    if not results:
+        print("Error: no benchmark matches the filters", file=sys.stderr)
+        return 2
+
+    comparisons = compare(results, baseline, threshold=args.threshold, overrides=dict(args.overrides)) if baseline else []
+    if args.json:
+        report = baseline_map(results)
+        if comparisons:
+            report["comparison"] = {
+                item.name: {"status": item.status, "ratio": item.ratio, "threshold": item.threshold}
+                for item in comparisons
+            }
+        sys.stdout.write(JSON.dumps(report, indent=True, sort_keys=True) + "\n")
+    else:
+        print(format_results(results, comparisons))
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"baseline written to {args.save}", file=sys.stderr)
+
+    regressed = [item for item in comparisons if item.status == "regressed"]
+    for item in regressed:
+        print(
+            f"regression: {item.name} is x{item.ratio:.2f} the baseline (threshold {item.threshold:.0%})",
+            file=sys.stderr,
+        )
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Single entry point for the Diana maintenance scripts.
+
+Usage examples::
+
+    python scripts/diana.py process service_account.json SESSION --memo "Buy milk"
+    python scripts/diana.py sessions service_account.json --json
+    python scripts/diana.py change-sets service_account.json SESSION
+    python scripts/diana.py resources upload service_account.json
+    python scripts/diana.py journal list --dead
+    python scripts/diana.py llm-log llm.jsonl.gz --limit 5 --bodies
+    python scripts/diana.py invite --uid someone --project my-project
+    python scripts/diana.py dataset --sessions 10 --jsonl dataset.jsonl
+    python scripts/diana.py bench --compare benchmarks/baseline.json
+    python scripts/diana.py imports --check
+
+Each command lives in its own script and is only imported once it has been
+chosen, and the scripts import the Firebase and Google Cloud SDKs only when a
+command actually connects. ``imports`` reports what each command costs to
+import (via ``python -X importtime``) and, with ``--check``, fails when a
+command pulls in an SDK at load time or exceeds ``--budget-ms``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import sys
+from pathlib import Path
+from typing import Iterable
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+# command -> (module, help); ``resources`` dispatches on a second word.
+COMMANDS: dict[str, tuple[str, str]] = {
+    "process": ("process_memo", "Process memos for a session (process_memo.py)"),
+    "sessions": ("list_sessions", "List sessions and their notes (list_sessions.py)"),
+    "change-sets": ("list_todo_change_sets", "List todo change sets of a session (list_todo_change_sets.py)"),
+    "history": ("thought_history", "Browse thought document history (thought_history.py)"),
+    "queue": ("memo_queue", "Manage the local memo job queue (memo_queue.py)"),
+    "journal": ("memo_journal", "Inspect the write-behind journal (memo_journal.py)"),
+    "llm-log": ("show_llm_log", "Read back an --llm-log file and its rotated backups (show_llm_log.py)"),
+    "invite": ("provision_invite", "Provision an invite and its QR payload (provision_invite.py)"),
+    "dataset": ("generate_dataset", "Generate synthetic sessions as JSONL or into an emulator (generate_dataset.py)"),
+    "bench": ("benchmark_notes", "Microbenchmark the note-processing hot paths (benchmark_notes.py)"),
+}
+RESOURCE_COMMANDS: dict[str, str] = {
+    "download": "download_llm_resources",
+    "upload": "upload_llm_resources",
+}
+
+
+def _command_modules() -> dict[str, str]:
+    modules = {name: module for name, (module, _) in COMMANDS.items()}
+    modules.update({f"resources {action}": module for action, module in RESOURCE_COMMANDS.items()})
+    return modules
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="diana", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+    for name, (_, help_text) in COMMANDS.items():
+        command = commands.add_parser(name, help=help_text, add_help=False)
+        command.add_argument("args", nargs=argparse.REMAINDER)
+    resources = commands.add_parser(
+        "resources", help="Download or upload LLM resources (download_llm_resources.py, upload_llm_resources.py)"
+    )
+    resources.add_argument("action", choices=sorted(RESOURCE_COMMANDS))
+    resources.add_argument("args", nargs=argparse.REMAINDER)
+
+    imports = commands.add_parser("imports", help="Report the import cost of each command")
+    imports.add_argument(
+        "targets",
+        nargs="*",
+        metavar="COMMAND",
+        help="Commands to measure, e.g. process or 'resources upload' (default: all)",
+    )
+    imports.add_argument("--top", type=int, default=8, help="Slowest modules to list per command (default: %(default)s)")
+    imports.add_argument("--json", action="store_true", help="Print one JSON report per command")
+    imports.add_argument(
+        "--check", action="store_true", help="Exit with status 1 if a command imports a Firebase/Google SDK at load time"
+    )
+    imports.add_argument(
+        "--budget-ms", type=float, help="With --check, also fail when a command takes longer than this to import"
+    )
+    return parser.parse_args(argv)
+
+
+def _run_imports(args: argparse.Namespace) -> int:
+    from notes_tools.importtime import measure_imports
+
+    modules = _command_modules()
+    targets = [" ".join(target.split()) for target in args.targets] or list(modules)
+    unknown = [target for target in targets if target not in modules]
+    if unknown:
+        print(f"error: unknown command(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    failures: list[str] = []
+    for target in targets:
+        try:
+            report = measure_imports(modules[target], path=[SCRIPTS_DIR])
+        except ImportError as exc:
+            print(f"error: {target}: {exc}", file=sys.stderr)
+            failures.append(target)
+            continue
+        if args.json:
+            print(json.dumps({"command": target, **report.to_map(args.top)}, sort_keys=True))
+        else:
+            print(f"[{target}] " + report.format(args.top))
+        if report.heavy():
+            failures.append(target)
+        elif args.budget_ms is not None and report.total_us / 1000 > args.budget_ms:
+            print(f"{target}: over the {args.budget_ms:g} ms import budget", file=sys.stderr)
+            failures.append(target)
+    return 1 if args.check and failures else 0
+
+
+def _dispatch(argv: list[str]) -> tuple[str, list[str]] | None:
+    """Resolve ``argv`` to (module, remaining arguments) without argparse.
+
+    argparse would try to interpret the command's own options (``--help``,
+    ``--queue``...), so known commands are split off by hand.
+    """
+
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]][0], argv[1:]
+    if len(argv) > 1 and argv[0] == "resources" and argv[1] in RESOURCE_COMMANDS:
+        return RESOURCE_COMMANDS[argv[1]], argv[2:]
+    return None
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if str(SCRIPTS_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRIPTS_DIR))  # the scripts import ``notes_tools`` as a top-level package
+    target = _dispatch(argv)
+    if target is not None:
+        module_name, arguments = target
+        return importlib.import_module(module_name).main(arguments)
+    # Only help, usage errors and ``imports`` get here.
+    return _run_imports(parse_args(argv))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -10,10 +10,14 @@ import sys
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterable
+from typing import TYPE_CHECKING, Iterable
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+from notes_tools.firestore_usage import metered
+from notes_tools.profiling import add_profile_arguments, profiled
+from notes_tools.timing import phase
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
 
 DEFAULT_COLLECTION = "resources"
 DEFAULT_DESTINATION = Path("archives/llm")
@@ -55,6 +59,7 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
         "--timestamp",
         help="Optional timestamp for the archive directory; defaults to current UTC time",
     )
+    add_profile_arguments(parser)
     return parser.parse_args(list(argv))
 
 
@@ -78,6 +83,9 @@ def normalize_path(path: str) -> str:
 
 
 def init_firestore(service_account: Path, project_id: str | None) -> firestore.Client:
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     if not service_account.is_file():
         raise FileNotFoundError(f"Service account key not found: {service_account}")
 
@@ -87,7 +95,7 @@ def init_firestore(service_account: Path, project_id: str | None) -> firestore.C
             firebase_admin.initialize_app(cred, {"projectId": project_id})
         else:
             firebase_admin.initialize_app(cred)
-    return firestore.client()
+    return metered(firestore.client())
 
 
 def fetch_remote_resources(collection_ref: firestore.CollectionReference) -> list[RemoteResource]:
@@ -152,9 +160,14 @@ def write_manifest(destination: Path, resources: list[RemoteResource], metadata:
 def main(argv: Iterable[str]) -> int:
     configure_logging()
     args = parse_args(argv)
+    with profiled(args):
+        return _run(args)
+
 
+def _run(args: argparse.Namespace) -> int:
     try:
-        firestore_client = init_firestore(args.service_account, args.project)
+        with phase("firestore_init"):
+            firestore_client = init_firestore(args.service_account, args.project)
     except FileNotFoundError as exc:
         logging.error(str(exc))
         return 1
@@ -163,7 +176,8 @@ def main(argv: Iterable[str]) -> int:
         return 1
 
     collection_ref = firestore_client.collection(args.collection)
-    resources = fetch_remote_resources(collection_ref)
+    with phase("fetch"):
+        resources = fetch_remote_resources(collection_ref)
     logging.info(
         "Fetched %d remote resources from collection '%s'", len(resources), args.collection
     )
@@ -176,7 +190,8 @@ def main(argv: Iterable[str]) -> int:
     ensure_directory(archive_root)
 
     try:
-        write_resources(archive_root, resources)
+        with phase("write"):
+            write_resources(archive_root, resources)
     except OSError as exc:
         logging.error("Failed to write resources: %s", exc)
         return 1
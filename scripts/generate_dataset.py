@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Generate seeded synthetic Diana sessions for load tests and benchmarks.
+
+Usage examples::
+
+    python scripts/generate_dataset.py --sessions 10 --todos 500 --jsonl dataset.jsonl
+    python scripts/generate_dataset.py --locales it,fr --legacy-tags 0.3 --memo-corpus memos.jsonl
+    python scripts/generate_dataset.py --thought-bytes 200000 --outline-depth 4 --thought-layout chunked \\
+        --emulator localhost:8080
+    python scripts/generate_dataset.py --from-jsonl dataset.jsonl --emulator
+
+Each session gets a tag catalog, notes, a thought document with its history,
+todo change sets and an inbox of memos (see :mod:`notes_tools.synthetic`). The
+same ``--seed`` and options always produce the same documents.
+
+``--jsonl`` writes one document write per line, and ``-`` means stdout.
+``--from-jsonl`` replays such a file instead of generating a dataset.
+``--emulator`` loads the writes into a Firestore emulator with a
+``BulkWriter``. It takes ``HOST:PORT`` and defaults to
+``$FIRESTORE_EMULATOR_HOST``, and it never connects to a real project.
+``--memo-corpus`` writes the generated memos as
+``{"session_id", "memo"}`` records for ``process_memo.py --batch`` and
+``memo_queue.py enqueue --jsonl``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from collections import Counter
+from contextlib import ExitStack
+from typing import IO, Any, Iterable, Iterator
+
+from notes_tools.firestore_usage import metered
+from notes_tools.profiling import add_profile_arguments, profiled
+from notes_tools.session_writes import WriteOp
+from notes_tools.synthetic import LOCALES, DatasetSpec, bulk_load, dataset_ops, memo_corpus, read_jsonl, write_jsonl
+from notes_tools.thought_store import LAYOUTS
+from notes_tools.timing import phase
+
+EMULATOR_ENV = "FIRESTORE_EMULATOR_HOST"
+DEFAULT_PROJECT = "demo-diana"
+
+
+class ScriptError(RuntimeError):
+    """Raised when the dataset cannot be generated or loaded."""
+
+
+def _locales(value: str) -> tuple[str, ...]:
+    locales = tuple(part.strip() for part in value.split(",") if part.strip())
+    unknown = [locale for locale in locales if locale not in LOCALES]
+    if not locales or unknown:
+        raise argparse.ArgumentTypeError(f"choose locales from {', '.join(LOCALES)}")
+    return locales
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    defaults = DatasetSpec()
+    shape = parser.add_argument_group("dataset")
+    shape.add_argument("--seed", type=int, default=defaults.seed, help="Random seed (default: %(default)s)")
+    shape.add_argument("--sessions", type=int, default=defaults.sessions, help="Sessions to generate (default: %(default)s)")
+    shape.add_argument("--todos", type=int, default=defaults.todos, help="Todos per session (default: %(default)s)")
+    shape.add_argument(
+        "--appointments", type=int, default=defaults.appointments, help="Appointments per session (default: %(default)s)"
+    )
+    shape.add_argument("--thoughts", type=int, default=defaults.thoughts, help="Thought notes per session (default: %(default)s)")
+    shape.add_argument("--free-notes", type=int, default=defaults.free_notes, help="Free notes per session (default: %(default)s)")
+    shape.add_argument("--tags", type=int, default=defaults.tags, help="Tag catalog size (default: %(default)s)")
+    shape.add_argument(
+        "--legacy-tags",
+        type=float,
+        default=defaults.legacy_tags,
+        metavar="SHARE",
+        help="Share of tagged notes using legacy 'tags' labels instead of tagIds, 0 to 1 (default: %(default)s)",
+    )
+    shape.add_argument(
+        "--locales",
+        type=_locales,
+        default=defaults.locales,
+        metavar="en,it,fr",
+        help="Session locales, assigned round-robin (default: en,it,fr)",
+    )
+    shape.add_argument(
+        "--thought-bytes", type=int, default=defaults.thought_bytes, help="Thought document size, 0 for none (default: %(default)s)"
+    )
+    shape.add_argument(
+        "--outline-depth", type=int, default=defaults.outline_depth, help="Deepest heading level (default: %(default)s)"
+    )
+    shape.add_argument(
+        "--thought-versions",
+        type=int,
+        default=defaults.thought_versions,
+        help="Thought history versions leading up to the document (default: %(default)s)",
+    )
+    shape.add_argument(
+        "--thought-layout", choices=LAYOUTS, default=defaults.thought_layout, help="Thought storage layout (default: %(default)s)"
+    )
+    shape.add_argument(
+        "--change-sets", type=int, default=defaults.change_sets, help="Todo change sets per session (default: %(default)s)"
+    )
+    shape.add_argument("--memos", type=int, default=defaults.memos, help="Inbox memos per session (default: %(default)s)")
+    shape.add_argument(
+        "--pending-memos",
+        type=int,
+        default=defaults.pending_memos,
+        help="How many of the newest memos stay pending (default: %(default)s)",
+    )
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--jsonl", metavar="PATH", help="Write the document writes as JSONL ('-' for stdout)")
+    output.add_argument(
+        "--emulator",
+        nargs="?",
+        const="",
+        metavar="HOST:PORT",
+        help=f"Load the dataset into a Firestore emulator (default: ${EMULATOR_ENV})",
+    )
+    output.add_argument(
+        "--project-id", default=DEFAULT_PROJECT, help="Emulator project ID (default: %(default)s)"
+    )
+    output.add_argument("--from-jsonl", metavar="PATH", help="Replay a JSONL dataset instead of generating one")
+    output.add_argument("--memo-corpus", metavar="PATH", help="Write the memos as batch records ('-' for stdout)")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.jsonl is None and args.emulator is None and args.memo_corpus is None:
+        parser.error("choose at least one of --jsonl, --emulator or --memo-corpus")
+    if args.from_jsonl and (args.memo_corpus or args.jsonl):
+        parser.error("--from-jsonl only replays into --emulator")
+    return args
+
+
+def _spec(args: argparse.Namespace) -> DatasetSpec:
+    try:
+        return DatasetSpec(
+            seed=args.seed,
+            sessions=args.sessions,
+            todos=args.todos,
+            appointments=args.appointments,
+            thoughts=args.thoughts,
+            free_notes=args.free_notes,
+            tags=args.tags,
+            legacy_tags=args.legacy_tags,
+            locales=args.locales,
+            thought_bytes=args.thought_bytes,
+            outline_depth=args.outline_depth,
+            thought_versions=args.thought_versions,
+            thought_layout=args.thought_layout,
+            change_sets=args.change_sets,
+            memos=args.memos,
+            pending_memos=args.pending_memos,
+        )
+    except ValueError as exc:
+        raise ScriptError(str(exc)) from exc
+
+
+def _open(stack: ExitStack, path: str) -> IO[str]:
+    if path == "-":
+        return sys.stdout
+    return stack.enter_context(open(path, "w", encoding="utf-8"))
+
+
+def _emulator_client(args: argparse.Namespace) -> Any:
+    host = args.emulator or os.environ.get(EMULATOR_ENV, "")
+    if not host:
+        raise ScriptError(f"--emulator needs HOST:PORT or ${EMULATOR_ENV}")
+    # The client only talks to the emulator (with anonymous credentials) when this is set.
+    os.environ[EMULATOR_ENV] = host
+    from google.cloud import firestore
+
+    return metered(firestore.Client(project=args.project_id))
+
+
+def _counted(ops: Iterable[WriteOp], counts: Counter[str]) -> Iterator[WriteOp]:
+    for op in ops:
+        counts[op.path[-2] if len(op.path) > 2 else op.path[0]] += 1
+        yield op
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    with profiled(args):
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
+    counts: Counter[str] = Counter()
+    try:
+        with ExitStack() as stack:
+            if args.from_jsonl:
+                source = stack.enter_context(open(args.from_jsonl, encoding="utf-8"))
+                ops: Iterable[WriteOp] = _counted(read_jsonl(source), counts)
+            else:
+                spec = _spec(args)
+                ops = _counted(dataset_ops(spec), counts)
+                if args.memo_corpus:
+                    with phase("memo_corpus"):
+                        memos = write_jsonl(memo_corpus(spec), _open(stack, args.memo_corpus))
+                    print(f"{memos} memos written to {args.memo_corpus}", file=sys.stderr)
+                if args.jsonl:
+                    with phase("jsonl"):
+                        write_jsonl(ops, _open(stack, args.jsonl))
+                    ops = dataset_ops(spec) if args.emulator is not None else ()
+            if args.emulator is not None:
+                with phase("firestore_init"):
+                    client = _emulator_client(args)
+                with phase("bulk_write"):
+                    bulk_load(client, ops)
+    except (OSError, ValueError, ScriptError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+    if counts:
+        summary = ", ".join(f"{name} {count}" for name, count in sorted(counts.items()))
+        print(f"{sum(counts.values())} documents written ({summary})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,33 +15,35 @@ document if present. Use ``--json`` for machine-readable output and
 from __future__ import annotations
 
 import argparse
-import json
 import sys
-from dataclasses import asdict, is_dataclass
-from typing import Any, Iterable
+from dataclasses import is_dataclass
+from typing import TYPE_CHECKING, Any, Iterable
 
-from google.api_core.exceptions import GoogleAPIError
-from google.api_core.retry import Retry
-from firebase_admin import exceptions as firebase_exceptions
-from google.cloud import firestore
-
-from notes_tools.firebase import initialize_firestore
+from notes_tools.codec import JSON, to_plain
 from notes_tools.notes import (
-    Appointment,
-    FreeNote,
     NotesTagCatalog,
     Session,
     SessionSettings,
     TagMappingContext,
-    Thought,
-    TodoItem,
+    note_type_name,
     parse_remote_note,
     parse_remote_session,
 )
+from notes_tools.profiling import add_profile_arguments, profiled
+from notes_tools.thought_store import (
+    LAYOUT_CHUNKED,
+    THOUGHT_DOCUMENT_ID,
+    load_thought_document,
+    parse_thought_header,
+    without_blob,
+)
+from notes_tools.timing import phase
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
 
 
 NOTE_COLLECTION = "notes"
-THOUGHT_DOCUMENT_ID = "__thought_document__"
 DEFAULT_PAGE_SIZE = 25
 DEFAULT_LOCALE = "en"
 
@@ -91,10 +93,24 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
         default=None,
         help="Limit how many structured notes to load per session",
     )
+    parser.add_argument(
+        "--thought-section",
+        dest="thought_sections",
+        action="append",
+        default=None,
+        metavar="ANCHOR",
+        help=(
+            "Only fetch the given top-level section of chunked thought documents "
+            "(repeatable; defaults to all sections for --json and the first one otherwise)"
+        ),
+    )
+    add_profile_arguments(parser)
     return parser.parse_args(argv)
 
 
 def _firestore_client(args: argparse.Namespace) -> firestore.Client:
+    from notes_tools.firebase import initialize_firestore
+
     return initialize_firestore(args.service_account, args.project_id)
 
 
@@ -125,6 +141,8 @@ def _fetch_sessions(
             return []
         return [(session, data)]
 
+    from google.api_core.retry import Retry
+
     query = _session_query(client, args)
     sessions: list[tuple[Session, dict[str, Any]]] = []
     for document in query.stream(retry=Retry(deadline=30.0)):
@@ -150,19 +168,36 @@ def _tag_context(session_data: dict[str, Any]) -> TagMappingContext:
 
 def _note_to_dict(note: Any) -> dict[str, Any]:
     if is_dataclass(note):
-        payload = asdict(note)
+        payload = to_plain(note)
     elif isinstance(note, dict):
         payload = dict(note)
     else:
         payload = {"value": repr(note)}
-    if isinstance(note, TodoItem):
-        payload["type"] = "todo"
-    elif isinstance(note, Thought):
-        payload["type"] = "memo"
-    elif isinstance(note, Appointment):
-        payload["type"] = "event"
-    elif isinstance(note, FreeNote):
-        payload["type"] = "free"
+    note_type = note_type_name(note)
+    if note_type is not None:
+        payload["type"] = note_type
+    return payload
+
+
+def _thought_document_payload(
+    client: firestore.Client,
+    reference: Any,
+    data: dict[str, Any],
+    sections: list[str] | None,
+    preview_only: bool,
+) -> dict[str, Any]:
+    header = parse_thought_header(data, reference.path)
+    if header is None or header.layout != LAYOUT_CHUNKED:
+        return without_blob(data, reference.path)
+    anchors: list[str] | None = sections
+    if anchors is None and preview_only:
+        anchors = [chunk.anchor or chunk.id for chunk in header.chunks[:1]]
+    document = load_thought_document(header, reference, anchors=anchors, client=client)
+    payload = dict(data)
+    payload["markdown"] = document.markdown_body if document else ""
+    payload["loaded_sections"] = anchors if anchors is not None else [
+        chunk.anchor or chunk.id for chunk in header.chunks
+    ]
     return payload
 
 
@@ -171,7 +206,11 @@ def _fetch_notes_for_session(
     session_id: str,
     session_data: dict[str, Any],
     notes_limit: int | None,
+    thought_sections: list[str] | None = None,
+    preview_only: bool = False,
 ) -> tuple[list[dict[str, Any]], dict[str, Any] | None]:
+    from google.api_core.retry import Retry
+
     collection = (
         client.collection("sessions")
         .document(session_id)
@@ -183,7 +222,11 @@ def _fetch_notes_for_session(
     loaded_notes = 0
     for document in collection.stream(retry=Retry(deadline=30.0)):
         if document.id == THOUGHT_DOCUMENT_ID:
-            thought_document = document.to_dict() or {}
+            with phase("thought_document"):
+                thought_document = _thought_document_payload(
+                    client,
+                    document.reference, document.to_dict() or {}, thought_sections, preview_only
+                )
             continue
         parsed = parse_remote_note(document, tag_context)
         if parsed is None:
@@ -278,14 +321,30 @@ def _print_text(sessions: list[dict[str, Any]]) -> None:
 
 def main(argv: Iterable[str] | None = None) -> int:
     args = parse_args(argv)
+    with profiled(args):
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
+    from firebase_admin import exceptions as firebase_exceptions
+    from google.api_core.exceptions import GoogleAPIError
+
     try:
-        client = _firestore_client(args)
-        sessions = _fetch_sessions(client, args)
+        with phase("firestore_init"):
+            client = _firestore_client(args)
+        with phase("sessions"):
+            sessions = _fetch_sessions(client, args)
         reports: list[dict[str, Any]] = []
         for session, session_data in sessions:
-            notes, thought_document = _fetch_notes_for_session(
-                client, session.id, session_data, args.notes_limit
-            )
+            with phase("notes"):
+                notes, thought_document = _fetch_notes_for_session(
+                    client,
+                    session.id,
+                    session_data,
+                    args.notes_limit,
+                    thought_sections=args.thought_sections,
+                    preview_only=not args.json,
+                )
             reports.append(_serialize_session(session, session_data, notes, thought_document))
     except FileNotFoundError as exc:
         print(f"Error: {exc}", file=sys.stderr)
@@ -297,11 +356,12 @@ def main(argv: Iterable[str] | None = None) -> int:
         print(f"Unexpected error: {exc}", file=sys.stderr)
         return 3
 
-    if args.json:
-        json.dump(reports, sys.stdout, indent=2, sort_keys=True)
-        sys.stdout.write("\n")
-    else:
-        _print_text(reports)
+    with phase("output"):
+        if args.json:
+            sys.stdout.write(JSON.dumps(reports, indent=True, sort_keys=True))
+            sys.stdout.write("\n")
+        else:
+            _print_text(reports)
     return 0
 
 
@@ -4,16 +4,15 @@
 from __future__ import annotations
 
 import argparse
-import json
-from dataclasses import asdict, is_dataclass
-from typing import Any, Iterable
+from typing import TYPE_CHECKING, Iterable
 
-from google.api_core.exceptions import GoogleAPIError
-from google.api_core.retry import Retry
-from google.cloud import firestore
-
-from notes_tools.firebase import initialize_firestore
+from notes_tools.codec import JSON, to_plain
 from notes_tools.notes import TodoChangeSet, parse_remote_todo_change_set
+from notes_tools.profiling import add_profile_arguments, profiled
+from notes_tools.timing import phase
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
 
 
 DEFAULT_PAGE_SIZE = 50
@@ -51,10 +50,13 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
         default=DEFAULT_PAGE_SIZE,
         help="Page size when streaming change sets",
     )
+    add_profile_arguments(parser)
     return parser.parse_args(argv)
 
 
 def _firestore_client(args: argparse.Namespace) -> firestore.Client:
+    from notes_tools.firebase import initialize_firestore
+
     return initialize_firestore(args.service_account, args.project_id)
 
 
@@ -71,6 +73,9 @@ def _fetch_change_sets(
     session_id: str,
     limit: int | None,
 ) -> list[TodoChangeSet]:
+    from google.api_core.exceptions import GoogleAPIError
+    from google.api_core.retry import Retry
+
     collection = _change_sets_collection(client, session_id)
     change_sets: list[TodoChangeSet] = []
     try:
@@ -88,14 +93,6 @@ def _fetch_change_sets(
     return change_sets
 
 
-def _serialize(value: Any) -> Any:
-    if is_dataclass(value):
-        return asdict(value)
-    if isinstance(value, list):
-        return [_serialize(item) for item in value]
-    return value
-
-
 def _render_change_set(change_set: TodoChangeSet) -> str:
     lines: list[str] = []
     header = (
@@ -118,11 +115,17 @@ def _render_change_set(change_set: TodoChangeSet) -> str:
 
 def main(argv: Iterable[str] | None = None) -> int:
     args = parse_args(argv)
-    client = _firestore_client(args)
-    change_sets = _fetch_change_sets(client, args.session_id, args.limit)
+    with profiled(args):
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
+    with phase("firestore_init"):
+        client = _firestore_client(args)
+    with phase("change_sets"):
+        change_sets = _fetch_change_sets(client, args.session_id, args.limit)
     if args.json:
-        payload = _serialize(change_sets)
-        print(json.dumps(payload, indent=2, sort_keys=True))
+        print(JSON.dumps(to_plain(change_sets), indent=True, sort_keys=True))
         return 0
     if not change_sets:
         print("No todo change sets found.")
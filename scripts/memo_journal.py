@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Inspect the write-behind journal filled by ``process_memo.py --write-behind``.
+
+Entries that failed permanently, or too often to be worth retrying, are
+dead-lettered and no longer hold back their session. They can be listed,
+revived for another round of retries, or dropped.
+
+Usage examples::
+
+    python scripts/memo_journal.py list
+    python scripts/memo_journal.py list --dead --json
+    python scripts/memo_journal.py requeue --all
+    python scripts/memo_journal.py drop 12 13
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Iterable
+
+from notes_tools.journal import DEFAULT_JOURNAL_PATH, JournalLocked, WriteJournal
+from notes_tools.profiling import add_profile_arguments, profiled
+from notes_tools.timing import phase
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--journal",
+        dest="journal",
+        type=Path,
+        default=DEFAULT_JOURNAL_PATH,
+        help="Location of the write-behind journal (default: %(default)s)",
+    )
+    add_profile_arguments(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    listing = commands.add_parser("list", help="List journal entries")
+    state = listing.add_mutually_exclusive_group()
+    state.add_argument("--dead", action="store_true", help="Only show dead-lettered entries")
+    state.add_argument("--live", action="store_true", help="Only show entries still being retried")
+    listing.add_argument("--limit", type=int, default=50, help="Maximum number of entries (default: %(default)s)")
+    listing.add_argument("--json", action="store_true", help="Print one JSON object per entry")
+
+    requeue = commands.add_parser("requeue", help="Retry dead-lettered entries on the next flush")
+    requeue.add_argument("entry_ids", nargs="*", type=int, help="Dead entry IDs to requeue")
+    requeue.add_argument("--all", action="store_true", help="Requeue every dead entry")
+
+    drop = commands.add_parser("drop", help="Delete dead-lettered entries; their writes are lost")
+    drop.add_argument("entry_ids", nargs="*", type=int, help="Dead entry IDs to delete")
+    drop.add_argument("--all", action="store_true", help="Delete every dead entry")
+    args = parser.parse_args(argv)
+    if args.command in ("requeue", "drop") and bool(args.entry_ids) == args.all:
+        parser.error(f"{args.command} needs either entry IDs or --all")
+    return args
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    with profiled(args):
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
+    try:
+        journal = WriteJournal(args.journal)
+    except JournalLocked as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    except (OSError, sqlite3.Error) as exc:
+        print(f"error: unable to open journal {args.journal}: {exc}", file=sys.stderr)
+        return 1
+    try:
+        with phase(args.command):
+            if args.command == "list":
+                dead = True if args.dead else False if args.live else None
+                for entry in journal.entries(dead=dead, limit=args.limit):
+                    if args.json:
+                        print(json.dumps(entry.to_map(), ensure_ascii=False))
+                        continue
+                    state = "dead" if entry.dead else "live"
+                    error = f" error={entry.last_error}" if entry.last_error else ""
+                    ops = len(entry.ops)
+                    print(f"{entry.id}\t{state}\t{entry.session_id}\tops={ops}\tattempts={entry.attempts}{error}")
+            elif args.command == "requeue":
+                count = journal.requeue_dead(None if args.all else args.entry_ids)
+                print(f"Requeued {count} entries.")
+            elif args.command == "drop":
+                count = journal.drop(None if args.all else args.entry_ids)
+                print(f"Deleted {count} entries.")
+        return 0
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
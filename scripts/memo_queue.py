@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Manage the local memo job queue consumed by ``process_memo.py --work-queue``.
+
+Usage examples::
+
+    python scripts/memo_queue.py enqueue SESSION --memo "Buy milk"
+    python scripts/memo_queue.py enqueue --jsonl backfill.jsonl
+    python scripts/memo_queue.py stats --watch 5
+    python scripts/memo_queue.py list --status dead
+    python scripts/memo_queue.py requeue --all
+    python scripts/memo_queue.py purge --older-than 604800
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from notes_tools.batch import BatchRecordError, parse_aspects
+from notes_tools.job_queue import DEFAULT_MAX_ATTEMPTS, DEFAULT_QUEUE_PATH, STATUSES, JobQueue
+from notes_tools.profiling import add_profile_arguments, profiled
+from notes_tools.timing import phase
+
+ENQUEUE_CHUNK = 1000
+
+
+class ScriptError(RuntimeError):
+    """Raised when the queue command cannot be completed."""
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--queue",
+        dest="queue",
+        type=Path,
+        default=DEFAULT_QUEUE_PATH,
+        help="Location of the queue database (default: %(default)s)",
+    )
+    add_profile_arguments(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add memos to the queue")
+    enqueue.add_argument("session_id", nargs="?", help="Target session (omit with --jsonl)")
+    source = enqueue.add_mutually_exclusive_group()
+    source.add_argument("--memo", help="Memo text (default: read from stdin)")
+    source.add_argument("--memo-file", help="Path to a file containing memo text")
+    source.add_argument(
+        "--jsonl",
+        metavar="FILE",
+        help="Enqueue {session_id, memo, aspects?, model?, key?} records from FILE ('-' for stdin)",
+    )
+    enqueue.add_argument(
+        "--aspects",
+        nargs="+",
+        choices=("todos", "appointments", "thoughts"),
+        help="Only process these aspects (default: session settings)",
+    )
+    enqueue.add_argument("--model", help="Override the model configured for the session")
+    enqueue.add_argument("--key", help="Idempotency key; enqueuing the same key twice is a no-op")
+    enqueue.add_argument("--delay", type=float, default=0.0, help="Seconds before the job becomes available")
+    enqueue.add_argument(
+        "--max-attempts",
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS,
+        help="Attempts before a job is dead-lettered (default: %(default)s)",
+    )
+
+    stats = commands.add_parser("stats", help="Show queue depth, state counts and throughput")
+    stats.add_argument("--json", action="store_true", help="Print machine readable JSON")
+    stats.add_argument("--watch", type=float, metavar="SECONDS", help="Repeat every SECONDS until interrupted")
+
+    listing = commands.add_parser("list", help="List jobs")
+    listing.add_argument("--status", choices=STATUSES, help="Only show jobs in this state")
+    listing.add_argument("--limit", type=int, default=50, help="Maximum number of jobs (default: %(default)s)")
+    listing.add_argument("--json", action="store_true", help="Print one JSON object per job")
+
+    requeue = commands.add_parser("requeue", help="Move dead-lettered jobs back to the ready state")
+    requeue.add_argument("job_ids", nargs="*", type=int, help="Dead job IDs to requeue")
+    requeue.add_argument("--all", action="store_true", help="Requeue every dead job")
+
+    purge = commands.add_parser("purge", help="Delete finished jobs")
+    purge.add_argument(
+        "--older-than",
+        type=float,
+        default=7 * 24 * 3600,
+        metavar="SECONDS",
+        help="Only delete jobs finished more than SECONDS ago (default: %(default)s)",
+    )
+    purge.add_argument("--dead", action="store_true", help="Also delete dead-lettered jobs")
+    args = parser.parse_args(argv)
+    if args.command == "requeue" and bool(args.job_ids) == args.all:
+        parser.error("requeue needs either job IDs or --all")
+    return args
+
+
+def _jsonl_record(line: str, number: int) -> dict:
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError as exc:
+        raise BatchRecordError(f"line {number}: invalid JSON: {exc}") from exc
+    if not isinstance(data, dict) or not str(data.get("session_id") or "").strip():
+        raise BatchRecordError(f"line {number}: record needs a 'session_id'")
+    if not str(data.get("memo") or "").strip():
+        raise BatchRecordError(f"line {number}: record needs a 'memo'")
+    try:
+        parse_aspects(data.get("aspects"))
+    except BatchRecordError as exc:
+        raise BatchRecordError(f"line {number}: {exc}") from exc
+    return {
+        "session_id": str(data["session_id"]).strip(),
+        "memo": str(data["memo"]).strip(),
+        "aspects": data.get("aspects"),
+        "model": data.get("model"),
+        "key": data.get("key"),
+    }
+
+
+def _memo_records(args: argparse.Namespace) -> Iterator[dict]:
+    if args.jsonl is not None:
+        stream = sys.stdin if args.jsonl == "-" else Path(args.jsonl).expanduser().open(encoding="utf-8")
+        with stream:
+            for number, line in enumerate(stream, start=1):
+                if line.strip():
+                    yield _jsonl_record(line, number)
+        return
+    if not args.session_id:
+        raise ScriptError("session_id is required unless --jsonl is given")
+    if args.memo_file:
+        text = Path(args.memo_file).expanduser().read_text(encoding="utf-8")
+    elif args.memo is not None:
+        text = args.memo
+    else:
+        text = sys.stdin.read()
+    if not text.strip():
+        raise ScriptError("Memo text is empty")
+    record = {"session_id": args.session_id, "memo": text.strip(), "aspects": args.aspects, "model": args.model}
+    if args.key:
+        record["key"] = args.key
+    yield record
+
+
+def _enqueue(queue: JobQueue, args: argparse.Namespace) -> None:
+    started = time.perf_counter()
+    added = total = 0
+    chunk: list[dict] = []
+    for record in _memo_records(args):
+        chunk.append(record)
+        total += 1
+        if len(chunk) >= ENQUEUE_CHUNK:
+            added += queue.enqueue_many(chunk, delay=args.delay)
+            chunk = []
+    if chunk:
+        added += queue.enqueue_many(chunk, delay=args.delay)
+    elapsed = time.perf_counter() - started
+    skipped = total - added
+    suffix = f" ({skipped} duplicate keys skipped)" if skipped else ""
+    print(f"Enqueued {added} jobs in {elapsed:.2f}s{suffix}.")
+
+
+def _print_stats(queue: JobQueue, as_json: bool) -> None:
+    stats = queue.stats()
+    if as_json:
+        print(json.dumps(stats.to_map()), flush=True)
+        return
+    counts = ", ".join(f"{status}={stats.counts[status]}" for status in STATUSES)
+    age = "n/a" if stats.oldest_ready_age is None else f"{stats.oldest_ready_age:.0f}s"
+    print(
+        f"depth={stats.depth} ({counts}); oldest ready {age}; "
+        f"completed {stats.completed_last_minute}/min now, "
+        f"{stats.completed_last_hour / 60:.1f}/min over the last hour",
+        flush=True,
+    )
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    with profiled(args):
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
+    try:
+        queue = JobQueue(args.queue, max_attempts=getattr(args, "max_attempts", DEFAULT_MAX_ATTEMPTS))
+    except (OSError, sqlite3.Error) as exc:
+        print(f"error: unable to open queue {args.queue}: {exc}", file=sys.stderr)
+        return 1
+    try:
+        with phase(args.command):
+            if args.command == "enqueue":
+                _enqueue(queue, args)
+            elif args.command == "stats":
+                _print_stats(queue, args.json)
+                while args.watch:
+                    time.sleep(args.watch)
+                    _print_stats(queue, args.json)
+            elif args.command == "list":
+                for job in queue.jobs(args.status, limit=args.limit):
+                    if args.json:
+                        print(json.dumps(job.to_map(), ensure_ascii=False))
+                        continue
+                    memo = str(job.payload.get("memo", "")).replace("\n", " ")
+                    error = f" error={job.last_error}" if job.last_error else ""
+                    print(f"{job.id}\t{job.status}\t{job.session_id}\tattempts={job.attempts}{error}\t{memo[:60]}")
+            elif args.command == "requeue":
+                count = queue.requeue_dead(None if args.all else args.job_ids)
+                print(f"Requeued {count} jobs.")
+            elif args.command == "purge":
+                statuses = ("done", "dead") if args.dead else ("done",)
+                count = queue.purge(args.older_than, statuses)
+                print(f"Deleted {count} jobs.")
+        return 0
+    except KeyboardInterrupt:
+        return 130
+    except (ScriptError, BatchRecordError, OSError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
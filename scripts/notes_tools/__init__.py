@@ -1,10 +1,6 @@
 """Utilities for working with remote notes and memo summaries."""
 
-try:
-    from .firebase import initialize_firestore
-except ModuleNotFoundError as exc:
-    def initialize_firestore(*args, **kwargs):
-        raise ModuleNotFoundError("firebase_admin is required for Firestore access") from exc
+from typing import Any
 
 from .notes import (
     Appointment,
@@ -29,14 +25,28 @@ from .notes import (
     resolve_tag_data,
     summary_to_notes,
 )
+from .note_table import NoteTable, NoteView, parse_remote_notes
 from .memo_processing import MemoProcessor, Prompts, load_resource
 
+
+def initialize_firestore(*args: Any, **kwargs: Any) -> Any:
+    """Create a Firestore client; ``firebase_admin`` is only imported on the first call."""
+
+    try:
+        from .firebase import initialize_firestore as initialize
+    except ModuleNotFoundError as exc:
+        raise ModuleNotFoundError("firebase_admin is required for Firestore access") from exc
+    return initialize(*args, **kwargs)
+
+
 __all__ = [
     "initialize_firestore",
     "Appointment",
     "LocalizedLabel",
     "MemoSummary",
     "NoteCollection",
+    "NoteTable",
+    "NoteView",
     "NotesTagCatalog",
     "NotesTagDefinition",
     "Session",
@@ -50,6 +60,7 @@ __all__ = [
     "TodoChangeSet",
     "TodoItem",
     "parse_remote_note",
+    "parse_remote_notes",
     "parse_remote_todo_change_set",
     "parse_remote_session",
     "resolve_tag_data",
@@ -0,0 +1,418 @@
+"""Asyncio API for memo processing, for services that already run an event loop.
+
+:class:`AsyncMemoPipeline` mirrors :class:`~notes_tools.pipeline.MemoPipeline`
+(same requests, results, conflict handling and write planning) but awaits its
+I/O. The model calls for the aspects of one memo go out together through a
+shared :class:`~notes_tools.openrouter.AsyncOpenRouterSession`, and Firestore
+is awaited directly when ``client`` is the async client
+(:func:`notes_tools.firebase.initialize_async_firestore`). Synchronous
+clients such as :class:`~notes_tools.memory_store.MemoryFirestore` work too;
+their calls run on a private thread pool sized to ``concurrency``.
+
+``concurrency`` bounds the number of memos in flight.
+:meth:`AsyncMemoPipeline.process_many` and :func:`run_batch_async` keep the
+memos of one session in order while different sessions run concurrently.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import functools
+import inspect
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Iterable, Mapping, Sequence
+
+from .batch import STATUS_ERROR, STATUS_OK, BatchOutcome, BatchRecord, BatchStats
+from .memo_processing import LlmLogger, MemoProcessor, load_resource
+from .metrics import LlmMetrics
+from .notes import MemoSummary, ThoughtDocument
+from .openrouter import AsyncOpenRouterSession, LlmReply, LlmRequestError
+from .pipeline import (
+    DEFAULT_MAX_ATTEMPTS,
+    ExtraOps,
+    MemoRequest,
+    MemoResult,
+    PipelineError,
+    SessionState,
+    WriteOptions,
+    _Aspects,
+    _as_reply,
+    _needs_reprocess,
+    _new_processor,
+    _observe_failure,
+    _observe_reply,
+    _plan_writes,
+    build_session_state,
+    load_session_state,
+)
+from .session_writes import (
+    MAX_BATCH_WRITES,
+    NOTES_COLLECTION,
+    SESSIONS_COLLECTION,
+    SessionGuard,
+    SummaryReads,
+    WriteConflict,
+    WriteOp,
+    WriteTooLarge,
+    apply_writes,
+    is_precondition_failure,
+    iter_write_batches,
+)
+from .thought_history import HISTORY_COLLECTION, HistoryEntry
+from .thought_store import (
+    THOUGHT_DOCUMENT_ID,
+    fill_chunks,
+    load_thought_document,
+    parse_thought_header,
+    section_reference,
+)
+
+DEFAULT_CONCURRENCY = 16
+
+AsyncLlmCall = Callable[[Mapping[str, Any]], "Awaitable[Mapping[str, Any] | LlmReply]"]
+
+
+def is_async_client(client: Any) -> bool:
+    """Whether ``client`` is an async Firestore client whose reads must be awaited."""
+
+    reference = client.collection(SESSIONS_COLLECTION).document("_")
+    return inspect.iscoroutinefunction(getattr(reference, "get", None))
+
+
+async def load_session_state_async(client: Any, session_id: str) -> SessionState:
+    """Async-client counterpart of :func:`~notes_tools.pipeline.load_session_state`."""
+
+    document = await client.collection(SESSIONS_COLLECTION).document(session_id).get()
+    if not document.exists:
+        raise PipelineError(f"Session '{session_id}' not found")
+    notes = [snapshot async for snapshot in document.reference.collection(NOTES_COLLECTION).stream()]
+    thought: ThoughtDocument | None = None
+    for snapshot in notes:
+        if snapshot.id == THOUGHT_DOCUMENT_ID:
+            thought = await _load_thought_async(client, snapshot)
+    return build_session_state(document, notes, load_thought=lambda _snapshot: thought)
+
+
+async def _load_thought_async(client: Any, snapshot: Any) -> ThoughtDocument | None:
+    """Parse the thought document, awaiting the sections of a chunked one in one round trip."""
+
+    header = parse_thought_header(snapshot.to_dict() or {}, snapshot.reference.path)
+    if header is None:
+        return None
+    pending = [chunk for chunk in header.chunks if chunk.markdown is None]
+    if pending:
+        references = [section_reference(snapshot.reference, chunk) for chunk in pending]
+        get_all = getattr(client, "get_all", None)
+        if get_all is not None:
+            sections = [section async for section in get_all(references)]
+        else:
+            sections = await asyncio.gather(*(reference.get() for reference in references))
+        fill_chunks(pending, sections)
+    return load_thought_document(header)
+
+
+async def apply_writes_async(
+    client: Any,
+    ops: Sequence[WriteOp],
+    *,
+    guard: SessionGuard | None = None,
+    batch_size: int = MAX_BATCH_WRITES,
+) -> int:
+    """Async-client counterpart of :func:`~notes_tools.session_writes.apply_writes`."""
+
+    if guard is not None:
+        guard = dataclasses.replace(guard)
+    commits = 0
+    for batch in iter_write_batches(client, ops, guard=guard, batch_size=batch_size):
+        try:
+            results = await batch.commit()
+        except WriteConflict:
+            raise
+        except Exception as exc:
+            if is_precondition_failure(exc):
+                raise WriteConflict(str(exc)) from exc
+            raise
+        if guard is not None:
+            guard.advance(results)
+        commits += 1
+    return commits
+
+
+async def _summary_reads(client: Any, state: SessionState, history: bool) -> SummaryReads:
+    session_ref = client.collection(SESSIONS_COLLECTION).document(state.session.id)
+    previous = await session_ref.collection(NOTES_COLLECTION).document(THOUGHT_DOCUMENT_ID).get()
+    head: HistoryEntry | None = None
+    if history:
+        query = session_ref.collection(HISTORY_COLLECTION).order_by("version", direction="DESCENDING").limit(1)
+        async for snapshot in query.stream():
+            head = HistoryEntry.from_map(snapshot.to_dict() or {})
+    return SummaryReads(previous.to_dict() if previous.exists else None, head)
+
+
+class AsyncMemoPipeline:
+    """Processes memos on an event loop; see the module docstring.
+
+    Use it as an async context manager (or call :meth:`aclose`) so pooled
+    connections and the I/O threads are released. ``logger`` and ``metrics``
+    are shared by every memo, as in :class:`~notes_tools.pipeline.MemoPipeline`.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        *,
+        api_key: str,
+        llm: AsyncLlmCall | None = None,
+        base_url: str | None = None,
+        write_options: WriteOptions | None = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        logger: LlmLogger | None = None,
+        metrics: LlmMetrics | None = None,
+    ) -> None:
+        self.client = client
+        self.api_key = api_key
+        self.logger = logger
+        self.metrics = metrics
+        self.write_options = write_options or WriteOptions()
+        self.max_attempts = max(1, max_attempts)
+        self.concurrency = max(1, concurrency)
+        self._async_client = is_async_client(client)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._executor: ThreadPoolExecutor | None = None
+        if not self._async_client:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="memo-io")
+        self._transport: AsyncOpenRouterSession | None = None
+        if llm is None:
+            # Up to one connection per aspect of every memo in flight.
+            transport = AsyncOpenRouterSession(
+                base_url or load_resource("llm/base_url.txt").strip(),
+                api_key,
+                max_connections=self.concurrency * 3,
+            )
+            self._transport = transport
+            llm = transport.complete
+        self._llm = llm
+
+    async def _call_llm(
+        self, processor: MemoProcessor, aspect: str, payload: Mapping[str, Any]
+    ) -> tuple[LlmReply, tuple[float, Mapping[str, Any] | None]]:
+        started = time.perf_counter()
+        try:
+            reply = _as_reply(await self._llm(payload))
+        except Exception as exc:
+            _observe_failure(self.metrics, processor, aspect, started, exc)
+            raise
+        return reply, _observe_reply(self.metrics, processor, aspect, started, reply)
+
+    async def __aenter__(self) -> "AsyncMemoPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._transport is not None:
+            await self._transport.aclose()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    async def process(
+        self,
+        request: MemoRequest,
+        *,
+        update: bool = False,
+        extra_ops: ExtraOps = (),
+    ) -> MemoResult:
+        """Process ``request``; with ``update``, ``extra_ops`` are committed atomically with the notes."""
+
+        async with self._slots:
+            return await self._process(request, update, extra_ops)
+
+    async def process_many(
+        self,
+        requests: Iterable[MemoRequest],
+        *,
+        update: bool = False,
+    ) -> list[MemoResult | Exception]:
+        """Process ``requests`` concurrently, in order per session; errors are returned in place."""
+
+        items = list(requests)
+        results: list[MemoResult | Exception] = [PipelineError("not processed")] * len(items)
+        chains: dict[str, list[int]] = {}
+        for index, request in enumerate(items):
+            chains.setdefault(request.session_id, []).append(index)
+
+        async def run_chain(indexes: list[int]) -> None:
+            for index in indexes:
+                try:
+                    results[index] = await self.process(items[index], update=update)
+                except Exception as exc:  # reported to the caller with the other results
+                    results[index] = exc
+
+        await asyncio.gather(*(run_chain(indexes) for indexes in chains.values()))
+        return results
+
+    async def _process(self, request: MemoRequest, update: bool, extra_ops: ExtraOps) -> MemoResult:
+        responses: dict[str, str] | None = None
+        calls: dict[str, tuple[float, Mapping[str, Any] | None]] = {}
+        basis: SessionState | None = None
+        llm_calls = 0
+        for attempt in range(1, self.max_attempts + 1):
+            state = await self._load(request.session_id)
+            aspects = _Aspects.resolve(request, state.session)
+            processor = _new_processor(self.api_key, state, request, self.logger)
+            requests = processor.prepare_requests(
+                request.memo,
+                process_todos=aspects.todos,
+                process_appointments=aspects.appointments,
+                process_thoughts=aspects.thoughts,
+            )
+            if responses is not None and (
+                set(responses) != set(requests) or _needs_reprocess(basis, state, aspects)
+            ):
+                responses = None
+            if responses is None:
+                names = list(requests)
+                replies = await asyncio.gather(*(self._call_llm(processor, name, requests[name]) for name in names))
+                responses = {name: json.dumps(reply.content) for name, (reply, _) in zip(names, replies)}
+                calls = {name: call for name, (_, call) in zip(names, replies)}
+                llm_calls += len(replies)
+                basis = state
+            for aspect, body in responses.items():
+                latency, usage = calls.pop(aspect, (None, None))
+                processor.ingest_response(aspect, body, latency=latency, usage=usage)
+            summary = processor.summary()
+            if not update:
+                return MemoResult(summary, processor.logger, attempts=attempt, llm_calls=llm_calls)
+            try:
+                saved = await self._write(state, summary, aspects, extra_ops)
+            except WriteConflict:
+                continue
+            except WriteTooLarge as exc:
+                raise PipelineError(f"Session '{request.session_id}': {exc}") from exc
+            return MemoResult(saved, processor.logger, written=True, attempts=attempt, llm_calls=llm_calls)
+        raise PipelineError(
+            f"Session '{request.session_id}' kept changing; gave up after {self.max_attempts} attempts"
+        )
+
+    async def _load(self, session_id: str) -> SessionState:
+        if self._async_client:
+            return await load_session_state_async(self.client, session_id)
+        return await self._run(load_session_state, self.client, session_id)
+
+    async def _write(
+        self,
+        state: SessionState,
+        summary: MemoSummary,
+        aspects: _Aspects,
+        extra_ops: ExtraOps,
+    ) -> MemoSummary:
+        options = self.write_options
+        if not self._async_client:
+
+            def write() -> MemoSummary:
+                ops, saved = _plan_writes(self.client, state, summary, aspects, options, extra_ops)
+                apply_writes(self.client, ops, guard=state.guard())
+                return saved
+
+            return await self._run(write)
+        reads = SummaryReads()
+        if aspects.thoughts and summary.thought_document is not None:
+            reads = await _summary_reads(self.client, state, bool(options.history_interval))
+        ops, saved = _plan_writes(self.client, state, summary, aspects, options, extra_ops, reads=reads)
+        await apply_writes_async(self.client, ops, guard=state.guard())
+        return saved
+
+    async def _run(self, function: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args))
+
+
+async def _process_record(
+    pipeline: AsyncMemoPipeline, record: BatchRecord, enqueued: float, update: bool
+) -> BatchOutcome:
+    started = time.perf_counter()
+    outcome = BatchOutcome(record.line, record.request.session_id, STATUS_OK)
+    try:
+        outcome.result = await pipeline.process(record.request, update=update)
+    except (PipelineError, LlmRequestError) as exc:
+        outcome.status, outcome.error = STATUS_ERROR, str(exc)
+    except Exception as exc:  # keep the batch going; report the failure on this record
+        outcome.status, outcome.error = STATUS_ERROR, f"{type(exc).__name__}: {exc}"
+    outcome.queued_ms = (started - enqueued) * 1000
+    outcome.elapsed_ms = (time.perf_counter() - started) * 1000
+    return outcome
+
+
+async def run_batch_async(
+    pipeline: AsyncMemoPipeline,
+    items: Iterable[BatchRecord | BatchOutcome],
+    *,
+    emit: Callable[[BatchOutcome], None],
+    update: bool = False,
+) -> BatchStats:
+    """Event-loop counterpart of :class:`~notes_tools.batch.BatchRunner`.
+
+    ``items`` is consumed on a worker thread so a slow input (such as a pipe)
+    does not stall memos already in flight.
+    """
+
+    started = time.perf_counter()
+    stats = BatchStats()
+    queues: dict[str, deque[tuple[BatchRecord, float]]] = {}
+    drainers: set[asyncio.Task[None]] = set()
+
+    def report(outcome: BatchOutcome) -> None:
+        stats.records += 1
+        if outcome.status != STATUS_OK:
+            stats.failed += 1
+        if outcome.session_id:
+            stats.sessions.add(outcome.session_id)
+        emit(outcome)
+
+    async def drain(session_id: str) -> None:
+        queue = queues[session_id]
+        while queue:
+            record, enqueued = queue.popleft()
+            report(await _process_record(pipeline, record, enqueued, update))
+        del queues[session_id]
+
+    loop = asyncio.get_running_loop()
+    iterator = iter(items)
+    done = object()
+    while True:
+        item = await loop.run_in_executor(None, next, iterator, done)
+        if item is done:
+            break
+        if isinstance(item, BatchOutcome):
+            report(item)
+            continue
+        session_id = item.request.session_id
+        queue = queues.get(session_id)
+        if queue is not None:
+            queue.append((item, time.perf_counter()))
+            continue
+        queues[session_id] = deque([(item, time.perf_counter())])
+        task = asyncio.create_task(drain(session_id))
+        drainers.add(task)
+        task.add_done_callback(drainers.discard)
+    while drainers:
+        await asyncio.gather(*drainers)
+    stats.elapsed_s = time.perf_counter() - started
+    return stats
+
+
+__all__ = [
+    "DEFAULT_CONCURRENCY",
+    "AsyncLlmCall",
+    "AsyncMemoPipeline",
+    "apply_writes_async",
+    "is_async_client",
+    "load_session_state_async",
+    "run_batch_async",
+]
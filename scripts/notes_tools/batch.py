@@ -0,0 +1,292 @@
+"""Process JSONL streams of memos across a worker pool.
+
+Each input line is a JSON object ``{"session_id": ..., "memo": ...}`` with an
+optional ``aspects`` field (a list such as ``["todos", "thoughts"]`` or a map
+like ``{"appointments": false}``) and an optional ``model``. Records for the
+same session are processed strictly in input order, while different sessions
+run in parallel on a shared :class:`~notes_tools.pipeline.MemoPipeline`.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, Mapping
+
+from .defaults import DEFAULT_WORKERS
+from .openrouter import LlmRequestError
+from .pipeline import MemoPipeline, MemoRequest, MemoResult, PipelineError
+
+ASPECT_NAMES = ("todos", "appointments", "thoughts")
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+class BatchRecordError(ValueError):
+    """Raised when an input line is not a valid batch record."""
+
+
+@dataclass(slots=True)
+class BatchRecord:
+    line: int
+    request: MemoRequest
+
+
+@dataclass(slots=True)
+class BatchOutcome:
+    """Result of one batch record, emitted as a JSONL line."""
+
+    line: int
+    session_id: str | None
+    status: str
+    error: str | None = None
+    result: MemoResult | None = None
+    queued_ms: float = 0.0
+    elapsed_ms: float = 0.0
+
+    def to_map(self, summary: Callable[[Any], Any] | None = None) -> dict[str, Any]:
+        payload: dict[str, Any] = {"line": self.line, "session_id": self.session_id, "status": self.status}
+        if self.error is not None:
+            payload["error"] = self.error
+        if self.result is not None:
+            payload.update(
+                attempts=self.result.attempts,
+                llm_calls=self.result.llm_calls,
+                written=self.result.written,
+                journaled=self.result.journaled,
+            )
+            if summary is not None:
+                payload["summary"] = summary(self.result.summary)
+        payload["timings"] = {"queued_ms": round(self.queued_ms, 1), "elapsed_ms": round(self.elapsed_ms, 1)}
+        return payload
+
+
+@dataclass(slots=True)
+class BatchStats:
+    records: int = 0
+    failed: int = 0
+    elapsed_s: float = 0.0
+    sessions: set[str] = field(default_factory=set)
+
+
+def parse_aspects(value: Any) -> dict[str, bool | None]:
+    """Normalize an ``aspects`` list or map; ``None`` entries defer to defaults."""
+
+    if value is None:
+        return {name: None for name in ASPECT_NAMES}
+    if isinstance(value, list):
+        unknown = [item for item in value if item not in ASPECT_NAMES]
+        if unknown:
+            raise BatchRecordError(f"Unknown aspects: {', '.join(map(str, unknown))}")
+        return {name: name in value for name in ASPECT_NAMES}
+    if isinstance(value, Mapping):
+        unknown = [key for key in value if key not in ASPECT_NAMES]
+        if unknown:
+            raise BatchRecordError(f"Unknown aspects: {', '.join(map(str, unknown))}")
+        return {name: (bool(value[name]) if name in value else None) for name in ASPECT_NAMES}
+    raise BatchRecordError("'aspects' must be a list or an object")
+
+
+def build_request(
+    session_id: str,
+    memo: str,
+    *,
+    aspects: Any = None,
+    model: str | None = None,
+    defaults: MemoRequest | None = None,
+) -> MemoRequest:
+    """Build a :class:`MemoRequest` from record fields, falling back to ``defaults``."""
+
+    flags = parse_aspects(aspects)
+
+    def _flag(name: str, fallback: bool | None) -> bool | None:
+        return flags[name] if flags[name] is not None else fallback
+
+    return MemoRequest(
+        session_id=session_id,
+        memo=memo,
+        process_todos=_flag("todos", defaults.process_todos if defaults else None),
+        process_appointments=_flag("appointments", defaults.process_appointments if defaults else None),
+        process_thoughts=_flag("thoughts", defaults.process_thoughts if defaults else None),
+        model=model or (defaults.model if defaults else None),
+    )
+
+
+def parse_batch_record(
+    text: str,
+    line: int,
+    *,
+    defaults: MemoRequest | None = None,
+) -> BatchRecord:
+    """Parse one JSONL line; unset fields fall back to ``defaults``."""
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as exc:
+        raise BatchRecordError(f"Invalid JSON: {exc}") from exc
+    if not isinstance(data, Mapping):
+        raise BatchRecordError("Record must be a JSON object")
+    session_id = str(data.get("session_id") or "").strip()
+    if not session_id:
+        raise BatchRecordError("Record is missing 'session_id'")
+    memo = str(data.get("memo") or "").strip()
+    if not memo:
+        raise BatchRecordError("Record is missing 'memo'")
+    request = build_request(
+        session_id,
+        memo,
+        aspects=data.get("aspects"),
+        model=str(data.get("model") or "").strip() or None,
+        defaults=defaults,
+    )
+    return BatchRecord(line, request)
+
+
+def read_batch(
+    lines: Iterable[str],
+    *,
+    defaults: MemoRequest | None = None,
+) -> Iterator[BatchRecord | BatchOutcome]:
+    """Yield a record per non-blank line, or an error outcome for invalid lines."""
+
+    for number, text in enumerate(lines, start=1):
+        if not text.strip():
+            continue
+        try:
+            yield parse_batch_record(text, number, defaults=defaults)
+        except BatchRecordError as exc:
+            yield BatchOutcome(number, None, STATUS_ERROR, error=str(exc))
+
+
+class SessionLocks:
+    """Serializes work per session; a session's lock exists only while it is held or awaited.
+
+    Like :class:`BatchRunner`'s session queues, entries are dropped once
+    drained, so a long-running service sees memory proportional to the
+    sessions in flight rather than to every session it ever handled.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._locks: dict[str, tuple[threading.Lock, list[int]]] = {}
+
+    @contextmanager
+    def hold(self, session_id: str) -> Iterator[None]:
+        with self._lock:
+            lock, users = self._locks.setdefault(session_id, (threading.Lock(), [0]))
+            users[0] += 1
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                users[0] -= 1
+                if not users[0]:
+                    del self._locks[session_id]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._locks)
+
+
+class BatchRunner:
+    """Schedules batch records on a thread pool with per-session ordering.
+
+    Each session owns a FIFO queue; at most one worker drains a given queue at
+    a time, so memos for one session are applied in input order while other
+    sessions proceed concurrently. ``emit`` is called (serialized) with every
+    outcome as soon as it is available.
+    """
+
+    def __init__(
+        self,
+        pipeline: MemoPipeline,
+        *,
+        emit: Callable[[BatchOutcome], None],
+        update: bool = False,
+        workers: int = DEFAULT_WORKERS,
+    ) -> None:
+        self.pipeline = pipeline
+        self.update = update
+        self.workers = max(1, workers)
+        self._emit = emit
+        self._emit_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._queues: dict[str, deque[tuple[BatchRecord, float]]] = {}
+        self._active: set[str] = set()
+        self.stats = BatchStats()
+
+    def run(self, items: Iterable[BatchRecord | BatchOutcome]) -> BatchStats:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="memo-batch") as executor:
+            for item in items:
+                if isinstance(item, BatchOutcome):
+                    self._report(item)
+                    continue
+                self._submit(executor, item)
+        self.stats.elapsed_s = time.perf_counter() - started
+        return self.stats
+
+    def _submit(self, executor: ThreadPoolExecutor, record: BatchRecord) -> None:
+        session_id = record.request.session_id
+        with self._lock:
+            self._queues.setdefault(session_id, deque()).append((record, time.perf_counter()))
+            if session_id in self._active:
+                return
+            self._active.add(session_id)
+        executor.submit(self._drain, session_id)
+
+    def _drain(self, session_id: str) -> None:
+        while True:
+            with self._lock:
+                queue = self._queues[session_id]
+                if not queue:
+                    self._active.discard(session_id)
+                    del self._queues[session_id]
+                    return
+                record, enqueued = queue.popleft()
+            self._report(self._process(record, enqueued))
+
+    def _process(self, record: BatchRecord, enqueued: float) -> BatchOutcome:
+        started = time.perf_counter()
+        outcome = BatchOutcome(record.line, record.request.session_id, STATUS_OK)
+        try:
+            outcome.result = self.pipeline.process(record.request, update=self.update)
+        except (PipelineError, LlmRequestError) as exc:
+            outcome.status, outcome.error = STATUS_ERROR, str(exc)
+        except Exception as exc:  # keep the batch going; report the failure on this record
+            outcome.status, outcome.error = STATUS_ERROR, f"{type(exc).__name__}: {exc}"
+        outcome.queued_ms = (started - enqueued) * 1000
+        outcome.elapsed_ms = (time.perf_counter() - started) * 1000
+        return outcome
+
+    def _report(self, outcome: BatchOutcome) -> None:
+        with self._emit_lock:
+            self.stats.records += 1
+            if outcome.status != STATUS_OK:
+                self.stats.failed += 1
+            if outcome.session_id:
+                self.stats.sessions.add(outcome.session_id)
+            self._emit(outcome)
+
+
+__all__ = [
+    "ASPECT_NAMES",
+    "DEFAULT_WORKERS",
+    "BatchOutcome",
+    "BatchRecord",
+    "BatchRecordError",
+    "BatchRunner",
+    "BatchStats",
+    "SessionLocks",
+    "build_request",
+    "parse_aspects",
+    "parse_batch_record",
+    "read_batch",
+]
@@ -0,0 +1,455 @@
+"""Microbenchmarks of the note-processing hot paths, with JSON baselines.
+
+:func:`suite` yields a :class:`Case` for every hot path at every requested
+scale. The scales are note counts (10 to 100k) and tag-catalog sizes (10 to
+1000), and each case runs on seeded data from :mod:`notes_tools.synthetic`.
+:func:`measure` times a case the way :mod:`timeit` does, with the garbage
+collector paused and the best of several runs kept. :func:`compare` checks
+the results against a saved baseline with a relative threshold, and
+thresholds can be set per case through ``fnmatch`` patterns. The summary
+dump cases time the ``--json`` output path (``to_plain`` then ``JSON.dumps``)
+next to the ``dataclasses.asdict`` it replaced. Nothing here
+touches Firebase or the network; ``MemoProcessor`` reads its prompts from the
+packaged resources.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import fnmatch
+import gc
+import platform
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Mapping
+
+from . import synthetic
+from .codec import JSON, to_plain
+from .memo_processing import MemoProcessor
+from .notes import (
+    Appointment,
+    MemoSummary,
+    NotesTagCatalog,
+    TagMappingContext,
+    Thought,
+    TodoItem,
+    parse_remote_note,
+    parse_remote_todo_change_set,
+    resolve_tag_data,
+    structured_note_to_map,
+)
+
+BASELINE_VERSION = 1
+DEFAULT_THRESHOLD = 0.25
+SCALES: dict[str, tuple[tuple[int, ...], tuple[int, ...]]] = {
+    # name -> (note counts, tag counts)
+    "quick": ((10, 1_000), (10, 100)),
+    "full": ((10, 1_000, 10_000, 100_000), (10, 100, 1_000)),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Case:
+    name: str
+    run: Callable[[], Any]
+    items: int
+
+
+@dataclass(slots=True)
+class BenchmarkResult:
+    name: str
+    items: int
+    runs: list[float] = field(default_factory=list)
+
+    @property
+    def best(self) -> float:
+        return min(self.runs)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.runs)
+
+    @property
+    def ns_per_item(self) -> float:
+        return self.best / max(self.items, 1) * 1e9
+
+    def to_map(self) -> dict[str, Any]:
+        return {
+            "items": self.items,
+            "best_s": self.best,
+            "median_s": self.median,
+            "runs": len(self.runs),
+            "ns_per_item": round(self.ns_per_item, 1),
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class Comparison:
+    name: str
+    baseline: float | None
+    current: float
+    threshold: float
+
+    @property
+    def ratio(self) -> float | None:
+        return self.current / self.baseline if self.baseline else None
+
+    @property
+    def status(self) -> str:
+        ratio = self.ratio
+        if ratio is None:
+            return "new"
+        if ratio > 1 + self.threshold:
+            return "regressed"
+        if ratio < 1 / (1 + self.threshold):
+            return "improved"
+        return "ok"
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+
+
+def _rng(*key: Any) -> random.Random:
+    return random.Random(repr(key))
+
+
+@lru_cache(maxsize=None)
+def tag_catalog_map(tags: int) -> dict[str, Any]:
+    """A ``settings.tagCatalog`` map with ``tags`` entries labelled in every locale."""
+
+    return synthetic.tag_catalog(_rng("catalog", tags), tags)
+
+
+@lru_cache(maxsize=None)
+def tag_context(tags: int, locale: str = "en") -> TagMappingContext:
+    return TagMappingContext(NotesTagCatalog.from_map(tag_catalog_map(tags)), locale)
+
+
+@lru_cache(maxsize=4)
+def note_documents(notes: int, tags: int) -> tuple[dict[str, Any], ...]:
+    """Remote note documents: 60% todos, with a third of the tags in the legacy ``tags`` field."""
+
+    todos, thoughts, appointments = notes * 6 // 10, notes * 2 // 10, notes // 10
+    spec = synthetic.DatasetSpec(
+        todos=todos,
+        thoughts=thoughts,
+        appointments=appointments,
+        free_notes=notes - todos - thoughts - appointments,
+        legacy_tags=0.33,
+    )
+    documents = synthetic.note_documents(_rng("notes", notes, tags), tag_catalog_map(tags), "en", spec)
+    return tuple({"id": note_id, **data} for note_id, data in documents)
+
+
+@lru_cache(maxsize=2)
+def change_set_documents(count: int) -> tuple[dict[str, Any], ...]:
+    todos = [(document["id"], document) for document in note_documents(count, 10) if document["type"] == "todo"]
+    documents = synthetic.change_set_documents(_rng("change-sets", count), "session-0", todos, (), count)
+    return tuple({"id": change_set_id, **data} for change_set_id, data in documents)
+
+
+def _processor(notes: int, tags: int) -> MemoProcessor:
+    context = tag_context(tags)
+    items = (parse_remote_note(document, context) for document in note_documents(notes, tags))
+    todos = [item for item in items if isinstance(item, TodoItem)]
+    processor = MemoProcessor("benchmark", tag_catalog=context.catalog)
+    processor.initialize(
+        MemoSummary("\n".join(item.text for item in todos), "", "", todos, [], [])
+    )
+    return processor
+
+
+@lru_cache(maxsize=2)
+def session_summary(notes: int, tags: int) -> MemoSummary:
+    """A summary holding every parsed todo, appointment and thought of a session, as ``--json`` dumps it."""
+
+    context = tag_context(tags)
+    parsed = [parse_remote_note(document, context) for document in note_documents(notes, tags)]
+    todos = [item for item in parsed if isinstance(item, TodoItem)]
+    appointments = [item for item in parsed if isinstance(item, Appointment)]
+    thoughts = [item for item in parsed if isinstance(item, Thought)]
+    return MemoSummary(
+        "\n".join(item.text for item in todos),
+        "\n".join(item.text for item in appointments),
+        "\n".join(item.text for item in thoughts),
+        todos,
+        appointments,
+        thoughts,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Cases
+
+
+def _parse_notes(notes: int, tags: int) -> Case:
+    documents, context = note_documents(notes, tags), tag_context(tags)
+    return Case(
+        f"parse_remote_note[notes={notes},tags={tags}]",
+        lambda: [parse_remote_note(document, context) for document in documents],
+        notes,
+    )
+
+
+def _parse_change_sets(notes: int) -> Case:
+    documents = change_set_documents(notes)
+    return Case(
+        f"parse_remote_todo_change_set[change_sets={notes}]",
+        lambda: [parse_remote_todo_change_set(document) for document in documents],
+        notes,
+    )
+
+
+def _tag_context(tags: int) -> Case:
+    catalog = NotesTagCatalog.from_map(tag_catalog_map(tags))
+    return Case(f"TagMappingContext[tags={tags}]", lambda: TagMappingContext(catalog, "it"), 1)
+
+
+def _resolve_tags(notes: int, tags: int) -> Case:
+    context = tag_context(tags)
+    inputs = [
+        (document.get("tagIds", ()), (), document.get("tags", ())) for document in note_documents(notes, tags)
+    ]
+    return Case(
+        f"resolve_tag_data[notes={notes},tags={tags}]",
+        lambda: [resolve_tag_data(ids, labels, legacy, context) for ids, labels, legacy in inputs],
+        notes,
+    )
+
+
+def _prepare_requests(notes: int, tags: int) -> Case:
+    processor = _processor(notes, tags)
+    return Case(
+        f"MemoProcessor.prepare_requests[notes={notes},tags={tags}]",
+        lambda: processor.prepare_requests("Buy milk and call the dentist tomorrow at 10"),
+        1,
+    )
+
+
+def _apply_todo_response(notes: int, tags: int) -> Case:
+    processor = _processor(notes, tags)
+    rng = _rng("response", notes)
+    todos = processor.todo_items
+    tag_ids = [tag["id"] for tag in tag_catalog_map(tags)["tags"][:2]]
+    response = {
+        "items": [
+            {"id": item.note_id, "text": item.text + " today", "status": "done", "tags": tag_ids}
+            for item in rng.sample(todos, k=min(len(todos), 10))
+        ]
+        + [{"text": "A brand new todo", "status": "not_started", "tags": []}]
+    }
+    return Case(
+        f"MemoProcessor._apply_todo_response[notes={notes},tags={tags}]",
+        lambda: processor._apply_todo_response(response),
+        1,
+    )
+
+
+def _note_maps(notes: int, tags: int) -> Case:
+    context = tag_context(tags)
+    parsed = [note for note in (parse_remote_note(doc, context) for doc in note_documents(notes, tags)) if note]
+    return Case(
+        f"structured_note_to_map[notes={notes}]",
+        lambda: [structured_note_to_map(note) for note in parsed],
+        len(parsed),
+    )
+
+
+def _summary_items(summary: MemoSummary) -> int:
+    return len(summary.todo_items) + len(summary.appointment_items) + len(summary.thought_items)
+
+
+def _summary_to_plain(notes: int, tags: int) -> Case:
+    summary = session_summary(notes, tags)
+    return Case(f"to_plain[notes={notes}]", lambda: to_plain(summary), _summary_items(summary))
+
+
+def _summary_asdict(notes: int, tags: int) -> Case:
+    summary = session_summary(notes, tags)
+    return Case(f"dataclasses.asdict[notes={notes}]", lambda: dataclasses.asdict(summary), _summary_items(summary))
+
+
+def _summary_json(notes: int, tags: int) -> Case:
+    summary = session_summary(notes, tags)
+    plain = to_plain(summary)
+    return Case(f"JSON.dumps[notes={notes}]", lambda: JSON.dumps(plain), _summary_items(summary))
+
+
+def _summary_dump(notes: int, tags: int) -> Case:
+    summary = session_summary(notes, tags)
+    return Case(
+        f"summary_dump[notes={notes}]",
+        lambda: JSON.dumps(to_plain(summary), indent=True),
+        _summary_items(summary),
+    )
+
+
+def suite(
+    note_counts: Iterable[int],
+    tag_counts: Iterable[int],
+    select: Iterable[str] = (),
+) -> Iterator[Case]:
+    """Every case at every scale, built lazily; ``select`` keeps names matching any pattern."""
+
+    note_counts, tag_counts, patterns = tuple(note_counts), tuple(tag_counts), tuple(select)
+    middle_tags = tag_counts[len(tag_counts) // 2] if tag_counts else 10
+    factories: list[tuple[str, Callable[[], Case]]] = []
+    for notes in note_counts:
+        for tags in tag_counts:
+            factories.append((f"parse_remote_note[notes={notes},tags={tags}]", lambda n=notes, t=tags: _parse_notes(n, t)))
+            factories.append((f"resolve_tag_data[notes={notes},tags={tags}]", lambda n=notes, t=tags: _resolve_tags(n, t)))
+        factories.append((f"parse_remote_todo_change_set[change_sets={notes}]", lambda n=notes: _parse_change_sets(n)))
+        factories.append((f"structured_note_to_map[notes={notes}]", lambda n=notes: _note_maps(n, middle_tags)))
+        factories.append((f"to_plain[notes={notes}]", lambda n=notes: _summary_to_plain(n, middle_tags)))
+        factories.append((f"dataclasses.asdict[notes={notes}]", lambda n=notes: _summary_asdict(n, middle_tags)))
+        factories.append((f"JSON.dumps[notes={notes}]", lambda n=notes: _summary_json(n, middle_tags)))
+        factories.append((f"summary_dump[notes={notes}]", lambda n=notes: _summary_dump(n, middle_tags)))
+        factories.append(
+            (f"MemoProcessor.prepare_requests[notes={notes},tags={middle_tags}]", lambda n=notes: _prepare_requests(n, middle_tags))
+        )
+        factories.append(
+            (f"MemoProcessor._apply_todo_response[notes={notes},tags={middle_tags}]", lambda n=notes: _apply_todo_response(n, middle_tags))
+        )
+    for tags in tag_counts:
+        factories.append((f"TagMappingContext[tags={tags}]", lambda t=tags: _tag_context(t)))
+    for name, factory in factories:
+        if not patterns or any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+            yield factory()
+
+
+def measure(case: Case, *, repeat: int = 5, min_time: float = 0.05, clock: Callable[[], float] = time.perf_counter) -> BenchmarkResult:
+    """Time ``case.run`` ``repeat`` times; fast cases loop until a run lasts ``min_time`` seconds."""
+
+    case.run()  # warm caches and lazily built structures
+    loops = 1
+    while True:
+        started = clock()
+        for _ in range(loops):
+            case.run()
+        elapsed = clock() - started
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    result = BenchmarkResult(case.name, case.items)
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = clock()
+            for _ in range(loops):
+                case.run()
+            result.runs.append((clock() - started) / loops)
+    finally:
+        if enabled:
+            gc.enable()
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Baselines
+
+
+def baseline_map(results: Iterable[BenchmarkResult]) -> dict[str, Any]:
+    return {
+        "version": BASELINE_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {result.name: result.to_map() for result in results},
+    }
+
+
+def save_baseline(path: str | Path, results: Iterable[BenchmarkResult], *, merge: bool = True) -> dict[str, Any]:
+    """Write ``results`` to ``path``; with ``merge`` cases missing from this run keep their old entries."""
+
+    target = Path(path).expanduser()
+    data = baseline_map(results)
+    if merge and target.is_file():
+        previous = load_baseline(target)
+        data["results"] = {**previous.get("results", {}), **data["results"]}
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(JSON.dumps(data, indent=True, sort_keys=True) + "\n", encoding="utf-8")
+    return data
+
+
+def load_baseline(path: str | Path) -> dict[str, Any]:
+    data = JSON.loads(Path(path).expanduser().read_text(encoding="utf-8"))
+    if not isinstance(data, Mapping) or data.get("version") != BASELINE_VERSION:
+        raise ValueError(f"{path} is not a version {BASELINE_VERSION} benchmark baseline")
+    return dict(data)
+
+
+def threshold_for(name: str, default: float, overrides: Mapping[str, float]) -> float:
+    """The threshold of the last ``overrides`` pattern matching ``name``, else ``default``."""
+
+    threshold = default
+    for pattern, value in overrides.items():
+        if fnmatch.fnmatchcase(name, pattern):
+            threshold = value
+    return threshold
+
+
+def compare(
+    results: Iterable[BenchmarkResult],
+    baseline: Mapping[str, Any],
+    *,
+    threshold: float = DEFAULT_THRESHOLD,
+    overrides: Mapping[str, float] | None = None,
+) -> list[Comparison]:
+    """Compare best times; a case regresses when it is more than ``threshold`` (0.25 = 25%) slower."""
+
+    saved = baseline.get("results", {})
+    comparisons = []
+    for result in results:
+        entry = saved.get(result.name)
+        comparisons.append(
+            Comparison(
+                result.name,
+                float(entry["best_s"]) if entry else None,
+                result.best,
+                threshold_for(result.name, threshold, overrides or {}),
+            )
+        )
+    return comparisons
+
+
+def _duration(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds * 1e9:.0f} ns"
+
+
+def format_results(results: Iterable[BenchmarkResult], comparisons: Iterable[Comparison] = ()) -> str:
+    by_name = {comparison.name: comparison for comparison in comparisons}
+    lines = [f"{'benchmark':<62}{'best':>11}{'median':>11}{'ns/item':>11}  baseline"]
+    for result in results:
+        line = f"{result.name:<62}{_duration(result.best):>11}{_duration(result.median):>11}{result.ns_per_item:>11.0f}"
+        comparison = by_name.get(result.name)
+        if comparison is not None:
+            ratio = comparison.ratio
+            line += f"  {comparison.status}" + (f" x{ratio:.2f}" if ratio is not None else "")
+        lines.append(line)
+    return "\n".join(lines)
+
+
+__all__ = [
+    "DEFAULT_THRESHOLD",
+    "SCALES",
+    "BenchmarkResult",
+    "Case",
+    "Comparison",
+    "baseline_map",
+    "compare",
+    "format_results",
+    "load_baseline",
+    "measure",
+    "save_baseline",
+    "session_summary",
+    "suite",
+    "threshold_for",
+]
@@ -0,0 +1,258 @@
+"""Serialisation of dataclasses to plain data, and a pluggable JSON codec.
+
+:func:`to_plain` returns the same data as :func:`dataclasses.asdict`, but it
+uses an encoder generated for each dataclass type and looked up by exact
+type. Scalar fields are copied as they are and lists of scalars with a
+single ``list()`` call, so only nested containers and dataclasses recurse
+(``asdict`` deep-copies every value). :func:`from_plain` reverses it.
+
+``JSON`` is the process-wide :class:`JsonCodec`. It uses ``orjson`` when
+that is installed (``DIANA_JSON_CODEC=stdlib`` forces the standard library)
+and writes the same layout either way: UTF-8, compact separators, or
+``indent=True`` for two-space indentation. Both write NaN and infinities as
+``null``, as ``orjson`` does, so the output is always strict JSON. Finite
+floats load back to the same values but may be spelled differently
+(``orjson`` writes ``1e16`` where :mod:`json` writes ``1e+16``). If
+``orjson`` rejects a value, such as an integer wider than 64 bits, a
+non-string key, or something left to ``default``, that call falls back to
+:mod:`json`.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import math
+import os
+import types
+import typing
+from typing import Any, Callable, TypeVar
+
+try:
+    import orjson
+except ModuleNotFoundError:  # optional speed-up
+    orjson = None  # type: ignore[assignment]
+
+T = TypeVar("T")
+Encoder = Callable[[Any], dict[str, Any]]
+Decoder = Callable[[Any], Any]
+
+_SCALARS = (str, int, float, bool, type(None))
+_ENCODERS: dict[type, Encoder] = {}
+_DECODERS: dict[type, Decoder] = {}
+
+
+def _union_args(annotation: Any) -> tuple[Any, ...] | None:
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        return typing.get_args(annotation)
+    return None
+
+
+def _is_scalar(annotation: Any) -> bool:
+    args = _union_args(annotation)
+    if args is not None:
+        return all(_is_scalar(arg) for arg in args)
+    return annotation in _SCALARS
+
+
+def _is_scalar_list(annotation: Any) -> bool:
+    args = typing.get_args(annotation)
+    return typing.get_origin(annotation) is list and len(args) == 1 and _is_scalar(args[0])
+
+
+def encoder_for(cls: type) -> Encoder:
+    """The generated ``asdict`` equivalent for dataclass ``cls``."""
+
+    encoder = _ENCODERS.get(cls)
+    if encoder is None:
+        hints = typing.get_type_hints(cls)
+        items = []
+        for field in dataclasses.fields(cls):
+            annotation = hints.get(field.name, Any)
+            if _is_scalar(annotation):
+                expression = f"o.{field.name}"
+            elif _is_scalar_list(annotation):
+                expression = f"list(o.{field.name})"
+            else:
+                expression = f"plain(o.{field.name})"
+            items.append(f"{field.name!r}: {expression}")
+        source = f"def encode(o):\n    return {{{', '.join(items)}}}\n"
+        namespace: dict[str, Any] = {"plain": to_plain}
+        exec(compile(source, f"<encoder {cls.__qualname__}>", "exec"), namespace)
+        encoder = _ENCODERS[cls] = namespace["encode"]
+    return encoder
+
+
+def to_plain(value: Any) -> Any:
+    """Dataclasses (recursively) to dicts; lists, tuples and dicts are rebuilt."""
+
+    encoder = _ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder(value)
+    if isinstance(value, _SCALARS):
+        return value
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    if isinstance(value, tuple):
+        return type(value)(*map(to_plain, value)) if hasattr(value, "_fields") else tuple(map(to_plain, value))
+    if isinstance(value, dict):
+        return type(value)((to_plain(key), to_plain(item)) for key, item in value.items())
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return encoder_for(type(value))(value)
+    return value
+
+
+def _value_decoder(annotation: Any) -> Decoder | None:
+    args = _union_args(annotation)
+    if args is not None:
+        present = [arg for arg in args if arg is not type(None)]
+        if len(present) == 1 and len(args) == 2:
+            inner = _value_decoder(present[0])
+            if inner is not None:
+                return lambda value: None if value is None else inner(value)
+        return None
+    if typing.get_origin(annotation) is list:
+        (item,) = typing.get_args(annotation) or (Any,)
+        inner = _value_decoder(item)
+        if inner is None:
+            return list
+        return lambda value: [inner(entry) for entry in value]
+    if dataclasses.is_dataclass(annotation):
+        return decoder_for(annotation)
+    return None
+
+
+def decoder_for(cls: type[T]) -> Callable[[Any], T]:
+    """Build ``cls`` from the output of :func:`to_plain`; missing keys take their defaults."""
+
+    decoder = _DECODERS.get(cls)
+    if decoder is None:
+        hints = typing.get_type_hints(cls)
+        steps: list[tuple[str, Decoder | None]] = []
+        # Register first so self-referencing dataclasses find this decoder.
+        _DECODERS[cls] = lambda data: decoder(data)  # type: ignore[misc]
+        for field in dataclasses.fields(cls):
+            if field.init:
+                steps.append((field.name, _value_decoder(hints.get(field.name, Any))))
+
+        def decoder(data: Any) -> T:
+            kwargs = {}
+            for name, convert in steps:
+                if name in data:
+                    value = data[name]
+                    kwargs[name] = value if convert is None else convert(value)
+            return cls(**kwargs)
+
+        _DECODERS[cls] = decoder
+    return decoder
+
+
+def from_plain(cls: type[T], data: Any) -> T:
+    return decoder_for(cls)(data)
+
+
+def _finite(value: Any) -> Any:
+    """``value`` with NaN and infinities replaced by ``None``, as ``orjson`` writes them."""
+
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    return value
+
+
+class JsonCodec:
+    """JSON through the standard library, in the format shared by every backend."""
+
+    name = "stdlib"
+
+    def dumps(
+        self,
+        value: Any,
+        *,
+        indent: bool = False,
+        sort_keys: bool = False,
+        default: Callable[[Any], Any] | None = None,
+    ) -> str:
+        try:
+            return self._dumps(value, indent, sort_keys, default)
+        except ValueError as exc:
+            if not str(exc).startswith("Out of range float"):
+                raise
+        # Rare: only values holding NaN or an infinity pay for the rebuild.
+        finite_default = None if default is None else (lambda item: _finite(default(item)))
+        return self._dumps(_finite(value), indent, sort_keys, finite_default)
+
+    @staticmethod
+    def _dumps(value: Any, indent: bool, sort_keys: bool, default: Callable[[Any], Any] | None) -> str:
+        layout: dict[str, Any] = {"indent": 2} if indent else {"separators": (",", ":")}
+        return json.dumps(value, ensure_ascii=False, allow_nan=False, sort_keys=sort_keys, default=default, **layout)
+
+    def loads(self, text: str | bytes) -> Any:
+        return json.loads(text)
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def dumps(
+        self,
+        value: Any,
+        *,
+        indent: bool = False,
+        sort_keys: bool = False,
+        default: Callable[[Any], Any] | None = None,
+    ) -> str:
+        # Dataclasses and datetimes go through ``default`` exactly as with json.
+        option = orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(value, default=default, option=option).decode("utf-8")
+        except TypeError:
+            return super().dumps(value, indent=indent, sort_keys=sort_keys, default=default)
+
+    def loads(self, text: str | bytes) -> Any:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:  # NaN/Infinity and anything else json accepts
+            return json.loads(text)
+
+
+JSON_CODECS: dict[str, type[JsonCodec]] = {"stdlib": JsonCodec}
+if orjson is not None:
+    JSON_CODECS["orjson"] = OrjsonCodec
+
+
+def json_codec(name: str | None = None) -> JsonCodec:
+    """The codec called ``name``, else ``$DIANA_JSON_CODEC`` if it names an installed one, else the fastest."""
+
+    if name is None:
+        configured = os.environ.get("DIANA_JSON_CODEC", "").strip().lower()
+        if configured not in JSON_CODECS:
+            configured = "orjson" if "orjson" in JSON_CODECS else "stdlib"
+        name = configured
+    try:
+        return JSON_CODECS[name]()
+    except KeyError:
+        raise ValueError(f"unknown or unavailable JSON codec {name!r}; choose from {sorted(JSON_CODECS)}") from None
+
+
+JSON = json_codec()
+
+
+__all__ = [
+    "JSON",
+    "JSON_CODECS",
+    "JsonCodec",
+    "OrjsonCodec",
+    "decoder_for",
+    "encoder_for",
+    "from_plain",
+    "json_codec",
+    "to_plain",
+]
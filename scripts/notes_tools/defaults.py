@@ -0,0 +1,38 @@
+"""Defaults of the long-running memo modes that command-line parsers display.
+
+The modes themselves (batch, inbox, fleet, job queue, service, session cache)
+import their defaults from here, so scripts can build their argument parsers
+without loading the modes they will not run.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+DEFAULT_WORKERS = 4
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_MAX_FAILURES = 3
+
+DEFAULT_SESSION_LEASE = 30.0
+
+DEFAULT_QUEUE_PATH = Path("~/.cache/diana/memo-queue.sqlite3")
+DEFAULT_VISIBILITY_TIMEOUT = 300.0
+
+DEFAULT_MAX_SESSIONS = 128
+DEFAULT_TTL = 10.0
+
+
+__all__ = [
+    "DEFAULT_ADDRESS",
+    "DEFAULT_LEASE_SECONDS",
+    "DEFAULT_MAX_FAILURES",
+    "DEFAULT_MAX_SESSIONS",
+    "DEFAULT_QUEUE_PATH",
+    "DEFAULT_SESSION_LEASE",
+    "DEFAULT_TTL",
+    "DEFAULT_VISIBILITY_TIMEOUT",
+    "DEFAULT_WORKERS",
+]
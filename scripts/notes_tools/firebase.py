@@ -8,6 +8,8 @@ from typing import Any, Mapping
 import firebase_admin
 from firebase_admin import App, credentials, firestore
 
+from .firestore_usage import metered
+
 
 def _normalize_service_account(path: str | Path) -> Path:
     candidate = Path(path).expanduser()
@@ -42,10 +44,27 @@ def initialize_firestore(
     *,
     app_name: str | None = None,
 ) -> firestore.Client:
-    """Create (or reuse) a Firestore client bound to the configured app."""
+    """Create (or reuse) a Firestore client bound to the configured app.
+
+    While ``--firestore-usage`` accounting is active the client is metered.
+    """
+
+    app = initialize_app(service_account, project_id, app_name=app_name)
+    return metered(firestore.client(app=app))
+
+
+def initialize_async_firestore(
+    service_account: str | Path,
+    project_id: str | None = None,
+    *,
+    app_name: str | None = None,
+) -> Any:
+    """Create an ``AsyncClient`` for the configured app (needs firebase-admin 6 or newer)."""
+
+    from firebase_admin import firestore_async
 
     app = initialize_app(service_account, project_id, app_name=app_name)
-    return firestore.client(app=app)
+    return firestore_async.client(app=app)
 
 
-__all__ = ["initialize_app", "initialize_firestore"]
+__all__ = ["initialize_app", "initialize_async_firestore", "initialize_firestore"]
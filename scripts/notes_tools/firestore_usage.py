@@ -0,0 +1,478 @@
+"""Billing-level accounting of Firestore operations.
+
+:class:`MeteredFirestore` wraps a synchronous Firestore client (or
+:class:`~notes_tools.memory_store.MemoryFirestore`) and records every
+document read, write and delete, every RPC and the estimated document bytes
+in a :class:`FirestoreUsage`. Counts are grouped by collection id and by the
+phase that was running (see :func:`notes_tools.timing.phase`). They follow
+Firestore's billing rules:
+
+* a document ``get`` bills one read, even when the document does not exist;
+* a query bills one read per returned document, or one read when it returns
+  nothing, plus one read per document skipped with ``offset``. The skipped
+  count is an upper bound, because a short collection skips fewer;
+* each listener delivery bills one read per changed document;
+* each written or deleted document bills one write or delete, whether it was
+  sent on its own, in a batch or through a ``BulkWriter``.
+
+Byte counts use Firestore's documented storage-size rules for document names
+and values. :func:`metered` wraps a client while an accounting context is
+active (:func:`activate_usage`, installed by ``--firestore-usage``), which is
+how :func:`notes_tools.firebase.initialize_firestore` picks it up. The async
+client is not wrapped.
+"""
+
+from __future__ import annotations
+
+import datetime
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Callable, Iterator, Mapping, NamedTuple
+
+from .codec import JSON
+from .timing import current_phase
+
+NO_PHASE = "-"
+BULK_WRITER_BATCH = 20
+
+
+class FirestorePrices(NamedTuple):
+    """USD per 100,000 operations."""
+
+    read: float = 0.06
+    write: float = 0.18
+    delete: float = 0.02
+
+    @classmethod
+    def from_env(cls) -> "FirestorePrices":
+        """``$DIANA_FIRESTORE_PRICES`` as ``READ,WRITE,DELETE``, else multi-region list prices."""
+
+        configured = os.environ.get("DIANA_FIRESTORE_PRICES", "").strip()
+        if not configured:
+            return cls()
+        try:
+            return cls(*(float(part) for part in configured.split(",")))
+        except (TypeError, ValueError):
+            raise ValueError(f"DIANA_FIRESTORE_PRICES must be READ,WRITE,DELETE, got {configured!r}") from None
+
+
+@dataclass(slots=True)
+class UsageCounts:
+    reads: int = 0
+    writes: int = 0
+    deletes: int = 0
+    rpcs: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+
+    def add(self, other: "UsageCounts") -> None:
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+    def cost(self, prices: FirestorePrices) -> float:
+        return (self.reads * prices.read + self.writes * prices.write + self.deletes * prices.delete) / 100_000
+
+    def to_map(self, prices: FirestorePrices) -> dict[str, Any]:
+        return {
+            "reads": self.reads,
+            "writes": self.writes,
+            "deletes": self.deletes,
+            "rpcs": self.rpcs,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "cost_usd": round(self.cost(prices), 8),
+        }
+
+
+class FirestoreUsage:
+    """Thread-safe usage counters keyed by ``(phase, collection)``."""
+
+    def __init__(self, prices: FirestorePrices | None = None) -> None:
+        self.prices = prices if prices is not None else FirestorePrices.from_env()
+        self._lock = threading.Lock()
+        self._counts: dict[tuple[str, str], UsageCounts] = {}
+
+    def record(self, collection: str, **counts: int) -> None:
+        key = (current_phase() or NO_PHASE, collection)
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None:
+                entry = self._counts[key] = UsageCounts()
+            for name, value in counts.items():
+                setattr(entry, name, getattr(entry, name) + value)
+
+    def _grouped(self, index: int | None) -> dict[str, UsageCounts]:
+        grouped: dict[str, UsageCounts] = {}
+        with self._lock:
+            for key, counts in self._counts.items():
+                grouped.setdefault("total" if index is None else key[index], UsageCounts()).add(counts)
+        return grouped
+
+    def total(self) -> UsageCounts:
+        return self._grouped(None).get("total", UsageCounts())
+
+    def by_phase(self) -> dict[str, UsageCounts]:
+        return self._grouped(0)
+
+    def by_collection(self) -> dict[str, UsageCounts]:
+        return self._grouped(1)
+
+    def to_map(self) -> dict[str, Any]:
+        return {
+            "prices_per_100k": self.prices._asdict(),
+            "total": self.total().to_map(self.prices),
+            "by_collection": {name: c.to_map(self.prices) for name, c in sorted(self.by_collection().items())},
+            "by_phase": {name: c.to_map(self.prices) for name, c in sorted(self.by_phase().items())},
+        }
+
+    def format(self) -> str:
+        header = f"{'':<22}{'reads':>9}{'writes':>9}{'deletes':>9}{'rpcs':>7}{'KiB read':>10}{'KiB written':>12}{'USD':>11}"
+
+        def row(name: str, counts: UsageCounts) -> str:
+            return (
+                f"{name[:21]:<22}{counts.reads:>9}{counts.writes:>9}{counts.deletes:>9}{counts.rpcs:>7}"
+                f"{counts.bytes_read / 1024:>10.1f}{counts.bytes_written / 1024:>12.1f}{counts.cost(self.prices):>11.6f}"
+            )
+
+        lines = ["Firestore usage by collection", header]
+        lines.extend(row(name, counts) for name, counts in sorted(self.by_collection().items()))
+        lines += ["Firestore usage by phase", header]
+        lines.extend(row(name, counts) for name, counts in sorted(self.by_phase().items()))
+        lines.append(row("total", self.total()))
+        return "\n".join(lines)
+
+    def report(self, target: str | Path) -> None:
+        """Print the text report to stderr for ``-``, else write it (JSON for ``.json`` paths)."""
+
+        if str(target) == "-":
+            print(self.format(), file=sys.stderr)
+            return
+        path = Path(target).expanduser()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        text = JSON.dumps(self.to_map(), indent=True) if path.suffix == ".json" else self.format()
+        path.write_text(text + "\n", encoding="utf-8")
+
+
+def _name_size(path: str) -> int:
+    return sum(len(segment.encode("utf-8")) + 1 for segment in path.split("/")) + 16
+
+
+def value_size(value: Any) -> int:
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime.datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, Mapping):
+        return sum(len(str(key).encode("utf-8")) + 1 + value_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(item) for item in value)
+    path = getattr(value, "path", None)
+    if isinstance(path, str):  # document reference
+        return _name_size(path)
+    return 16  # geo points and sentinels such as SERVER_TIMESTAMP
+
+
+def document_size(path: str, data: Mapping[str, Any] | None) -> int:
+    """Storage size of a document: name, fields and 32 bytes of overhead."""
+
+    return _name_size(path) + (value_size(data) if data else 0) + 32
+
+
+def _collection_of(path: str) -> str:
+    parts = path.split("/")
+    return parts[-2] if len(parts) >= 2 else parts[0]
+
+
+def _unwrap(value: Any) -> Any:
+    return value._target if isinstance(value, _Metered) else value
+
+
+class _Metered:
+    __slots__ = ("_target", "_usage")
+
+    def __init__(self, target: Any, usage: FirestoreUsage) -> None:
+        self._target = target
+        self._usage = usage
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
+
+    def __eq__(self, other: object) -> bool:
+        return self._target == _unwrap(other)
+
+    def __hash__(self) -> int:
+        return hash(self._target)
+
+    def __repr__(self) -> str:
+        return f"Metered({self._target!r})"
+
+
+class MeteredSnapshot(_Metered):
+    __slots__ = ()
+
+    @property
+    def reference(self) -> "MeteredDocument":
+        return MeteredDocument(self._target.reference, self._usage)
+
+
+def _snapshot_size(snapshot: Any) -> int:
+    data = snapshot.to_dict() if snapshot.exists else None
+    return document_size(snapshot.reference.path, data) if data is not None else 0
+
+
+class MeteredDocument(_Metered):
+    __slots__ = ()
+
+    @property
+    def _collection(self) -> str:
+        return _collection_of(self._target.path)
+
+    @property
+    def parent(self) -> "MeteredCollection":
+        return MeteredCollection(self._target.parent, self._usage)
+
+    def collection(self, name: str) -> "MeteredCollection":
+        return MeteredCollection(self._target.collection(name), self._usage)
+
+    def get(self, *args: Any, **kwargs: Any) -> MeteredSnapshot:
+        snapshot = self._target.get(*args, **kwargs)
+        self._usage.record(self._collection, reads=1, rpcs=1, bytes_read=_snapshot_size(snapshot))
+        return MeteredSnapshot(snapshot, self._usage)
+
+    def _write(self, method: str, data: Mapping[str, Any], *args: Any, **kwargs: Any) -> Any:
+        result = getattr(self._target, method)(data, *args, **kwargs)
+        self._usage.record(self._collection, writes=1, rpcs=1, bytes_written=document_size(self._target.path, data))
+        return result
+
+    def set(self, data: Mapping[str, Any], *args: Any, **kwargs: Any) -> Any:
+        return self._write("set", data, *args, **kwargs)
+
+    def create(self, data: Mapping[str, Any], *args: Any, **kwargs: Any) -> Any:
+        return self._write("create", data, *args, **kwargs)
+
+    def update(self, data: Mapping[str, Any], *args: Any, **kwargs: Any) -> Any:
+        return self._write("update", data, *args, **kwargs)
+
+    def delete(self, *args: Any, **kwargs: Any) -> Any:
+        result = self._target.delete(*args, **kwargs)
+        self._usage.record(self._collection, deletes=1, rpcs=1)
+        return result
+
+
+class MeteredQuery(_Metered):
+    __slots__ = ("_collection", "_offset")
+
+    def __init__(self, target: Any, usage: FirestoreUsage, collection: str, offset: int = 0) -> None:
+        super().__init__(target, usage)
+        self._collection = collection
+        self._offset = offset
+
+    def _derive(self, target: Any, offset: int | None = None) -> "MeteredQuery":
+        return MeteredQuery(target, self._usage, self._collection, self._offset if offset is None else offset)
+
+    def where(self, *args: Any, **kwargs: Any) -> "MeteredQuery":
+        return self._derive(self._target.where(*args, **kwargs))
+
+    def order_by(self, *args: Any, **kwargs: Any) -> "MeteredQuery":
+        return self._derive(self._target.order_by(*args, **kwargs))
+
+    def limit(self, count: int) -> "MeteredQuery":
+        return self._derive(self._target.limit(count))
+
+    def offset(self, count: int) -> "MeteredQuery":
+        return self._derive(self._target.offset(count), offset=count)
+
+    def select(self, *args: Any, **kwargs: Any) -> "MeteredQuery":
+        return self._derive(self._target.select(*args, **kwargs))
+
+    def start_after(self, *args: Any, **kwargs: Any) -> "MeteredQuery":
+        return self._derive(self._target.start_after(*map(_unwrap, args), **kwargs))
+
+    def stream(self, *args: Any, **kwargs: Any) -> Iterator[MeteredSnapshot]:
+        returned = 0
+        size = 0
+        try:
+            for snapshot in self._target.stream(*args, **kwargs):
+                returned += 1
+                size += _snapshot_size(snapshot)
+                yield MeteredSnapshot(snapshot, self._usage)
+        finally:
+            # An empty result still bills one read; skipped documents bill as reads too.
+            self._usage.record(self._collection, reads=max(returned, 1) + self._offset, rpcs=1, bytes_read=size)
+
+    def get(self, *args: Any, **kwargs: Any) -> list[MeteredSnapshot]:
+        return list(self.stream(*args, **kwargs))
+
+    def on_snapshot(self, callback: Callable[..., Any]) -> Any:
+        usage, collection = self._usage, self._collection
+
+        def metered_callback(snapshots: list[Any], changes: list[Any], read_time: Any) -> Any:
+            usage.record(collection, reads=len(changes), rpcs=1, bytes_read=sum(map(_snapshot_size, snapshots)))
+            return callback([MeteredSnapshot(snapshot, usage) for snapshot in snapshots], changes, read_time)
+
+        return self._target.on_snapshot(metered_callback)
+
+
+class MeteredCollection(MeteredQuery):
+    __slots__ = ()
+
+    def __init__(self, target: Any, usage: FirestoreUsage) -> None:
+        super().__init__(target, usage, target.id)
+
+    @property
+    def parent(self) -> MeteredDocument | None:
+        parent = self._target.parent
+        return MeteredDocument(parent, self._usage) if parent is not None else None
+
+    def document(self, *args: Any) -> MeteredDocument:
+        return MeteredDocument(self._target.document(*args), self._usage)
+
+    def add(self, data: Mapping[str, Any], *args: Any, **kwargs: Any) -> tuple[Any, MeteredDocument]:
+        stamp, reference = self._target.add(data, *args, **kwargs)
+        self._usage.record(self._collection, writes=1, rpcs=1, bytes_written=document_size(reference.path, data))
+        return stamp, MeteredDocument(reference, self._usage)
+
+
+class _MeteredWrites(_Metered):
+    """Shared bookkeeping of batches and bulk writers: counts are recorded when sent."""
+
+    __slots__ = ("_pending",)
+
+    def __init__(self, target: Any, usage: FirestoreUsage) -> None:
+        super().__init__(target, usage)
+        self._pending: list[tuple[str, str, int]] = []
+
+    def _add(self, kind: str, reference: Any, data: Mapping[str, Any] | None = None) -> None:
+        path = _unwrap(reference).path
+        size = document_size(path, data) if data is not None else 0
+        self._pending.append((_collection_of(path), kind, size))
+
+    def set(self, reference: Any, data: Mapping[str, Any], *args: Any, **kwargs: Any) -> Any:
+        self._add("writes", reference, data)
+        return self._target.set(_unwrap(reference), data, *args, **kwargs)
+
+    def create(self, reference: Any, data: Mapping[str, Any], *args: Any, **kwargs: Any) -> Any:
+        self._add("writes", reference, data)
+        return self._target.create(_unwrap(reference), data, *args, **kwargs)
+
+    def update(self, reference: Any, data: Mapping[str, Any], *args: Any, **kwargs: Any) -> Any:
+        self._add("writes", reference, data)
+        return self._target.update(_unwrap(reference), data, *args, **kwargs)
+
+    def delete(self, reference: Any, *args: Any, **kwargs: Any) -> Any:
+        self._add("deletes", reference)
+        return self._target.delete(_unwrap(reference), *args, **kwargs)
+
+    def _record(self, rpcs: int) -> None:
+        pending, self._pending = self._pending, []
+        for index, (collection, kind, size) in enumerate(pending):
+            self._usage.record(collection, rpcs=rpcs if index == 0 else 0, bytes_written=size, **{kind: 1})
+
+    def __len__(self) -> int:
+        return len(self._target)
+
+
+class MeteredBatch(_MeteredWrites):
+    __slots__ = ()
+
+    def commit(self, *args: Any, **kwargs: Any) -> Any:
+        result = self._target.commit(*args, **kwargs)
+        self._record(rpcs=1)
+        return result
+
+
+class MeteredBulkWriter(_MeteredWrites):
+    """Writes are billed per document; RPCs are estimated at one per 20 writes."""
+
+    __slots__ = ()
+
+    def _send(self, method: str) -> Any:
+        result = getattr(self._target, method)()
+        self._record(rpcs=-(-len(self._pending) // BULK_WRITER_BATCH))
+        return result
+
+    def flush(self) -> Any:
+        return self._send("flush")
+
+    def close(self) -> Any:
+        return self._send("close")
+
+
+class MeteredFirestore(_Metered):
+    __slots__ = ()
+
+    @property
+    def usage(self) -> FirestoreUsage:
+        return self._usage
+
+    def collection(self, *path: str) -> MeteredCollection:
+        return MeteredCollection(self._target.collection(*path), self._usage)
+
+    def collection_group(self, collection_id: str) -> MeteredQuery:
+        return MeteredQuery(self._target.collection_group(collection_id), self._usage, collection_id)
+
+    def document(self, *path: str) -> MeteredDocument:
+        return MeteredDocument(self._target.document(*path), self._usage)
+
+    def batch(self) -> MeteredBatch:
+        return MeteredBatch(self._target.batch(), self._usage)
+
+    def bulk_writer(self, *args: Any, **kwargs: Any) -> MeteredBulkWriter:
+        return MeteredBulkWriter(self._target.bulk_writer(*args, **kwargs), self._usage)
+
+    def get_all(self, references: Any, *args: Any, **kwargs: Any) -> Iterator[MeteredSnapshot]:
+        rpcs = 1
+        for snapshot in self._target.get_all([_unwrap(reference) for reference in references], *args, **kwargs):
+            collection = _collection_of(snapshot.reference.path)
+            self._usage.record(collection, reads=1, rpcs=rpcs, bytes_read=_snapshot_size(snapshot))
+            rpcs = 0
+            yield MeteredSnapshot(snapshot, self._usage)
+
+
+_active: FirestoreUsage | None = None
+
+
+def active_usage() -> FirestoreUsage | None:
+    return _active
+
+
+@contextmanager
+def activate_usage(usage: FirestoreUsage) -> Iterator[FirestoreUsage]:
+    """Make :func:`metered` wrap clients with ``usage`` while the context is open."""
+
+    global _active
+    previous, _active = _active, usage
+    try:
+        yield usage
+    finally:
+        _active = previous
+
+
+def metered(client: Any) -> Any:
+    """``client`` wrapped with the active usage, or unchanged when accounting is off."""
+
+    usage = _active
+    if usage is None or isinstance(client, MeteredFirestore):
+        return client
+    return MeteredFirestore(client, usage)
+
+
+__all__ = [
+    "FirestorePrices",
+    "FirestoreUsage",
+    "MeteredFirestore",
+    "UsageCounts",
+    "activate_usage",
+    "active_usage",
+    "document_size",
+    "metered",
+    "value_size",
+]
@@ -0,0 +1,346 @@
+"""Spread memo processing over a fleet of workers with per-session affinity.
+
+Workers register under ``fleets/{fleet}/members/{worker}`` and refresh an
+``expiresAt`` deadline on every heartbeat; members past their deadline are
+ignored. Every worker builds the same consistent-hash ring from the live
+members (virtual nodes keep the split even) and only takes sessions the ring
+maps to it, so a worker joining or leaving moves roughly ``1/N`` of the
+sessions and leaves the rest, and their warm caches, where they are.
+
+Membership views disagree for a heartbeat or two while the fleet changes, so
+a worker also holds ``fleets/{fleet}/leases/{session}`` before it touches a
+session. Leases are created with ``create()``, renewed and taken over under
+update-time preconditions, and released once the ring moves the session
+elsewhere and the memo in progress has finished. A crashed worker's leases
+expire after ``lease_seconds``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+from .defaults import DEFAULT_SESSION_LEASE
+from .inbox import default_worker_id
+from .session_writes import is_precondition_failure
+
+FLEETS_COLLECTION = "fleets"
+MEMBERS_COLLECTION = "members"
+LEASES_COLLECTION = "leases"
+
+DEFAULT_FLEET = "default"
+DEFAULT_MEMBER_TTL = 15.0
+DEFAULT_REPLICAS = 64
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent-hash ring mapping keys to members through ``replicas`` virtual nodes each."""
+
+    def __init__(self, members: Iterable[str] = (), replicas: int = DEFAULT_REPLICAS) -> None:
+        self.members = tuple(sorted(set(members)))
+        self.replicas = max(1, replicas)
+        points = sorted(
+            (_hash(f"{member}#{index}"), member) for member in self.members for index in range(self.replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> str | None:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def assignments(self, keys: Iterable[str]) -> dict[str, list[str]]:
+        result: dict[str, list[str]] = {member: [] for member in self.members}
+        for key in keys:
+            owner = self.owner(key)
+            if owner is not None:
+                result[owner].append(key)
+        return result
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, HashRing) and (other.members, other.replicas) == (self.members, self.replicas)
+
+    def __repr__(self) -> str:
+        return f"HashRing({list(self.members)!r}, replicas={self.replicas})"
+
+
+@dataclass(slots=True)
+class FleetStats:
+    rebalances: int = 0
+    acquired: int = 0
+    renewed: int = 0
+    taken_over: int = 0
+    contended: int = 0
+    lost: int = 0
+    released: int = 0
+
+    def to_map(self) -> dict[str, int]:
+        return {
+            "rebalances": self.rebalances,
+            "acquired": self.acquired,
+            "renewed": self.renewed,
+            "taken_over": self.taken_over,
+            "contended": self.contended,
+            "lost": self.lost,
+            "released": self.released,
+        }
+
+
+class FleetCoordinator:
+    """Membership, hash ring and session leases for one worker of a fleet.
+
+    Call :meth:`acquire` before working on a session and :meth:`done` after;
+    :meth:`start` joins the fleet and keeps membership and leases fresh on a
+    background thread, :meth:`heartbeat` does one round by hand. Callbacks
+    registered with :meth:`subscribe` receive the new ring whenever the
+    membership changes.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        worker_id: str | None = None,
+        *,
+        fleet: str = DEFAULT_FLEET,
+        member_ttl: float = DEFAULT_MEMBER_TTL,
+        lease_seconds: float = DEFAULT_SESSION_LEASE,
+        replicas: int = DEFAULT_REPLICAS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.client = client
+        self.worker_id = worker_id or default_worker_id()
+        self.fleet = fleet
+        self.member_ttl = member_ttl
+        self.lease_seconds = lease_seconds
+        self.replicas = replicas
+        self.stats = FleetStats()
+        self._clock = clock
+        self._ring = HashRing((), replicas)
+        self._leases: dict[str, int] = {}
+        self._active: dict[str, int] = {}
+        self._draining: set[str] = set()
+        self._listeners: list[Callable[[HashRing], None]] = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def ring(self) -> HashRing:
+        return self._ring
+
+    def subscribe(self, callback: Callable[[HashRing], None]) -> None:
+        with self._lock:
+            self._listeners.append(callback)
+
+    def held(self) -> set[str]:
+        with self._lock:
+            return set(self._leases)
+
+    def start(self) -> None:
+        self.join()
+        interval = max(0.05, min(self.member_ttl, self.lease_seconds) / 3)
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._heartbeat_loop, args=(interval,), name="fleet-heartbeat", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Leave the fleet: release every lease and remove the membership document."""
+
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        for session_id in self.held():
+            self.release(session_id)
+        self._member_ref(self.worker_id).delete()
+
+    def join(self) -> None:
+        self._write_membership(joined=True)
+        self.refresh()
+
+    def heartbeat(self) -> None:
+        self._write_membership(joined=False)
+        self.refresh()
+        self.renew_leases()
+
+    def members(self) -> list[str]:
+        now = self._now_ms()
+        live = []
+        for snapshot in self._fleet_ref().collection(MEMBERS_COLLECTION).stream():
+            expires_at = snapshot.get("expiresAt")
+            if isinstance(expires_at, (int, float)) and expires_at > now:
+                live.append(snapshot.id)
+        return live
+
+    def refresh(self) -> bool:
+        """Rebuild the ring from live members; returns whether it changed."""
+
+        ring = HashRing(self.members(), self.replicas)
+        with self._lock:
+            if ring == self._ring:
+                return False
+            self._ring = ring
+            self.stats.rebalances += 1
+            moved = [session_id for session_id in self._leases if ring.owner(session_id) != self.worker_id]
+            listeners = list(self._listeners)
+        for session_id in moved:
+            self._release_when_idle(session_id)
+        for callback in listeners:
+            callback(ring)
+        return True
+
+    def owns(self, session_id: str) -> bool:
+        """Whether the ring maps ``session_id`` to this worker (no lease check)."""
+
+        return self._ring.owner(session_id) == self.worker_id
+
+    def acquire(self, session_id: str) -> bool:
+        """Hold the lease on ``session_id`` for one unit of work; pair every success with :meth:`done`."""
+
+        if not self.owns(session_id):
+            return False
+        with self._lock:
+            if session_id in self._draining:
+                return False
+            self._active[session_id] = self._active.get(session_id, 0) + 1
+            expires_at = self._leases.get(session_id)
+        if expires_at is not None and expires_at - self._now_ms() > self.lease_seconds * 500:
+            return True
+        if self._take(session_id):
+            return True
+        self._finish(session_id)
+        return False
+
+    def done(self, session_id: str) -> None:
+        if self._finish(session_id):
+            self.release(session_id)
+
+    def release(self, session_id: str) -> None:
+        with self._lock:
+            self._leases.pop(session_id, None)
+            self._draining.discard(session_id)
+        reference = self._lease_ref(session_id)
+        snapshot = reference.get()
+        if not snapshot.exists or snapshot.get("owner") != self.worker_id:
+            return
+        try:
+            reference.delete(option=self.client.write_option(last_update_time=snapshot.update_time))
+        except Exception as exc:
+            if not is_precondition_failure(exc):
+                raise
+            return
+        with self._lock:
+            self.stats.released += 1
+
+    def renew_leases(self) -> None:
+        for session_id in self.held():
+            if not self.owns(session_id):
+                self._release_when_idle(session_id)
+            elif not self._take(session_id):
+                with self._lock:
+                    if self._leases.pop(session_id, None) is not None:
+                        self.stats.lost += 1
+
+    def _take(self, session_id: str) -> bool:
+        now = self._now_ms()
+        expires_at = now + int(self.lease_seconds * 1000)
+        data: dict[str, Any] = {"owner": self.worker_id, "renewedAt": now, "expiresAt": expires_at}
+        reference = self._lease_ref(session_id)
+        snapshot = reference.get()
+        try:
+            if not snapshot.exists:
+                reference.create({**data, "acquiredAt": now})
+                outcome = "acquired"
+            else:
+                owner = snapshot.get("owner")
+                current_expiry = snapshot.get("expiresAt")
+                if owner != self.worker_id and isinstance(current_expiry, (int, float)) and current_expiry > now:
+                    with self._lock:
+                        self.stats.contended += 1
+                    return False
+                outcome = "renewed"
+                if owner != self.worker_id:
+                    data.update({"acquiredAt": now, "previousOwner": owner})
+                    outcome = "taken_over"
+                reference.update(data, option=self.client.write_option(last_update_time=snapshot.update_time))
+        except Exception as exc:
+            if not is_precondition_failure(exc):
+                raise
+            with self._lock:
+                self.stats.contended += 1
+            return False
+        with self._lock:
+            self._leases[session_id] = expires_at
+            setattr(self.stats, outcome, getattr(self.stats, outcome) + 1)
+        return True
+
+    def _finish(self, session_id: str) -> bool:
+        """Drop one unit of work; returns whether a deferred release is now due."""
+
+        with self._lock:
+            remaining = self._active.get(session_id, 0) - 1
+            if remaining > 0:
+                self._active[session_id] = remaining
+                return False
+            self._active.pop(session_id, None)
+            return session_id in self._draining
+
+    def _release_when_idle(self, session_id: str) -> None:
+        with self._lock:
+            if self._active.get(session_id):
+                self._draining.add(session_id)
+                return
+        self.release(session_id)
+
+    def _heartbeat_loop(self, interval: float) -> None:
+        while not self._stopping.wait(interval):
+            try:
+                self.heartbeat()
+            except Exception:  # transient Firestore errors are retried on the next beat
+                continue
+
+    def _write_membership(self, *, joined: bool) -> None:
+        now = self._now_ms()
+        data: dict[str, Any] = {"heartbeatAt": now, "expiresAt": now + int(self.member_ttl * 1000)}
+        if joined:
+            data["joinedAt"] = now
+        self._member_ref(self.worker_id).set(data, merge=True)
+
+    def _now_ms(self) -> int:
+        return int(self._clock() * 1000)
+
+    def _fleet_ref(self) -> Any:
+        return self.client.collection(FLEETS_COLLECTION).document(self.fleet)
+
+    def _member_ref(self, worker_id: str) -> Any:
+        return self._fleet_ref().collection(MEMBERS_COLLECTION).document(worker_id)
+
+    def _lease_ref(self, session_id: str) -> Any:
+        return self._fleet_ref().collection(LEASES_COLLECTION).document(session_id)
+
+
+__all__ = [
+    "DEFAULT_FLEET",
+    "DEFAULT_MEMBER_TTL",
+    "DEFAULT_REPLICAS",
+    "DEFAULT_SESSION_LEASE",
+    "FLEETS_COLLECTION",
+    "FleetCoordinator",
+    "FleetStats",
+    "HashRing",
+]
@@ -0,0 +1,130 @@
+"""Measure module import cost with ``python -X importtime``.
+
+Each measurement runs a fresh interpreter, so results reflect a cold start
+(minus the OS file cache) and are independent of what the caller imported.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Sequence
+
+# SDKs that should only be imported by the command that talks to Firebase.
+HEAVY_MODULES = ("firebase_admin", "google.cloud", "google.api_core", "grpc")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+@dataclass(frozen=True, slots=True)
+class ImportRecord:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+@dataclass(slots=True)
+class ImportReport:
+    target: str
+    records: list[ImportRecord] = field(default_factory=list)
+
+    @property
+    def total_us(self) -> int:
+        """Cumulative time of the top-level imports, i.e. the cost of importing ``target``."""
+
+        return sum(record.cumulative_us for record in self.records if record.depth == 0)
+
+    def heavy(self, prefixes: Sequence[str] = HEAVY_MODULES) -> list[str]:
+        return [
+            record.module
+            for record in self.records
+            if any(record.module == prefix or record.module.startswith(prefix + ".") for prefix in prefixes)
+        ]
+
+    def slowest(self, count: int = 10) -> list[ImportRecord]:
+        return sorted(self.records, key=lambda record: record.cumulative_us, reverse=True)[:count]
+
+    def to_map(self, top: int = 10) -> dict[str, Any]:
+        return {
+            "target": self.target,
+            "total_ms": round(self.total_us / 1000, 1),
+            "modules": len(self.records),
+            "heavy": self.heavy(),
+            "slowest": [
+                {"module": record.module, "self_ms": round(record.self_us / 1000, 1),
+                 "cumulative_ms": round(record.cumulative_us / 1000, 1)}
+                for record in self.slowest(top)
+            ],
+        }
+
+    def format(self, top: int = 10) -> str:
+        lines = [f"{self.target}: {self.total_us / 1000:.1f} ms, {len(self.records)} modules"]
+        for record in self.slowest(top):
+            lines.append(f"  {record.cumulative_us / 1000:>8.1f} ms  {record.module}")
+        heavy = self.heavy()
+        if heavy:
+            lines.append("  heavy imports at load: " + ", ".join(heavy))
+        return "\n".join(lines)
+
+
+def parse_importtime(output: str) -> list[ImportRecord]:
+    """Parse the ``-X importtime`` lines of ``output``, ignoring everything else."""
+
+    records = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append(ImportRecord(module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return records
+
+
+def measure_imports(
+    module: str,
+    *,
+    path: Iterable[str | Path] = (),
+    python: str = sys.executable,
+    baseline: bool = True,
+) -> ImportReport:
+    """Import ``module`` in a fresh interpreter and report what that import cost.
+
+    ``path`` entries are prepended to ``PYTHONPATH``. With ``baseline`` the
+    modules the interpreter imports on its own are left out of the report.
+    """
+
+    env = dict(os.environ)
+    entries = [str(entry) for entry in path]
+    if env.get("PYTHONPATH"):
+        entries.append(env["PYTHONPATH"])
+    if entries:
+        env["PYTHONPATH"] = os.pathsep.join(entries)
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if completed.returncode != 0:
+        raise ImportError(f"importing {module} failed:\n{completed.stderr.strip()[-2000:]}")
+    records = parse_importtime(completed.stderr)
+    if baseline:
+        startup = subprocess.run(
+            [python, "-X", "importtime", "-c", "pass"], capture_output=True, text=True, env=env
+        )
+        preloaded = {record.module for record in parse_importtime(startup.stderr)}
+        records = [record for record in records if record.module not in preloaded]
+    return ImportReport(module, records)
+
+
+__all__ = [
+    "HEAVY_MODULES",
+    "ImportRecord",
+    "ImportReport",
+    "measure_imports",
+    "parse_importtime",
+]
@@ -0,0 +1,591 @@
+"""Process memos dropped into Firestore ``memos`` inboxes as they arrive.
+
+A memo is a document under ``sessions/{session}/memos`` with ``text``,
+``createdAt`` (epoch milliseconds) and ``status: "pending"``; ``aspects`` and
+``model`` are optional and use the batch record format. An
+:class:`InboxWatcher` listens with ``on_snapshot`` on specific sessions or on
+the ``memos`` collection group (which needs a collection-group index on
+``status``), claims each pending memo and runs it through the pipeline on a
+bounded worker pool.
+
+Claims are leases: a watcher flips ``status`` to ``processing`` under an
+update-time precondition, so exactly one of several watchers wins, and
+records ``claimedBy`` and ``leaseExpiresAt``. While the memo is processed a
+heartbeat renews the lease every third of ``lease_seconds``, so the lease only
+has to outlast a stalled watcher, not the slowest memo. Marking the memo
+``done`` is committed in the same batch as the notes it produced, under an
+update-time precondition on the memo, so a watcher whose lease was taken over
+writes nothing. Leases left
+behind by a crashed watcher are returned to ``pending`` by a periodic sweep
+once they expire. Renewals and the reset after a failed attempt are
+conditional on the memo's update time from this watcher's last write, so they
+are dropped once another watcher has taken the memo over.
+
+With a :class:`~notes_tools.fleet.FleetCoordinator` the watcher only takes
+memos of sessions its fleet member owns and holds the session lease while
+it works on them; memos of sessions it gains in a rebalance are picked up by
+a rescan of the pending queries.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Mapping, Sequence
+
+from .batch import BatchRecordError, SessionLocks, build_request
+from .defaults import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_FAILURES, DEFAULT_WORKERS
+from .openrouter import LlmRequestError
+from .pipeline import MemoPipeline, MemoRequest, MemoResult, PipelineError
+from .session_writes import (
+    SESSIONS_COLLECTION,
+    WriteOp,
+    is_precondition_failure,
+    new_document_id,
+)
+
+if TYPE_CHECKING:
+    from .fleet import FleetCoordinator
+
+MEMOS_COLLECTION = "memos"
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+LAG_SAMPLES = 1024
+
+
+class _ClaimLost(RuntimeError):
+    """Raised while committing a memo this watcher no longer holds the lease on."""
+FLEET_RETRY_SECONDS = 1.0
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_memo(
+    client: Any,
+    session_id: str,
+    text: str,
+    *,
+    aspects: Sequence[str] | Mapping[str, bool] | None = None,
+    model: str | None = None,
+    created_at: int | None = None,
+) -> str:
+    """Add a pending memo to ``session_id``'s inbox and return its document ID."""
+
+    memo_id = new_document_id()
+    data: dict[str, Any] = {
+        "text": text,
+        "createdAt": created_at if created_at is not None else _now_ms(),
+        "status": STATUS_PENDING,
+    }
+    if aspects is not None:
+        data["aspects"] = list(aspects) if not isinstance(aspects, Mapping) else dict(aspects)
+    if model:
+        data["model"] = model
+    client.collection(SESSIONS_COLLECTION).document(session_id).collection(MEMOS_COLLECTION).document(
+        memo_id
+    ).set(data)
+    return memo_id
+
+
+@dataclass(slots=True)
+class InboxMemo:
+    """A memo document read from an inbox."""
+
+    reference: Any
+    session_id: str
+    text: str
+    created_at: int
+    status: str
+    attempts: int = 0
+    aspects: Any = None
+    model: str | None = None
+    lease_expires_at: int | None = None
+    update_time: Any = None
+
+    @property
+    def path(self) -> tuple[str, ...]:
+        return (SESSIONS_COLLECTION, self.session_id, MEMOS_COLLECTION, self.reference.id)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Any) -> "InboxMemo | None":
+        data = snapshot.to_dict() or {}
+        session_ref = snapshot.reference.parent.parent
+        if session_ref is None:
+            return None
+        session_id = session_ref.id
+        text = str(data.get("text") or "").strip()
+        try:
+            created_at = int(data.get("createdAt") or 0)
+        except (TypeError, ValueError):
+            created_at = 0
+        lease = data.get("leaseExpiresAt")
+        return cls(
+            reference=snapshot.reference,
+            session_id=session_id,
+            text=text,
+            created_at=created_at,
+            status=str(data.get("status") or ""),
+            attempts=int(data.get("attempts") or 0),
+            aspects=data.get("aspects"),
+            model=str(data.get("model") or "").strip() or None,
+            lease_expires_at=int(lease) if isinstance(lease, (int, float)) else None,
+            update_time=getattr(snapshot, "update_time", None),
+        )
+
+    def request(self, defaults: MemoRequest | None = None) -> MemoRequest:
+        return build_request(
+            self.session_id, self.text, aspects=self.aspects, model=self.model, defaults=defaults
+        )
+
+
+class LagStats:
+    """Rolling window of latency samples in milliseconds."""
+
+    def __init__(self, samples: int = LAG_SAMPLES) -> None:
+        self._values: deque[float] = deque(maxlen=samples)
+
+    def record(self, value_ms: float) -> None:
+        self._values.append(max(0.0, value_ms))
+
+    def to_map(self) -> dict[str, float | int]:
+        values = sorted(self._values)
+        if not values:
+            return {"count": 0}
+
+        def _pct(fraction: float) -> float:
+            return round(values[min(len(values) - 1, int(fraction * len(values)))], 1)
+
+        return {"count": len(values), "p50": _pct(0.5), "p95": _pct(0.95), "max": round(values[-1], 1)}
+
+
+@dataclass(slots=True)
+class InboxMetrics:
+    seen: int = 0
+    claimed: int = 0
+    lost_claims: int = 0
+    deferred: int = 0
+    processed: int = 0
+    failed: int = 0
+    retried: int = 0
+    reclaimed_leases: int = 0
+    claim_lag: LagStats = field(default_factory=LagStats)
+    end_to_end_lag: LagStats = field(default_factory=LagStats)
+    processing_time: LagStats = field(default_factory=LagStats)
+
+    def to_map(self) -> dict[str, Any]:
+        return {
+            "seen": self.seen,
+            "claimed": self.claimed,
+            "lost_claims": self.lost_claims,
+            "deferred": self.deferred,
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "reclaimed_leases": self.reclaimed_leases,
+            "claim_lag_ms": self.claim_lag.to_map(),
+            "end_to_end_lag_ms": self.end_to_end_lag.to_map(),
+            "processing_ms": self.processing_time.to_map(),
+        }
+
+
+class InboxWatcher:
+    """Subscribes to memo inboxes and processes pending memos on a worker pool.
+
+    ``session_ids`` limits the watcher to those sessions; ``None`` listens on
+    the ``memos`` collection group. ``on_result`` is called with a JSON-ready
+    map for every memo that finished (successfully or not). ``fleet``
+    restricts the watcher to the sessions that coordinator owns.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        pipeline: MemoPipeline,
+        *,
+        session_ids: Iterable[str] | None = None,
+        worker_id: str | None = None,
+        workers: int = DEFAULT_WORKERS,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_failures: int = DEFAULT_MAX_FAILURES,
+        defaults: MemoRequest | None = None,
+        on_result: Callable[[dict[str, Any]], None] | None = None,
+        serialize: Callable[[Any], Any] | None = None,
+        fleet: FleetCoordinator | None = None,
+    ) -> None:
+        self.client = client
+        self.pipeline = pipeline
+        self.session_ids = list(session_ids) if session_ids is not None else None
+        self.worker_id = worker_id or default_worker_id()
+        self.workers = max(1, workers)
+        self.lease_seconds = lease_seconds
+        self.max_failures = max(1, max_failures)
+        self.defaults = defaults
+        self.on_result = on_result
+        self.serialize = serialize
+        self.fleet = fleet
+        self.metrics = InboxMetrics()
+        self._lock = threading.Lock()
+        self._in_flight: set[tuple[str, ...]] = set()
+        self._claims: dict[tuple[str, ...], InboxMemo] = {}
+        self._lease_lock = threading.Lock()
+        self._session_locks = SessionLocks()
+        self._executor: ThreadPoolExecutor | None = None
+        self._watches: list[Any] = []
+        self._stopping = threading.Event()
+        self._stopped = threading.Event()
+        self._sweeper: threading.Thread | None = None
+        self._heartbeat_thread: threading.Thread | None = None
+
+    def queries(self, status: str = STATUS_PENDING) -> list[Any]:
+        if self.session_ids is None:
+            inboxes = [self.client.collection_group(MEMOS_COLLECTION)]
+        else:
+            sessions = self.client.collection(SESSIONS_COLLECTION)
+            inboxes = [sessions.document(session_id).collection(MEMOS_COLLECTION) for session_id in self.session_ids]
+        return [inbox.where("status", "==", status) for inbox in inboxes]
+
+    def start(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inbox-worker")
+        self.sweep_expired_leases()
+        if self.fleet is not None:
+            self.fleet.subscribe(lambda ring: self.rescan())
+        for query in self.queries():
+            self._watches.append(query.on_snapshot(self._on_snapshot))
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="inbox-lease-sweeper", daemon=True)
+        self._sweeper.start()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, name="inbox-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        self._stopping.set()
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        # Memos still draining above kept their leases renewed until now.
+        self._stopped.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join(timeout=1.0)
+            self._heartbeat_thread = None
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until no memo is being processed; mainly for tests and shutdown."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._in_flight:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    def sweep_expired_leases(self) -> int:
+        """Return memos whose lease expired to ``pending``; returns how many were reset."""
+
+        now = _now_ms()
+        reset = 0
+        for query in self.queries(STATUS_PROCESSING):
+            for snapshot in query.stream():
+                memo = InboxMemo.from_snapshot(snapshot)
+                if memo is None or memo.lease_expires_at is None or memo.lease_expires_at > now:
+                    continue
+                if self._conditional_update(
+                    memo,
+                    {"status": STATUS_PENDING, "claimedBy": None, "leaseExpiresAt": None},
+                ):
+                    reset += 1
+        if reset:
+            with self._lock:
+                self.metrics.reclaimed_leases += reset
+        return reset
+
+    def rescan(self) -> int:
+        """Dispatch every pending memo this watcher may take; returns how many were queued."""
+
+        if self._stopping.is_set():
+            return 0
+        memos = []
+        for query in self.queries():
+            for snapshot in query.stream():
+                memo = InboxMemo.from_snapshot(snapshot)
+                if memo is not None and memo.status == STATUS_PENDING:
+                    memos.append(memo)
+        return sum(self._dispatch(memo) for memo in sorted(memos, key=lambda item: item.created_at))
+
+    def _sweep_loop(self) -> None:
+        interval = max(1.0, self.lease_seconds / 2)
+        while not self._stopping.wait(interval):
+            try:
+                self.sweep_expired_leases()
+            except Exception:  # transient read failures are retried on the next sweep
+                continue
+
+    def _heartbeat(self) -> None:
+        interval = max(0.05, self.lease_seconds / 3)
+        while not self._stopped.wait(interval):
+            with self._lock:
+                claims = list(self._claims.values())
+            for memo in claims:
+                try:
+                    self._renew(memo)
+                except Exception:  # retried on the next beat; the lease still has two thirds left
+                    continue
+
+    def _renew(self, memo: InboxMemo) -> None:
+        with self._lease_lock:
+            with self._lock:
+                if self._claims.get(memo.path) is not memo:
+                    return
+            lease = {"leaseExpiresAt": _now_ms() + int(self.lease_seconds * 1000)}
+            if not self._conditional_update(memo, lease):
+                # Taken over after an expiry, or already marked done by our own commit.
+                with self._lock:
+                    self._claims.pop(memo.path, None)
+
+    def _release(self, memo: InboxMemo, data: Mapping[str, Any] | None = None) -> bool:
+        """Stop renewing ``memo``'s lease, first writing ``data`` if this watcher still holds it."""
+
+        with self._lease_lock:
+            with self._lock:
+                held = self._claims.pop(memo.path, None) is memo
+            if data is None or not held:
+                return held
+            return self._conditional_update(memo, data)
+
+    def _on_snapshot(self, snapshots: Sequence[Any], changes: Sequence[Any], read_time: Any) -> None:
+        arrivals = []
+        for change in changes:
+            if change.type.name not in {"ADDED", "MODIFIED"}:
+                continue
+            memo = InboxMemo.from_snapshot(change.document)
+            if memo is not None and memo.status == STATUS_PENDING:
+                arrivals.append(memo)
+        for memo in sorted(arrivals, key=lambda item: item.created_at):
+            self._dispatch(memo)
+
+    def _dispatch(self, memo: InboxMemo) -> bool:
+        if self.fleet is not None and not self.fleet.owns(memo.session_id):
+            return False
+        with self._lock:
+            executor = self._executor
+            if executor is None or memo.path in self._in_flight:
+                return False
+            self._in_flight.add(memo.path)
+            self.metrics.seen += 1
+        executor.submit(self._handle, memo)
+        return True
+
+    def _handle(self, memo: InboxMemo) -> None:
+        retry = deferred = False
+        try:
+            with self._session_locks.hold(memo.session_id):
+                if self._stopping.is_set():
+                    return
+                if self.fleet is not None and not self.fleet.acquire(memo.session_id):
+                    # Usually the previous owner is finishing a memo; try again once it let go.
+                    deferred = self.fleet.owns(memo.session_id)
+                    return
+                try:
+                    if self._claim(memo):
+                        retry = self._process(memo)
+                finally:
+                    if self.fleet is not None:
+                        self.fleet.done(memo.session_id)
+        finally:
+            with self._lock:
+                self._in_flight.discard(memo.path)
+                if deferred:
+                    self.metrics.deferred += 1
+        if deferred:
+            timer = threading.Timer(FLEET_RETRY_SECONDS, self._redispatch, args=(memo,))
+            timer.daemon = True
+            timer.start()
+        elif retry:
+            # The snapshot announcing the reset may have arrived while the memo was still in flight.
+            self._redispatch(memo)
+
+    def _redispatch(self, memo: InboxMemo) -> None:
+        if self._stopping.is_set():
+            return
+        fresh = InboxMemo.from_snapshot(memo.reference.get())
+        if fresh is not None and fresh.status == STATUS_PENDING:
+            self._dispatch(fresh)
+
+    def _claim(self, memo: InboxMemo) -> bool:
+        now = _now_ms()
+        claimed = self._conditional_update(
+            memo,
+            {
+                "status": STATUS_PROCESSING,
+                "claimedBy": self.worker_id,
+                "claimedAt": now,
+                "leaseExpiresAt": now + int(self.lease_seconds * 1000),
+                "attempts": memo.attempts + 1,
+            },
+        )
+        with self._lock:
+            if claimed:
+                self._claims[memo.path] = memo
+                self.metrics.claimed += 1
+                if memo.created_at:
+                    self.metrics.claim_lag.record(now - memo.created_at)
+            else:
+                self.metrics.lost_claims += 1
+        return claimed
+
+    def _conditional_update(self, memo: InboxMemo, data: Mapping[str, Any]) -> bool:
+        """Update ``memo`` unless it changed since it was read; tracks the new update time."""
+
+        option = None
+        if memo.update_time is not None:
+            option = self.client.write_option(last_update_time=memo.update_time)
+        try:
+            result = memo.reference.update(dict(data), option=option)
+        except Exception as exc:
+            if is_precondition_failure(exc):
+                return False
+            raise
+        memo.update_time = getattr(result, "update_time", None)
+        return True
+
+    def _process(self, memo: InboxMemo) -> bool:
+        """Run a claimed memo; returns whether it was put back to ``pending`` for a retry."""
+
+        started = time.perf_counter()
+        result: MemoResult | None = None
+        error: str | None = None
+        try:
+            if not memo.text:
+                raise PipelineError("Memo text is empty")
+            request = memo.request(self.defaults)
+            done = {
+                "status": STATUS_DONE,
+                "processedAt": _now_ms(),
+                "processedBy": self.worker_id,
+                "leaseExpiresAt": None,
+                "error": None,
+            }
+            if memo.created_at:
+                done["lagMs"] = done["processedAt"] - memo.created_at
+            result = self.pipeline.process(request, update=True, extra_ops=self._done_ops(memo, done))
+        except _ClaimLost:
+            # Another watcher took the memo over after our lease lapsed; nothing was written.
+            self._release(memo)
+            with self._lock:
+                self.metrics.lost_claims += 1
+            return False
+        except (PipelineError, LlmRequestError, BatchRecordError) as exc:
+            error = str(exc)
+        except Exception as exc:  # keep the watcher alive; the memo is retried or failed below
+            error = f"{type(exc).__name__}: {exc}"
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        finished = _now_ms()
+        status = STATUS_DONE
+        if error is None:
+            self._release(memo)
+        else:
+            status = STATUS_FAILED if memo.attempts + 1 >= self.max_failures else STATUS_PENDING
+            try:
+                released = self._release(
+                    memo, {"status": status, "error": error, "claimedBy": None, "leaseExpiresAt": None}
+                )
+            except Exception:  # the lease sweep returns it to pending later
+                released = True
+            if not released:
+                # Another watcher took the memo over after our lease lapsed; leave it to them.
+                with self._lock:
+                    self.metrics.lost_claims += 1
+                return False
+        with self._lock:
+            self.metrics.processing_time.record(elapsed_ms)
+            if error is None:
+                self.metrics.processed += 1
+                if memo.created_at:
+                    self.metrics.end_to_end_lag.record(finished - memo.created_at)
+            elif status == STATUS_FAILED:
+                self.metrics.failed += 1
+            else:
+                self.metrics.retried += 1
+        if self.on_result is not None:
+            payload: dict[str, Any] = {
+                "session_id": memo.session_id,
+                "memo_id": memo.reference.id,
+                "status": status,
+                "attempt": memo.attempts + 1,
+                "timings": {
+                    "processing_ms": round(elapsed_ms, 1),
+                    "end_to_end_ms": finished - memo.created_at if memo.created_at else None,
+                },
+            }
+            if error is not None:
+                payload["error"] = error
+            if result is not None:
+                payload["llm_calls"] = result.llm_calls
+                payload["journaled"] = result.journaled
+                if self.serialize is not None:
+                    payload["summary"] = self.serialize(result.summary)
+            self.on_result(payload)
+        return status == STATUS_PENDING
+
+    def _done_ops(self, memo: InboxMemo, done: Mapping[str, Any]) -> Callable[[], list[WriteOp]]:
+        """Plan the ``done`` marker for each commit attempt, conditional on still holding the claim.
+
+        The marker carries the memo's update time from this watcher's last
+        write, so the commit fails if anyone else wrote the memo since. The
+        pipeline retries a failed commit as a conflict; before a retry the
+        memo is read again and, unless it still carries our update time (the
+        commit may have lost to our own heartbeat), :class:`_ClaimLost` ends
+        the attempt instead.
+        """
+
+        attempted = False
+
+        def plan() -> list[WriteOp]:
+            nonlocal attempted
+            with self._lease_lock:
+                with self._lock:
+                    held = self._claims.get(memo.path) is memo
+                if held and attempted and memo.update_time is not None:
+                    held = getattr(memo.reference.get(), "update_time", None) == memo.update_time
+                if not held:
+                    raise _ClaimLost(f"Lost the claim on {memo.reference.id}")
+                attempted = True
+                return [WriteOp(memo.path, dict(done), merge=True, update_time=memo.update_time)]
+
+        return plan
+
+
+__all__ = [
+    "DEFAULT_LEASE_SECONDS",
+    "DEFAULT_MAX_FAILURES",
+    "MEMOS_COLLECTION",
+    "STATUS_DONE",
+    "STATUS_FAILED",
+    "STATUS_PENDING",
+    "STATUS_PROCESSING",
+    "InboxMemo",
+    "InboxMetrics",
+    "InboxWatcher",
+    "LagStats",
+    "default_worker_id",
+    "enqueue_memo",
+]
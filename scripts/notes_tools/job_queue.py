@@ -0,0 +1,570 @@
+"""Durable local job queue for memo processing backed by SQLite.
+
+Jobs move through ``ready`` → ``claimed`` → ``done``. A claim is a lease:
+a worker that crashes, or takes longer than its visibility timeout without
+calling :meth:`JobQueue.extend`, loses the job to the next claimer. Failed
+jobs return to ``ready`` after an exponential backoff; after ``max_attempts``
+they are moved to the ``dead`` state, where they can be inspected and requeued.
+
+Only the oldest unfinished job of a session is claimable, so memos for one
+session are processed in enqueue order even with many workers, while
+different sessions proceed in parallel. Delivery is at least once; the
+:class:`QueueWorker` makes redelivery harmless by committing a completion
+marker together with the notes and skipping jobs that already have one.
+
+The database runs in WAL mode; ``synchronous=NORMAL`` (the default) survives
+process crashes, ``durable=True`` also survives power loss at the cost of an
+fsync per transaction.
+"""
+
+from __future__ import annotations
+
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Mapping, Sequence
+
+from .batch import build_request
+from .codec import JSON
+from .defaults import DEFAULT_QUEUE_PATH, DEFAULT_VISIBILITY_TIMEOUT
+from .pipeline import MemoPipeline, MemoRequest, MemoResult
+from .session_writes import SESSIONS_COLLECTION, WriteOp
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF = 5.0
+MAX_BACKOFF = 3600.0
+
+STATUS_READY = "ready"
+STATUS_CLAIMED = "claimed"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+STATUSES = (STATUS_READY, STATUS_CLAIMED, STATUS_DONE, STATUS_DEAD)
+
+# Completed jobs leave a marker in the session's memo inbox (see notes_tools.inbox).
+COMPLETION_COLLECTION = "memos"
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT NOT NULL UNIQUE,
+        session_id TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        available_at REAL NOT NULL,
+        created_at REAL NOT NULL,
+        claimed_by TEXT,
+        claim_expires_at REAL,
+        finished_at REAL,
+        last_error TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS jobs_session ON jobs (session_id, status, id)",
+    "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)",
+    "CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at) WHERE finished_at IS NOT NULL",
+)
+
+_COLUMNS = (
+    "id, key, session_id, payload, status, attempts, max_attempts, available_at, created_at, "
+    "claimed_by, claim_expires_at, finished_at, last_error"
+)
+
+
+@dataclass(slots=True)
+class Job:
+    id: int
+    key: str
+    session_id: str
+    payload: dict[str, Any]
+    status: str
+    attempts: int
+    max_attempts: int
+    available_at: float
+    created_at: float
+    claimed_by: str | None = None
+    claim_expires_at: float | None = None
+    finished_at: float | None = None
+    last_error: str | None = None
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "Job":
+        return cls(*row[:3], JSON.loads(row[3]), *row[4:])
+
+    def request(self, defaults: MemoRequest | None = None) -> MemoRequest:
+        return build_request(
+            self.session_id,
+            str(self.payload.get("memo", "")),
+            aspects=self.payload.get("aspects"),
+            model=self.payload.get("model"),
+            defaults=defaults,
+        )
+
+    def to_map(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "key": self.key,
+            "session_id": self.session_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "created_at": self.created_at,
+            "available_at": self.available_at,
+            "claimed_by": self.claimed_by,
+            "last_error": self.last_error,
+            "payload": self.payload,
+        }
+
+
+@dataclass(slots=True)
+class QueueStats:
+    counts: dict[str, int]
+    oldest_ready_age: float | None
+    completed_last_minute: int
+    completed_last_hour: int
+
+    @property
+    def depth(self) -> int:
+        return self.counts.get(STATUS_READY, 0) + self.counts.get(STATUS_CLAIMED, 0)
+
+    def to_map(self) -> dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "counts": dict(self.counts),
+            "oldest_ready_age_s": None if self.oldest_ready_age is None else round(self.oldest_ready_age, 1),
+            "throughput_per_min": {
+                "last_minute": self.completed_last_minute,
+                "last_hour": round(self.completed_last_hour / 60, 1),
+            },
+        }
+
+
+def backoff_delay(attempts: int, base: float = DEFAULT_BACKOFF, cap: float = MAX_BACKOFF) -> float:
+    """Exponential backoff with equal jitter for the given number of failed attempts.
+
+    The delay is drawn from the upper half of the exponential ceiling, so
+    retries of many jobs spread out but none of them is retried right away.
+    """
+
+    ceiling = min(cap, base * (2 ** max(0, attempts - 1)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class JobQueue:
+    """SQLite-backed memo job queue; safe to share between threads and processes."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        durable: bool = False,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        backoff: float = DEFAULT_BACKOFF,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None, timeout=30.0
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(f"PRAGMA synchronous={'FULL' if durable else 'NORMAL'}")
+        for statement in _SCHEMA:
+            self._connection.execute(statement)
+
+    def _transaction(self, body: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = body(self._connection)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    def enqueue(
+        self,
+        session_id: str,
+        memo: str,
+        *,
+        aspects: Any = None,
+        model: str | None = None,
+        delay: float = 0.0,
+        key: str | None = None,
+    ) -> Job:
+        key = key or uuid.uuid4().hex
+        record = {"session_id": session_id, "memo": memo, "aspects": aspects, "model": model, "key": key}
+        self.enqueue_many([record], delay=delay)
+        with self._lock:
+            row = self._connection.execute(f"SELECT {_COLUMNS} FROM jobs WHERE key = ?", (key,)).fetchone()
+        return Job.from_row(row)
+
+    def enqueue_many(
+        self,
+        records: Iterable[Mapping[str, Any]],
+        *,
+        delay: float = 0.0,
+    ) -> int:
+        """Insert ``{session_id, memo, aspects?, model?, key?}`` records in one transaction.
+
+        Returns the number of new jobs. Records whose ``key`` already exists
+        are skipped, which makes producer retries idempotent.
+        """
+
+        now = self._clock()
+        rows = []
+        for record in records:
+            key = record.get("key")
+            payload = {name: record[name] for name in ("memo", "aspects", "model") if record.get(name) is not None}
+            rows.append(
+                (
+                    str(key or uuid.uuid4().hex),
+                    str(record["session_id"]),
+                    JSON.dumps(payload),
+                    STATUS_READY,
+                    self.max_attempts,
+                    now + delay,
+                    now,
+                )
+            )
+
+        def insert(connection: sqlite3.Connection) -> int:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs (key, session_id, payload, status, max_attempts, available_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return connection.total_changes - before
+
+        return self._transaction(insert)
+
+    def claim(
+        self,
+        worker_id: str,
+        *,
+        limit: int = 1,
+        visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+    ) -> list[Job]:
+        """Lease up to ``limit`` jobs, at most one per session (its oldest unfinished job)."""
+
+        now = self._clock()
+
+        def take(connection: sqlite3.Connection) -> list[Job]:
+            ids = [
+                row[0]
+                for row in connection.execute(
+                    """
+                    SELECT j.id FROM jobs j
+                    WHERE j.status IN (?, ?)
+                      AND j.id = (
+                          SELECT MIN(o.id) FROM jobs o
+                          WHERE o.session_id = j.session_id AND o.status IN (?, ?)
+                      )
+                      AND (
+                          (j.status = ? AND j.available_at <= ?)
+                          OR (j.status = ? AND j.claim_expires_at <= ?)
+                      )
+                    ORDER BY j.available_at, j.id
+                    LIMIT ?
+                    """,
+                    (
+                        STATUS_READY,
+                        STATUS_CLAIMED,
+                        STATUS_READY,
+                        STATUS_CLAIMED,
+                        STATUS_READY,
+                        now,
+                        STATUS_CLAIMED,
+                        now,
+                        limit,
+                    ),
+                )
+            ]
+            if not ids:
+                return []
+            placeholders = ",".join("?" * len(ids))
+            connection.execute(
+                f"UPDATE jobs SET status = ?, claimed_by = ?, claim_expires_at = ?, attempts = attempts + 1 "
+                f"WHERE id IN ({placeholders})",
+                (STATUS_CLAIMED, worker_id, now + visibility_timeout, *ids),
+            )
+            rows = connection.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE id IN ({placeholders}) ORDER BY available_at, id", ids
+            ).fetchall()
+            return [Job.from_row(row) for row in rows]
+
+        return self._transaction(take)
+
+    def extend(self, job: Job, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> bool:
+        """Push back the lease of a job this worker still holds."""
+
+        return self._update_claimed(job, "claim_expires_at = ?", (self._clock() + visibility_timeout,))
+
+    def ack(self, job: Job) -> bool:
+        """Mark a claimed job done; ``False`` if the lease was lost meanwhile."""
+
+        return self._update_claimed(
+            job,
+            "status = ?, finished_at = ?, claim_expires_at = NULL, last_error = NULL",
+            (STATUS_DONE, self._clock()),
+        )
+
+    def nack(self, job: Job, error: str, *, retry: bool = True) -> str:
+        """Record a failure; returns the new status (``ready`` for a retry or ``dead``)."""
+
+        now = self._clock()
+        if retry and job.attempts < job.max_attempts:
+            status = STATUS_READY
+            fields = "status = ?, available_at = ?, claimed_by = NULL, claim_expires_at = NULL, last_error = ?"
+            params: tuple[Any, ...] = (status, now + backoff_delay(job.attempts, self.backoff), error)
+        else:
+            status = STATUS_DEAD
+            fields = "status = ?, finished_at = ?, claim_expires_at = NULL, last_error = ?"
+            params = (status, now, error)
+        self._update_claimed(job, fields, params)
+        return status
+
+    def _update_claimed(self, job: Job, fields: str, params: tuple[Any, ...]) -> bool:
+        with self._lock:
+            cursor = self._connection.execute(
+                f"UPDATE jobs SET {fields} WHERE id = ? AND status = ? AND claimed_by = ? AND attempts = ?",
+                (*params, job.id, STATUS_CLAIMED, job.claimed_by, job.attempts),
+            )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: int) -> Job | None:
+        with self._lock:
+            row = self._connection.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def jobs(self, status: str | None = None, *, limit: int = 100) -> list[Job]:
+        query = f"SELECT {_COLUMNS} FROM jobs"
+        params: tuple[Any, ...] = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY id LIMIT ?"
+        with self._lock:
+            rows = self._connection.execute(query, (*params, limit)).fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def requeue_dead(self, job_ids: Iterable[int] | None = None) -> int:
+        """Move dead jobs (all, or the given IDs) back to ``ready`` with a fresh attempt budget."""
+
+        now = self._clock()
+        query = (
+            "UPDATE jobs SET status = ?, attempts = 0, available_at = ?, finished_at = NULL, "
+            "claimed_by = NULL WHERE status = ?"
+        )
+        params: list[Any] = [STATUS_READY, now, STATUS_DEAD]
+        if job_ids is not None:
+            ids = list(job_ids)
+            if not ids:
+                return 0
+            query += f" AND id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        with self._lock:
+            return self._connection.execute(query, params).rowcount
+
+    def purge(self, older_than: float, statuses: Sequence[str] = (STATUS_DONE,)) -> int:
+        """Delete finished jobs whose ``finished_at`` is more than ``older_than`` seconds ago."""
+
+        cutoff = self._clock() - older_than
+        placeholders = ",".join("?" * len(statuses))
+        with self._lock:
+            return self._connection.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+                (*statuses, cutoff),
+            ).rowcount
+
+    def stats(self) -> QueueStats:
+        now = self._clock()
+        with self._lock:
+            counts = {status: 0 for status in STATUSES}
+            for status, count in self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+                counts[status] = count
+            oldest = self._connection.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE status = ?", (STATUS_READY,)
+            ).fetchone()[0]
+            minute, hour = self._connection.execute(
+                "SELECT SUM(finished_at >= ?), COUNT(*) FROM jobs WHERE status = ? AND finished_at >= ?",
+                (now - 60, STATUS_DONE, now - 3600),
+            ).fetchone()
+        return QueueStats(counts, None if oldest is None else now - oldest, int(minute or 0), int(hour or 0))
+
+    def __len__(self) -> int:
+        return self.stats().depth
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def completion_marker(job: Job) -> WriteOp:
+    """Write recording that ``job`` was applied, committed together with its notes."""
+
+    return WriteOp(
+        (SESSIONS_COLLECTION, job.session_id, COMPLETION_COLLECTION, f"job-{job.key}"),
+        {
+            "text": str(job.payload.get("memo", "")),
+            "status": "done",
+            "source": "queue",
+            "createdAt": int(job.created_at * 1000),
+            "processedAt": int(time.time() * 1000),
+        },
+    )
+
+
+class QueueWorker:
+    """Runs queued memos through a :class:`MemoPipeline` with ``concurrency`` threads.
+
+    Leases of in-flight jobs are extended in the background, so a visibility
+    timeout only has to cover a stalled worker, not a slow memo.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        pipeline: MemoPipeline,
+        *,
+        worker_id: str,
+        concurrency: int = 4,
+        update: bool = True,
+        visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+        poll_interval: float = 1.0,
+        defaults: MemoRequest | None = None,
+        on_result: Callable[[dict[str, Any]], None] | None = None,
+    ) -> None:
+        self.queue = queue
+        self.pipeline = pipeline
+        self.worker_id = worker_id
+        self.concurrency = max(1, concurrency)
+        self.update = update
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.defaults = defaults
+        self.on_result = on_result
+        self.processed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._in_flight: dict[int, Job] = {}
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+
+    def run(self, *, drain: bool = False) -> None:
+        """Process jobs until :meth:`stop`; with ``drain`` return once the queue is empty."""
+
+        heartbeat = threading.Thread(target=self._heartbeat, name="queue-heartbeat", daemon=True)
+        heartbeat.start()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="queue-worker") as executor:
+            while not self._stopping.is_set():
+                self._wakeup.clear()
+                with self._lock:
+                    free = self.concurrency - len(self._in_flight)
+                jobs = []
+                if free:
+                    jobs = self.queue.claim(self.worker_id, limit=free, visibility_timeout=self.visibility_timeout)
+                if not jobs:
+                    with self._lock:
+                        idle = not self._in_flight
+                    if drain and idle and self.queue.stats().depth == 0:
+                        break
+                    # Finishing a job can unblock the next memo of its session.
+                    self._wakeup.wait(self.poll_interval)
+                    continue
+                for job in jobs:
+                    with self._lock:
+                        self._in_flight[job.id] = job
+                    executor.submit(self._run_job, job)
+        self._stopping.set()
+        heartbeat.join(timeout=1.0)
+
+    def _heartbeat(self) -> None:
+        interval = max(0.05, self.visibility_timeout / 3)
+        while not self._stopping.wait(interval):
+            with self._lock:
+                jobs = list(self._in_flight.values())
+            for job in jobs:
+                self.queue.extend(job, self.visibility_timeout)
+
+    def _already_applied(self, job: Job) -> bool:
+        marker = completion_marker(job)
+        return bool(self.pipeline.client.document(marker.document_path).get().exists)
+
+    def _run_job(self, job: Job) -> None:
+        started = time.perf_counter()
+        queued_ms = (time.time() - job.created_at) * 1000
+        status = STATUS_DONE
+        error: str | None = None
+        result: MemoResult | None = None
+        try:
+            # A redelivered job may have been committed by an attempt that then lost its lease.
+            if not (self.update and job.attempts > 1 and self._already_applied(job)):
+                extra = [completion_marker(job)] if self.update else []
+                result = self.pipeline.process(job.request(self.defaults), update=self.update, extra_ops=extra)
+        except Exception as exc:  # every failure is retried with backoff, then dead-lettered
+            error = f"{type(exc).__name__}: {exc}"
+        try:
+            if error is None:
+                self.queue.ack(job)
+            else:
+                status = self.queue.nack(job, error)
+        finally:
+            with self._lock:
+                self._in_flight.pop(job.id, None)
+                if error is None:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+            self._wakeup.set()
+        if self.on_result is not None:
+            payload: dict[str, Any] = {
+                "job_id": job.id,
+                "session_id": job.session_id,
+                "status": status,
+                "attempt": job.attempts,
+                "timings": {
+                    "queued_ms": round(queued_ms, 1),
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+                },
+            }
+            if error is not None:
+                payload["error"] = error
+            if result is not None:
+                payload["llm_calls"] = result.llm_calls
+                payload["attempts"] = result.attempts
+            self.on_result(payload)
+
+
+__all__ = [
+    "DEFAULT_MAX_ATTEMPTS",
+    "DEFAULT_QUEUE_PATH",
+    "DEFAULT_VISIBILITY_TIMEOUT",
+    "STATUSES",
+    "STATUS_CLAIMED",
+    "STATUS_DEAD",
+    "STATUS_DONE",
+    "STATUS_READY",
+    "Job",
+    "JobQueue",
+    "QueueStats",
+    "QueueWorker",
+    "backoff_delay",
+    "completion_marker",
+]
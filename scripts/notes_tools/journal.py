@@ -0,0 +1,308 @@
+"""Durable local journal backing write-behind persistence of memo summaries.
+
+Planned :class:`~notes_tools.session_writes.WriteOp` lists are appended to a
+SQLite database (WAL mode, ``synchronous=FULL`` so every append is fsync'd
+before it is acknowledged). A :class:`JournalFlusher` thread applies pending
+entries to Firestore in order for each session, retrying with exponential
+backoff; entries that survive a crash are picked up again the next time a
+flusher starts. An entry that keeps failing, or fails with an error that a
+retry cannot fix, is dead-lettered so it stops holding back its session.
+
+One process at a time owns a journal: it is opened with SQLite's exclusive
+locking mode, and a second process opening it gets :class:`JournalLocked`.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Sequence
+
+from .codec import JSON
+from .session_writes import WriteOp, decode_ops, encode_ops
+
+DEFAULT_JOURNAL_PATH = Path("~/.cache/diana/write-journal.sqlite3")
+DEFAULT_MAX_ATTEMPTS = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    ops TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    dead INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+_COLUMNS = "id, session_id, created_at, ops, attempts, last_error, dead"
+
+
+class JournalLocked(RuntimeError):
+    """Raised when another process already holds the journal."""
+
+
+def is_permanent_failure(exc: BaseException) -> bool:
+    """Whether retrying the write that raised ``exc`` cannot succeed.
+
+    Invalid arguments (such as an oversized document), denied permissions
+    and missing parents are reported by Firestore as client errors; rate
+    limits and aborted or conflicting writes are worth retrying.
+    """
+
+    try:
+        from google.api_core.exceptions import BadRequest, Forbidden, NotFound
+    except ModuleNotFoundError:
+        return False
+    return isinstance(exc, (BadRequest, Forbidden, NotFound))
+
+
+@dataclass(slots=True)
+class JournalEntry:
+    id: int
+    session_id: str
+    created_at: float
+    ops: list[WriteOp]
+    attempts: int = 0
+    last_error: str | None = None
+    dead: bool = False
+
+    def to_map(self) -> dict[str, object]:
+        return {
+            "id": self.id,
+            "session_id": self.session_id,
+            "created_at": self.created_at,
+            "ops": len(self.ops),
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "dead": self.dead,
+        }
+
+
+def _entry(row: Sequence[object]) -> JournalEntry:
+    return JournalEntry(row[0], row[1], row[2], decode_ops(JSON.loads(row[3])), row[4], row[5], bool(row[6]))
+
+
+class WriteJournal:
+    """Append-only queue of pending session writes stored in SQLite.
+
+    Entries that failed ``max_attempts`` times are dead: they are no longer
+    returned by :meth:`pending` until :meth:`requeue_dead` revives them.
+    """
+
+    def __init__(self, path: str | Path, *, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None, timeout=1.0
+        )
+        try:
+            # Set before the first access, so the lock is held until close().
+            self._connection.execute("PRAGMA locking_mode=EXCLUSIVE")
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.execute("COMMIT")
+        except sqlite3.OperationalError as exc:
+            self._connection.close()
+            if "locked" not in str(exc):
+                raise
+            raise JournalLocked(f"Journal {self.path} is in use by another process") from exc
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.execute(_SCHEMA)
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(entries)")}
+        if "dead" not in columns:  # journals written before dead-lettering
+            self._connection.execute("ALTER TABLE entries ADD COLUMN dead INTEGER NOT NULL DEFAULT 0")
+
+    def append(self, session_id: str, ops: Sequence[WriteOp]) -> int:
+        payload = JSON.dumps(encode_ops(ops))
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO entries (session_id, created_at, ops) VALUES (?, ?, ?)",
+                (session_id, time.time(), payload),
+            )
+            return int(cursor.lastrowid)
+
+    def pending(self, limit: int | None = None) -> list[JournalEntry]:
+        return self.entries(dead=False, limit=limit)
+
+    def entries(self, *, dead: bool | None = None, limit: int | None = None) -> list[JournalEntry]:
+        """Entries in journal order; ``dead`` selects live or dead-lettered ones (default: both)."""
+
+        query = f"SELECT {_COLUMNS} FROM entries"
+        params: list[object] = []
+        if dead is not None:
+            query += " WHERE dead = ?"
+            params.append(int(dead))
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [_entry(row) for row in rows]
+
+    def __len__(self) -> int:
+        """The number of live (not dead-lettered) entries."""
+
+        with self._lock:
+            return int(self._connection.execute("SELECT COUNT(*) FROM entries WHERE dead = 0").fetchone()[0])
+
+    def dead_count(self) -> int:
+        with self._lock:
+            return int(self._connection.execute("SELECT COUNT(*) FROM entries WHERE dead = 1").fetchone()[0])
+
+    def has_pending(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM entries WHERE session_id = ? AND dead = 0 LIMIT 1", (session_id,)
+            ).fetchone()
+        return row is not None
+
+    def mark_applied(self, entry_id: int) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+
+    def mark_failed(self, entry_id: int, error: str, *, permanent: bool = False) -> bool:
+        """Record a failed attempt; returns ``True`` if the entry is now dead."""
+
+        with self._lock:
+            self._connection.execute(
+                "UPDATE entries SET attempts = attempts + 1, last_error = ?, "
+                "dead = (? OR attempts + 1 >= ?) WHERE id = ?",
+                (error, int(permanent), self.max_attempts, entry_id),
+            )
+            row = self._connection.execute("SELECT dead FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        return bool(row and row[0])
+
+    def requeue_dead(self, entry_ids: Iterable[int] | None = None) -> int:
+        """Revive dead entries (all, or the given IDs) with a fresh attempt budget."""
+
+        return self._update_dead("UPDATE entries SET dead = 0, attempts = 0 WHERE dead = 1", entry_ids)
+
+    def drop(self, entry_ids: Iterable[int] | None = None, *, dead_only: bool = True) -> int:
+        """Delete entries (dead ones by default; all of them when ``entry_ids`` is ``None``)."""
+
+        query = "DELETE FROM entries WHERE dead = 1" if dead_only else "DELETE FROM entries WHERE 1"
+        return self._update_dead(query, entry_ids)
+
+    def _update_dead(self, query: str, entry_ids: Iterable[int] | None) -> int:
+        params: list[int] = []
+        if entry_ids is not None:
+            params = list(entry_ids)
+            if not params:
+                return 0
+            query += f" AND id IN ({','.join('?' * len(params))})"
+        with self._lock:
+            return self._connection.execute(query, params).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class JournalFlusher(threading.Thread):
+    """Background thread draining a :class:`WriteJournal` into Firestore.
+
+    Entries of one session are applied strictly in journal order; a failing
+    entry holds back the later ones of its session (they overwrite the same
+    notes) until a retry succeeds or the entry is dead-lettered, while other
+    sessions keep flushing.
+    """
+
+    def __init__(
+        self,
+        journal: WriteJournal,
+        apply: Callable[[Sequence[WriteOp]], object],
+        *,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ) -> None:
+        super().__init__(name="journal-flusher", daemon=True)
+        self.journal = journal
+        self._apply = apply
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._idle = threading.Condition()
+        self._drained = False
+        self.last_error: str | None = None
+
+    def notify(self) -> None:
+        """Signal that new entries were appended."""
+
+        with self._idle:
+            self._drained = False
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+
+    def wait_until_drained(self, timeout: float | None = None) -> bool:
+        """Block until the journal is empty; returns ``False`` on timeout."""
+
+        with self._idle:
+            return self._idle.wait_for(lambda: self._drained, timeout)
+
+    def wait_for_session(self, session_id: str, timeout: float | None = None) -> bool:
+        """Block until no entry for ``session_id`` is pending; returns ``False`` on timeout.
+
+        Call this before reading a session so that writes journaled by this
+        or an earlier (crashed) run are visible in Firestore.
+        """
+
+        with self._idle:
+            return self._idle.wait_for(lambda: not self.journal.has_pending(session_id), timeout)
+
+    def flush_once(self) -> bool:
+        """Apply pending entries in order; returns ``True`` when none is left to retry."""
+
+        blocked: set[str] = set()
+        for entry in self.journal.pending():
+            if entry.session_id in blocked:
+                continue
+            try:
+                self._apply(entry.ops)
+            except Exception as exc:  # retried with backoff, up to the journal's max_attempts
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                if not self.journal.mark_failed(entry.id, self.last_error, permanent=is_permanent_failure(exc)):
+                    blocked.add(entry.session_id)
+                    continue
+            else:
+                self.journal.mark_applied(entry.id)
+            with self._idle:
+                self._idle.notify_all()
+        return not blocked
+
+    def run(self) -> None:
+        backoff = self._initial_backoff
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            if self.flush_once():
+                backoff = self._initial_backoff
+                with self._idle:
+                    if len(self.journal) == 0:
+                        self._drained = True
+                        self._idle.notify_all()
+                self._wakeup.wait()
+            else:
+                self._wakeup.wait(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+
+
+__all__ = [
+    "DEFAULT_JOURNAL_PATH",
+    "DEFAULT_MAX_ATTEMPTS",
+    "JournalEntry",
+    "JournalFlusher",
+    "JournalLocked",
+    "WriteJournal",
+    "is_permanent_failure",
+]
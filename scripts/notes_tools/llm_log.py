@@ -0,0 +1,360 @@
+"""Bounded, structured log of LLM requests and responses.
+
+:class:`LlmLogger` keeps the newest ``max_entries`` :class:`LlmRecord` objects
+in a ring buffer. Each record holds a timestamp, aspect, model, body sizes,
+latency and usage. Request and response bodies are stored separately, keyed by
+content hash, so a body that appears in several records (a replayed response,
+for example) is held only once. Bodies are evicted least recently used first
+once they exceed ``max_body_bytes``; the records survive with their hashes and
+sizes. With ``path`` set, records and the first occurrence of each body are
+also appended to a gzip-compressed JSONL file that rotates once it exceeds
+``max_file_bytes``, keeping ``backups`` older files as ``path.1``,
+``path.2``... (read them back with :func:`read_llm_logs`, or with
+``diana.py llm-log PATH``). A file left without its gzip trailer by a crash
+is rotated away when the log is next opened, so new records never follow a
+damaged member. The logger can be shared between threads.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Mapping
+
+from .codec import JSON
+
+DEFAULT_MAX_ENTRIES = 100
+DEFAULT_MAX_BODY_BYTES = 8 * 1024 * 1024
+DEFAULT_MAX_FILE_BYTES = 16 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+# A truncated member ends in EOFError; bytes appended after it fail as BadGzipFile (an OSError) or zlib.error.
+_READ_ERRORS = (EOFError, OSError, zlib.error)
+
+
+def body_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@dataclass(frozen=True, slots=True)
+class LlmRecord:
+    timestamp: float
+    aspect: str
+    model: str
+    request_hash: str
+    response_hash: str
+    request_bytes: int
+    response_bytes: int
+    latency_ms: float | None = None
+    usage: Mapping[str, Any] | None = None
+
+    def to_map(self) -> dict[str, Any]:
+        return {
+            "timestamp": self.timestamp,
+            "aspect": self.aspect,
+            "model": self.model,
+            "request_hash": self.request_hash,
+            "response_hash": self.response_hash,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "latency_ms": self.latency_ms,
+            "usage": dict(self.usage) if self.usage is not None else None,
+        }
+
+    @classmethod
+    def from_map(cls, data: Mapping[str, Any]) -> "LlmRecord":
+        return cls(
+            float(data.get("timestamp", 0.0)),
+            str(data.get("aspect", "")),
+            str(data.get("model", "")),
+            str(data.get("request_hash", "")),
+            str(data.get("response_hash", "")),
+            int(data.get("request_bytes", 0)),
+            int(data.get("response_bytes", 0)),
+            data.get("latency_ms"),
+            data.get("usage"),
+        )
+
+    def describe(self) -> str:
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.timestamp))
+        parts = [stamp, self.aspect or "-", self.model or "-", f"{self.request_bytes}B -> {self.response_bytes}B"]
+        if self.latency_ms is not None:
+            parts.append(f"{self.latency_ms:.0f} ms")
+        if self.usage:
+            parts.append(" ".join(f"{key}={value}" for key, value in self.usage.items()))
+        return " | ".join(parts)
+
+
+class _RotatingGzipJsonl:
+    def __init__(self, path: Path, max_bytes: int, backups: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = max(0, backups)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._raw: BinaryIO | None = None
+        self._gzip: gzip.GzipFile | None = None
+        self._checked = False
+        self.written_bodies: set[str] = set()
+
+    def write(self, lines: list[dict[str, Any]]) -> None:
+        if not self._checked:
+            self._checked = True
+            if not _is_complete_gzip(self.path):
+                self.rotate()  # left behind by a crash: keep what is readable, start a fresh file
+        if self._gzip is None:
+            self._raw = open(self.path, "ab")
+            self._gzip = gzip.GzipFile(fileobj=self._raw, mode="ab")
+        self._gzip.write("".join(JSON.dumps(line) + "\n" for line in lines).encode("utf-8"))
+        self._gzip.flush()  # sync flush: everything written so far can be decompressed
+        if self._raw is not None and self._raw.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self) -> None:
+        self.close()
+        if self.backups == 0:
+            self.path.unlink(missing_ok=True)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.path.exists():
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+    def close(self) -> None:
+        if self._gzip is not None:
+            self._gzip.close()
+            self._gzip = None
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+        # A new file must be readable on its own, so bodies are written again.
+        self.written_bodies.clear()
+
+
+def _is_complete_gzip(path: Path) -> bool:
+    """Whether ``path`` is missing or decompresses to the end; a crash leaves the last member without a trailer."""
+
+    try:
+        with gzip.open(path, "rb") as handle:
+            while handle.read(1 << 20):
+                pass
+    except FileNotFoundError:
+        return True
+    except _READ_ERRORS:
+        return False
+    return True
+
+
+class LlmLogger:
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        *,
+        max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+        path: str | Path | None = None,
+        max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+        backups: int = DEFAULT_BACKUPS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._records: deque[LlmRecord] = deque(maxlen=max(1, max_entries))
+        self._bodies: OrderedDict[str, str] = OrderedDict()
+        self._body_sizes: dict[str, int] = {}
+        self._body_bytes = 0
+        self._file = (
+            _RotatingGzipJsonl(Path(path).expanduser(), max_file_bytes, backups) if path is not None else None
+        )
+
+    def log(
+        self,
+        request: str,
+        response: str,
+        *,
+        aspect: str = "",
+        model: str = "",
+        latency: float | None = None,
+        usage: Mapping[str, Any] | None = None,
+    ) -> LlmRecord:
+        """Record one exchange; ``latency`` is in seconds."""
+
+        request_data = request.encode("utf-8")
+        response_data = response.encode("utf-8")
+        record = LlmRecord(
+            timestamp=self._clock(),
+            aspect=aspect,
+            model=model,
+            request_hash=body_hash(request_data),
+            response_hash=body_hash(response_data),
+            request_bytes=len(request_data),
+            response_bytes=len(response_data),
+            latency_ms=round(latency * 1000, 1) if latency is not None else None,
+            usage=dict(usage) if usage is not None else None,
+        )
+        with self._lock:
+            self._records.append(record)
+            self._keep_body(record.request_hash, request, record.request_bytes)
+            self._keep_body(record.response_hash, response, record.response_bytes)
+            if self._file is not None:
+                self._persist(record, request, response)
+        return record
+
+    def _keep_body(self, digest: str, text: str, size: int) -> None:
+        if digest in self._bodies:
+            self._bodies.move_to_end(digest)
+            return
+        if size > self.max_body_bytes:
+            return
+        self._bodies[digest] = text
+        self._body_sizes[digest] = size
+        self._body_bytes += size
+        while self._body_bytes > self.max_body_bytes:
+            evicted, _ = self._bodies.popitem(last=False)
+            self._body_bytes -= self._body_sizes.pop(evicted)
+
+    def _persist(self, record: LlmRecord, request: str, response: str) -> None:
+        assert self._file is not None
+        lines: list[dict[str, Any]] = []
+        for digest, text in ((record.request_hash, request), (record.response_hash, response)):
+            if digest not in self._file.written_bodies:
+                self._file.written_bodies.add(digest)
+                lines.append({"body": digest, "text": text})
+        lines.append({"record": record.to_map()})
+        self._file.write(lines)
+
+    def records(self) -> list[LlmRecord]:
+        with self._lock:
+            return list(self._records)
+
+    def body(self, digest: str) -> str | None:
+        with self._lock:
+            return self._bodies.get(digest)
+
+    def entries(self) -> list[str]:
+        """The records with their bodies, for display; evicted bodies are summarised."""
+
+        with self._lock:
+            records = list(self._records)
+            bodies = dict(self._bodies)
+
+        def text(digest: str, size: int) -> str:
+            body = bodies.get(digest)
+            return body if body is not None else f"<{size} bytes, {digest}, no longer kept>"
+
+        return [
+            f"{record.describe()}\n"
+            f"REQUEST: {text(record.request_hash, record.request_bytes)}\n"
+            f"RESPONSE: {text(record.response_hash, record.response_bytes)}"
+            for record in records
+        ]
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+
+
+def _gzip_lines(path: Path) -> Iterator[bytes]:
+    """Complete lines of every gzip member in ``path``, up to the first truncated or damaged one.
+
+    Decompressed incrementally, unlike :mod:`gzip`, whose line iterator loses
+    the lines of a buffered chunk when the member it belongs to is cut short.
+    """
+
+    pending = b""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    with open(path, "rb") as raw:
+        while chunk := raw.read(1 << 16):
+            while chunk:
+                backup = decompressor.copy()
+                try:
+                    pending += decompressor.decompress(chunk)
+                except zlib.error:
+                    # Damaged, e.g. another member appended after a crash: keep what precedes the damage.
+                    yield from (pending + _salvage(backup, chunk)).split(b"\n")[:-1]
+                    return
+                *lines, pending = pending.split(b"\n")
+                yield from lines
+                if not decompressor.eof:
+                    break
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+
+def _salvage(decompressor: Any, data: bytes) -> bytes:
+    output = []
+    for index in range(len(data)):
+        try:
+            output.append(decompressor.decompress(data[index : index + 1]))
+        except zlib.error:
+            break
+    return b"".join(output)
+
+
+def read_llm_log(path: str | Path) -> Iterator[tuple[LlmRecord, str | None, str | None]]:
+    """Yield ``(record, request, response)`` from one log file, oldest first.
+
+    A file cut short by a crash is read up to the last complete line.
+    """
+
+    bodies: dict[str, str] = {}
+    for line in _gzip_lines(Path(path).expanduser()):
+        entry = JSON.loads(line)
+        if "body" in entry:
+            bodies[entry["body"]] = entry["text"]
+        elif "record" in entry:
+            record = LlmRecord.from_map(entry["record"])
+            yield record, bodies.get(record.request_hash), bodies.get(record.response_hash)
+
+
+def log_files(path: str | Path) -> list[Path]:
+    """``path`` and its rotated backups that exist, oldest (highest number) first."""
+
+    path = Path(path).expanduser()
+    pattern = re.compile(re.escape(path.name) + r"\.(\d+)")
+    backups: list[tuple[int, Path]] = []
+    if path.parent.is_dir():
+        for candidate in path.parent.iterdir():
+            match = pattern.fullmatch(candidate.name)
+            if match is not None and candidate.is_file():
+                backups.append((int(match.group(1)), candidate))
+    files = [candidate for _, candidate in sorted(backups, reverse=True)]
+    if path.is_file():
+        files.append(path)
+    return files
+
+
+def read_llm_logs(paths: str | Path | Iterable[str | Path]) -> Iterator[tuple[LlmRecord, str | None, str | None]]:
+    """Like :func:`read_llm_log` across files; a single path also reads its rotated backups, oldest first."""
+
+    files = log_files(paths) if isinstance(paths, (str, Path)) else [Path(path).expanduser() for path in paths]
+    for path in files:
+        yield from read_llm_log(path)
+
+
+__all__ = [
+    "DEFAULT_BACKUPS",
+    "DEFAULT_MAX_BODY_BYTES",
+    "DEFAULT_MAX_ENTRIES",
+    "DEFAULT_MAX_FILE_BYTES",
+    "LlmLogger",
+    "LlmRecord",
+    "body_hash",
+    "log_files",
+    "read_llm_log",
+    "read_llm_logs",
+]
@@ -2,134 +2,161 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
+import os
 from dataclasses import dataclass, field
 from datetime import date
-from pathlib import Path, PurePosixPath
+from pathlib import Path
 from typing import Any, Iterable, Mapping, Sequence
 
+from .llm_log import LlmLogger
 from .notes import (
     Appointment,
+    CompiledTagCatalog,
     MemoSummary,
     NotesTagCatalog,
-    NotesTagDefinition,
-    TagMappingContext,
+    TagDescriptor,
     Thought,
     ThoughtDocument,
     ThoughtOutline,
     ThoughtOutlineSection,
     TodoItem,
+    compile_tag_catalog,
 )
+from .prompt_template import PromptTemplate
+from .request_schema import CompiledSchema, compile_schema, encode_payload
+from .resource_cache import RESOURCE_ROOT, RESOURCES
 
-RESOURCE_ROOT = Path(__file__).resolve().parents[2] / "app" / "src" / "main" / "resources" / "llm"
+PROMPT_LANGUAGES = ("en", "it", "fr")
+PROMPT_NAMES = ("todo", "appointments", "thoughts", "system", "user")
+SCHEMA_NAMES = ("base", "todo", "appointment", "thought")
+TEMPLATE_PLACEHOLDERS = frozenset({"aspect", "prior", "memo", "today", "date", "tag_catalog"})
+_PROMPT_PATHS = {
+    language: tuple(f"llm/prompts/{language}/{name}.txt" for name in PROMPT_NAMES) for language in PROMPT_LANGUAGES
+}
 
 
 def load_resource(path: str, root: Path | None = None) -> str:
-    """Load a text asset from the LLM resources directory."""
-
-    trimmed = path.strip()
-    if not trimmed:
-        raise ValueError("Empty resource path")
-    normalized = trimmed.lstrip("/")
-    if normalized.startswith("llm/"):
-        normalized = normalized[4:]
-    candidate = PurePosixPath(normalized)
-    if any(part == ".." for part in candidate.parts):
-        raise ValueError(f"Invalid resource path: {path}")
+    """Load a text asset from the LLM resources directory (through the shared cache)."""
+
+    return RESOURCES.load(path, root)
+
+
+def _json_resource(path: str, root: Path | None) -> Any:
+    """Parsed JSON shared by every caller; treat it as read-only."""
+
+    return RESOURCES.derive("json", (path,), json.loads, root)
+
+
+def clear_resource_caches() -> None:
+    """Forget cached prompts and schemas so edited resources are read again."""
+
+    RESOURCES.clear()
+
+
+def preload_resources(root: Path | None = None, languages: Iterable[str] = PROMPT_LANGUAGES) -> None:
+    """Read and parse the prompts of ``languages``, every schema and the model list.
+
+    Meant to run at start-up (on a helper thread, for single runs) so the
+    first :class:`MemoProcessor` does not touch the filesystem.
+    """
+
+    for language in languages:
+        Prompts.for_locale(language, root)
+    for name in SCHEMA_NAMES:
+        _json_resource(f"llm/schema/{name}.json", root)
+    available_model_ids(root)
+
+
+def resource_fingerprint(root: Path | None = None) -> tuple[tuple[str, int, int], ...]:
+    """Return ``(path, size, mtime_ns)`` for every resource file, to detect edits."""
+
     base = root or RESOURCE_ROOT
-    target = base.joinpath(*candidate.parts)
-    return target.read_text(encoding="utf-8")
+    entries: list[tuple[str, int, int]] = []
+    pending = [base]
+    while pending:
+        directory = pending.pop()
+        try:
+            scanner = os.scandir(directory)
+        except OSError:
+            continue
+        with scanner:
+            for entry in scanner:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(Path(entry.path))
+                    continue
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(entries))
 
 
-@dataclass(slots=True)
+@dataclass(frozen=True, slots=True)
 class Prompts:
     todo: str
     appointments: str
     thoughts: str
     system_template: str
     user_template: str
+    # Compiled from the two templates above; unknown placeholders fail here, when the bundle loads.
+    system: PromptTemplate = field(init=False, repr=False, compare=False)
+    user: PromptTemplate = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(
+            self, "system", PromptTemplate.compile(self.system_template, TEMPLATE_PLACEHOLDERS, name="system prompt")
+        )
+        object.__setattr__(
+            self, "user", PromptTemplate.compile(self.user_template, TEMPLATE_PLACEHOLDERS, name="user prompt")
+        )
 
     @classmethod
     def for_locale(cls, locale: str, root: Path | None = None) -> "Prompts":
+        """Return the prompt bundle for ``locale``; bundles are cached and shared between processors."""
+
         language = locale.split("-")[0].lower()
-        if language not in {"en", "it", "fr"}:
+        if language not in PROMPT_LANGUAGES:
             language = "en"
+        return RESOURCES.derive("prompts", _PROMPT_PATHS[language], cls._from_texts, root)
 
-        def _load(name: str) -> str:
-            return load_resource(f"llm/prompts/{language}/{name}.txt", root).strip()
-
+    @classmethod
+    def _from_texts(cls, todo: str, appointments: str, thoughts: str, system: str, user: str) -> "Prompts":
         return cls(
-            todo=_load("todo"),
-            appointments=_load("appointments"),
-            thoughts=_load("thoughts"),
-            system_template=_load("system"),
-            user_template=_load("user"),
+            todo=todo.strip(),
+            appointments=appointments.strip(),
+            thoughts=thoughts.strip(),
+            system_template=system.strip(),
+            user_template=user.strip(),
         )
 
 
-@dataclass(slots=True)
-class LlmLogger:
-    max_entries: int = 100
-    _entries: list[str] = field(default_factory=list)
-
-    def log(self, request: str, response: str) -> None:
-        entry = f"REQUEST: {request}\nRESPONSE: {response}"
-        self._entries.append(entry)
-        if len(self._entries) > self.max_entries:
-            del self._entries[0]
-
-    def entries(self) -> list[str]:
-        return list(self._entries)
-
-
-@dataclass(slots=True)
-class TagDescriptor:
-    id: str
-    label: str
-
-
 @dataclass(slots=True)
 class TagCatalogSnapshot:
     descriptors: list[TagDescriptor]
     approved_ids: set[str]
     prompt_text: str
     primary_tag_id: str | None
+    # Identifies the tag enumeration injected into schemas, so compiled schemas can be shared.
+    fingerprint: str = field(init=False, default="")
+
+    def __post_init__(self) -> None:
+        ids = "\x1f".join(descriptor.id for descriptor in self.descriptors)
+        self.fingerprint = hashlib.blake2b(ids.encode("utf-8"), digest_size=8).hexdigest()
 
     @classmethod
     def from_catalog(cls, catalog: NotesTagCatalog | None, locale: str) -> "TagCatalogSnapshot":
-        if catalog is None or not catalog.tags:
-            return cls([], set(), "- (no tags available)", None)
-        descriptors: list[TagDescriptor] = []
-        approved: list[str] = []
-        for definition in catalog.tags:
-            tag_id = definition.id.strip()
-            if not tag_id:
-                continue
-            label = definition.label_for_locale(locale) or (
-                definition.labels[0].value if definition.labels else tag_id
-            )
-            descriptors.append(TagDescriptor(tag_id, label))
-            approved.append(tag_id)
-        unique: dict[str, TagDescriptor] = {}
-        for descriptor in descriptors:
-            unique.setdefault(descriptor.id, descriptor)
-        descriptors = sorted(
-            unique.values(),
-            key=lambda item: (item.label.lower(), item.id.lower()),
-        )
-        prompt = "\n".join(f"- {descriptor.id}: {descriptor.label}" for descriptor in descriptors)
-        return cls(descriptors, set(approved), prompt, descriptors[0].id if descriptors else None)
+        return cls.from_compiled(compile_tag_catalog(catalog, locale))
 
+    @classmethod
+    def from_compiled(cls, compiled: CompiledTagCatalog) -> "TagCatalogSnapshot":
+        return cls(list(compiled.descriptors), set(compiled.ids), compiled.prompt_text, compiled.primary_tag_id)
 
-def available_model_ids(root: Path | None = None) -> list[str]:
-    try:
-        raw = load_resource("llm/models.json", root)
-    except FileNotFoundError:
-        return []
+
+def _parse_model_ids(raw: str) -> tuple[str, ...]:
     try:
         parsed = json.loads(raw)
     except json.JSONDecodeError:
-        return []
+        return ()
     ids: list[str] = []
     seen: set[str] = set()
     for entry in parsed:
@@ -139,7 +166,18 @@ def available_model_ids(root: Path | None = None) -> list[str]:
         if identifier and identifier not in seen:
             ids.append(identifier)
             seen.add(identifier)
-    return ids
+    return tuple(ids)
+
+
+def _model_ids(root: Path | None) -> tuple[str, ...]:
+    try:
+        return RESOURCES.derive("model_ids", ("llm/models.json",), _parse_model_ids, root)
+    except FileNotFoundError:
+        return ()
+
+
+def available_model_ids(root: Path | None = None) -> list[str]:
+    return list(_model_ids(root))
 
 
 class MemoProcessor:
@@ -155,17 +193,18 @@ class MemoProcessor:
         logger: LlmLogger | None = None,
         root: Path | None = None,
         tag_catalog: NotesTagCatalog | None = None,
+        tag_catalog_snapshot: TagCatalogSnapshot | None = None,
     ) -> None:
         self.api_key = api_key
         self.locale = locale
         self.root = root
         self.prompts = Prompts.for_locale(locale, root)
-        self.logger = logger or LlmLogger()
-        self.base_schema = json.loads(load_resource("llm/schema/base.json", root))
-        self.todo_schema = json.loads(load_resource("llm/schema/todo.json", root))
-        self.appointment_schema = json.loads(load_resource("llm/schema/appointment.json", root))
-        self.thought_schema = json.loads(load_resource("llm/schema/thought.json", root))
-        self.tag_catalog_snapshot = TagCatalogSnapshot.from_catalog(tag_catalog, locale)
+        self.logger = logger if logger is not None else LlmLogger()
+        self.base_schema = _json_resource("llm/schema/base.json", root)
+        self.todo_schema = _json_resource("llm/schema/todo.json", root)
+        self.appointment_schema = _json_resource("llm/schema/appointment.json", root)
+        self.thought_schema = _json_resource("llm/schema/thought.json", root)
+        self.tag_catalog_snapshot = tag_catalog_snapshot or TagCatalogSnapshot.from_catalog(tag_catalog, locale)
         self.todo: str = ""
         self.todo_items: list[TodoItem] = []
         self.appointments: str = ""
@@ -185,7 +224,7 @@ class MemoProcessor:
         self._model = self._normalize_model(value)
 
     def _normalize_model(self, candidate: str) -> str:
-        available = available_model_ids(self.root)
+        available = _model_ids(self.root)
         if not available:
             return candidate or self.DEFAULT_MODEL
         if candidate in available:
@@ -211,6 +250,17 @@ class MemoProcessor:
         self.thought_items = self._sanitize_thought_items(summary.thought_items)
         self.thought_document = summary.thought_document
 
+    def aspect_name(self, aspect: str) -> str:
+        """The locale-independent name (``todo``, ``appointments``, ``thoughts``) of ``aspect``."""
+
+        if aspect == self.prompts.todo:
+            return "todo"
+        if aspect == self.prompts.appointments:
+            return "appointments"
+        if aspect == self.prompts.thoughts:
+            return "thoughts"
+        return aspect
+
     def prepare_requests(
         self,
         memo_text: str,
@@ -226,24 +276,33 @@ class MemoProcessor:
             prior = self._todo_prior_json()
             payload = self._build_request(self.prompts.todo, prior, memo_text)
             requests[self.prompts.todo] = payload
-            self._pending_requests[self.prompts.todo] = json.dumps(payload, ensure_ascii=False)
+            self._pending_requests[self.prompts.todo] = encode_payload(payload, ensure_ascii=False)
         if process_appointments:
             prior = self._appointment_prior_json()
             payload = self._build_request(self.prompts.appointments, prior, memo_text)
             requests[self.prompts.appointments] = payload
-            self._pending_requests[self.prompts.appointments] = json.dumps(payload, ensure_ascii=False)
+            self._pending_requests[self.prompts.appointments] = encode_payload(payload, ensure_ascii=False)
         if process_thoughts:
             prior = self._thought_prior_json()
             payload = self._build_request(self.prompts.thoughts, prior, memo_text)
             requests[self.prompts.thoughts] = payload
-            self._pending_requests[self.prompts.thoughts] = json.dumps(payload, ensure_ascii=False)
+            self._pending_requests[self.prompts.thoughts] = encode_payload(payload, ensure_ascii=False)
         return requests
 
-    def ingest_response(self, aspect: str, response_body: str) -> str:
+    def ingest_response(
+        self,
+        aspect: str,
+        response_body: str,
+        *,
+        latency: float | None = None,
+        usage: Mapping[str, Any] | None = None,
+    ) -> str:
+        """Apply the response for ``aspect``; ``latency`` (seconds) and ``usage`` go to the log."""
+
         if aspect not in self._pending_requests:
             raise KeyError(f"No pending request for aspect '{aspect}'")
         request = self._pending_requests.pop(aspect)
-        self.logger.log(request, response_body)
+        self.logger.log(request, response_body, aspect=aspect, model=self.model, latency=latency, usage=usage)
         return self._apply_response(aspect, response_body)
 
     def summary(self) -> MemoSummary:
@@ -343,26 +402,18 @@ class MemoProcessor:
         }
 
     def _build_request(self, aspect: str, prior_json: str, memo_text: str) -> dict[str, Any]:
-        if aspect == self.prompts.todo:
-            schema = json.loads(json.dumps(self.todo_schema))
-        elif aspect == self.prompts.appointments:
-            schema = json.loads(json.dumps(self.appointment_schema))
-        elif aspect == self.prompts.thoughts:
-            schema = json.loads(json.dumps(self.thought_schema))
-        else:
-            schema = json.loads(json.dumps(self.base_schema))
-        self._apply_tag_enumeration(aspect, schema)
-        system = self.prompts.system_template.replace("{aspect}", aspect)
+        schema = self._compiled_schema(aspect)
         today = date.today().isoformat()
-        user = (
-            self.prompts.user_template
-            .replace("{aspect}", aspect)
-            .replace("{prior}", prior_json)
-            .replace("{memo}", memo_text)
-            .replace("{today}", today)
-            .replace("{date}", today)
-            .replace("{tag_catalog}", self.tag_catalog_snapshot.prompt_text)
-        )
+        values = {
+            "aspect": aspect,
+            "prior": prior_json,
+            "memo": memo_text,
+            "today": today,
+            "date": today,
+            "tag_catalog": self.tag_catalog_snapshot.prompt_text,
+        }
+        system = self.prompts.system.render(values)
+        user = self.prompts.user.render(values)
         payload = {
             "model": self.model,
             "messages": [
@@ -461,27 +512,29 @@ class MemoProcessor:
         slug = "".join(ch for ch in title.lower() if ch.isalnum() or ch.isspace()).strip().replace(" ", "-")
         return slug or f"section-{abs(hash(title)) & 0xFFFF:x}"
 
-    def _apply_tag_enumeration(self, aspect: str, schema_object: dict[str, Any]) -> None:
-        if aspect not in {self.prompts.todo, self.prompts.thoughts}:
-            return
-        target = schema_object.get("schema")
-        if not isinstance(target, dict):
-            target = schema_object
-        cursor: dict[str, Any] | None = target
-        path = ["properties", "items", "items", "properties", "tags", "items"]
-        for segment in path[:-1]:
-            next_obj = cursor.get(segment) if isinstance(cursor, dict) else None
-            if not isinstance(next_obj, dict):
-                return
-            cursor = next_obj
-        final = cursor.get(path[-1]) if isinstance(cursor, dict) else None
-        if not isinstance(final, dict):
-            return
-        final.pop("pattern", None)
-        if self.tag_catalog_snapshot.descriptors:
-            final["enum"] = [descriptor.id for descriptor in self.tag_catalog_snapshot.descriptors]
+    def _compiled_schema(self, aspect: str) -> CompiledSchema:
+        """The aspect's schema with the tag enumeration applied, shared by every processor."""
+
+        if aspect == self.prompts.todo:
+            name, tagged = "todo", True
+        elif aspect == self.prompts.appointments:
+            name, tagged = "appointment", False
+        elif aspect == self.prompts.thoughts:
+            name, tagged = "thought", True
         else:
-            final.pop("enum", None)
+            name, tagged = "base", False
+        if not tagged:
+            return RESOURCES.derive(
+                "schema", (f"llm/schema/{name}.json",), lambda raw: compile_schema(json.loads(raw)), self.root
+            )
+        snapshot = self.tag_catalog_snapshot
+        tag_ids = [descriptor.id for descriptor in snapshot.descriptors]
+        return RESOURCES.derive(
+            f"schema:{snapshot.fingerprint}",
+            (f"llm/schema/{name}.json",),
+            lambda raw: compile_schema(json.loads(raw), tag_ids),
+            self.root,
+        )
 
 
 __all__ = [
@@ -489,5 +542,8 @@ __all__ = [
     "MemoProcessor",
     "Prompts",
     "available_model_ids",
+    "clear_resource_caches",
     "load_resource",
+    "preload_resources",
+    "resource_fingerprint",
 ]
@@ -0,0 +1,475 @@
+"""In-memory stand-in for the subset of the Firestore client used by the scripts.
+
+The classes mirror the shape of ``google.cloud.firestore`` references and
+snapshots closely enough for the note helpers to run offline, which keeps unit
+tests and local experiments free of network access and credentials.
+"""
+
+from __future__ import annotations
+
+import copy
+import enum
+import itertools
+import operator
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Mapping
+
+from .session_writes import WriteConflict, increment_amount, new_document_id
+
+
+_OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+}
+
+
+@dataclass(slots=True)
+class MemoryWriteOption:
+    last_update_time: int | None = None
+    exists: bool | None = None
+
+
+@dataclass(slots=True)
+class MemoryWriteResult:
+    update_time: int | None = None
+
+
+@dataclass(slots=True)
+class MemorySnapshot:
+    reference: "MemoryDocumentReference"
+    _data: dict[str, Any] | None
+    update_time: int | None = None
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> dict[str, Any] | None:
+        if self._data is None:
+            return None
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryFirestore", path: tuple[str, ...]) -> None:
+        self._client = client
+        self._path = path
+
+    @property
+    def id(self) -> str:
+        return self._path[-1]
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._path)
+
+    @property
+    def parent(self) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, self._path[:-1])
+
+    def collection(self, name: str) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, self._path + (name,))
+
+    def get(self, **_: Any) -> MemorySnapshot:
+        return self._client._snapshot(self._path)
+
+    def set(self, data: Mapping[str, Any], merge: bool = False) -> None:
+        self._client._set(self._path, data, merge=merge)
+
+    def create(self, data: Mapping[str, Any]) -> None:
+        with self._client._lock:
+            self._client._check(self._path, MemoryWriteOption(exists=False))
+            self._client._set(self._path, data, merge=False)
+
+    def update(self, data: Mapping[str, Any], option: MemoryWriteOption | None = None) -> "MemoryWriteResult":
+        with self._client._lock:
+            self._client._check(self._path, option)
+            self._client._update(self._path, data)
+            return MemoryWriteResult(self._client._documents[self._path][1])
+
+    def delete(self, option: MemoryWriteOption | None = None) -> None:
+        with self._client._lock:
+            self._client._check(self._path, option)
+            self._client._delete(self._path)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, MemoryDocumentReference) and other._path == self._path
+
+    def __hash__(self) -> int:
+        return hash(self._path)
+
+
+class MemoryCollectionReference:
+    def __init__(
+        self,
+        client: "MemoryFirestore",
+        path: tuple[str, ...],
+        *,
+        order_field: str | None = None,
+        descending: bool = False,
+        limit: int | None = None,
+        offset: int = 0,
+        filters: tuple[tuple[str, str, Any], ...] = (),
+        group: bool = False,
+    ) -> None:
+        self._client = client
+        self._path = path
+        self._order_field = order_field
+        self._descending = descending
+        self._limit = limit
+        self._offset = offset
+        self._filters = filters
+        self._group = group
+
+    @property
+    def id(self) -> str:
+        return self._path[-1]
+
+    @property
+    def parent(self) -> MemoryDocumentReference | None:
+        if len(self._path) < 2:
+            return None
+        return MemoryDocumentReference(self._client, self._path[:-1])
+
+    def document(self, document_id: str | None = None) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._path + (document_id or new_document_id(),))
+
+    def add(self, data: Mapping[str, Any]) -> tuple[int, MemoryDocumentReference]:
+        reference = self.document()
+        reference.set(data)
+        return self._client._documents[reference._path][1], reference
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "MemoryCollectionReference":
+        return self._derive(order_field=field, descending=direction == "DESCENDING")
+
+    def limit(self, count: int) -> "MemoryCollectionReference":
+        return self._derive(limit=count)
+
+    def offset(self, count: int) -> "MemoryCollectionReference":
+        return self._derive(offset=count)
+
+    def where(self, field: str, op: str, value: Any) -> "MemoryCollectionReference":
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        return self._derive(filters=self._filters + ((field, op, value),))
+
+    def on_snapshot(self, callback: Callable[[list[MemorySnapshot], list[Any], int], None]) -> "MemoryWatch":
+        """Call ``callback(snapshots, changes, read_time)`` now and after every change to the results."""
+
+        return MemoryWatch(self._client, self, callback)
+
+    def _derive(self, **overrides: Any) -> "MemoryCollectionReference":
+        options = {
+            "order_field": self._order_field,
+            "descending": self._descending,
+            "limit": self._limit,
+            "offset": self._offset,
+            "filters": self._filters,
+            "group": self._group,
+        }
+        options.update(overrides)
+        return MemoryCollectionReference(self._client, self._path, **options)
+
+    def _accepts(self, snapshot: MemorySnapshot) -> bool:
+        for field, op, value in self._filters:
+            current = snapshot.get(field)
+            if current is None and op != "==":
+                return False
+            try:
+                if not _OPERATORS[op](current, value):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def stream(self, **_: Any) -> Iterator[MemorySnapshot]:
+        if self._group:
+            snapshots = self._client._group_members(self.id)
+        else:
+            snapshots = self._client._children(self._path)
+        snapshots = [snap for snap in snapshots if self._accepts(snap)]
+        if self._order_field is not None:
+            field = self._order_field
+            present = [snap for snap in snapshots if snap.get(field) is not None]
+            snapshots = sorted(present, key=lambda snap: snap.get(field), reverse=self._descending)
+        snapshots = snapshots[self._offset :]
+        if self._limit is not None:
+            snapshots = snapshots[: self._limit]
+        return iter(snapshots)
+
+
+class MemoryChangeType(enum.Enum):
+    ADDED = 1
+    MODIFIED = 2
+    REMOVED = 3
+
+
+@dataclass(slots=True)
+class MemoryDocumentChange:
+    type: MemoryChangeType
+    document: MemorySnapshot
+
+
+class MemoryWatch:
+    """Listener created by ``on_snapshot``; callbacks run on a dedicated thread like the real client."""
+
+    def __init__(
+        self,
+        client: "MemoryFirestore",
+        query: MemoryCollectionReference,
+        callback: Callable[[list[MemorySnapshot], list[MemoryDocumentChange], int], None],
+    ) -> None:
+        self._client = client
+        self._query = query
+        self._callback = callback
+        self._seen: dict[tuple[str, ...], int | None] = {}
+        self._delivered = False
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._wake.set()
+        self._thread = threading.Thread(target=self._run, name="memory-watch", daemon=True)
+        client._watches.add(self)
+        self._thread.start()
+
+    def unsubscribe(self) -> None:
+        self._client._watches.discard(self)
+        self._stopped.set()
+        self._wake.set()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=1.0)
+
+    def _notify(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            if self._stopped.is_set():
+                return
+            self._wake.clear()
+            with self._client._lock:
+                snapshots = list(self._query.stream())
+                read_time = next(self._client._clock)
+            current = {snap.reference._path: snap for snap in snapshots}
+            changes = [
+                MemoryDocumentChange(MemoryChangeType.REMOVED, self._client._snapshot(path))
+                for path in self._seen
+                if path not in current
+            ]
+            for path, snap in current.items():
+                if path not in self._seen:
+                    changes.append(MemoryDocumentChange(MemoryChangeType.ADDED, snap))
+                elif self._seen[path] != snap.update_time:
+                    changes.append(MemoryDocumentChange(MemoryChangeType.MODIFIED, snap))
+            self._seen = {path: snap.update_time for path, snap in current.items()}
+            if changes or not self._delivered:
+                self._delivered = True
+                self._callback(snapshots, changes, read_time)
+
+
+class MemoryWriteBatch:
+    """Collects writes and applies them atomically on :meth:`commit`."""
+
+    def __init__(self, client: "MemoryFirestore") -> None:
+        self._client = client
+        self._writes: list[
+            tuple[str, tuple[str, ...], Mapping[str, Any] | None, bool, MemoryWriteOption | None]
+        ] = []
+
+    def set(self, reference: MemoryDocumentReference, data: Mapping[str, Any], merge: bool = False) -> None:
+        self._writes.append(("set", reference._path, data, merge, None))
+
+    def update(
+        self,
+        reference: MemoryDocumentReference,
+        data: Mapping[str, Any],
+        option: MemoryWriteOption | None = None,
+    ) -> None:
+        self._writes.append(("update", reference._path, data, True, option))
+
+    def delete(self, reference: MemoryDocumentReference) -> None:
+        self._writes.append(("delete", reference._path, None, False, None))
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def commit(self) -> list[MemoryWriteResult]:
+        results: list[MemoryWriteResult] = []
+        with self._client._lock:
+            for kind, path, _, _, option in self._writes:
+                if kind == "update" and path not in self._client._documents:
+                    raise KeyError(f"No document to update: {'/'.join(path)}")
+                self._client._check(path, option)
+            for kind, path, data, merge, _ in self._writes:
+                if kind == "delete":
+                    self._client._delete(path)
+                    results.append(MemoryWriteResult())
+                else:
+                    self._client._set(path, data or {}, merge=merge)
+                    results.append(MemoryWriteResult(self._client._documents[path][1]))
+        self._writes = []
+        return results
+
+
+class _SharedClock:
+    """Update-time counter kept in a manager ``Value``; only advanced under the store lock."""
+
+    def __init__(self, value: Any) -> None:
+        self._value = value
+
+    def __iter__(self) -> "_SharedClock":
+        return self
+
+    def __next__(self) -> int:
+        self._value.value += 1
+        return self._value.value
+
+
+class MemoryFirestore:
+    """Thread-safe dictionary-backed replacement for ``firestore.Client``.
+
+    ``documents``, ``lock`` and ``clock`` default to process-local objects;
+    :func:`shared_memory_firestore` swaps in ``multiprocessing`` manager
+    proxies so several processes can share one store. Listeners registered
+    with ``on_snapshot`` only see writes made by their own process.
+    """
+
+    def __init__(
+        self,
+        *,
+        documents: Any | None = None,
+        lock: Any | None = None,
+        clock: Iterator[int] | None = None,
+    ) -> None:
+        self._documents: dict[tuple[str, ...], tuple[dict[str, Any], int]] = (
+            documents if documents is not None else {}
+        )
+        self._lock = lock if lock is not None else threading.RLock()
+        self._clock = clock if clock is not None else itertools.count(time.time_ns())
+        self._watches: set[MemoryWatch] = set()
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"documents": self._documents, "lock": self._lock, "clock": self._clock}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def collection(self, name: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, (name,))
+
+    def collection_group(self, name: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, (name,), group=True)
+
+    def document(self, path: str) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self, tuple(part for part in path.split("/") if part))
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def write_option(self, **kwargs: Any) -> MemoryWriteOption:
+        return MemoryWriteOption(**kwargs)
+
+    def get_all(self, references: Iterable[MemoryDocumentReference], **_: Any) -> Iterator[MemorySnapshot]:
+        for reference in references:
+            yield self._snapshot(reference._path)
+
+    def _check(self, path: tuple[str, ...], option: MemoryWriteOption | None) -> None:
+        if option is None:
+            return
+        entry = self._documents.get(path)
+        if option.exists is not None and option.exists != (entry is not None):
+            raise WriteConflict(f"Existence precondition failed for {'/'.join(path)}")
+        if option.last_update_time is not None and (entry is None or entry[1] != option.last_update_time):
+            raise WriteConflict(f"Document {'/'.join(path)} changed since it was read")
+
+    def _snapshot(self, path: tuple[str, ...]) -> MemorySnapshot:
+        with self._lock:
+            entry = self._documents.get(path)
+        reference = MemoryDocumentReference(self, path)
+        if entry is None:
+            return MemorySnapshot(reference, None)
+        return MemorySnapshot(reference, copy.deepcopy(entry[0]), entry[1])
+
+    def _children(self, path: tuple[str, ...]) -> list[MemorySnapshot]:
+        depth = len(path) + 1
+        with self._lock:
+            matches = [
+                key for key in self._documents.keys() if len(key) == depth and key[:-1] == path
+            ]
+        return [self._snapshot(key) for key in sorted(matches)]
+
+    def _group_members(self, name: str) -> list[MemorySnapshot]:
+        with self._lock:
+            matches = [key for key in self._documents.keys() if len(key) % 2 == 0 and key[-2] == name]
+        return [self._snapshot(key) for key in sorted(matches)]
+
+    def _notify(self) -> None:
+        for watch in list(self._watches):
+            watch._notify()
+
+    def _set(self, path: tuple[str, ...], data: Mapping[str, Any], *, merge: bool) -> None:
+        with self._lock:
+            payload = copy.deepcopy(dict(data))
+            current = self._documents[path][0] if merge and path in self._documents else {}
+            for key, value in payload.items():
+                amount = increment_amount(value)
+                if amount is not None:
+                    base = current.get(key)
+                    numeric = isinstance(base, (int, float)) and not isinstance(base, bool)
+                    payload[key] = (base if numeric else 0) + amount
+            if current:
+                merged = dict(current)
+                merged.update(payload)
+                payload = merged
+            self._documents[path] = (payload, next(self._clock))
+            self._notify()
+
+    def _update(self, path: tuple[str, ...], data: Mapping[str, Any]) -> None:
+        with self._lock:
+            if path not in self._documents:
+                raise KeyError(f"No document to update: {'/'.join(path)}")
+            self._set(path, data, merge=True)
+
+    def _delete(self, path: tuple[str, ...]) -> None:
+        with self._lock:
+            if self._documents.pop(path, None) is not None:
+                self._notify()
+
+
+def shared_memory_firestore(manager: Any) -> MemoryFirestore:
+    """Create a store backed by ``manager`` (a started ``SyncManager``) that can be passed to child processes."""
+
+    return MemoryFirestore(
+        documents=manager.dict(),
+        lock=manager.RLock(),
+        clock=_SharedClock(manager.Value("q", time.time_ns())),
+    )
+
+
+__all__ = [
+    "MemoryChangeType",
+    "MemoryCollectionReference",
+    "MemoryDocumentChange",
+    "MemoryDocumentReference",
+    "MemoryFirestore",
+    "MemorySnapshot",
+    "MemoryWatch",
+    "MemoryWriteBatch",
+    "MemoryWriteOption",
+    "MemoryWriteResult",
+    "shared_memory_firestore",
+]
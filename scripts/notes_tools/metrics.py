@@ -0,0 +1,254 @@
+"""Per-model, per-aspect metrics for LLM calls.
+
+:class:`LlmMetrics` keeps a counter set and two fixed-bucket histograms
+(latency and response size) for every ``(model, aspect)`` series. It counts
+requests, errors, retries, prompt, completion and cached tokens, and the
+cost reported by OpenRouter. A metrics object can be shared between threads
+and rendered as a Prometheus text exposition (:meth:`LlmMetrics.to_prometheus`,
+suitable for node_exporter's textfile collector) or as a JSON summary with
+estimated percentiles (:meth:`LlmMetrics.to_map`).
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Mapping
+
+from .codec import JSON
+
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+METRIC_PREFIX = "diana_llm"
+FORMATS = ("prometheus", "json")
+FILE_MODE = 0o644
+
+
+class Histogram:
+    """Counts per upper bound (the last slot is ``+Inf``), plus the sum and count."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate by linear interpolation inside the bucket, as Prometheus does."""
+
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.bounds):
+                    return self.bounds[-1] if self.bounds else None
+                lower = self.bounds[index - 1] if index else 0.0
+                return lower + (self.bounds[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1] if self.bounds else None
+
+    def to_map(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": _round(self.quantile(0.5)),
+            "p95": _round(self.quantile(0.95)),
+            "p99": _round(self.quantile(0.99)),
+        }
+
+
+def _round(value: float | None) -> float | None:
+    return round(value, 4) if value is not None else None
+
+
+@dataclass(slots=True)
+class _Series:
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+    latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    response_bytes: Histogram = field(default_factory=lambda: Histogram(SIZE_BUCKETS))
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class LlmMetrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._series: dict[tuple[str, str], _Series] = {}
+
+    def _get(self, model: str, aspect: str) -> _Series:
+        series = self._series.get((model, aspect))
+        if series is None:
+            series = self._series[(model, aspect)] = _Series()
+        return series
+
+    def observe(
+        self,
+        model: str,
+        aspect: str,
+        latency: float,
+        *,
+        usage: Mapping[str, Any] | None = None,
+        attempts: int = 1,
+        response_bytes: int = 0,
+    ) -> None:
+        """Record one successful call; ``usage`` is the OpenRouter ``usage`` object."""
+
+        usage = usage or {}
+        details = usage.get("prompt_tokens_details")
+        cached = details.get("cached_tokens") if isinstance(details, Mapping) else usage.get("cached_tokens")
+        with self._lock:
+            series = self._get(model, aspect)
+            series.requests += 1
+            series.retries += max(0, attempts - 1)
+            series.prompt_tokens += _int(usage.get("prompt_tokens"))
+            series.completion_tokens += _int(usage.get("completion_tokens"))
+            series.cached_tokens += _int(cached)
+            try:
+                series.cost += float(usage.get("cost") or 0.0)
+            except (TypeError, ValueError):
+                pass
+            series.latency.observe(latency)
+            if response_bytes:
+                series.response_bytes.observe(response_bytes)
+
+    def observe_error(self, model: str, aspect: str, latency: float, *, attempts: int = 1) -> None:
+        with self._lock:
+            series = self._get(model, aspect)
+            series.requests += 1
+            series.errors += 1
+            series.retries += max(0, attempts - 1)
+            series.latency.observe(latency)
+
+    def to_map(self) -> dict[str, Any]:
+        with self._lock:
+            items = sorted(self._series.items())
+            return {
+                "series": [
+                    {
+                        "model": model,
+                        "aspect": aspect,
+                        "requests": series.requests,
+                        "errors": series.errors,
+                        "retries": series.retries,
+                        "prompt_tokens": series.prompt_tokens,
+                        "completion_tokens": series.completion_tokens,
+                        "cached_tokens": series.cached_tokens,
+                        "cost_usd": round(series.cost, 6),
+                        "latency_s": series.latency.to_map(),
+                        "response_bytes": series.response_bytes.to_map(),
+                    }
+                    for (model, aspect), series in items
+                ]
+            }
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            items = sorted(self._series.items())
+            lines: list[str] = []
+            counters = (
+                ("requests_total", "LLM calls, including failed ones.", lambda s: s.requests),
+                ("errors_total", "LLM calls that failed after all retries.", lambda s: s.errors),
+                ("retries_total", "Extra HTTP attempts made by LLM calls.", lambda s: s.retries),
+                ("cost_usd_total", "Cost reported by OpenRouter, in USD.", lambda s: s.cost),
+            )
+            for name, help_text, value in counters:
+                lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+                for (model, aspect), series in items:
+                    lines.append(f"{METRIC_PREFIX}_{name}{{{_labels(model, aspect)}}} {_number(value(series))}")
+            lines.append(f"# HELP {METRIC_PREFIX}_tokens_total Tokens reported by OpenRouter, by kind.")
+            lines.append(f"# TYPE {METRIC_PREFIX}_tokens_total counter")
+            for (model, aspect), series in items:
+                for kind, count in (
+                    ("prompt", series.prompt_tokens),
+                    ("completion", series.completion_tokens),
+                    ("cached", series.cached_tokens),
+                ):
+                    lines.append(f'{METRIC_PREFIX}_tokens_total{{{_labels(model, aspect)},kind="{kind}"}} {count}')
+            for name, help_text, attribute in (
+                ("latency_seconds", "LLM call latency, retries included.", "latency"),
+                ("response_bytes", "Size of LLM responses.", "response_bytes"),
+            ):
+                lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} histogram")
+                for (model, aspect), series in items:
+                    histogram: Histogram = getattr(series, attribute)
+                    labels = _labels(model, aspect)
+                    cumulative = 0
+                    for bound, count in zip((*histogram.bounds, "+Inf"), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{METRIC_PREFIX}_{name}_bucket{{{labels},le="{_number(bound)}"}} {cumulative}')
+                    lines.append(f"{METRIC_PREFIX}_{name}_sum{{{labels}}} {_number(histogram.sum)}")
+                    lines.append(f"{METRIC_PREFIX}_{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def render(self, format: str) -> str:
+        if format == "json":
+            return JSON.dumps(self.to_map(), indent=True) + "\n"
+        if format == "prometheus":
+            return self.to_prometheus()
+        raise ValueError(f"Unknown metrics format '{format}' (expected one of {', '.join(FORMATS)})")
+
+    def write(self, path: str | Path, format: str | None = None) -> None:
+        """Atomically replace ``path``; the format defaults to JSON for ``.json`` files.
+
+        The file is world-readable (0644) like any file written in place, so
+        a collector running as another user (node_exporter's textfile
+        directory) can read it; ``mkstemp`` alone would leave it at 0600.
+        """
+
+        target = Path(path).expanduser()
+        text = self.render(format or ("json" if target.suffix == ".json" else "prometheus"))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+        try:
+            with os.fdopen(handle, "w", encoding="utf-8") as stream:
+                os.fchmod(stream.fileno(), FILE_MODE)
+                stream.write(text)
+            os.replace(temporary, target)
+        except BaseException:
+            Path(temporary).unlink(missing_ok=True)
+            raise
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(model: str, aspect: str) -> str:
+    return f'model="{_escape(model)}",aspect="{_escape(aspect)}"'
+
+
+def _number(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value)
+
+
+__all__ = ["FORMATS", "LATENCY_BUCKETS", "SIZE_BUCKETS", "Histogram", "LlmMetrics"]
@@ -0,0 +1,271 @@
+"""Columnar bulk parsing of note documents.
+
+:func:`parse_remote_notes` accepts the same documents as
+:func:`~notes_tools.notes.parse_remote_note` but returns a :class:`NoteTable`
+instead of one dataclass per note. Type codes, timestamps and indexes into
+shared pools of tag sets and type-specific fields are kept in ``array``
+columns, so notes that carry the same tags or the same status share a single
+pool entry. Tags are resolved once for each distinct combination of raw tag
+fields, not once per note.
+
+Filtering a table or :class:`NoteView` produces another view that holds only
+row numbers. :class:`TodoItem`, :class:`Thought`, :class:`Appointment` and
+:class:`FreeNote` objects are built only when a view is iterated.
+"""
+
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass, field
+from itertools import compress
+from typing import Any, Iterable, Iterator, Sequence
+
+from .notes import (
+    Appointment,
+    FreeNote,
+    StructuredNoteType,
+    TagMappingContext,
+    Thought,
+    TodoItem,
+    _as_string_sequence,
+    _coerce_int,
+    _document_payload,
+    resolve_tag_data,
+)
+
+NOTE_TYPES = ("todo", "memo", "event", "free")
+TYPE_CODES = {name: code for code, name in enumerate(NOTE_TYPES)}
+TODO, MEMO, EVENT, FREE = range(len(NOTE_TYPES))
+
+INT64_MIN, INT64_MAX = -(2**63), 2**63 - 1
+
+_TagSet = tuple[tuple[str, ...], tuple[str, ...]]
+_NO_TAGS: _TagSet = ((), ())
+
+
+@dataclass(slots=True)
+class NoteTable:
+    """Notes stored as parallel columns; row ``i`` of every column is note ``i``.
+
+    ``tag_set`` and ``detail`` index the ``tag_sets`` and ``details`` pools.
+    A detail entry holds the type-specific fields, led by the type code:
+    ``(TODO, status, due_date, event_date)``, ``(MEMO, section_anchor,
+    section_title)`` or ``(EVENT, datetime, location)``; free notes use
+    entry 0, ``()``. ``created_at`` values outside the 64-bit range are
+    clamped to it.
+    """
+
+    types: array = field(default_factory=lambda: array("B"))
+    created_at: array = field(default_factory=lambda: array("q"))
+    tag_set: array = field(default_factory=lambda: array("I"))
+    detail: array = field(default_factory=lambda: array("I"))
+    text: list[str] = field(default_factory=list)
+    note_id: list[str] = field(default_factory=list)
+    tag_sets: list[_TagSet] = field(default_factory=lambda: [_NO_TAGS])
+    details: list[tuple[Any, ...]] = field(default_factory=lambda: [()])
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __iter__(self) -> Iterator[StructuredNoteType]:
+        return map(self.note, range(len(self.types)))
+
+    def view(self) -> "NoteView":
+        return NoteView(self, range(len(self.types)))
+
+    def of_type(self, *note_types: str) -> "NoteView":
+        return self.view().of_type(*note_types)
+
+    def with_status(self, *statuses: str) -> "NoteView":
+        return self.view().with_status(*statuses)
+
+    def with_tag(self, *tag_ids: str) -> "NoteView":
+        return self.view().with_tag(*tag_ids)
+
+    def created_between(self, start: int | None = None, end: int | None = None) -> "NoteView":
+        return self.view().created_between(start, end)
+
+    def type_counts(self) -> dict[str, int]:
+        counts = [0] * len(NOTE_TYPES)
+        for code in self.types:
+            counts[code] += 1
+        return {name: counts[code] for code, name in enumerate(NOTE_TYPES)}
+
+    def note(self, row: int) -> StructuredNoteType:
+        """Build the dataclass for ``row``; every call returns a new object."""
+
+        code = self.types[row]
+        detail = self.details[self.detail[row]]
+        if code == EVENT:
+            return Appointment(
+                text=self.text[row],
+                datetime=detail[1],
+                location=detail[2],
+                created_at=self.created_at[row],
+            )
+        tag_ids, tag_labels = self.tag_sets[self.tag_set[row]]
+        if code == TODO:
+            return TodoItem(
+                text=self.text[row],
+                status=detail[1],
+                tag_ids=list(tag_ids),
+                tag_labels=list(tag_labels),
+                due_date=detail[2],
+                event_date=detail[3],
+                note_id=self.note_id[row],
+                created_at=self.created_at[row],
+            )
+        if code == MEMO:
+            return Thought(
+                text=self.text[row],
+                tag_ids=list(tag_ids),
+                tag_labels=list(tag_labels),
+                section_anchor=detail[1] or None,
+                section_title=detail[2] or None,
+                created_at=self.created_at[row],
+            )
+        return FreeNote(
+            text=self.text[row],
+            tag_ids=list(tag_ids),
+            tag_labels=list(tag_labels),
+            created_at=self.created_at[row],
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class NoteView:
+    """A selection of rows of a :class:`NoteTable`, in table order."""
+
+    table: NoteTable
+    rows: Sequence[int]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[StructuredNoteType]:
+        return map(self.table.note, self.rows)
+
+    def __getitem__(self, index: int) -> StructuredNoteType:
+        return self.table.note(self.rows[index])
+
+    def texts(self) -> Iterator[str]:
+        return map(self.table.text.__getitem__, self.rows)
+
+    def of_type(self, *note_types: str) -> "NoteView":
+        return self._select(self.table.types, {TYPE_CODES[name] for name in note_types})
+
+    def with_status(self, *statuses: str) -> "NoteView":
+        """To-do rows whose status is one of ``statuses``."""
+
+        wanted = set(statuses)
+        codes = {
+            index
+            for index, detail in enumerate(self.table.details)
+            if detail and detail[0] == TODO and detail[1] in wanted
+        }
+        return self._select(self.table.detail, codes)
+
+    def with_tag(self, *tag_ids: str) -> "NoteView":
+        """Rows carrying any of ``tag_ids``."""
+
+        wanted = set(tag_ids)
+        codes = {index for index, (ids, _) in enumerate(self.table.tag_sets) if not wanted.isdisjoint(ids)}
+        return self._select(self.table.tag_set, codes)
+
+    def created_between(self, start: int | None = None, end: int | None = None) -> "NoteView":
+        """Rows with ``start <= created_at < end``; either bound may be omitted."""
+
+        rows: Iterable[int] = self.rows
+        created_at = self.table.created_at
+        if start is not None:
+            rows = compress(rows, map(start.__le__, map(created_at.__getitem__, self.rows)))
+        if end is not None:
+            rows = array("I", rows)
+            rows = compress(rows, map(end.__gt__, map(created_at.__getitem__, rows)))
+        return NoteView(self.table, array("I", rows))
+
+    def _select(self, column: array, codes: set[int]) -> "NoteView":
+        rows = self.rows
+        keep = compress(rows, map(codes.__contains__, map(column.__getitem__, rows)))
+        return NoteView(self.table, array("I", keep))
+
+
+def _text(value: Any) -> str:
+    return str(value).strip()
+
+
+def parse_remote_notes(documents: Iterable[Any], tag_context: TagMappingContext) -> NoteTable:
+    """Parse note documents into a :class:`NoteTable`.
+
+    Keeps exactly the notes :func:`parse_remote_note` would return, in order.
+    """
+
+    table = NoteTable()
+    tag_sets = table.tag_sets
+    tag_set_index: dict[_TagSet, int] = {_NO_TAGS: 0}
+    resolved: dict[tuple[tuple[str, ...], ...], int] = {((), (), ()): 0}
+    details = table.details
+    detail_index: dict[tuple[Any, ...], int] = {(): 0}
+    append_type = table.types.append
+    append_created_at = table.created_at.append
+    append_tag_set = table.tag_set.append
+    append_detail = table.detail.append
+    append_text = table.text.append
+    append_id = table.note_id.append
+
+    for document in documents:
+        doc_id, data = _document_payload(document)
+        code = TYPE_CODES.get(_text(data.get("type", "")).lower())
+        text = data.get("text")
+        if not isinstance(text, str):
+            continue
+        text = text.strip()
+        if not text or code is None:
+            continue
+        tag_set = 0
+        if code != EVENT:
+            key = (
+                tuple(_as_string_sequence(data.get("tagIds"))),
+                tuple(_as_string_sequence(data.get("tagLabels"))),
+                tuple(_as_string_sequence(data.get("tags"))),
+            )
+            tag_set = resolved.get(key, -1)
+            if tag_set < 0:
+                ids, labels = resolve_tag_data(*key, tag_context=tag_context)
+                entry = (tuple(ids), tuple(labels))
+                tag_set = tag_set_index.get(entry, -1)
+                if tag_set < 0:
+                    tag_set = tag_set_index[entry] = len(tag_sets)
+                    tag_sets.append(entry)
+                resolved[key] = tag_set
+        if code == TODO:
+            detail: tuple[Any, ...] = (
+                TODO,
+                _text(data.get("status", "")),
+                _text(data.get("dueDate", "")),
+                _text(data.get("eventDate", "")),
+            )
+        elif code == MEMO:
+            detail = (MEMO, _text(data.get("sectionAnchor", "")), _text(data.get("sectionTitle", "")))
+        elif code == EVENT:
+            detail = (EVENT, _text(data.get("datetime", "")), _text(data.get("location", "")))
+        else:
+            detail = ()
+        detail_code = detail_index.get(detail, -1)
+        if detail_code < 0:
+            detail_code = detail_index[detail] = len(details)
+            details.append(detail)
+        append_type(code)
+        created_at = _coerce_int(data.get("createdAt", 0))
+        try:
+            append_created_at(created_at)
+        except OverflowError:  # clamped so a corrupt timestamp still sorts at the end it was on
+            append_created_at(INT64_MAX if created_at > 0 else INT64_MIN)
+        append_tag_set(tag_set)
+        append_detail(detail_code)
+        append_text(text)
+        append_id(doc_id)
+    return table
+
+
+__all__ = ["INT64_MAX", "INT64_MIN", "NOTE_TYPES", "NoteTable", "NoteView", "parse_remote_notes"]
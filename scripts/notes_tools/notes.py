@@ -2,8 +2,13 @@
 
 from __future__ import annotations
 
+import hashlib
+import math
+from collections.abc import Iterable, Mapping, Sequence
 from dataclasses import dataclass, field
-from typing import Any, Iterable, Mapping, Sequence
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any
 
 DocumentData = Mapping[str, Any]
 
@@ -22,7 +27,7 @@ def _coerce_int(value: Any, *, default: int = 0) -> int:
     if isinstance(value, int):
         return value
     if isinstance(value, float):
-        return int(value)
+        return int(value) if math.isfinite(value) else default
     if isinstance(value, str):
         trimmed = value.strip()
         if not trimmed:
@@ -32,7 +37,7 @@ def _coerce_int(value: Any, *, default: int = 0) -> int:
         except ValueError:
             try:
                 return int(float(trimmed))
-            except ValueError:
+            except (OverflowError, ValueError):  # "inf", "nan" or not a number
                 return default
     return default
 
@@ -151,21 +156,7 @@ class NotesTagDefinition:
     color: str | None = None
 
     def label_for_locale(self, locale: str) -> str | None:
-        if not self.labels:
-            return None
-        normalized_locale = locale.replace("_", "-").lower()
-        by_tag: dict[str, str] = {}
-        default_label: str | None = None
-        for label in self.labels:
-            tag = label.normalized_tag
-            if tag is None:
-                default_label = default_label or label.value
-            elif tag not in by_tag:
-                by_tag[tag] = label.value
-        if normalized_locale in by_tag:
-            return by_tag[normalized_locale]
-        language = normalized_locale.split("-")[0]
-        return by_tag.get(language) or default_label or self.labels[0].value
+        return _label_for_locale(self.labels, _normalize_locale(locale))
 
     @classmethod
     def from_map(cls, data: Mapping[str, Any]) -> "NotesTagDefinition":
@@ -214,6 +205,135 @@ class NotesTagCatalog:
         return cls(tags)
 
 
+def _normalize_locale(locale: str) -> str:
+    return locale.replace("_", "-").lower()
+
+
+def _label_for_locale(labels: Sequence[LocalizedLabel], normalized_locale: str) -> str | None:
+    """First label for the exact locale, else its language, else the default, else the first label."""
+
+    if not labels:
+        return None
+    language = normalized_locale.split("-")[0]
+    exact: str | None = None
+    by_language: str | None = None
+    default_label: str | None = None
+    seen: set[str] = set()
+    for label in labels:
+        tag = label.normalized_tag
+        if tag is None:
+            default_label = default_label or label.value
+        elif tag not in seen:
+            seen.add(tag)
+            if tag == normalized_locale:
+                exact = label.value
+                break
+            if tag == language:
+                by_language = label.value
+    if exact is not None:
+        return exact
+    return by_language or default_label or labels[0].value
+
+
+@dataclass(frozen=True, slots=True)
+class TagDescriptor:
+    id: str
+    label: str
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledTagCatalog:
+    """Read-only lookup tables for one tag catalog in one locale.
+
+    Built by :func:`compile_tag_catalog`, which memoises by catalog content and
+    locale, so sessions sharing a catalog share one instance. ``fingerprint``
+    identifies the catalog content independently of the locale.
+    """
+
+    fingerprint: str
+    locale: str
+    ids: tuple[str, ...]
+    labels: Mapping[str, str]
+    id_lookup: Mapping[str, str]
+    label_lookup: Mapping[str, str]
+    descriptors: tuple[TagDescriptor, ...]
+    prompt_text: str
+    primary_tag_id: str | None
+
+    def resolve(self, value: str) -> str | None:
+        """Map a tag id or label (any case) to its canonical id."""
+
+        trimmed = value.strip()
+        if not trimmed:
+            return None
+        if trimmed in self.labels:  # already a canonical id (ids may differ only by case)
+            return trimmed
+        lower = trimmed.lower()
+        return self.id_lookup.get(lower) or self.label_lookup.get(lower)
+
+
+_CatalogKey = tuple[tuple[str, tuple[tuple[str | None, str], ...]], ...]
+
+
+def _catalog_key(catalog: NotesTagCatalog | None) -> _CatalogKey:
+    if catalog is None:
+        return ()
+    return tuple(
+        (definition.id, tuple((label.locale_tag, label.value) for label in definition.labels))
+        for definition in catalog.tags
+    )
+
+
+def compile_tag_catalog(catalog: NotesTagCatalog | None, locale: str) -> CompiledTagCatalog:
+    """Return the (memoised) compiled form of ``catalog`` for ``locale``."""
+
+    return _compile_tag_catalog(_catalog_key(catalog), _normalize_locale(locale))
+
+
+@lru_cache(maxsize=256)
+def _compile_tag_catalog(key: _CatalogKey, locale: str) -> CompiledTagCatalog:
+    fingerprint = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=8).hexdigest()
+    preferred: dict[str, str] = {}
+    id_lookup: dict[str, str] = {}
+    label_lookup: dict[str, str] = {}
+    for raw_id, raw_labels in key:
+        tag_id = raw_id.strip()
+        if not tag_id:
+            continue
+        labels = [LocalizedLabel(locale_tag, value) for locale_tag, value in raw_labels]
+        id_lookup.setdefault(tag_id.lower(), tag_id)
+        label = _label_for_locale(labels, locale)
+        if label:
+            label_lookup.setdefault(label.strip().lower(), tag_id)
+        for candidate in labels:
+            normalized = (candidate.value or "").strip().lower()
+            if normalized:
+                label_lookup.setdefault(normalized, tag_id)
+        preferred.setdefault(tag_id, label or (labels[0].value if labels else tag_id))
+    if not key:
+        descriptors: tuple[TagDescriptor, ...] = ()
+        prompt_text = "- (no tags available)"
+    else:
+        descriptors = tuple(
+            sorted(
+                (TagDescriptor(tag_id, label) for tag_id, label in preferred.items()),
+                key=lambda item: (item.label.lower(), item.id.lower()),
+            )
+        )
+        prompt_text = "\n".join(f"- {descriptor.id}: {descriptor.label}" for descriptor in descriptors)
+    return CompiledTagCatalog(
+        fingerprint=fingerprint,
+        locale=locale,
+        ids=tuple(preferred),
+        labels=MappingProxyType(preferred),
+        id_lookup=MappingProxyType(id_lookup),
+        label_lookup=MappingProxyType(label_lookup),
+        descriptors=descriptors,
+        prompt_text=prompt_text,
+        primary_tag_id=descriptors[0].id if descriptors else None,
+    )
+
+
 @dataclass(slots=True)
 class ThoughtOutlineSection:
     title: str
@@ -315,14 +435,15 @@ class MemoSummary:
 
 
 def _sanitize_strings(values: Iterable[str]) -> list[str]:
-    seen: list[str] = []
+    """Trimmed, non-empty strings in first-seen order without duplicates."""
+
+    seen: dict[str, None] = {}
     for value in values:
-        if not isinstance(value, str):
-            continue
-        trimmed = value.strip()
-        if trimmed and trimmed not in seen:
-            seen.append(trimmed)
-    return seen
+        if isinstance(value, str):
+            trimmed = value.strip()
+            if trimmed:
+                seen[trimmed] = None
+    return list(seen)
 
 
 @dataclass(slots=True)
@@ -335,55 +456,23 @@ class TagMigrationResult:
 class TagMappingContext:
     catalog: NotesTagCatalog | None
     locale: str
-    _canonical_ids: set[str] = field(init=False, default_factory=set)
-    _id_lookup: dict[str, str] = field(init=False, default_factory=dict)
-    _label_lookup: dict[str, str] = field(init=False, default_factory=dict)
+    compiled: CompiledTagCatalog = field(init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
-        ids: list[str] = []
-        id_lookup: dict[str, str] = {}
-        label_lookup: dict[str, str] = {}
-        if self.catalog:
-            for definition in self.catalog.tags:
-                tag_id = definition.id.strip()
-                if not tag_id:
-                    continue
-                if tag_id not in ids:
-                    ids.append(tag_id)
-                id_lookup.setdefault(tag_id.lower(), tag_id)
-                preferred = definition.label_for_locale(self.locale)
-                if preferred:
-                    label_lookup.setdefault(preferred.strip().lower(), tag_id)
-                for label in definition.labels:
-                    normalized = (label.value or "").strip().lower()
-                    if normalized:
-                        label_lookup.setdefault(normalized, tag_id)
-        self._canonical_ids = set(ids)
-        self._id_lookup = id_lookup
-        self._label_lookup = label_lookup
+        self.compiled = compile_tag_catalog(self.catalog, self.locale)
 
     def map_legacy(self, legacy: Sequence[str]) -> TagMigrationResult:
-        resolved: list[str] = []
+        resolved: dict[str, None] = {}
         unresolved: list[str] = []
         for raw in legacy:
-            candidate = self._resolve(raw)
+            candidate = self.compiled.resolve(raw)
             if candidate:
-                if candidate not in resolved:
-                    resolved.append(candidate)
+                resolved[candidate] = None
             else:
                 trimmed = raw.strip()
                 if trimmed:
                     unresolved.append(trimmed)
-        return TagMigrationResult(resolved, unresolved)
-
-    def _resolve(self, value: str) -> str | None:
-        trimmed = value.strip()
-        if not trimmed:
-            return None
-        if trimmed in self._canonical_ids:
-            return trimmed
-        lower = trimmed.lower()
-        return self._id_lookup.get(lower) or self._label_lookup.get(lower)
+        return TagMigrationResult(list(resolved), unresolved)
 
 
 def resolve_tag_data(
@@ -395,16 +484,10 @@ def resolve_tag_data(
     ids = _sanitize_strings(explicit_ids)
     labels = _sanitize_strings(explicit_labels)
     legacy = _sanitize_strings(legacy_tags)
-    if not ids and legacy:
+    if legacy:
         migrated = tag_context.map_legacy(legacy)
-        ids = migrated.tag_ids
-        labels.extend(label for label in migrated.unresolved_labels if label not in labels)
-    elif legacy:
-        migrated = tag_context.map_legacy(legacy)
-        for tag_id in migrated.tag_ids:
-            if tag_id not in ids:
-                ids.append(tag_id)
-        labels.extend(label for label in migrated.unresolved_labels if label not in labels)
+        ids = list(dict.fromkeys(ids + migrated.tag_ids))
+        labels = list(dict.fromkeys(labels + migrated.unresolved_labels))
     return ids, labels
 
 
@@ -524,49 +607,79 @@ def parse_remote_todo_change_set(document: Any) -> TodoChangeSet | None:
     )
 
 
+def _todo_to_map(note: TodoItem) -> dict[str, Any]:
+    payload: dict[str, Any] = {
+        "type": "todo",
+        "text": note.text,
+        "status": note.status,
+        "tagIds": note.tag_ids,
+        "tagLabels": note.tag_labels,
+        "dueDate": note.due_date,
+        "eventDate": note.event_date,
+        "createdAt": note.created_at,
+    }
+    if note.note_id:
+        payload["id"] = note.note_id
+    return payload
+
+
+def _thought_to_map(note: Thought) -> dict[str, Any]:
+    return {
+        "type": "memo",
+        "text": note.text,
+        "tagIds": note.tag_ids,
+        "tagLabels": note.tag_labels,
+        "sectionAnchor": note.section_anchor,
+        "sectionTitle": note.section_title,
+        "createdAt": note.created_at,
+    }
+
+
+def _appointment_to_map(note: Appointment) -> dict[str, Any]:
+    return {
+        "type": "event",
+        "text": note.text,
+        "datetime": note.datetime,
+        "location": note.location,
+        "createdAt": note.created_at,
+    }
+
+
+def _free_note_to_map(note: FreeNote) -> dict[str, Any]:
+    return {
+        "type": "free",
+        "text": note.text,
+        "tagIds": note.tag_ids,
+        "tagLabels": note.tag_labels,
+        "createdAt": note.created_at,
+    }
+
+
+NOTE_TYPE_NAMES: dict[type, str] = {TodoItem: "todo", Thought: "memo", Appointment: "event", FreeNote: "free"}
+_NOTE_MAPPERS: dict[type, Any] = {
+    TodoItem: _todo_to_map,
+    Thought: _thought_to_map,
+    Appointment: _appointment_to_map,
+    FreeNote: _free_note_to_map,
+}
+
+
+def note_type_name(note: Any) -> str | None:
+    """The Firestore ``type`` of ``note`` (``"todo"``, ``"memo"``, ...), or ``None``."""
+
+    name = NOTE_TYPE_NAMES.get(type(note))
+    if name is None:
+        name = next((NOTE_TYPE_NAMES[base] for base in type(note).__mro__ if base in NOTE_TYPE_NAMES), None)
+    return name
+
+
 def structured_note_to_map(note: StructuredNoteType) -> dict[str, Any]:
-    if isinstance(note, TodoItem):
-        payload: dict[str, Any] = {
-            "type": "todo",
-            "text": note.text,
-            "status": note.status,
-            "tagIds": note.tag_ids,
-            "tagLabels": note.tag_labels,
-            "dueDate": note.due_date,
-            "eventDate": note.event_date,
-            "createdAt": note.created_at,
-        }
-        if note.note_id:
-            payload["id"] = note.note_id
-        return payload
-    if isinstance(note, Thought):
-        payload = {
-            "type": "memo",
-            "text": note.text,
-            "tagIds": note.tag_ids,
-            "tagLabels": note.tag_labels,
-            "sectionAnchor": note.section_anchor,
-            "sectionTitle": note.section_title,
-            "createdAt": note.created_at,
-        }
-        return payload
-    if isinstance(note, Appointment):
-        return {
-            "type": "event",
-            "text": note.text,
-            "datetime": note.datetime,
-            "location": note.location,
-            "createdAt": note.created_at,
-        }
-    if isinstance(note, FreeNote):
-        return {
-            "type": "free",
-            "text": note.text,
-            "tagIds": note.tag_ids,
-            "tagLabels": note.tag_labels,
-            "createdAt": note.created_at,
-        }
-    raise TypeError(f"Unsupported note type: {type(note)!r}")
+    mapper = _NOTE_MAPPERS.get(type(note))
+    if mapper is None:
+        mapper = next((_NOTE_MAPPERS[base] for base in type(note).__mro__ if base in _NOTE_MAPPERS), None)
+        if mapper is None:
+            raise TypeError(f"Unsupported note type: {type(note)!r}")
+    return mapper(note)
 
 
 def summary_to_notes(
@@ -616,7 +729,9 @@ def summary_to_notes(
 
 
 __all__ = [
+    "NOTE_TYPE_NAMES",
     "Appointment",
+    "CompiledTagCatalog",
     "FreeNote",
     "LocalizedLabel",
     "MemoSummary",
@@ -626,6 +741,7 @@ __all__ = [
     "Session",
     "SessionSettings",
     "StructuredNote",
+    "TagDescriptor",
     "TagMappingContext",
     "Thought",
     "ThoughtDocument",
@@ -634,6 +750,8 @@ __all__ = [
     "TodoAction",
     "TodoChangeSet",
     "TodoItem",
+    "compile_tag_catalog",
+    "note_type_name",
     "parse_remote_note",
     "parse_remote_todo_change_set",
     "parse_remote_session",
@@ -0,0 +1,439 @@
+"""Minimal OpenRouter chat-completions client used by the memo pipeline."""
+
+from __future__ import annotations
+
+import http.client
+import json
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Mapping
+
+from .request_schema import encode_payload
+
+if TYPE_CHECKING:
+    import asyncio
+
+MAX_REQUEST_ATTEMPTS = 3
+DEFAULT_MAX_CONNECTIONS = 16
+
+
+class LlmRequestError(RuntimeError):
+    """Raised when the LLM request fails or returns an unusable response.
+
+    ``attempts`` is the number of HTTP attempts made before giving up.
+    """
+
+    def __init__(self, message: str, *, attempts: int = 1) -> None:
+        super().__init__(message)
+        self.attempts = attempts
+
+
+@dataclass(slots=True)
+class LlmReply:
+    """The structured content of a completion plus the metadata kept for metrics."""
+
+    content: Mapping[str, Any]
+    model: str = ""
+    usage: Mapping[str, Any] | None = None
+    attempts: int = 1
+    response_bytes: int = 0
+
+
+def is_retryable_status(status: int) -> bool:
+    """Whether an HTTP error status is worth retrying: rate limits and server errors.
+
+    Other 4xx responses (bad key, invalid payload) fail the same way again.
+    """
+
+    return status == 429 or status >= 500
+
+
+def reply_from_response(response: Mapping[str, Any], *, attempts: int = 1, response_bytes: int = 0) -> LlmReply:
+    usage = response.get("usage")
+    return LlmReply(
+        extract_structured_json(response),
+        model=str(response.get("model") or ""),
+        usage=usage if isinstance(usage, Mapping) else None,
+        attempts=attempts,
+        response_bytes=response_bytes,
+    )
+
+
+def call_openrouter(
+    *,
+    url: str,
+    payload: Mapping[str, Any],
+    api_key: str,
+    timeout: float = 60.0,
+) -> Mapping[str, Any]:
+    data = encode_payload(payload).encode("utf-8")
+    request = urllib.request.Request(
+        url,
+        data=data,
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        },
+        method="POST",
+    )
+
+    last_error: Exception | None = None
+    for attempt in range(MAX_REQUEST_ATTEMPTS):
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                body = response.read()
+                text = body.decode("utf-8", errors="replace")
+                return json.loads(text)
+        except (urllib.error.HTTPError, urllib.error.URLError, TimeoutError, json.JSONDecodeError) as exc:
+            last_error = exc
+            if isinstance(exc, urllib.error.HTTPError) and not is_retryable_status(exc.code):
+                break
+            if attempt == MAX_REQUEST_ATTEMPTS - 1:
+                break
+            time.sleep(2 ** attempt)
+    if last_error is None:
+        raise LlmRequestError("OpenRouter request failed")
+    raise LlmRequestError(f"OpenRouter request failed: {last_error}")
+
+
+class OpenRouterSession:
+    """Chat-completions client drawing keep-alive HTTPS connections from a shared pool.
+
+    ``call_openrouter`` opens a new TLS connection for every request; long runs
+    that issue many requests share a session instead. A request checks an
+    idle connection out and returns it afterwards, so the pool grows to the
+    peak number of concurrent requests and short-lived threads (one per
+    request in serve mode) reuse the same handshakes.
+    """
+
+    def __init__(self, url: str, api_key: str, *, timeout: float = 60.0) -> None:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in {"http", "https"} or not parts.hostname:
+            raise LlmRequestError(f"Unsupported OpenRouter URL: {url}")
+        self.url = url
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path or "/"
+        if parts.query:
+            self._path += f"?{parts.query}"
+        self._headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+            "Connection": "keep-alive",
+        }
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._connections: set[http.client.HTTPConnection] = set()
+        self._idle: list[http.client.HTTPConnection] = []
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        factory = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+        connection = factory(self._host, self._port, timeout=self.timeout)
+        with self._lock:
+            self._connections.add(connection)
+        return connection
+
+    def _checkout(self) -> http.client.HTTPConnection:
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        return connection if connection is not None else self._new_connection()
+
+    def _checkin(self, connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if connection in self._connections:  # not closed meanwhile
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def _discard(self, connection: http.client.HTTPConnection) -> None:
+        connection.close()
+        with self._lock:
+            self._connections.discard(connection)
+
+    def warm(self) -> bool:
+        """Connect (including the TLS handshake) ahead of the first request, from any thread.
+
+        The warmed connection joins the idle pool. Returns ``False`` if
+        connecting failed; ``post`` then simply connects itself.
+        """
+
+        connection = self._new_connection()
+        try:
+            connection.connect()
+        except (OSError, http.client.HTTPException):
+            self._discard(connection)
+            return False
+        self._checkin(connection)
+        return True
+
+    def post(self, payload: Mapping[str, Any]) -> Mapping[str, Any]:
+        return self._send(payload)[0]
+
+    def complete(self, payload: Mapping[str, Any]) -> LlmReply:
+        """POST ``payload`` and return the structured content with its usage metadata."""
+
+        response, attempts, size = self._send(payload)
+        try:
+            return reply_from_response(response, attempts=attempts, response_bytes=size)
+        except LlmRequestError as exc:
+            exc.attempts = attempts
+            raise
+
+    def _send(self, payload: Mapping[str, Any]) -> tuple[Mapping[str, Any], int, int]:
+        data = encode_payload(payload).encode("utf-8")
+        last_error: Exception | None = None
+        for attempt in range(MAX_REQUEST_ATTEMPTS):
+            connection = self._checkout()
+            try:
+                connection.request("POST", self._path, body=data, headers=self._headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as exc:
+                last_error = exc
+                self._discard(connection)
+            else:
+                if response.will_close:
+                    self._discard(connection)
+                else:
+                    self._checkin(connection)
+                if response.status >= 400:
+                    last_error = LlmRequestError(f"HTTP Error {response.status}: {response.reason}")
+                    if not is_retryable_status(response.status):
+                        raise LlmRequestError(f"OpenRouter request failed: {last_error}", attempts=attempt + 1)
+                else:
+                    try:
+                        return json.loads(body.decode("utf-8", errors="replace")), attempt + 1, len(body)
+                    except json.JSONDecodeError as exc:
+                        last_error = exc
+            if attempt < MAX_REQUEST_ATTEMPTS - 1:
+                time.sleep(2 ** attempt)
+        raise LlmRequestError(f"OpenRouter request failed: {last_error}", attempts=MAX_REQUEST_ATTEMPTS)
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, set()
+            self._idle = []
+        for connection in connections:
+            connection.close()
+
+
+class _NoResponse(ConnectionResetError):
+    """The connection failed before any byte of the response arrived."""
+
+
+class AsyncOpenRouterSession:
+    """Asyncio counterpart of :class:`OpenRouterSession` built on ``asyncio`` streams.
+
+    Requests are plain HTTP/1.1 over a pool of at most ``max_connections``
+    keep-alive connections shared by every task on the event loop, so a
+    single loop can keep that many model calls in flight without threads.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        *,
+        timeout: float = 60.0,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+    ) -> None:
+        import asyncio  # imported here so synchronous callers do not pay for it
+
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in {"http", "https"} or not parts.hostname:
+            raise LlmRequestError(f"Unsupported OpenRouter URL: {url}")
+        self.url = url
+        self.timeout = timeout
+        self._host = parts.hostname
+        self._ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        default_port = 443 if parts.scheme == "https" else 80
+        self._port = parts.port or default_port
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        host = self._host if self._port == default_port else f"{self._host}:{self._port}"
+        self._head = (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Authorization: Bearer {api_key}\r\n"
+            "Connection: keep-alive\r\n"
+        )
+        self._slots = asyncio.Semaphore(max(1, max_connections))
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def post(self, payload: Mapping[str, Any]) -> Mapping[str, Any]:
+        return (await self._send(payload))[0]
+
+    async def complete(self, payload: Mapping[str, Any]) -> LlmReply:
+        response, attempts, size = await self._send(payload)
+        try:
+            return reply_from_response(response, attempts=attempts, response_bytes=size)
+        except LlmRequestError as exc:
+            exc.attempts = attempts
+            raise
+
+    async def _send(self, payload: Mapping[str, Any]) -> tuple[Mapping[str, Any], int, int]:
+        import asyncio
+
+        data = encode_payload(payload).encode("utf-8")
+        request = (self._head + f"Content-Length: {len(data)}\r\n\r\n").encode("latin-1") + data
+        last_error: Exception | None = None
+        for attempt in range(MAX_REQUEST_ATTEMPTS):
+            async with self._slots:
+                try:
+                    status, reason, body = await self._request(request)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+                    last_error = exc
+                else:
+                    if status >= 400:
+                        last_error = LlmRequestError(f"HTTP Error {status}: {reason}")
+                        if not is_retryable_status(status):
+                            raise LlmRequestError(
+                                f"OpenRouter request failed: {last_error}", attempts=attempt + 1
+                            )
+                    else:
+                        try:
+                            return json.loads(body.decode("utf-8", errors="replace")), attempt + 1, len(body)
+                        except json.JSONDecodeError as exc:
+                            last_error = exc
+            if attempt < MAX_REQUEST_ATTEMPTS - 1:
+                await asyncio.sleep(2 ** attempt)
+        raise LlmRequestError(f"OpenRouter request failed: {last_error}", attempts=MAX_REQUEST_ATTEMPTS)
+
+    async def _request(self, request: bytes) -> tuple[int, str, bytes]:
+        """One exchange, on an idle connection if there is one.
+
+        A server may close a keep-alive connection while it sits idle, which
+        only shows once it is used again. So when a reused connection fails
+        before any response bytes arrive, the request is sent again at once
+        on a fresh connection; that is not a failed attempt.
+        """
+
+        import asyncio
+
+        if self._idle:
+            try:
+                return await self._exchange_on(self._idle.pop(), request)
+            except _NoResponse:
+                pass
+        connection = await asyncio.wait_for(
+            asyncio.open_connection(self._host, self._port, ssl=self._ssl), self.timeout
+        )
+        return await self._exchange_on(connection, request)
+
+    async def _exchange_on(
+        self,
+        connection: tuple[asyncio.StreamReader, asyncio.StreamWriter],
+        request: bytes,
+    ) -> tuple[int, str, bytes]:
+        import asyncio
+
+        keep_alive = False
+        try:
+            status, reason, body, keep_alive = await asyncio.wait_for(
+                self._exchange(connection, request), self.timeout
+            )
+            return status, reason, body
+        finally:
+            # Also on cancellation: a connection abandoned mid-exchange cannot be reused.
+            if keep_alive:
+                self._idle.append(connection)
+            else:
+                connection[1].close()
+
+    async def _exchange(
+        self,
+        connection: tuple[asyncio.StreamReader, asyncio.StreamWriter],
+        request: bytes,
+    ) -> tuple[int, str, bytes, bool]:
+        reader, writer = connection
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+        except OSError as exc:
+            raise _NoResponse(f"connection failed before the response: {exc}") from exc
+        if not status_line:
+            raise _NoResponse("connection closed by server")
+        version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+        headers: dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version != "HTTP/1.0" and headers.get("connection", "").lower() != "close"
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif "content-length" in headers:
+            body = bytearray(await reader.readexactly(int(headers["content-length"])))
+        else:
+            body = bytearray(await reader.read())
+            keep_alive = False
+        return int(status), reason, bytes(body), keep_alive
+
+    async def aclose(self) -> None:
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+def extract_structured_json(response: Mapping[str, Any]) -> Mapping[str, Any]:
+    choices = response.get("choices")
+    if not isinstance(choices, list) or not choices:
+        raise LlmRequestError("LLM response missing choices")
+    message = choices[0].get("message")
+    content: Any
+    if isinstance(message, Mapping):
+        content = message.get("content")
+    else:
+        content = None
+    if isinstance(content, list):
+        text = "".join(
+            part.get("text", "")
+            for part in content
+            if isinstance(part, Mapping) and isinstance(part.get("text"), str)
+        )
+    elif isinstance(content, str):
+        text = content
+    else:
+        raise LlmRequestError("LLM response missing content")
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end == -1 or end <= start:
+        raise LlmRequestError("LLM content did not include JSON object")
+    try:
+        return json.loads(text[start : end + 1])
+    except json.JSONDecodeError as exc:
+        raise LlmRequestError(f"Invalid JSON from model: {exc}") from exc
+
+
+__all__ = [
+    "AsyncOpenRouterSession",
+    "LlmReply",
+    "LlmRequestError",
+    "OpenRouterSession",
+    "call_openrouter",
+    "extract_structured_json",
+    "is_retryable_status",
+    "reply_from_response",
+]
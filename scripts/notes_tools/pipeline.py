@@ -0,0 +1,511 @@
+"""End-to-end memo processing for one session: load, call the LLM, persist.
+
+:class:`MemoPipeline` is shared by ``process_memo.py`` and the long-running
+modes. Persistence uses optimistic concurrency: the session is re-read when a
+guarded commit loses a race (see :mod:`notes_tools.session_writes`), and the
+memo is either rebased onto the fresh state by re-applying the LLM responses
+already received or, when the aspects the model saw changed underneath it,
+reprocessed from scratch. Both paths are bounded by ``max_attempts``.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Mapping, Sequence
+
+from .journal import JournalFlusher
+from .memo_processing import LlmLogger, MemoProcessor, TagCatalogSnapshot, load_resource
+from .metrics import LlmMetrics
+from .note_table import parse_remote_notes
+from .notes import (
+    MemoSummary,
+    NotesTagCatalog,
+    Session,
+    TagMappingContext,
+    ThoughtDocument,
+    parse_remote_session,
+)
+from .openrouter import LlmReply, OpenRouterSession
+from .session_writes import (
+    NOTES_COLLECTION,
+    SESSION_VERSION_FIELD,
+    SESSIONS_COLLECTION,
+    SessionGuard,
+    SummaryReads,
+    WriteConflict,
+    WriteOp,
+    WriteTooLarge,
+    apply_writes,
+    plan_summary_writes,
+)
+from .thought_history import DEFAULT_SNAPSHOT_INTERVAL
+from .thought_store import ENCODING_ZLIB, LAYOUT_INLINE, THOUGHT_DOCUMENT_ID, parse_thought_document
+from .timing import PhaseTimer, phase
+
+if TYPE_CHECKING:
+    from .session_cache import SessionStateCache
+
+DEFAULT_LOCALE = "en"
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Returns the structured content, or an LlmReply carrying it with usage metadata.
+LlmCall = Callable[[Mapping[str, Any]], "Mapping[str, Any] | LlmReply"]
+# Extra writes for the memo's commit, or a callable planning them anew for every write attempt.
+ExtraOps = Sequence[WriteOp] | Callable[[], Sequence[WriteOp]]
+
+
+class PipelineError(RuntimeError):
+    """Raised when a memo cannot be processed for a session."""
+
+
+@dataclass(slots=True)
+class SessionState:
+    session: Session
+    summary: MemoSummary
+    tag_catalog: NotesTagCatalog | None
+    locale: str
+    version: int = 0
+    update_time: Any = None
+    tag_snapshot: TagCatalogSnapshot | None = None
+
+    def guard(self) -> SessionGuard:
+        return SessionGuard(self.session.id, self.version, self.update_time)
+
+
+def _stream_notes(notes_ref: Any) -> Iterator[Any]:
+    try:
+        from google.api_core.exceptions import GoogleAPIError
+        from google.api_core.retry import Retry
+    except ModuleNotFoundError:  # offline stand-ins
+        return iter(notes_ref.stream())
+    try:
+        return notes_ref.stream(retry=Retry(deadline=30.0))
+    except GoogleAPIError as exc:  # pragma: no cover - network failure
+        raise PipelineError(f"Failed to stream notes: {exc}") from exc
+
+
+def load_session_state(client: Any, session_id: str, document: Any = None) -> SessionState:
+    """Read a session and its notes; ``document`` reuses an already fetched session snapshot."""
+
+    if document is None:
+        document = client.collection(SESSIONS_COLLECTION).document(session_id).get()
+    if not document.exists:
+        raise PipelineError(f"Session '{session_id}' not found")
+    return build_session_state(
+        document,
+        _stream_notes(document.reference.collection(NOTES_COLLECTION)),
+        load_thought=lambda snapshot: _load_thought(snapshot, client),
+    )
+
+
+def _load_thought(snapshot: Any, client: Any = None) -> ThoughtDocument | None:
+    return parse_thought_document(snapshot.to_dict() or {}, snapshot.reference, client=client)
+
+
+def build_session_state(
+    document: Any,
+    note_snapshots: Iterable[Any],
+    *,
+    load_thought: Callable[[Any], ThoughtDocument | None] = _load_thought,
+) -> SessionState:
+    """Parse an existing session snapshot and the snapshots of its notes.
+
+    ``load_thought`` turns the thought document's snapshot into a
+    :class:`ThoughtDocument`; the default fetches chunked sections with
+    blocking reads, so async callers pass one that uses prefetched sections.
+    """
+
+    session_id = document.id
+    session = parse_remote_session(document)
+    if session is None:
+        raise PipelineError(f"Session '{session_id}' is missing required fields")
+    session_data = document.to_dict() or {}
+    settings = session_data.get("settings") if isinstance(session_data.get("settings"), Mapping) else {}
+    locale = str(settings.get("locale", DEFAULT_LOCALE)).strip() or DEFAULT_LOCALE
+    catalog_data = settings.get("tagCatalog") if isinstance(settings.get("tagCatalog"), Mapping) else None
+    tag_catalog = NotesTagCatalog.from_map(catalog_data)
+    tag_context = TagMappingContext(catalog=tag_catalog, locale=locale)
+
+    thought_document: ThoughtDocument | None = None
+
+    def note_documents() -> Iterator[Any]:
+        nonlocal thought_document
+        for snapshot in note_snapshots:
+            if snapshot.id == THOUGHT_DOCUMENT_ID:
+                thought_document = load_thought(snapshot)
+            else:
+                yield snapshot
+
+    table = parse_remote_notes(note_documents(), tag_context)
+    todo_view = table.of_type("todo")
+    appointment_view = table.of_type("event")
+    thought_view = table.of_type("memo")
+
+    summary = MemoSummary(
+        todo="\n".join(todo_view.texts()),
+        appointments="\n".join(appointment_view.texts()),
+        thoughts=(
+            thought_document.markdown_body
+            if thought_document is not None
+            else "\n".join(thought_view.texts())
+        ),
+        todo_items=list(todo_view),
+        appointment_items=list(appointment_view),
+        thought_items=list(thought_view),
+        thought_document=thought_document,
+    )
+    try:
+        version = int(session_data.get(SESSION_VERSION_FIELD, 0) or 0)
+    except (TypeError, ValueError):
+        version = 0
+    return SessionState(
+        session,
+        summary,
+        tag_catalog,
+        locale,
+        version=version,
+        update_time=getattr(document, "update_time", None),
+        tag_snapshot=TagCatalogSnapshot.from_compiled(tag_context.compiled),
+    )
+
+
+@dataclass(slots=True)
+class MemoRequest:
+    """One memo to process; ``None`` aspect flags defer to the session settings."""
+
+    session_id: str
+    memo: str
+    process_todos: bool | None = None
+    process_appointments: bool | None = None
+    process_thoughts: bool | None = None
+    model: str | None = None
+
+
+@dataclass(slots=True)
+class WriteOptions:
+    thought_layout: str = LAYOUT_INLINE
+    history_interval: int | None = DEFAULT_SNAPSHOT_INTERVAL
+    compress_threshold: int | None = None
+    thought_encoding: str = ENCODING_ZLIB
+
+
+@dataclass(slots=True)
+class MemoResult:
+    summary: MemoSummary
+    logger: LlmLogger
+    written: bool = False
+    journaled: bool = False
+    attempts: int = 1
+    llm_calls: int = 0
+
+
+@dataclass(slots=True)
+class _Aspects:
+    todos: bool
+    appointments: bool
+    thoughts: bool
+
+    @classmethod
+    def resolve(cls, request: MemoRequest, session: Session) -> "_Aspects":
+        settings = session.settings
+        return cls(
+            request.process_todos if request.process_todos is not None else settings.process_todos,
+            (
+                request.process_appointments
+                if request.process_appointments is not None
+                else settings.process_appointments
+            ),
+            request.process_thoughts if request.process_thoughts is not None else settings.process_thoughts,
+        )
+
+
+class MemoPipeline:
+    """Processes memos against Firestore sessions with conflict-safe writes.
+
+    A pipeline can be shared between threads. Concurrent memos for the same
+    session are resolved by the write guard but land in arbitrary order, so
+    callers that care about memo order serialize them per session (see
+    :mod:`notes_tools.batch`). ``transport`` supplies an already connected
+    LLM session and ``timer`` records the load, prompt, LLM, parse and write
+    phases of every memo, which is only useful for single runs; without it
+    they go to the timer activated by ``--profile``, if any. ``logger`` is shared by every
+    memo; without it each :class:`MemoResult` carries a logger of its own.
+    ``metrics`` records the latency, usage and failures of every LLM call.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        *,
+        api_key: str,
+        llm: LlmCall | None = None,
+        base_url: str | None = None,
+        write_options: WriteOptions | None = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        flusher: JournalFlusher | None = None,
+        flush_timeout: float | None = None,
+        state_cache: SessionStateCache | None = None,
+        transport: OpenRouterSession | None = None,
+        timer: PhaseTimer | None = None,
+        logger: LlmLogger | None = None,
+        metrics: LlmMetrics | None = None,
+    ) -> None:
+        self.client = client
+        self.state_cache = state_cache
+        self.timer = timer
+        self.logger = logger
+        self.metrics = metrics
+        self.api_key = api_key
+        self.write_options = write_options or WriteOptions()
+        self.max_attempts = max(1, max_attempts)
+        self.flusher = flusher
+        self.flush_timeout = flush_timeout
+        self._transport: OpenRouterSession | None = None
+        if llm is None:
+            if transport is None:
+                transport = OpenRouterSession(base_url or load_resource("llm/base_url.txt").strip(), api_key)
+            self._transport = transport
+            llm = transport.complete
+        self._llm = llm
+
+    def close(self) -> None:
+        """Release the pooled LLM connections."""
+
+        if self._transport is not None:
+            self._transport.close()
+
+    def process(
+        self,
+        request: MemoRequest,
+        *,
+        update: bool = False,
+        extra_ops: ExtraOps = (),
+        initial_state: SessionState | None = None,
+    ) -> MemoResult:
+        """Process ``request``; with ``update``, ``extra_ops`` are committed atomically with the notes.
+
+        ``initial_state`` is a session state the caller already loaded; it is
+        used for the first attempt instead of reading the session again. With
+        a write-behind ``flusher`` it must have been read after the session's
+        journal entries were flushed, as every other load here waits for them.
+        A callable ``extra_ops`` is called right before each commit, so its
+        ops can carry preconditions read at that point; exceptions it raises
+        propagate.
+        """
+
+        responses: dict[str, str] | None = None
+        calls: dict[str, tuple[float, Mapping[str, Any] | None]] = {}
+        basis: SessionState | None = None
+        llm_calls = 0
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt == 1 and initial_state is not None:
+                state = initial_state
+            else:
+                with self._phase("session_load"):
+                    state = self._load(request.session_id, fresh=attempt > 1)
+            aspects = _Aspects.resolve(request, state.session)
+            with self._phase("prompt"):
+                processor = self._processor(state, request)
+                requests = processor.prepare_requests(
+                    request.memo,
+                    process_todos=aspects.todos,
+                    process_appointments=aspects.appointments,
+                    process_thoughts=aspects.thoughts,
+                )
+            if responses is not None and (
+                set(responses) != set(requests) or _needs_reprocess(basis, state, aspects)
+            ):
+                responses = None
+            if responses is None:
+                responses = {}
+                with self._phase("llm"):
+                    for aspect, payload in requests.items():
+                        started = time.perf_counter()
+                        try:
+                            reply = _as_reply(self._llm(payload))
+                        except Exception as exc:
+                            _observe_failure(self.metrics, processor, aspect, started, exc)
+                            raise
+                        calls[aspect] = _observe_reply(self.metrics, processor, aspect, started, reply)
+                        responses[aspect] = json.dumps(reply.content)
+                        llm_calls += 1
+                basis = state
+            with self._phase("parse"):
+                for aspect, body in responses.items():
+                    # Only the attempt that made the call reports latency and usage; replays log none.
+                    latency, usage = calls.pop(aspect, (None, None))
+                    processor.ingest_response(aspect, body, latency=latency, usage=usage)
+                summary = processor.summary()
+            if not update:
+                return MemoResult(summary, processor.logger, attempts=attempt, llm_calls=llm_calls)
+            try:
+                with self._phase("write"):
+                    saved = self._write(state, summary, aspects, extra_ops)
+            except WriteConflict:
+                continue
+            except WriteTooLarge as exc:
+                raise PipelineError(f"Session '{request.session_id}': {exc}; use --write-behind") from exc
+            if self.state_cache is not None:
+                self.state_cache.refresh(request.session_id)
+            return MemoResult(
+                saved,
+                processor.logger,
+                written=self.flusher is None,
+                journaled=self.flusher is not None,
+                attempts=attempt,
+                llm_calls=llm_calls,
+            )
+        raise PipelineError(
+            f"Session '{request.session_id}' kept changing; gave up after {self.max_attempts} attempts"
+        )
+
+    def _phase(self, name: str) -> Any:
+        return phase(name) if self.timer is None else self.timer.phase(name)
+
+    def _load(self, session_id: str, *, fresh: bool) -> SessionState:
+        if self.flusher is not None and not self.flusher.wait_for_session(session_id, self.flush_timeout):
+            reason = self.flusher.last_error or "timed out"
+            raise PipelineError(f"Journaled writes for session '{session_id}' are not flushed yet ({reason})")
+        if self.state_cache is None:
+            return load_session_state(self.client, session_id)
+        if fresh:
+            self.state_cache.invalidate(session_id)
+        return self.state_cache.get(session_id)
+
+    def _processor(self, state: SessionState, request: MemoRequest) -> MemoProcessor:
+        return _new_processor(self.api_key, state, request, self.logger)
+
+    def _write(
+        self,
+        state: SessionState,
+        summary: MemoSummary,
+        aspects: _Aspects,
+        extra_ops: ExtraOps = (),
+    ) -> MemoSummary:
+        ops, saved = _plan_writes(self.client, state, summary, aspects, self.write_options, extra_ops)
+        guard = state.guard()
+        if self.flusher is None:
+            apply_writes(self.client, ops, guard=guard)
+        else:
+            self.flusher.journal.append(state.session.id, [*ops, guard.bump_op()])
+            self.flusher.notify()
+        return saved
+
+
+def _as_reply(result: Mapping[str, Any] | LlmReply) -> LlmReply:
+    return result if isinstance(result, LlmReply) else LlmReply(result)
+
+
+def _observe_reply(
+    metrics: LlmMetrics | None, processor: MemoProcessor, aspect: str, started: float, reply: LlmReply
+) -> tuple[float, Mapping[str, Any] | None]:
+    latency = time.perf_counter() - started
+    if metrics is not None:
+        metrics.observe(
+            processor.model,
+            processor.aspect_name(aspect),
+            latency,
+            usage=reply.usage,
+            attempts=reply.attempts,
+            response_bytes=reply.response_bytes,
+        )
+    return latency, reply.usage
+
+
+def _observe_failure(
+    metrics: LlmMetrics | None, processor: MemoProcessor, aspect: str, started: float, exc: BaseException
+) -> None:
+    if metrics is not None:
+        metrics.observe_error(
+            processor.model,
+            processor.aspect_name(aspect),
+            time.perf_counter() - started,
+            attempts=getattr(exc, "attempts", 1),
+        )
+
+
+def _new_processor(
+    api_key: str, state: SessionState, request: MemoRequest, logger: LlmLogger | None = None
+) -> MemoProcessor:
+    processor = MemoProcessor(
+        api_key=api_key,
+        locale=state.locale,
+        tag_catalog=state.tag_catalog,
+        tag_catalog_snapshot=state.tag_snapshot,
+        logger=logger if logger is not None else LlmLogger(),
+    )
+    model_override = request.model or state.session.settings.model
+    if model_override:
+        processor.model = model_override
+    processor.initialize(state.summary)
+    return processor
+
+
+def _plan_writes(
+    client: Any,
+    state: SessionState,
+    summary: MemoSummary,
+    aspects: _Aspects,
+    options: WriteOptions,
+    extra_ops: ExtraOps = (),
+    reads: SummaryReads | None = None,
+) -> tuple[list[WriteOp], MemoSummary]:
+    previous = state.summary.thought_document
+    ops, saved = plan_summary_writes(
+        client.collection(SESSIONS_COLLECTION).document(state.session.id),
+        summary,
+        save_todos=aspects.todos,
+        save_appointments=aspects.appointments,
+        save_thoughts=aspects.thoughts,
+        thought_layout=options.thought_layout,
+        previous_thoughts=previous.markdown_body if previous else None,
+        history_interval=options.history_interval,
+        compress_threshold=options.compress_threshold,
+        thought_encoding=options.thought_encoding,
+        reads=reads,
+    )
+    ops.extend(extra_ops() if callable(extra_ops) else extra_ops)
+    return ops, saved
+
+
+def _needs_reprocess(basis: SessionState | None, current: SessionState, aspects: _Aspects) -> bool:
+    """Whether replaying stored responses onto ``current`` would drop concurrent edits.
+
+    Todo responses are merged by note ID, so they rebase cleanly. Appointment
+    and thought responses replace their whole aspect, so a concurrent change
+    to those inputs requires asking the model again.
+    """
+
+    if basis is None:
+        return True
+    if aspects.thoughts and _thought_markdown(basis) != _thought_markdown(current):
+        return True
+    if aspects.appointments and _appointment_keys(basis) != _appointment_keys(current):
+        return True
+    return False
+
+
+def _thought_markdown(state: SessionState) -> str:
+    document = state.summary.thought_document
+    return document.markdown_body if document else state.summary.thoughts
+
+
+def _appointment_keys(state: SessionState) -> list[tuple[str, str, str]]:
+    return sorted((item.text, item.datetime, item.location) for item in state.summary.appointment_items)
+
+
+__all__ = [
+    "DEFAULT_MAX_ATTEMPTS",
+    "ExtraOps",
+    "LlmCall",
+    "MemoPipeline",
+    "MemoRequest",
+    "MemoResult",
+    "PipelineError",
+    "SessionState",
+    "WriteOptions",
+    "build_session_state",
+    "load_session_state",
+]
@@ -0,0 +1,266 @@
+"""Opt-in profiling shared by the scripts.
+
+:func:`add_profile_arguments` gives a script ``--profile PREFIX``;
+:func:`profiled` wraps the run. Without ``--profile`` it does nothing, and
+:func:`notes_tools.timing.phase` stays a shared no-op. With it, a
+:class:`~notes_tools.timing.PhaseTimer` collects every named phase (Firestore
+streams, parsing, prompt building, LLM calls, writes...) and, depending on
+``--profiler``, one of these profilers runs as well:
+
+``cprofile`` (default)
+    Deterministic profile of the main thread, written to ``PREFIX.pstats``
+    (``python -m pstats``, snakeviz...). ``PREFIX.collapsed`` folds the
+    call graph into stacks by splitting each function's time over its
+    callers, which is an approximation for functions reached from several
+    places.
+``sample``
+    Samples the stacks of every thread each ``--profile-interval``
+    milliseconds; ``PREFIX.collapsed`` holds the exact sampled stacks.
+``phases``
+    Phase spans only.
+
+The ``.collapsed`` files use the folded format (``frame;frame;frame count``)
+read by flamegraph.pl, speedscope and inferno. ``PREFIX.phases.json`` holds the
+phase spans and per-phase totals, which are also printed to stderr.
+
+``--firestore-usage`` (or ``--firestore-usage-file PATH``) meters the
+Firestore clients the run creates (see :mod:`notes_tools.firestore_usage`)
+and prints the read/write/delete cost report by collection and phase to
+stderr at exit (or writes it to ``PATH``, as JSON for a ``.json`` path).
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+from .codec import JSON
+from .firestore_usage import FirestoreUsage, activate_usage
+from .timing import PhaseTimer, activate
+
+PROFILERS = ("cprofile", "sample", "phases")
+DEFAULT_SAMPLE_INTERVAL_MS = 5.0
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("profiling")
+    group.add_argument(
+        "--profile",
+        dest="profile",
+        type=Path,
+        default=None,
+        metavar="PREFIX",
+        help=(
+            "Time named phases and profile the run, writing PREFIX.phases.json, PREFIX.pstats "
+            "and PREFIX.collapsed (flame graph input)"
+        ),
+    )
+    group.add_argument(
+        "--profiler",
+        dest="profiler",
+        choices=PROFILERS,
+        default="cprofile",
+        help=(
+            "cprofile: deterministic, main thread only; sample: stack sampling of all threads; "
+            "phases: phase timings only (default: %(default)s)"
+        ),
+    )
+    group.add_argument(
+        "--profile-interval",
+        dest="profile_interval",
+        type=float,
+        default=DEFAULT_SAMPLE_INTERVAL_MS,
+        metavar="MS",
+        help="Sampling interval for --profiler sample (default: %(default)s ms)",
+    )
+    group.add_argument(
+        "--firestore-usage",
+        dest="firestore_usage",
+        action="store_true",
+        help="Count Firestore reads, writes, deletes, RPCs and bytes per collection and phase; print the cost at exit",
+    )
+    group.add_argument(
+        "--firestore-usage-file",
+        dest="firestore_usage_file",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="Write the Firestore usage report to PATH instead (JSON for a .json path)",
+    )
+
+
+def _label(filename: str, line: int, name: str) -> str:
+    if filename == "~":  # builtins, e.g. "<method 'join' of 'str' objects>"
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class StackSampler:
+    """Counts the stacks of every other thread, rooted at the thread name, every ``interval`` seconds."""
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL_MS / 1000) -> None:
+        self.interval = max(interval, 0.0001)
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._labels: dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        labels = self._labels
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _label(code.co_filename, code.co_firstlineno, code.co_name)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> list[str]:
+        return [f"{stack} {count}" for stack, count in sorted(self.stacks.items())]
+
+
+def collapse_stats(stats: Any, *, unit: float = 1e-6) -> list[str]:
+    """Fold a :class:`pstats.Stats` call graph into stacks weighted in ``unit`` seconds.
+
+    Starting from the functions nobody called, each function's own time is
+    attributed to the current stack in proportion to the share of its
+    cumulative time that arrived through the edge being followed. Recursive
+    edges are not followed and shares below one ``unit`` are dropped.
+    """
+
+    raw = stats.stats  # function -> (primitive calls, calls, own time, cumulative time, callers)
+    callees: dict[Any, list[tuple[Any, float]]] = {}
+    for function, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+    folded: Counter[str] = Counter()
+    pending = [(function, entry[3], (), frozenset()) for function, entry in raw.items() if not entry[4]]
+    while pending:
+        function, share, path, active = pending.pop()
+        _, _, own, cumulative, _ = raw[function]
+        fraction = min(1.0, share / cumulative) if cumulative else 0.0
+        stack = (*path, _label(*function))
+        weight = int(own * fraction / unit)
+        if weight:
+            folded[";".join(stack)] += weight
+        active = active | {function}
+        for callee, edge_time in callees.get(function, ()):
+            if callee not in active and edge_time * fraction >= unit:
+                pending.append((callee, edge_time * fraction, stack, active))
+    return [f"{stack} {count}" for stack, count in sorted(folded.items())]
+
+
+def _write_lines(path: Path, lines: list[str]) -> None:
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+@contextmanager
+def profiled(args: argparse.Namespace) -> Iterator[PhaseTimer | None]:
+    """Profile the enclosed run as configured by :func:`add_profile_arguments`.
+
+    Yields the active timer, or ``None`` when neither ``--profile`` nor
+    Firestore accounting was requested.
+    """
+
+    prefix: Path | None = getattr(args, "profile", None)
+    usage_target: str | Path | None = getattr(args, "firestore_usage_file", None)
+    if usage_target is None and getattr(args, "firestore_usage", False):
+        usage_target = "-"
+    if prefix is None and usage_target is None:
+        yield None
+        return
+    kind = getattr(args, "profiler", "cprofile") if prefix is not None else "phases"
+    timer = PhaseTimer()
+    usage = FirestoreUsage() if usage_target is not None else None
+    profile: Any = None
+    sampler: StackSampler | None = None
+    if kind == "cprofile":
+        import cProfile
+
+        profile = cProfile.Profile()
+    elif kind == "sample":
+        sampler = StackSampler(getattr(args, "profile_interval", DEFAULT_SAMPLE_INTERVAL_MS) / 1000)
+        sampler.start()
+    try:
+        with ExitStack() as stack:
+            stack.enter_context(activate(timer))
+            if usage is not None:
+                stack.enter_context(activate_usage(usage))
+            if profile is not None:
+                profile.enable()
+            try:
+                yield timer
+            finally:
+                if profile is not None:
+                    profile.disable()
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if prefix is not None:
+            written = _write_profile(prefix.expanduser(), timer, profile, sampler)
+            if timer.phases:
+                print(timer.format_totals(), file=sys.stderr)
+            print("profile written to " + ", ".join(str(path) for path in written), file=sys.stderr)
+        if usage is not None and usage_target is not None:
+            usage.report(usage_target)
+
+
+def _write_profile(prefix: Path, timer: PhaseTimer, profile: Any, sampler: StackSampler | None) -> list[Path]:
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+    written = [prefix.with_name(prefix.name + ".phases.json")]
+    report = timer.to_map()
+    report["totals"] = [
+        {"name": name, "count": count, "total_ms": round(seconds * 1000, 1)} for name, count, seconds in timer.totals()
+    ]
+    written[0].write_text(JSON.dumps(report, indent=True) + "\n", encoding="utf-8")
+    collapsed: list[str] | None = None
+    if profile is not None:
+        import pstats
+
+        stats_path = prefix.with_name(prefix.name + ".pstats")
+        profile.dump_stats(stats_path)
+        written.append(stats_path)
+        collapsed = collapse_stats(pstats.Stats(profile))
+    elif sampler is not None:
+        collapsed = sampler.collapsed()
+    if collapsed is not None:
+        collapsed_path = prefix.with_name(prefix.name + ".collapsed")
+        _write_lines(collapsed_path, collapsed)
+        written.append(collapsed_path)
+    return written
+
+
+__all__ = [
+    "DEFAULT_SAMPLE_INTERVAL_MS",
+    "PROFILERS",
+    "StackSampler",
+    "add_profile_arguments",
+    "collapse_stats",
+    "profiled",
+]
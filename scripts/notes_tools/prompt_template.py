@@ -0,0 +1,62 @@
+"""Prompt templates compiled into literal and placeholder segments.
+
+Placeholders are ``{name}`` with a lowercase identifier; any other brace is
+literal text. Rendering joins the segments in one pass, so its cost is linear
+in the output and substituted values are never scanned for placeholders (a
+memo containing ``{today}`` stays as written).
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, Mapping
+
+PLACEHOLDER = re.compile(r"\{([a-z_][a-z0-9_]*)\}")
+
+
+class PromptTemplateError(ValueError):
+    """Raised for unknown placeholders at compile time or missing values at render time."""
+
+
+@dataclass(frozen=True, slots=True)
+class PromptTemplate:
+    name: str
+    literals: tuple[str, ...]
+    fields: tuple[str, ...]
+
+    @classmethod
+    def compile(cls, text: str, allowed: Iterable[str] | None = None, *, name: str = "template") -> "PromptTemplate":
+        """Split ``text`` into segments; ``allowed`` lists the placeholders it may use."""
+
+        literals: list[str] = []
+        fields: list[str] = []
+        position = 0
+        for match in PLACEHOLDER.finditer(text):
+            literals.append(text[position:match.start()])
+            fields.append(match.group(1))
+            position = match.end()
+        literals.append(text[position:])
+        if allowed is not None:
+            unknown = sorted(set(fields) - set(allowed))
+            if unknown:
+                names = ", ".join("{" + field + "}" for field in unknown)
+                raise PromptTemplateError(f"{name}: unknown placeholder(s) {names}")
+        return cls(name, tuple(literals), tuple(fields))
+
+    @property
+    def placeholders(self) -> frozenset[str]:
+        return frozenset(self.fields)
+
+    def render(self, values: Mapping[str, str]) -> str:
+        parts = [self.literals[0]]
+        try:
+            for field, literal in zip(self.fields, self.literals[1:]):
+                parts.append(values[field])
+                parts.append(literal)
+        except KeyError as exc:
+            raise PromptTemplateError(f"{self.name}: no value for {{{exc.args[0]}}}") from None
+        return "".join(parts)
+
+
+__all__ = ["PLACEHOLDER", "PromptTemplate", "PromptTemplateError"]
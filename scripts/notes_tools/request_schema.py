@@ -0,0 +1,125 @@
+"""Response schemas compiled once per aspect and tag catalog.
+
+A :class:`CompiledSchema` is the aspect's ``json_schema`` object with the tag
+enumeration already applied, frozen so it can be shared by every request and
+processor, and serialised once. :func:`encode_payload` splices that
+serialisation into the request body instead of encoding the schema again.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Iterable, Mapping, NoReturn
+
+TAG_ENUM_PATH = ("properties", "items", "items", "properties", "tags", "items")
+
+
+class FrozenDict(dict):
+    """A ``dict`` that refuses mutation; ``json`` still encodes it as an object."""
+
+    __slots__ = ()
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise TypeError("compiled schemas are shared and read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly  # type: ignore[assignment]
+    clear = pop = popitem = setdefault = update = _readonly  # type: ignore[assignment]
+
+    def __copy__(self) -> dict[str, Any]:
+        return dict(self)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> dict[str, Any]:
+        return json.loads(json.dumps(self))
+
+    def __reduce__(self) -> Any:
+        return (dict, (dict(self),))
+
+
+class FrozenList(list):
+    """A ``list`` that refuses mutation, so frozen arrays still compare equal to lists."""
+
+    __slots__ = ()
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise TypeError("compiled schemas are shared and read-only")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly  # type: ignore[assignment]
+    append = clear = extend = insert = pop = remove = reverse = sort = _readonly  # type: ignore[assignment]
+
+    def __copy__(self) -> list[Any]:
+        return list(self)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> list[Any]:
+        return json.loads(json.dumps(self))
+
+    def __reduce__(self) -> Any:
+        return (list, (list(self),))
+
+
+def freeze(value: Any) -> Any:
+    """Deep-freeze parsed JSON into :class:`FrozenDict` objects and :class:`FrozenList` arrays."""
+
+    if isinstance(value, Mapping):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+class CompiledSchema(FrozenDict):
+    """A frozen ``json_schema`` object carrying its own serialisations."""
+
+    __slots__ = ("json", "ascii_json")
+
+    def __init__(self, schema: Mapping[str, Any]) -> None:
+        super().__init__((key, freeze(value)) for key, value in schema.items())
+        self.json = json.dumps(self, ensure_ascii=False)
+        self.ascii_json = json.dumps(self)
+
+
+def compile_schema(schema: Mapping[str, Any], tag_ids: Iterable[str] | None = None) -> CompiledSchema:
+    """Compile ``schema``; with ``tag_ids`` set, restrict the note tags to that enumeration.
+
+    An empty ``tag_ids`` drops any enumeration (and pattern) so every tag is
+    accepted; ``None`` leaves the schema as it is.
+    """
+
+    if tag_ids is None:
+        return CompiledSchema(schema)
+    copy = json.loads(json.dumps(schema))
+    target = copy.get("schema")
+    if not isinstance(target, dict):
+        target = copy
+    cursor: Any = target
+    for segment in TAG_ENUM_PATH[:-1]:
+        cursor = cursor.get(segment) if isinstance(cursor, dict) else None
+    final = cursor.get(TAG_ENUM_PATH[-1]) if isinstance(cursor, dict) else None
+    if isinstance(final, dict):
+        final.pop("pattern", None)
+        ids = list(tag_ids)
+        if ids:
+            final["enum"] = ids
+        else:
+            final.pop("enum", None)
+    return CompiledSchema(copy)
+
+
+def encode_payload(payload: Mapping[str, Any], *, ensure_ascii: bool = True) -> str:
+    """``json.dumps(payload)``, reusing the serialisation of a compiled ``json_schema``."""
+
+    response_format = payload.get("response_format")
+    schema = response_format.get("json_schema") if isinstance(response_format, dict) else None
+    if not isinstance(schema, CompiledSchema):
+        return json.dumps(payload, ensure_ascii=ensure_ascii)
+    rest = {key: value for key, value in payload.items() if key != "response_format"}
+    options = {key: value for key, value in response_format.items() if key != "json_schema"}
+    fragment = schema.ascii_json if ensure_ascii else schema.json
+    head = json.dumps(rest, ensure_ascii=ensure_ascii)[:-1]
+    inner = json.dumps(options, ensure_ascii=ensure_ascii)[:-1]
+    return (
+        f'{head}{", " if rest else ""}"response_format": '
+        f'{inner}{", " if options else ""}"json_schema": {fragment}}}}}'
+    )
+
+
+__all__ = ["CompiledSchema", "FrozenDict", "FrozenList", "compile_schema", "encode_payload", "freeze"]
@@ -0,0 +1,185 @@
+"""Process-wide cache of LLM resource files and the values parsed from them.
+
+Entries are keyed by resource root and normalised path. A cached file is
+re-``stat``-ed at most once per ``check_interval``; when its size or mtime
+changed it is read again and its content hash decides whether it really
+changed, so touching a file (or a checkout that rewrites it unchanged) keeps
+everything parsed from it. Parsed values (JSON, prompt bundles, model lists)
+are registered through :meth:`ResourceCache.derive` and rebuilt only when one
+of the files they came from changed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Any, Callable, TypeVar
+
+RESOURCE_ROOT = Path(__file__).resolve().parents[2] / "app" / "src" / "main" / "resources" / "llm"
+DEFAULT_CHECK_INTERVAL = 1.0
+DEFAULT_MAX_DERIVED = 1024
+
+T = TypeVar("T")
+
+
+def resource_path(path: str, root: Path | None = None) -> Path:
+    """Resolve ``path`` (optionally prefixed with ``llm/``) below ``root``, rejecting ``..``."""
+
+    trimmed = path.strip()
+    if not trimmed:
+        raise ValueError("Empty resource path")
+    normalized = trimmed.lstrip("/")
+    if normalized.startswith("llm/"):
+        normalized = normalized[4:]
+    candidate = PurePosixPath(normalized)
+    if any(part == ".." for part in candidate.parts):
+        raise ValueError(f"Invalid resource path: {path}")
+    base = root or RESOURCE_ROOT
+    return base.joinpath(*candidate.parts)
+
+
+@dataclass(slots=True)
+class _Entry:
+    text: str | None  # None when the file does not exist
+    digest: bytes
+    stamp: tuple[int, int] | None
+    checked_at: float
+    version: int
+
+
+@dataclass(slots=True)
+class ResourceCacheStats:
+    reads: int = 0
+    reloads: int = 0
+    builds: int = 0
+
+    def to_map(self) -> dict[str, int]:
+        return {"reads": self.reads, "reloads": self.reloads, "builds": self.builds}
+
+
+class ResourceCache:
+    """Thread-safe cache of resource texts and values derived from them.
+
+    Lookups of fresh entries take no lock (single dict reads are atomic), so
+    a hit costs a couple of dictionary lookups. ``check_interval`` bounds how
+    stale a cached file may be; ``0`` checks on every access and
+    ``float("inf")`` never looks at the filesystem again once a file has been
+    read. At most ``max_derived`` derived values are kept (oldest evicted
+    first), since their names may embed per-session keys such as a tag catalog
+    fingerprint.
+    """
+
+    def __init__(
+        self,
+        *,
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+        max_derived: int = DEFAULT_MAX_DERIVED,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.check_interval = check_interval
+        self.max_derived = max(1, max_derived)
+        self.stats = ResourceCacheStats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[Path | None, str], _Entry] = {}
+        self._derived: dict[tuple[Any, ...], tuple[tuple[int, ...], Any]] = {}
+
+    def load(self, path: str, root: Path | None = None) -> str:
+        """Return the text of ``path``; raises ``FileNotFoundError`` like a plain read."""
+
+        entry = self._entry(path, root)
+        if entry.text is None:
+            raise FileNotFoundError(f"Resource not found: {resource_path(path, root)}")
+        return entry.text
+
+    def derive(
+        self,
+        name: str,
+        paths: tuple[str, ...],
+        build: Callable[..., T],
+        root: Path | None = None,
+    ) -> T:
+        """Return ``build(*texts)`` for ``paths``, cached until one of the files changes.
+
+        ``name`` identifies the kind of value, so one file can back several
+        derived values (its text parsed as JSON, a list of ids...). A missing
+        file raises ``FileNotFoundError`` before ``build`` is called.
+        """
+
+        entries = [self._entry(path, root) for path in paths]
+        versions = tuple(entry.version for entry in entries)
+        key = (root, name, paths)
+        cached = self._derived.get(key)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+        texts = []
+        for path, entry in zip(paths, entries):
+            if entry.text is None:
+                raise FileNotFoundError(f"Resource not found: {resource_path(path, root)}")
+            texts.append(entry.text)
+        value = build(*texts)
+        with self._lock:
+            self._derived.pop(key, None)
+            self._derived[key] = (versions, value)
+            while len(self._derived) > self.max_derived:
+                del self._derived[next(iter(self._derived))]
+            self.stats.builds += 1
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._derived.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _entry(self, path: str, root: Path | None) -> _Entry:
+        key = (root, path)
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.checked_at < self.check_interval:
+            return entry
+        target = resource_path(path, root)
+        try:
+            stat = os.stat(target)
+            stamp: tuple[int, int] | None = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if entry is not None and entry.stamp == stamp:
+            entry.checked_at = now
+            return entry
+        text = target.read_text(encoding="utf-8") if stamp is not None else None
+        digest = hashlib.blake2b((text or "").encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            self.stats.reads += 1
+            current = self._entries.get(key)
+            if current is not None and current.digest == digest and (current.text is None) == (text is None):
+                current.stamp, current.checked_at = stamp, now
+                return current
+            version = 0
+            if current is not None:
+                version = current.version + 1
+                self.stats.reloads += 1
+            entry = _Entry(text, digest, stamp, now, version)
+            self._entries[key] = entry
+            return entry
+
+
+RESOURCES = ResourceCache()
+
+
+__all__ = [
+    "DEFAULT_CHECK_INTERVAL",
+    "DEFAULT_MAX_DERIVED",
+    "RESOURCES",
+    "RESOURCE_ROOT",
+    "ResourceCache",
+    "ResourceCacheStats",
+    "resource_path",
+]
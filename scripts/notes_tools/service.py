@@ -0,0 +1,221 @@
+"""Long-running HTTP front end for the memo pipeline.
+
+The service keeps one :class:`~notes_tools.pipeline.MemoPipeline` warm: the
+Firestore client, pooled LLM connections, parsed prompts and schemas, and a
+:class:`~notes_tools.session_cache.SessionStateCache` of recently used
+sessions with their compiled tag catalogs. Prompt and schema files are
+re-read when they change on disk.
+
+Endpoints (JSON in, JSON out):
+
+``POST /memos``
+    Body ``{"session_id": ..., "memo": ..., "aspects"?: ..., "model"?: ...}``
+    using the same record format as ``process_memo.py --batch``.
+``GET /healthz``
+    Liveness plus counters for processed memos and the session cache.
+``GET /metrics``
+    LLM call metrics in the Prometheus text format, or as JSON with
+    ``?format=json``; only when the pipeline records metrics.
+
+The server listens on ``HOST:PORT`` or, with a ``unix:`` prefix, on a Unix
+domain socket.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socketserver
+import threading
+import time
+import urllib.parse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Mapping
+
+from .batch import STATUS_OK, BatchOutcome, BatchRecordError, SessionLocks, parse_batch_record
+from .defaults import DEFAULT_ADDRESS
+from .memo_processing import clear_resource_caches, resource_fingerprint
+from .openrouter import LlmRequestError
+from .pipeline import MemoPipeline, MemoRequest, PipelineError
+
+UNIX_PREFIX = "unix:"
+MAX_BODY_BYTES = 1 << 20
+RESOURCE_CHECK_INTERVAL = 1.0
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MemoService:
+    """Processes submitted memos on a shared pipeline, one memo per session at a time."""
+
+    def __init__(
+        self,
+        pipeline: MemoPipeline,
+        *,
+        update: bool = False,
+        defaults: MemoRequest | None = None,
+        serialize: Callable[[Any], Any] | None = None,
+        resource_root: Path | None = None,
+        resource_check_interval: float = RESOURCE_CHECK_INTERVAL,
+    ) -> None:
+        self.pipeline = pipeline
+        self.update = update
+        self.defaults = defaults
+        self.serialize = serialize
+        self.resource_root = resource_root
+        self.resource_check_interval = resource_check_interval
+        self.started_at = time.time()
+        self.processed = 0
+        self.failed = 0
+        self.resource_reloads = 0
+        self._lock = threading.Lock()
+        self._session_locks = SessionLocks()
+        self._fingerprint = resource_fingerprint(resource_root)
+        self._checked_at = time.monotonic()
+
+    def submit(self, body: bytes) -> tuple[int, dict[str, Any]]:
+        """Handle one ``POST /memos`` body; returns the HTTP status and response payload."""
+
+        try:
+            record = parse_batch_record(body.decode("utf-8"), 0, defaults=self.defaults)
+        except (BatchRecordError, UnicodeDecodeError) as exc:
+            return HTTPStatus.BAD_REQUEST, {"status": "error", "error": str(exc)}
+        self.reload_resources_if_changed()
+
+        request = record.request
+        started = time.perf_counter()
+        outcome = BatchOutcome(0, request.session_id, STATUS_OK)
+        code = HTTPStatus.OK
+        with self._session_locks.hold(request.session_id):
+            waited = time.perf_counter()
+            try:
+                outcome.result = self.pipeline.process(request, update=self.update)
+            except PipelineError as exc:
+                code, outcome.status, outcome.error = HTTPStatus.UNPROCESSABLE_ENTITY, "error", str(exc)
+            except LlmRequestError as exc:
+                code, outcome.status, outcome.error = HTTPStatus.BAD_GATEWAY, "error", str(exc)
+            except Exception as exc:  # keep serving; report the failure to this caller
+                code, outcome.status = HTTPStatus.INTERNAL_SERVER_ERROR, "error"
+                outcome.error = f"{type(exc).__name__}: {exc}"
+        outcome.queued_ms = (waited - started) * 1000
+        outcome.elapsed_ms = (time.perf_counter() - waited) * 1000
+        with self._lock:
+            self.processed += 1
+            if outcome.status != STATUS_OK:
+                self.failed += 1
+        payload = outcome.to_map(self.serialize)
+        payload.pop("line", None)
+        return code, payload
+
+    def health(self) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "status": "ok",
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "processed": self.processed,
+            "failed": self.failed,
+            "resource_reloads": self.resource_reloads,
+        }
+        cache = self.pipeline.state_cache
+        if cache is not None:
+            payload["session_cache"] = {
+                "size": len(cache),
+                "hits": cache.stats.hits,
+                "misses": cache.stats.misses,
+                "refreshes": cache.stats.refreshes,
+            }
+        return payload
+
+    def reload_resources_if_changed(self) -> bool:
+        """Drop cached prompts and schemas when files under the resource root changed."""
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.resource_check_interval:
+                return False
+            self._checked_at = now
+        fingerprint = resource_fingerprint(self.resource_root)
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return False
+            self._fingerprint = fingerprint
+            self.resource_reloads += 1
+        clear_resource_caches()
+        return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "DianaMemoService/1"
+    service: MemoService
+
+    def do_GET(self) -> None:
+        path, _, query = self.path.partition("?")
+        path = path.rstrip("/")
+        metrics = self.service.pipeline.metrics
+        if path == "/healthz":
+            self._respond(HTTPStatus.OK, self.service.health())
+        elif path == "/metrics" and metrics is not None:
+            if "json" in urllib.parse.parse_qs(query).get("format", []):
+                self._respond(HTTPStatus.OK, metrics.to_map())
+            else:
+                self._send(HTTPStatus.OK, metrics.to_prometheus().encode("utf-8"), PROMETHEUS_CONTENT_TYPE)
+        else:
+            self._respond(HTTPStatus.NOT_FOUND, {"status": "error", "error": "Not found"})
+
+    def do_POST(self) -> None:
+        if self.path.rstrip("/") != "/memos":
+            self._respond(HTTPStatus.NOT_FOUND, {"status": "error", "error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            self._respond(HTTPStatus.BAD_REQUEST, {"status": "error", "error": "Invalid Content-Length"})
+            return
+        code, payload = self.service.submit(self.rfile.read(length))
+        self._respond(code, payload)
+
+    def address_string(self) -> str:
+        # Unix socket peers have no (host, port) address.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _respond(self, code: int, payload: Mapping[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self._send(code, body, "application/json; charset=utf-8")
+
+    def _send(self, code: int, body: bytes, content_type: str) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(address: str, service: MemoService) -> socketserver.BaseServer:
+    """Bind ``HOST:PORT`` or ``unix:PATH`` and return a threaded HTTP server for ``service``."""
+
+    handler = type("MemoServiceHandler", (_Handler,), {"service": service})
+    if address.startswith(UNIX_PREFIX):
+        path = Path(address[len(UNIX_PREFIX):]).expanduser()
+        if path.is_socket():
+            path.unlink()
+        return _UnixHTTPServer(os.fspath(path), handler)
+    host, _, port = address.rpartition(":")
+    try:
+        port_number = int(port)
+    except ValueError as exc:
+        raise ValueError(f"Invalid listen address '{address}' (expected HOST:PORT or unix:PATH)") from exc
+    return ThreadingHTTPServer((host or "127.0.0.1", port_number), handler)
+
+
+__all__ = ["DEFAULT_ADDRESS", "MemoService", "make_server"]
@@ -0,0 +1,133 @@
+"""LRU cache of loaded session states for long-running memo processing.
+
+Loading a session streams every note, which dominates the non-LLM cost of a
+memo. Cached states are revalidated with a single read of the session
+document: a hit requires an unchanged ``notesVersion`` and update time, which
+every guarded pipeline write bumps. Clients that edit notes without touching
+the session document (such as the Android app) are only picked up once an
+entry is older than ``ttl`` seconds, so keep the TTL short.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from .defaults import DEFAULT_MAX_SESSIONS, DEFAULT_TTL
+from .pipeline import SessionState, load_session_state
+from .session_writes import SESSION_VERSION_FIELD, SESSIONS_COLLECTION
+
+
+@dataclass(slots=True)
+class _Entry:
+    state: SessionState
+    loaded_at: float
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+
+
+class SessionStateCache:
+    """Thread-safe LRU of :class:`~notes_tools.pipeline.SessionState` values."""
+
+    def __init__(
+        self,
+        client: Any,
+        *,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        ttl: float = DEFAULT_TTL,
+    ) -> None:
+        self.client = client
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._refresher: ThreadPoolExecutor | None = None
+
+    def get(self, session_id: str) -> SessionState:
+        """Return the session state, reloading notes only if the session changed."""
+
+        document = self.client.collection(SESSIONS_COLLECTION).document(session_id).get()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and self._is_current(entry, document):
+                self._entries.move_to_end(session_id)
+                self.stats.hits += 1
+                return entry.state
+            self.stats.misses += 1
+        state = load_session_state(self.client, session_id, document)
+        self._store(session_id, state)
+        return state
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def retain(self, keep: Callable[[str], bool]) -> int:
+        """Drop every cached session for which ``keep`` is false; returns how many were dropped."""
+
+        with self._lock:
+            dropped = [session_id for session_id in self._entries if not keep(session_id)]
+            for session_id in dropped:
+                del self._entries[session_id]
+        return len(dropped)
+
+    def refresh(self, session_id: str) -> None:
+        """Drop ``session_id`` and reload it in the background for the next memo."""
+
+        self.invalidate(session_id)
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-refresh")
+            refresher = self._refresher
+            self.stats.refreshes += 1
+        refresher.submit(self._reload, session_id)
+
+    def close(self) -> None:
+        with self._lock:
+            refresher, self._refresher = self._refresher, None
+        if refresher is not None:
+            refresher.shutdown(wait=True)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _reload(self, session_id: str) -> None:
+        try:
+            state = load_session_state(self.client, session_id)
+        except Exception:  # the next get() reloads and reports the error
+            return
+        self._store(session_id, state)
+
+    def _store(self, session_id: str, state: SessionState) -> None:
+        with self._lock:
+            current = self._entries.get(session_id)
+            if current is not None and current.state.version > state.version:
+                return
+            self._entries[session_id] = _Entry(state, time.monotonic())
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def _is_current(self, entry: _Entry, document: Any) -> bool:
+        if not document.exists or time.monotonic() - entry.loaded_at > self.ttl:
+            return False
+        data = document.to_dict() or {}
+        try:
+            version = int(data.get(SESSION_VERSION_FIELD, 0) or 0)
+        except (TypeError, ValueError):
+            return False
+        return version == entry.state.version and getattr(document, "update_time", None) == entry.state.update_time
+
+
+__all__ = ["DEFAULT_MAX_SESSIONS", "DEFAULT_TTL", "CacheStats", "SessionStateCache"]
@@ -0,0 +1,417 @@
+"""Plan and apply the Firestore writes that persist a processed memo summary.
+
+Writes are computed up front as a list of :class:`WriteOp` values with
+client-generated document IDs. That makes them serializable (for the
+write-behind journal) and idempotent: replaying the same ops after a partial
+failure converges to the same state instead of duplicating notes.
+
+Writers can pass a :class:`SessionGuard` to make the commit conditional on the
+session document being unchanged since it was loaded. A guarded commit is a
+single batch that also bumps the session's ``notesVersion``, so concurrent
+writers observe each other and a lost race (:class:`WriteConflict`) leaves
+nothing behind; writes that do not fit one batch raise :class:`WriteTooLarge`
+before anything is committed. Journaled writes cannot carry that
+precondition and bump the version with an :class:`Increment` instead.
+"""
+
+from __future__ import annotations
+
+import base64
+import functools
+import secrets
+import string
+from dataclasses import dataclass, replace
+from typing import Any, Iterable, Iterator, Mapping, Sequence
+
+from .notes import MemoSummary, TodoItem, structured_note_to_map, summary_to_notes
+from .thought_history import (
+    DEFAULT_SNAPSHOT_INTERVAL,
+    HISTORY_COLLECTION,
+    HistoryEntry,
+    ThoughtHistory,
+    plan_history_entry,
+    version_document_id,
+)
+from .thought_store import (
+    ENCODING_ZLIB,
+    LAYOUT_INLINE,
+    THOUGHT_DOCUMENT_ID,
+    plan_thought_document_writes,
+)
+
+SESSIONS_COLLECTION = "sessions"
+NOTES_COLLECTION = "notes"
+SESSION_VERSION_FIELD = "notesVersion"
+MAX_BATCH_WRITES = 400
+
+_AUTO_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def new_document_id() -> str:
+    """Return a random 20 character identifier in Firestore's auto-ID style."""
+
+    return "".join(secrets.choice(_AUTO_ID_ALPHABET) for _ in range(20))
+
+
+class WriteConflict(RuntimeError):
+    """Raised when a guarded commit loses against a concurrent session write."""
+
+
+class WriteTooLarge(ValueError):
+    """Raised when guarded writes would need more than one batch to commit."""
+
+
+@dataclass(frozen=True, slots=True)
+class Increment:
+    """Serializable stand-in for ``firestore.Increment`` in planned writes.
+
+    Batches built by :func:`iter_write_batches` swap it for the client's own
+    transform when ``google-cloud-firestore`` is installed.
+    """
+
+    value: int = 1
+
+
+@functools.cache
+def _native_increment() -> type | None:
+    try:
+        from google.cloud.firestore import Increment as FirestoreIncrement
+    except ModuleNotFoundError:
+        return None
+    return FirestoreIncrement
+
+
+def increment_amount(value: Any) -> int | float | None:
+    """Return how much ``value`` increments a field by, or ``None`` if it is not an increment."""
+
+    if isinstance(value, Increment):
+        return value.value
+    native = _native_increment()
+    if native is not None and isinstance(value, native):
+        return value.value
+    return None
+
+
+@dataclass(slots=True)
+class WriteOp:
+    """A document write addressed by its full path; ``data`` of ``None`` deletes.
+
+    With an ``update_time`` the write is an update of an existing document,
+    rejected (as a :class:`WriteConflict` of the whole batch) if the document
+    changed since that time. Journal entries cannot carry the precondition,
+    so :meth:`to_map` drops it.
+    """
+
+    path: tuple[str, ...]
+    data: dict[str, Any] | None
+    merge: bool = False
+    update_time: Any = None
+
+    @property
+    def document_path(self) -> str:
+        return "/".join(self.path)
+
+    def to_map(self) -> dict[str, Any]:
+        payload = {"path": list(self.path), "data": _encode_value(self.data)}
+        if self.merge:
+            payload["merge"] = True
+        return payload
+
+    @classmethod
+    def from_map(cls, data: Mapping[str, Any]) -> "WriteOp":
+        payload = _decode_value(data.get("data"))
+        return cls(tuple(str(part) for part in data.get("path", [])), payload, bool(data.get("merge", False)))
+
+
+@dataclass(slots=True)
+class SessionGuard:
+    """Precondition tying a commit to the session state that was read."""
+
+    session_id: str
+    version: int
+    update_time: Any = None
+
+    @property
+    def document_path(self) -> str:
+        return f"{SESSIONS_COLLECTION}/{self.session_id}"
+
+    def bump_op(self) -> WriteOp:
+        """Unconditional version bump, used when writes are deferred to the journal.
+
+        The bump is an increment rather than ``version + 1``: two memos
+        journaled from the same version must leave the session two versions
+        ahead, or a writer holding the first bump would miss the second.
+        """
+
+        return WriteOp(
+            (SESSIONS_COLLECTION, self.session_id),
+            {SESSION_VERSION_FIELD: Increment(1)},
+            merge=True,
+        )
+
+    def advance(self, results: Sequence[Any]) -> None:
+        """Move past a committed guarded batch; ``results`` are its write results."""
+
+        self.version += 1
+        self.update_time = getattr(results[0], "update_time", None) if results else None
+
+
+@dataclass(slots=True)
+class SummaryReads:
+    """Documents :func:`plan_summary_writes` would otherwise read itself.
+
+    Callers on the async Firestore client fetch them up front so planning
+    stays free of blocking I/O.
+    """
+
+    previous_thought: dict[str, Any] | None = None
+    history_head: HistoryEntry | None = None
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"__bytes__": base64.b64encode(bytes(value)).decode("ascii")}
+    if isinstance(value, Increment):
+        return {"__increment__": value.value}
+    if isinstance(value, Mapping):
+        return {str(key): _encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(item) for item in value]
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        if set(value) == {"__bytes__"}:
+            return base64.b64decode(value["__bytes__"])
+        if set(value) == {"__increment__"}:
+            return Increment(value["__increment__"])
+        return {key: _decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_value(item) for item in value]
+    return value
+
+
+def plan_summary_writes(
+    session_ref: Any,
+    summary: MemoSummary,
+    *,
+    save_todos: bool,
+    save_appointments: bool,
+    save_thoughts: bool,
+    thought_layout: str = LAYOUT_INLINE,
+    previous_thoughts: str | None = None,
+    history_interval: int | None = DEFAULT_SNAPSHOT_INTERVAL,
+    compress_threshold: int | None = None,
+    thought_encoding: str = ENCODING_ZLIB,
+    reads: SummaryReads | None = None,
+) -> tuple[list[WriteOp], MemoSummary]:
+    """Return the writes persisting ``summary`` and the summary as it will be saved.
+
+    The thought document header and history head are read from
+    ``session_ref`` (unless ``reads`` supplies them) so unchanged sections are
+    skipped and deltas can be chained; everything else is computed locally.
+    """
+
+    session_path = (SESSIONS_COLLECTION, session_ref.id)
+    notes_path = session_path + (NOTES_COLLECTION,)
+    ops: list[WriteOp] = []
+    saved_todos: list[TodoItem] = []
+    for note in summary_to_notes(summary, save_todos, save_appointments, save_thoughts):
+        payload = structured_note_to_map(note)
+        if isinstance(note, TodoItem):
+            note_id = note.note_id.strip() or new_document_id()
+            ops.append(WriteOp(notes_path + (note_id,), payload))
+            saved_todos.append(
+                TodoItem(
+                    text=note.text,
+                    status=note.status,
+                    tag_ids=list(note.tag_ids),
+                    tag_labels=list(note.tag_labels),
+                    due_date=note.due_date,
+                    event_date=note.event_date,
+                    note_id=note_id,
+                    created_at=note.created_at,
+                )
+            )
+        else:
+            ops.append(WriteOp(notes_path + (new_document_id(),), payload))
+
+    if save_thoughts and summary.thought_document is not None:
+        if reads is None:
+            previous = session_ref.collection(NOTES_COLLECTION).document(THOUGHT_DOCUMENT_ID).get()
+            previous_data = previous.to_dict() if previous.exists else None
+        else:
+            previous_data = reads.previous_thought
+        writes = plan_thought_document_writes(
+            summary.thought_document,
+            layout=thought_layout,
+            previous=previous_data,
+            compress_threshold=compress_threshold,
+            encoding=thought_encoding,
+        )
+        ops.extend(WriteOp(notes_path + write.path, write.data) for write in writes)
+        if history_interval:
+            entry = plan_history_entry(
+                summary.thought_document.markdown_body,
+                head=ThoughtHistory(session_ref).head() if reads is None else reads.history_head,
+                previous_markdown=previous_thoughts,
+                snapshot_interval=history_interval,
+            )
+            if entry is not None:
+                ops.append(
+                    WriteOp(
+                        session_path + (HISTORY_COLLECTION, version_document_id(entry.version)),
+                        entry.to_map(),
+                    )
+                )
+
+    if save_todos:
+        summary = MemoSummary(
+            todo=summary.todo,
+            appointments=summary.appointments,
+            thoughts=summary.thoughts,
+            todo_items=saved_todos,
+            appointment_items=summary.appointment_items,
+            thought_items=summary.thought_items,
+            thought_document=summary.thought_document,
+        )
+    return ops, summary
+
+
+def apply_writes(
+    client: Any,
+    ops: Sequence[WriteOp],
+    *,
+    guard: SessionGuard | None = None,
+    batch_size: int = MAX_BATCH_WRITES,
+) -> int:
+    """Commit ``ops`` in order using batched writes; returns the number of commits.
+
+    With a ``guard`` the ops and a session version bump are committed in one
+    batch under a ``last_update_time`` precondition, so the batch is rejected
+    with :class:`WriteConflict` if another writer got there first. Splitting
+    them would leave the first batches committed after a later conflict, and
+    the retry would write its new notes a second time.
+    """
+
+    if guard is not None:
+        guard = replace(guard)
+    commits = 0
+    for batch in iter_write_batches(client, ops, guard=guard, batch_size=batch_size):
+        results = _commit(batch)
+        if guard is not None:
+            guard.advance(results)
+        commits += 1
+    return commits
+
+
+def iter_write_batches(
+    client: Any,
+    ops: Sequence[WriteOp],
+    *,
+    guard: SessionGuard | None = None,
+    batch_size: int = MAX_BATCH_WRITES,
+) -> Iterator[Any]:
+    """Yield the uncommitted batches :func:`apply_writes` commits, in order.
+
+    Works with any client whose ``batch()`` collects writes, including the
+    async client, whose batches are committed with ``await batch.commit()``.
+    Guarded writes form a single batch; :class:`WriteTooLarge` is raised
+    before it is drawn when they do not fit.
+    """
+
+    if not ops and guard is None:
+        return
+    if guard is not None and len(ops) > batch_size - 1:
+        raise WriteTooLarge(
+            f"{len(ops)} writes and the version bump do not fit one guarded batch of {batch_size}"
+        )
+    pending = list(ops)
+    first = True
+    while first or pending:
+        batch = client.batch()
+        room = batch_size
+        if guard is not None:
+            option = None
+            if guard.update_time is not None:
+                option = client.write_option(last_update_time=guard.update_time)
+            batch.update(
+                client.document(guard.document_path),
+                {SESSION_VERSION_FIELD: guard.version + 1},
+                option=option,
+            )
+            room -= 1
+        chunk, pending = pending[:room], pending[room:]
+        for op in chunk:
+            reference = client.document(op.document_path)
+            if op.data is None:
+                batch.delete(reference)
+            elif op.update_time is not None:
+                option = client.write_option(last_update_time=op.update_time)
+                batch.update(reference, _with_transforms(op.data), option=option)
+            else:
+                batch.set(reference, _with_transforms(op.data), merge=op.merge)
+        first = False
+        yield batch
+
+
+def _with_transforms(data: dict[str, Any]) -> dict[str, Any]:
+    native = _native_increment()
+    if native is None or not any(isinstance(value, Increment) for value in data.values()):
+        return data
+    return {key: native(value.value) if isinstance(value, Increment) else value for key, value in data.items()}
+
+
+def _commit(batch: Any) -> Any:
+    try:
+        return batch.commit()
+    except WriteConflict:
+        raise
+    except Exception as exc:
+        if is_precondition_failure(exc):
+            raise WriteConflict(str(exc)) from exc
+        raise
+
+
+def is_precondition_failure(exc: BaseException) -> bool:
+    """Whether ``exc`` is Firestore rejecting a write because of a failed precondition.
+
+    ``create()`` on an existing document counts as one as well.
+    """
+
+    if isinstance(exc, WriteConflict):
+        return True
+    try:
+        from google.api_core.exceptions import Aborted, AlreadyExists, FailedPrecondition
+    except ModuleNotFoundError:
+        return False
+    return isinstance(exc, (Aborted, AlreadyExists, FailedPrecondition))
+
+
+def encode_ops(ops: Iterable[WriteOp]) -> list[dict[str, Any]]:
+    return [op.to_map() for op in ops]
+
+
+def decode_ops(data: Iterable[Mapping[str, Any]]) -> list[WriteOp]:
+    return [WriteOp.from_map(entry) for entry in data]
+
+
+__all__ = [
+    "Increment",
+    "MAX_BATCH_WRITES",
+    "SESSION_VERSION_FIELD",
+    "SessionGuard",
+    "SummaryReads",
+    "WriteConflict",
+    "WriteTooLarge",
+    "WriteOp",
+    "apply_writes",
+    "decode_ops",
+    "encode_ops",
+    "increment_amount",
+    "is_precondition_failure",
+    "iter_write_batches",
+    "new_document_id",
+    "plan_summary_writes",
+]
@@ -0,0 +1,563 @@
+"""Seeded synthetic sessions for load tests, benchmarks and emulator runs.
+
+:func:`generate` turns a :class:`DatasetSpec` into sessions laid out like the
+app's Firestore data:
+
+* the session document, with a ``settings.tagCatalog`` and a locale;
+* its notes (todos, appointments, thoughts and free notes), where the tags
+  are ``tagIds``/``tagLabels`` or, for a chosen share, legacy ``tags`` labels;
+* the thought document at a chosen size and outline depth, together with its
+  ``thought_history`` versions;
+* the ``todo_change_sets`` history;
+* the ``memos`` inbox.
+
+Each session is a list of :class:`~notes_tools.session_writes.WriteOp`, so a
+dataset can be streamed as JSONL (:func:`write_jsonl`) and replayed later
+(:func:`read_jsonl`). It can be loaded into any client that has batches,
+including :class:`~notes_tools.memory_store.MemoryFirestore`
+(:func:`load_ops`), or into a Firestore emulator through a ``BulkWriter``
+(:func:`bulk_load`). The same seed and spec always give the same documents.
+Each session draws from its own random stream, so adding sessions leaves the
+earlier ones unchanged.
+"""
+
+from __future__ import annotations
+
+import random
+import string
+from dataclasses import dataclass, field
+from typing import IO, Any, Iterable, Iterator, Sequence
+
+from .codec import JSON
+from .inbox import MEMOS_COLLECTION, STATUS_DONE, STATUS_PENDING
+from .notes import (
+    Appointment,
+    FreeNote,
+    SessionSettings,
+    Thought,
+    ThoughtDocument,
+    ThoughtOutline,
+    ThoughtOutlineSection,
+    TodoItem,
+    structured_note_to_map,
+)
+from .session_writes import MAX_BATCH_WRITES, NOTES_COLLECTION, SESSIONS_COLLECTION, WriteOp, apply_writes
+from .thought_history import DEFAULT_SNAPSHOT_INTERVAL, HISTORY_COLLECTION, plan_history_entry, version_document_id
+from .thought_store import LAYOUT_INLINE, LAYOUTS, default_anchor, plan_thought_document_writes
+
+CHANGE_SETS_COLLECTION = "todo_change_sets"
+LOCALES = ("en", "it", "fr")
+TODO_STATUSES = ("not_started", "not_started", "in_progress", "done", "not_required", "cancelled")
+DEFAULT_MODEL = "mistralai/mistral-nemo"
+PROMPT_VERSION = "v1"
+START_MS = 1_704_067_200_000  # 2024-01-01T00:00:00Z
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+_VOCABULARY: dict[str, dict[str, tuple[str, ...]]] = {
+    "en": {
+        "verbs": ("Buy", "Call", "Book", "Email", "Fix", "Plan", "Review", "Pay", "Clean", "Prepare"),
+        "objects": (
+            "milk", "the dentist", "train tickets", "the invoice", "the garden", "the quarterly report",
+            "a gift for Anna", "the car", "the budget", "the slides",
+        ),
+        "events": ("Meeting with Marco", "Dinner", "Doctor appointment", "Team call", "Yoga class"),
+        "places": ("the office", "home", "Central Station", "the gym", "Café Rossi"),
+        "topics": ("Work", "Family", "Travel", "Health", "Reading", "Ideas", "Home", "Finance"),
+        "words": (
+            "maybe", "we", "should", "try", "a", "new", "approach", "for", "next", "week", "because",
+            "it", "feels", "simpler", "and", "the", "team", "agrees", "with", "this", "plan",
+        ),
+        "joiner": " and ",
+        "at": " at ",
+    },
+    "it": {
+        "verbs": ("Compra", "Chiama", "Prenota", "Scrivi a", "Ripara", "Pianifica", "Rivedi", "Paga", "Pulisci", "Prepara"),
+        "objects": (
+            "il latte", "il dentista", "i biglietti del treno", "la fattura", "il giardino", "il report trimestrale",
+            "un regalo per Anna", "la macchina", "il bilancio", "le slide",
+        ),
+        "events": ("Riunione con Marco", "Cena", "Visita medica", "Chiamata di team", "Lezione di yoga"),
+        "places": ("l'ufficio", "casa", "la Stazione Centrale", "la palestra", "il Bar Rossi"),
+        "topics": ("Lavoro", "Famiglia", "Viaggi", "Salute", "Letture", "Idee", "Casa", "Finanze"),
+        "words": (
+            "forse", "dovremmo", "provare", "un", "nuovo", "approccio", "per", "la", "prossima", "settimana",
+            "perché", "sembra", "più", "semplice", "e", "il", "gruppo", "è", "d'accordo", "con", "questo",
+        ),
+        "joiner": " e ",
+        "at": " a ",
+    },
+    "fr": {
+        "verbs": ("Acheter", "Appeler", "Réserver", "Écrire à", "Réparer", "Planifier", "Relire", "Payer", "Nettoyer", "Préparer"),
+        "objects": (
+            "du lait", "le dentiste", "les billets de train", "la facture", "le jardin", "le rapport trimestriel",
+            "un cadeau pour Anna", "la voiture", "le budget", "les diapositives",
+        ),
+        "events": ("Réunion avec Marco", "Dîner", "Rendez-vous médical", "Appel d'équipe", "Cours de yoga"),
+        "places": ("le bureau", "la maison", "la Gare Centrale", "la salle de sport", "le Café Rossi"),
+        "topics": ("Travail", "Famille", "Voyages", "Santé", "Lectures", "Idées", "Maison", "Finances"),
+        "words": (
+            "peut-être", "devrions", "nous", "essayer", "une", "nouvelle", "approche", "pour", "la", "semaine",
+            "prochaine", "car", "cela", "semble", "plus", "simple", "et", "l'équipe", "est", "d'accord",
+        ),
+        "joiner": " et ",
+        "at": " à ",
+    },
+}
+
+
+@dataclass(slots=True)
+class DatasetSpec:
+    """What :func:`generate` produces; counts are per session."""
+
+    seed: int = 0
+    sessions: int = 1
+    todos: int = 50
+    appointments: int = 10
+    thoughts: int = 10
+    free_notes: int = 5
+    tags: int = 20
+    legacy_tags: float = 0.0  # share of tagged notes stored with legacy ``tags`` labels
+    locales: Sequence[str] = LOCALES  # assigned to sessions round-robin
+    thought_bytes: int = 4_000
+    outline_depth: int = 2
+    thought_versions: int = 1
+    thought_layout: str = LAYOUT_INLINE
+    change_sets: int = 20
+    memos: int = 20
+    pending_memos: int = 0
+    start_ms: int = START_MS
+
+    def __post_init__(self) -> None:
+        counts = ("sessions", "todos", "appointments", "thoughts", "free_notes", "tags", "thought_bytes")
+        counts += ("thought_versions", "change_sets", "memos", "pending_memos")
+        negative = [name for name in counts if getattr(self, name) < 0]
+        if negative:
+            raise ValueError(f"Counts must not be negative: {', '.join(negative)}")
+        if not 0.0 <= self.legacy_tags <= 1.0:
+            raise ValueError("legacy_tags must be between 0 and 1")
+        unknown = [locale for locale in self.locales if locale not in _VOCABULARY]
+        if unknown or not self.locales:
+            raise ValueError(f"Unsupported locales {unknown}; choose from {', '.join(LOCALES)}")
+        if not 1 <= self.outline_depth <= 6:
+            raise ValueError("outline_depth must be between 1 and 6")
+        if self.thought_layout not in LAYOUTS:
+            raise ValueError(f"Unknown thought document layout: {self.thought_layout}")
+        if self.pending_memos > self.memos:
+            raise ValueError("pending_memos cannot exceed memos")
+
+
+@dataclass(slots=True)
+class SyntheticSession:
+    id: str
+    locale: str
+    ops: list[WriteOp] = field(default_factory=list)
+    memos: list[str] = field(default_factory=list)
+
+
+def document_id(rng: random.Random) -> str:
+    """A 20 character identifier in Firestore's auto-ID style, drawn from ``rng``."""
+
+    return "".join(rng.choice(_ID_ALPHABET) for _ in range(20))
+
+
+def tag_catalog(rng: random.Random, count: int) -> dict[str, Any]:
+    """A ``settings.tagCatalog`` map: English ``default`` labels plus ``it`` and ``fr`` ones."""
+
+    topics = {locale: vocabulary["topics"] for locale, vocabulary in _VOCABULARY.items()}
+    tags = []
+    for index in range(count):
+        round_, position = divmod(index, len(topics["en"]))
+        suffix = f" {round_ + 1}" if round_ else ""
+        tags.append(
+            {
+                "id": document_id(rng),
+                "labels": {
+                    "default": topics["en"][position] + suffix,
+                    "it": topics["it"][position] + suffix,
+                    "fr": topics["fr"][position] + suffix,
+                },
+                "color": f"#{rng.randrange(0x1000000):06x}",
+            }
+        )
+    return {"tags": tags}
+
+
+def _label(tag: dict[str, Any], locale: str) -> str:
+    labels = tag["labels"]
+    return labels.get(locale) or labels["default"]
+
+
+def _sentence(rng: random.Random, locale: str, words: int) -> str:
+    vocabulary = _VOCABULARY[locale]["words"]
+    text = " ".join(rng.choice(vocabulary) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _todo_text(rng: random.Random, locale: str) -> str:
+    vocabulary = _VOCABULARY[locale]
+    return f"{rng.choice(vocabulary['verbs'])} {rng.choice(vocabulary['objects'])}"
+
+
+def _event_text(rng: random.Random, locale: str) -> tuple[str, str]:
+    vocabulary = _VOCABULARY[locale]
+    return rng.choice(vocabulary["events"]), rng.choice(vocabulary["places"])
+
+
+def _day(rng: random.Random, start_ms: int, span_days: int = 120) -> str:
+    day = start_ms // 86_400_000 + rng.randrange(span_days)
+    year, month, date = _civil_from_days(day)
+    return f"{year:04d}-{month:02d}-{date:02d}"
+
+
+def _civil_from_days(days: int) -> tuple[int, int, int]:
+    # Howard Hinnant's days-from-epoch to proleptic Gregorian date; keeps the generator free of time zones.
+    days += 719_468
+    era = days // 146_097
+    day_of_era = days - era * 146_097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36_524 - day_of_era // 146_096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    month_index = (5 * day_of_year + 2) // 153
+    date = day_of_year - (153 * month_index + 2) // 5 + 1
+    month = month_index + 3 if month_index < 10 else month_index - 9
+    return year_of_era + era * 400 + (month <= 2), month, date
+
+
+def memo_text(rng: random.Random, locale: str, start_ms: int = START_MS) -> str:
+    """A dictated memo mixing todos with, sometimes, an appointment and a thought."""
+
+    vocabulary = _VOCABULARY[locale]
+    parts = [_todo_text(rng, locale).lower() for _ in range(rng.randint(1, 3))]
+    if rng.random() < 0.4:
+        event, place = _event_text(rng, locale)
+        parts.append(f"{event.lower()}{vocabulary['at']}{place} {_day(rng, start_ms)} 18:00")
+    text = vocabulary["joiner"].join(parts)
+    text = text[0].upper() + text[1:] + "."
+    if rng.random() < 0.3:
+        text += " " + _sentence(rng, locale, rng.randint(6, 14))
+    return text
+
+
+def thought_document(rng: random.Random, locale: str, size: int, depth: int) -> ThoughtDocument:
+    """Markdown of about ``size`` bytes whose headings nest ``depth`` levels, with the matching outline."""
+
+    topics = _VOCABULARY[locale]["topics"]
+    lines: list[str] = []
+    roots: list[ThoughtOutlineSection] = []
+    parents: list[ThoughtOutlineSection] = []
+    used = 0
+    counter = 0
+    while used < size or not roots:
+        deepest = min(len(parents) + 1, depth)
+        level = rng.choices(range(1, deepest + 1), weights=range(deepest, 0, -1))[0]
+        counter += 1
+        title = f"{rng.choice(topics)} {counter}"
+        section = ThoughtOutlineSection(title=title, level=level, anchor=default_anchor(title))
+        del parents[level - 1 :]
+        (parents[-1].children if parents else roots).append(section)
+        parents.append(section)
+        block = [f"{'#' * level} {title}", ""]
+        block.extend(_sentence(rng, locale, rng.randint(8, 24)) for _ in range(rng.randint(1, 4)))
+        block.append("")
+        lines.extend(block)
+        used += sum(len(line.encode("utf-8")) + 1 for line in block)
+    return ThoughtDocument("\n".join(lines), ThoughtOutline(roots))
+
+
+def thought_versions(
+    rng: random.Random, locale: str, size: int, depth: int, versions: int
+) -> list[ThoughtDocument]:
+    """``versions`` successive documents growing to ``size`` bytes by whole top-level sections."""
+
+    if versions <= 0 or size <= 0:
+        return []
+    final = thought_document(rng, locale, size, depth)
+    if versions == 1:
+        return [final]
+    chunks = final.markdown_body.split("\n# ")
+    sections = final.outline.sections
+    documents = []
+    for version in range(1, versions + 1):
+        keep = max(1, round(len(sections) * version / versions))
+        markdown = "\n# ".join(chunks[:keep])
+        if keep < len(chunks):
+            markdown += "\n"
+        documents.append(ThoughtDocument(markdown, ThoughtOutline(sections[:keep])))
+    return documents
+
+
+def _tagged(
+    rng: random.Random,
+    payload: dict[str, Any],
+    catalog: Sequence[dict[str, Any]],
+    locale: str,
+    legacy_share: float,
+) -> dict[str, Any]:
+    picked = rng.sample(catalog, k=min(len(catalog), rng.choice((0, 1, 1, 2, 3))))
+    if picked and rng.random() < legacy_share:
+        payload.pop("tagIds", None)
+        payload.pop("tagLabels", None)
+        payload["tags"] = [_label(tag, locale) for tag in picked]
+        if rng.random() < 0.1:
+            payload["tags"].append("untracked")
+    else:
+        payload["tagIds"] = [tag["id"] for tag in picked]
+        payload["tagLabels"] = [_label(tag, locale) for tag in picked]
+    return payload
+
+
+def note_documents(
+    rng: random.Random,
+    catalog: dict[str, Any],
+    locale: str,
+    spec: DatasetSpec,
+    *,
+    outline: ThoughtOutline | None = None,
+) -> list[tuple[str, dict[str, Any]]]:
+    """``(document ID, data)`` pairs for the notes of one session, oldest first."""
+
+    tags = catalog.get("tags", [])
+    anchors = list(_walk(outline.sections)) if outline else []
+    kinds = ["todo"] * spec.todos + ["event"] * spec.appointments + ["memo"] * spec.thoughts
+    kinds += ["free"] * spec.free_notes
+    rng.shuffle(kinds)
+    created_at = spec.start_ms
+    documents = []
+    for kind in kinds:
+        created_at += rng.randrange(60_000, 6 * 3_600_000)
+        note_id = document_id(rng)
+        if kind == "todo":
+            note: Any = TodoItem(
+                text=_todo_text(rng, locale),
+                status=rng.choice(TODO_STATUSES),
+                due_date=_day(rng, created_at) if rng.random() < 0.3 else "",
+                event_date=_day(rng, created_at) if rng.random() < 0.1 else "",
+                note_id=note_id,
+            )
+        elif kind == "event":
+            event, place = _event_text(rng, locale)
+            note = Appointment(text=event, datetime=f"{_day(rng, created_at)}T{rng.randrange(8, 21):02d}:00", location=place)
+        elif kind == "memo":
+            section = rng.choice(anchors) if anchors else None
+            note = Thought(
+                text=_sentence(rng, locale, rng.randint(6, 20)),
+                section_anchor=section.anchor if section else None,
+                section_title=section.title if section else None,
+            )
+        else:
+            note = FreeNote(text=_sentence(rng, locale, rng.randint(4, 12)))
+        note.created_at = created_at
+        payload = structured_note_to_map(note)
+        if kind != "event":
+            payload = _tagged(rng, payload, tags, locale, spec.legacy_tags)
+        documents.append((note_id, payload))
+    return documents
+
+
+def _walk(sections: Iterable[ThoughtOutlineSection]) -> Iterator[ThoughtOutlineSection]:
+    for section in sections:
+        yield section
+        yield from _walk(section.children)
+
+
+def change_set_documents(
+    rng: random.Random,
+    session_id: str,
+    todos: Sequence[tuple[str, dict[str, Any]]],
+    memo_ids: Sequence[str],
+    count: int,
+    start_ms: int = START_MS,
+) -> list[tuple[str, dict[str, Any]]]:
+    """A ``todo_change_sets`` history of ``count`` add/update/delete batches over ``todos``."""
+
+    documents = []
+    timestamp = start_ms
+    for index in range(count):
+        timestamp += rng.randrange(60_000, 24 * 3_600_000)
+        actions = []
+        for _ in range(rng.randint(1, 4)):
+            if todos:
+                op = rng.choice(("add", "add", "update", "update", "update", "delete"))
+                note_id, data = rng.choice(todos)
+                current = {**data, "id": note_id}
+            else:
+                op = "add"
+                current = {"type": "todo", "text": f"Todo {index}", "status": TODO_STATUSES[0], "id": document_id(rng)}
+            if op == "add":
+                actions.append({"op": op, "before": None, "after": current})
+            elif op == "update":
+                before = {**current, "status": rng.choice(TODO_STATUSES[:3])}
+                actions.append({"op": op, "before": before, "after": current})
+            else:
+                actions.append({"op": op, "before": current, "after": None})
+        documents.append(
+            (
+                document_id(rng),
+                {
+                    "sessionId": session_id,
+                    "memoId": memo_ids[index % len(memo_ids)] if memo_ids else document_id(rng),
+                    "timestamp": timestamp,
+                    "model": DEFAULT_MODEL,
+                    "promptVersion": PROMPT_VERSION,
+                    "type": "undo" if rng.random() < 0.05 else "apply",
+                    "actions": actions,
+                },
+            )
+        )
+    return documents
+
+
+def generate_session(spec: DatasetSpec, index: int) -> SyntheticSession:
+    """Session ``index`` of ``spec``; independent of the sessions before it."""
+
+    rng = random.Random(f"{spec.seed}:{index}")
+    locale = spec.locales[index % len(spec.locales)]
+    session = SyntheticSession(document_id(rng), locale)
+    session_path = (SESSIONS_COLLECTION, session.id)
+    notes_path = session_path + (NOTES_COLLECTION,)
+    catalog = tag_catalog(rng, spec.tags)
+    topic = _VOCABULARY[locale]["topics"][index % len(_VOCABULARY[locale]["topics"])]
+    settings = {**SessionSettings().to_map(), "locale": locale, "tagCatalog": catalog}
+    session.ops.append(WriteOp(session_path, {"name": f"{topic} {index + 1}", "settings": settings}))
+
+    documents = thought_versions(rng, locale, spec.thought_bytes, spec.outline_depth, spec.thought_versions)
+    outline = documents[-1].outline if documents else None
+    notes = note_documents(rng, catalog, locale, spec, outline=outline)
+    session.ops.extend(WriteOp(notes_path + (note_id,), data) for note_id, data in notes)
+
+    if documents:
+        for write in plan_thought_document_writes(documents[-1], layout=spec.thought_layout):
+            session.ops.append(WriteOp(notes_path + write.path, write.data))
+        head = None
+        previous: str | None = None
+        timestamp = spec.start_ms
+        for document in documents:
+            timestamp += rng.randrange(3_600_000, 72 * 3_600_000)
+            entry = plan_history_entry(
+                document.markdown_body,
+                head=head,
+                previous_markdown=previous,
+                snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL,
+                timestamp=timestamp,
+            )
+            if entry is not None:
+                session.ops.append(
+                    WriteOp(session_path + (HISTORY_COLLECTION, version_document_id(entry.version)), entry.to_map())
+                )
+                head = entry
+            previous = document.markdown_body
+
+    memo_ids = []
+    created_at = spec.start_ms
+    for memo_index in range(spec.memos):
+        created_at += rng.randrange(60_000, 12 * 3_600_000)
+        memo_id = document_id(rng)
+        text = memo_text(rng, locale, created_at)
+        pending = memo_index >= spec.memos - spec.pending_memos
+        data = {"text": text, "createdAt": created_at, "status": STATUS_PENDING if pending else STATUS_DONE}
+        session.ops.append(WriteOp(session_path + (MEMOS_COLLECTION, memo_id), data))
+        session.memos.append(text)
+        memo_ids.append(memo_id)
+
+    todos = [(note_id, data) for note_id, data in notes if data["type"] == "todo"]
+    for change_set_id, data in change_set_documents(rng, session.id, todos, memo_ids, spec.change_sets, spec.start_ms):
+        session.ops.append(WriteOp(session_path + (CHANGE_SETS_COLLECTION, change_set_id), data))
+    return session
+
+
+def generate(spec: DatasetSpec) -> Iterator[SyntheticSession]:
+    for index in range(spec.sessions):
+        yield generate_session(spec, index)
+
+
+def dataset_ops(spec: DatasetSpec) -> Iterator[WriteOp]:
+    for session in generate(spec):
+        yield from session.ops
+
+
+def memo_corpus(spec: DatasetSpec) -> Iterator[dict[str, str]]:
+    """Batch records (``{"session_id", "memo"}``) for every generated memo, session by session."""
+
+    for session in generate(spec):
+        for text in session.memos:
+            yield {"session_id": session.id, "memo": text}
+
+
+def write_jsonl(records: Iterable[WriteOp | dict[str, Any]], stream: IO[str]) -> int:
+    """Write one JSON object per line (``WriteOp.to_map()`` for ops); returns the line count."""
+
+    lines = 0
+    for record in records:
+        payload = record.to_map() if isinstance(record, WriteOp) else record
+        stream.write(JSON.dumps(payload) + "\n")
+        lines += 1
+    return lines
+
+
+def read_jsonl(lines: Iterable[str]) -> Iterator[WriteOp]:
+    for line in lines:
+        if line.strip():
+            yield WriteOp.from_map(JSON.loads(line))
+
+
+def _chunks(ops: Iterable[WriteOp], size: int) -> Iterator[list[WriteOp]]:
+    chunk: list[WriteOp] = []
+    for op in ops:
+        chunk.append(op)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_ops(client: Any, ops: Iterable[WriteOp], *, batch_size: int = MAX_BATCH_WRITES) -> int:
+    """Commit ``ops`` through batched writes, streaming; returns the number of writes."""
+
+    written = 0
+    for chunk in _chunks(ops, batch_size):
+        apply_writes(client, chunk, batch_size=batch_size)
+        written += len(chunk)
+    return written
+
+
+def bulk_load(client: Any, ops: Iterable[WriteOp]) -> int:
+    """Send ``ops`` through ``client.bulk_writer()``, which batches and retries for us."""
+
+    writer = client.bulk_writer()
+    written = 0
+    try:
+        for op in ops:
+            reference = client.document(op.document_path)
+            if op.data is None:
+                writer.delete(reference)
+            else:
+                writer.set(reference, op.data, merge=op.merge)
+            written += 1
+    finally:
+        writer.close()
+    return written
+
+
+__all__ = [
+    "CHANGE_SETS_COLLECTION",
+    "LOCALES",
+    "TODO_STATUSES",
+    "DatasetSpec",
+    "SyntheticSession",
+    "bulk_load",
+    "change_set_documents",
+    "dataset_ops",
+    "document_id",
+    "generate",
+    "generate_session",
+    "load_ops",
+    "memo_corpus",
+    "memo_text",
+    "note_documents",
+    "read_jsonl",
+    "tag_catalog",
+    "thought_document",
+    "thought_versions",
+    "write_jsonl",
+]
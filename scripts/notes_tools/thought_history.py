@@ -0,0 +1,250 @@
+"""Delta-encoded version history for the session thought document.
+
+Every stored version of the thought document gets an entry in the session's
+``thought_history`` subcollection. Most entries hold a compact line-level delta
+against the previous version; a full snapshot is written every
+``snapshot_interval`` versions (and whenever the chain cannot be continued), so
+reconstructing any version touches at most ``snapshot_interval`` documents.
+"""
+
+from __future__ import annotations
+
+import difflib
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Mapping, Sequence
+
+from .thought_store import content_hash
+
+HISTORY_COLLECTION = "thought_history"
+DEFAULT_SNAPSHOT_INTERVAL = 20
+
+KIND_SNAPSHOT = "snapshot"
+KIND_DELTA = "delta"
+
+
+def version_document_id(version: int) -> str:
+    return f"{version:08d}"
+
+
+def line_delta(old: str, new: str) -> list[dict[str, Any]]:
+    """Encode the line-level edit script turning ``old`` into ``new``.
+
+    Operations are maps (Firestore does not allow nested arrays): ``{"k": n}``
+    keeps ``n`` lines, ``{"d": n}`` drops ``n`` lines and ``{"i": [...]}``
+    inserts the given lines. Line endings are preserved.
+    """
+
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(a=old_lines, b=new_lines, autojunk=False)
+    ops: list[dict[str, Any]] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append({"k": i2 - i1})
+            continue
+        if i2 > i1:
+            ops.append({"d": i2 - i1})
+        if j2 > j1:
+            ops.append({"i": new_lines[j1:j2]})
+    return ops
+
+
+def apply_delta(old: str, ops: Sequence[Mapping[str, Any]]) -> str:
+    lines = old.splitlines(keepends=True)
+    cursor = 0
+    result: list[str] = []
+    for op in ops:
+        if "k" in op:
+            count = int(op["k"])
+            result.extend(lines[cursor : cursor + count])
+            cursor += count
+        elif "d" in op:
+            cursor += int(op["d"])
+        elif "i" in op:
+            result.extend(str(line) for line in op["i"])
+        else:
+            raise ValueError(f"Unknown delta operation: {dict(op)!r}")
+    if cursor != len(lines):
+        raise ValueError("Delta does not match the base version")
+    return "".join(result)
+
+
+@dataclass(slots=True)
+class HistoryEntry:
+    version: int
+    kind: str
+    snapshot: int
+    timestamp: int
+    hash: str
+    size: int
+    markdown: str | None = None
+    delta: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def stored_size(self) -> int:
+        """Approximate number of bytes the entry adds to storage."""
+
+        if self.kind == KIND_SNAPSHOT:
+            return len((self.markdown or "").encode("utf-8"))
+        total = 0
+        for op in self.delta:
+            inserted = op.get("i")
+            total += sum(len(line.encode("utf-8")) for line in inserted) if inserted else 8
+        return total
+
+    def to_map(self) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "version": self.version,
+            "kind": self.kind,
+            "snapshot": self.snapshot,
+            "timestamp": self.timestamp,
+            "hash": self.hash,
+            "size": self.size,
+        }
+        if self.kind == KIND_SNAPSHOT:
+            payload["markdown"] = self.markdown or ""
+        else:
+            payload["delta"] = self.delta
+        return payload
+
+    @classmethod
+    def from_map(cls, data: Mapping[str, Any]) -> "HistoryEntry":
+        kind = str(data.get("kind", KIND_SNAPSHOT))
+        markdown = data.get("markdown")
+        raw_delta = data.get("delta")
+        return cls(
+            version=int(data.get("version", 0)),
+            kind=kind,
+            snapshot=int(data.get("snapshot", 0)),
+            timestamp=int(data.get("timestamp", 0)),
+            hash=str(data.get("hash", "")),
+            size=int(data.get("size", 0)),
+            markdown=markdown if isinstance(markdown, str) else None,
+            delta=[dict(op) for op in raw_delta if isinstance(op, Mapping)] if isinstance(raw_delta, Sequence) else [],
+        )
+
+
+def plan_history_entry(
+    markdown: str,
+    *,
+    head: HistoryEntry | None,
+    previous_markdown: str | None,
+    snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL,
+    timestamp: int | None = None,
+) -> HistoryEntry | None:
+    """Return the entry recording ``markdown`` after ``head``, or ``None`` if unchanged.
+
+    A delta is only emitted when ``previous_markdown`` is known to be the text
+    of ``head`` (checked by hash); otherwise the chain restarts with a snapshot.
+    """
+
+    digest = content_hash(markdown)
+    if head is not None and head.hash == digest:
+        return None
+    version = head.version + 1 if head is not None else 1
+    stamp = timestamp if timestamp is not None else int(time.time() * 1000)
+    size = len(markdown.encode("utf-8"))
+    can_delta = (
+        head is not None
+        and previous_markdown is not None
+        and content_hash(previous_markdown) == head.hash
+        and version - head.snapshot < max(snapshot_interval, 1)
+    )
+    if not can_delta:
+        return HistoryEntry(version, KIND_SNAPSHOT, version, stamp, digest, size, markdown=markdown)
+    assert head is not None and previous_markdown is not None
+    return HistoryEntry(
+        version,
+        KIND_DELTA,
+        head.snapshot,
+        stamp,
+        digest,
+        size,
+        delta=line_delta(previous_markdown, markdown),
+    )
+
+
+def _from_snapshot(snapshot: Any) -> HistoryEntry:
+    return HistoryEntry.from_map(snapshot.to_dict() or {})
+
+
+class ThoughtHistory:
+    """Reads and appends versions in a session's ``thought_history`` collection."""
+
+    def __init__(self, session_ref: Any, *, snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL) -> None:
+        self.collection = session_ref.collection(HISTORY_COLLECTION)
+        self.snapshot_interval = snapshot_interval
+
+    def head(self) -> HistoryEntry | None:
+        query = self.collection.order_by("version", direction="DESCENDING").limit(1)
+        for snapshot in query.stream():
+            return _from_snapshot(snapshot)
+        return None
+
+    def entry(self, version: int) -> HistoryEntry | None:
+        snapshot = self.collection.document(version_document_id(version)).get()
+        if not snapshot.exists:
+            return None
+        return _from_snapshot(snapshot)
+
+    def entries(self) -> Iterator[HistoryEntry]:
+        for snapshot in self.collection.order_by("version").stream():
+            yield _from_snapshot(snapshot)
+
+    def record(self, markdown: str, *, previous_markdown: str | None = None) -> HistoryEntry | None:
+        """Append ``markdown`` as the version after the current head.
+
+        The entry is created rather than set, so a writer that appended the
+        same version since the head was read makes this fail with the
+        client's precondition error instead of being overwritten.
+        """
+
+        entry = plan_history_entry(
+            markdown,
+            head=self.head(),
+            previous_markdown=previous_markdown,
+            snapshot_interval=self.snapshot_interval,
+        )
+        if entry is not None:
+            self.collection.document(version_document_id(entry.version)).create(entry.to_map())
+        return entry
+
+    def reconstruct(self, version: int) -> str:
+        """Rebuild the Markdown of ``version`` from its snapshot and delta chain."""
+
+        target = self.entry(version)
+        if target is None:
+            raise KeyError(f"Unknown thought document version: {version}")
+        chain = [target]
+        if target.kind != KIND_SNAPSHOT:
+            # One ordered query for the whole chain back to the snapshot it builds on.
+            query = (
+                self.collection.where("version", ">=", target.snapshot)
+                .where("version", "<", version)
+                .order_by("version")
+            )
+            older = {entry.version: entry for entry in map(_from_snapshot, query.stream())}
+        while chain[-1].kind != KIND_SNAPSHOT:
+            previous = older.get(chain[-1].version - 1)
+            if previous is None or previous.version < target.snapshot:
+                raise ValueError(f"History chain for version {version} is incomplete")
+            chain.append(previous)
+        markdown = chain[-1].markdown or ""
+        for entry in reversed(chain[:-1]):
+            markdown = apply_delta(markdown, entry.delta)
+        if content_hash(markdown) != target.hash:
+            raise ValueError(f"Reconstructed version {version} failed its integrity check")
+        return markdown
+
+
+__all__ = [
+    "DEFAULT_SNAPSHOT_INTERVAL",
+    "HISTORY_COLLECTION",
+    "HistoryEntry",
+    "ThoughtHistory",
+    "apply_delta",
+    "line_delta",
+    "plan_history_entry",
+    "version_document_id",
+]
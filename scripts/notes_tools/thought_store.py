@@ -0,0 +1,520 @@
+"""Firestore storage layouts for the per-session thought document.
+
+Two layouts are supported:
+
+``inline``
+    The historical format understood by the Android client: a single
+    ``__thought_document__`` note holding the full Markdown body and outline.
+
+``chunked``
+    A small header document carrying the outline plus a manifest of chunks, and
+    one document per top-level Markdown section in the header's ``sections``
+    subcollection. Writers only touch sections whose content hash changed and
+    readers can fetch just the sections they need.
+
+Markdown bodies in either layout may optionally be stored compressed: above a
+size threshold the text moves from ``markdown`` into the ``markdownBlob``
+bytes field, tagged with ``encoding``/``encodingVersion`` so readers can
+decode it transparently.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Mapping, MutableMapping, Sequence
+
+from .notes import ThoughtDocument, ThoughtOutline, ThoughtOutlineSection
+
+try:
+    import zstandard
+except ModuleNotFoundError:  # optional dependency
+    zstandard = None
+
+THOUGHT_DOCUMENT_ID = "__thought_document__"
+THOUGHT_DOCUMENT_TYPE = "thought_document"
+THOUGHT_SECTION_TYPE = "thought_section"
+SECTION_COLLECTION = "sections"
+PREAMBLE_CHUNK_ID = "_preamble"
+
+LAYOUT_INLINE = "inline"
+LAYOUT_CHUNKED = "chunked"
+LAYOUTS = (LAYOUT_INLINE, LAYOUT_CHUNKED)
+
+ENCODING_PLAIN = "plain"
+ENCODING_ZLIB = "zlib"
+ENCODING_ZSTD = "zstd"
+ENCODINGS = (ENCODING_ZLIB, ENCODING_ZSTD)
+ENCODING_VERSION = 1
+MARKDOWN_BLOB_FIELD = "markdownBlob"
+
+_DECODE_ERRORS: tuple[type[Exception], ...] = (zlib.error, UnicodeDecodeError)
+if zstandard is not None:
+    _DECODE_ERRORS += (zstandard.ZstdError,)
+
+_HEADING = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t]*#*[ \t]*$")
+_FENCE = re.compile(r"^[ \t]{0,3}(```|~~~)")
+
+
+class ThoughtDocumentError(ValueError):
+    """Raised when a stored thought document cannot be decoded."""
+
+
+def default_anchor(title: str) -> str:
+    slug = "".join(ch for ch in title.lower() if ch.isalnum() or ch.isspace()).strip().replace(" ", "-")
+    return slug or f"section-{content_hash(title)[:8]}"
+
+
+def content_hash(text: str) -> str:
+    """Return a short, stable digest used to detect changed sections."""
+
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+
+
+def encoding_available(encoding: str) -> bool:
+    return encoding == ENCODING_ZLIB or (encoding == ENCODING_ZSTD and zstandard is not None)
+
+
+def encode_markdown(
+    markdown: str,
+    *,
+    threshold: int | None = None,
+    encoding: str = ENCODING_ZLIB,
+) -> dict[str, Any]:
+    """Return the fields storing ``markdown``, compressed when it is large enough.
+
+    Bodies smaller than ``threshold`` bytes (or every body when ``threshold``
+    is ``None``) stay plain text, as do bodies that would not shrink.
+    """
+
+    raw = markdown.encode("utf-8")
+    if threshold is None or len(raw) < threshold:
+        return {"markdown": markdown}
+    if encoding == ENCODING_ZLIB:
+        blob = zlib.compress(raw, 6)
+    elif encoding == ENCODING_ZSTD:
+        if zstandard is None:
+            raise ModuleNotFoundError("zstandard is required for zstd thought document encoding")
+        blob = zstandard.ZstdCompressor(level=6).compress(raw)
+    else:
+        raise ValueError(f"Unknown thought document encoding: {encoding}")
+    if len(blob) >= len(raw):
+        return {"markdown": markdown}
+    return {
+        "encoding": encoding,
+        "encodingVersion": ENCODING_VERSION,
+        MARKDOWN_BLOB_FIELD: blob,
+        "rawSize": len(raw),
+    }
+
+
+def decode_markdown(data: Mapping[str, Any], path: str | None = None) -> str | None:
+    """Return the Markdown stored in ``data`` regardless of its encoding.
+
+    A blob that cannot be decoded raises :class:`ThoughtDocumentError` naming
+    ``path``, the document ``data`` was read from.
+    """
+
+    encoding = str(data.get("encoding", "") or ENCODING_PLAIN)
+    where = path or "thought document"
+    if encoding == ENCODING_PLAIN:
+        markdown = data.get("markdown")
+        return markdown if isinstance(markdown, str) else None
+    version = int(data.get("encodingVersion", ENCODING_VERSION) or ENCODING_VERSION)
+    if version != ENCODING_VERSION:
+        raise ThoughtDocumentError(f"Unsupported {encoding} encoding version {version} in {where}")
+    blob = data.get(MARKDOWN_BLOB_FIELD)
+    if not isinstance(blob, (bytes, bytearray, memoryview)):
+        return None
+    try:
+        if encoding == ENCODING_ZLIB:
+            raw = zlib.decompress(bytes(blob))
+        elif encoding == ENCODING_ZSTD:
+            if zstandard is None:
+                raise ModuleNotFoundError("zstandard is required to read zstd thought documents")
+            raw = zstandard.ZstdDecompressor().decompress(bytes(blob))
+        else:
+            raise ThoughtDocumentError(f"Unknown encoding {encoding} in {where}")
+        return raw.decode("utf-8")
+    except _DECODE_ERRORS as exc:
+        raise ThoughtDocumentError(f"Corrupt {encoding} blob in {where}: {exc}") from exc
+
+
+def without_blob(data: Mapping[str, Any], path: str | None = None) -> dict[str, Any]:
+    """Return a JSON-friendly copy of ``data`` with any blob decoded to text."""
+
+    if MARKDOWN_BLOB_FIELD not in data:
+        return dict(data)
+    payload = {key: value for key, value in data.items() if key != MARKDOWN_BLOB_FIELD}
+    payload["markdown"] = decode_markdown(data, path) or ""
+    return payload
+
+
+@dataclass(slots=True)
+class ThoughtChunk:
+    id: str
+    anchor: str | None
+    title: str | None
+    hash: str
+    size: int
+    markdown: str | None = None
+
+    def to_manifest_entry(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "anchor": self.anchor,
+            "title": self.title,
+            "hash": self.hash,
+            "size": self.size,
+        }
+
+
+@dataclass(slots=True)
+class ThoughtHeader:
+    layout: str
+    outline: ThoughtOutline
+    markdown: str | None = None
+    chunks: list[ThoughtChunk] = field(default_factory=list)
+
+    def chunk_for_anchor(self, anchor: str) -> ThoughtChunk | None:
+        for chunk in self.chunks:
+            if chunk.anchor == anchor:
+                return chunk
+        return None
+
+
+@dataclass(slots=True)
+class ThoughtWrite:
+    """A pending write relative to the session's ``notes`` collection.
+
+    ``path`` alternates document and collection names starting with a document
+    ID, and ``data`` of ``None`` requests a delete.
+    """
+
+    path: tuple[str, ...]
+    data: dict[str, Any] | None
+
+
+def outline_section_to_map(section: ThoughtOutlineSection) -> MutableMapping[str, Any]:
+    return {
+        "title": section.title,
+        "level": section.level,
+        "anchor": section.anchor,
+        "children": [outline_section_to_map(child) for child in section.children],
+    }
+
+
+def parse_outline_sections(value: Any) -> list[ThoughtOutlineSection]:
+    if not isinstance(value, Iterable) or isinstance(value, (str, bytes, Mapping)):
+        return []
+    sections: list[ThoughtOutlineSection] = []
+    for entry in value:
+        if not isinstance(entry, Mapping):
+            continue
+        title = str(entry.get("title", "")).strip()
+        if not title:
+            continue
+        level = int(entry.get("level", 1) or 1)
+        anchor = str(entry.get("anchor", "")).strip() or default_anchor(title)
+        children = parse_outline_sections(entry.get("children"))
+        sections.append(ThoughtOutlineSection(title=title, level=level, anchor=anchor, children=children))
+    return sections
+
+
+def split_sections(markdown: str) -> list[ThoughtChunk]:
+    """Split ``markdown`` at its top-level headings without losing any text.
+
+    The top level is the shallowest ATX heading depth outside fenced code
+    blocks. Text before the first heading becomes a preamble chunk, and
+    concatenating the chunk bodies reproduces ``markdown`` exactly.
+    """
+
+    lines = markdown.splitlines(keepends=True)
+    headings: list[tuple[int, int, str]] = []
+    in_fence = False
+    for index, line in enumerate(lines):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            continue
+        match = _HEADING.match(line.rstrip("\r\n"))
+        if match:
+            headings.append((index, len(match.group(1)), match.group(2).strip()))
+
+    if not headings:
+        return [_make_chunk(PREAMBLE_CHUNK_ID, None, None, markdown)] if markdown else []
+
+    top_level = min(level for _, level, _ in headings)
+    boundaries = [(index, title) for index, level, title in headings if level == top_level]
+    chunks: list[ThoughtChunk] = []
+    used_ids: set[str] = {PREAMBLE_CHUNK_ID}
+    first_index = boundaries[0][0]
+    if first_index > 0:
+        chunks.append(_make_chunk(PREAMBLE_CHUNK_ID, None, None, "".join(lines[:first_index])))
+    for position, (start, title) in enumerate(boundaries):
+        end = boundaries[position + 1][0] if position + 1 < len(boundaries) else len(lines)
+        anchor = default_anchor(title)
+        chunk_id = anchor
+        suffix = 2
+        while chunk_id in used_ids:
+            chunk_id = f"{anchor}-{suffix}"
+            suffix += 1
+        used_ids.add(chunk_id)
+        chunks.append(_make_chunk(chunk_id, anchor, title, "".join(lines[start:end])))
+    return chunks
+
+
+def _make_chunk(chunk_id: str, anchor: str | None, title: str | None, markdown: str) -> ThoughtChunk:
+    return ThoughtChunk(
+        id=chunk_id,
+        anchor=anchor,
+        title=title,
+        hash=content_hash(markdown),
+        size=len(markdown.encode("utf-8")),
+        markdown=markdown,
+    )
+
+
+def thought_document_to_map(
+    document: ThoughtDocument,
+    *,
+    compress_threshold: int | None = None,
+    encoding: str = ENCODING_ZLIB,
+) -> dict[str, Any]:
+    """Return the inline representation shared with the Android client."""
+
+    payload: dict[str, Any] = {"type": THOUGHT_DOCUMENT_TYPE}
+    payload.update(encode_markdown(document.markdown_body, threshold=compress_threshold, encoding=encoding))
+    payload["outline"] = [outline_section_to_map(section) for section in document.outline.sections]
+    return payload
+
+
+def plan_thought_document_writes(
+    document: ThoughtDocument,
+    *,
+    layout: str = LAYOUT_INLINE,
+    previous: Mapping[str, Any] | None = None,
+    compress_threshold: int | None = None,
+    encoding: str = ENCODING_ZLIB,
+) -> list[ThoughtWrite]:
+    """Compute the writes needed to store ``document`` in ``layout``.
+
+    ``previous`` is the current header document (if any). Chunks whose hash
+    matches the previous manifest are skipped, and sections that disappeared
+    are deleted after the header stops referencing them. Bodies of at least
+    ``compress_threshold`` bytes are stored with ``encoding``.
+    """
+
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown thought document layout: {layout}")
+    try:
+        previous_header = parse_thought_header(previous) if previous else None
+    except ThoughtDocumentError:  # only inline bodies are decoded here, and they have no chunks to reuse
+        previous_header = None
+    previous_chunks = {chunk.id: chunk for chunk in previous_header.chunks} if previous_header else {}
+
+    if layout == LAYOUT_INLINE:
+        header = thought_document_to_map(document, compress_threshold=compress_threshold, encoding=encoding)
+        writes = [ThoughtWrite((THOUGHT_DOCUMENT_ID,), header)]
+        writes.extend(_section_write(chunk_id, None) for chunk_id in previous_chunks)
+        return writes
+
+    chunks = split_sections(document.markdown_body)
+    writes = []
+    for position, chunk in enumerate(chunks):
+        prior = previous_chunks.get(chunk.id)
+        if prior is not None and prior.hash == chunk.hash:
+            continue
+        section = {
+            "type": THOUGHT_SECTION_TYPE,
+            "anchor": chunk.anchor,
+            "title": chunk.title,
+            "position": position,
+            "hash": chunk.hash,
+        }
+        section.update(encode_markdown(chunk.markdown or "", threshold=compress_threshold, encoding=encoding))
+        writes.append(_section_write(chunk.id, section))
+    header = {
+        "type": THOUGHT_DOCUMENT_TYPE,
+        "layout": LAYOUT_CHUNKED,
+        "outline": [outline_section_to_map(section) for section in document.outline.sections],
+        "chunks": [chunk.to_manifest_entry() for chunk in chunks],
+        "size": sum(chunk.size for chunk in chunks),
+    }
+    writes.append(ThoughtWrite((THOUGHT_DOCUMENT_ID,), header))
+    current_ids = {chunk.id for chunk in chunks}
+    writes.extend(
+        _section_write(chunk_id, None) for chunk_id in previous_chunks if chunk_id not in current_ids
+    )
+    return writes
+
+
+def _section_write(chunk_id: str, data: dict[str, Any] | None) -> ThoughtWrite:
+    return ThoughtWrite((THOUGHT_DOCUMENT_ID, SECTION_COLLECTION, chunk_id), data)
+
+
+def document_for_path(notes_collection: Any, path: Sequence[str]) -> Any:
+    """Resolve a :class:`ThoughtWrite` path against a ``notes`` collection."""
+
+    reference = notes_collection.document(path[0])
+    for index in range(1, len(path), 2):
+        reference = reference.collection(path[index]).document(path[index + 1])
+    return reference
+
+
+def apply_thought_writes(notes_collection: Any, writes: Iterable[ThoughtWrite]) -> None:
+    for write in writes:
+        reference = document_for_path(notes_collection, write.path)
+        if write.data is None:
+            reference.delete()
+        else:
+            reference.set(write.data)
+
+
+def parse_thought_header(data: Mapping[str, Any] | None, path: str | None = None) -> ThoughtHeader | None:
+    if not data:
+        return None
+    doc_type = str(data.get("type", "")).strip()
+    if doc_type != THOUGHT_DOCUMENT_TYPE:
+        return None
+    outline = ThoughtOutline(parse_outline_sections(data.get("outline")))
+    layout = str(data.get("layout", "")).strip() or LAYOUT_INLINE
+    if layout == LAYOUT_CHUNKED:
+        chunks: list[ThoughtChunk] = []
+        raw_chunks = data.get("chunks")
+        if isinstance(raw_chunks, Sequence):
+            for entry in raw_chunks:
+                if not isinstance(entry, Mapping):
+                    continue
+                chunk_id = str(entry.get("id", "")).strip()
+                if not chunk_id:
+                    continue
+                chunks.append(
+                    ThoughtChunk(
+                        id=chunk_id,
+                        anchor=(str(entry["anchor"]) if entry.get("anchor") else None),
+                        title=(str(entry["title"]) if entry.get("title") else None),
+                        hash=str(entry.get("hash", "")),
+                        size=int(entry.get("size", 0) or 0),
+                    )
+                )
+        return ThoughtHeader(LAYOUT_CHUNKED, outline, None, chunks)
+    markdown = decode_markdown(data, path)
+    if markdown is None:
+        return None
+    return ThoughtHeader(LAYOUT_INLINE, outline, markdown)
+
+
+def load_thought_document(
+    header: ThoughtHeader,
+    header_ref: Any = None,
+    *,
+    anchors: Iterable[str] | None = None,
+    client: Any = None,
+) -> ThoughtDocument | None:
+    """Materialize a :class:`ThoughtDocument` from ``header``.
+
+    For chunked documents only the sections whose anchors are listed in
+    ``anchors`` are fetched (all of them when ``anchors`` is ``None``), using
+    ``header_ref`` to reach the ``sections`` subcollection. They are read in
+    one ``client.get_all`` call when a ``client`` is given, otherwise one by
+    one. Chunks whose Markdown is already known (see :func:`fill_chunks`) are
+    not fetched again.
+    """
+
+    if header.layout == LAYOUT_INLINE:
+        markdown = header.markdown or ""
+    else:
+        selected = selected_chunks(header, anchors)
+        pending = [chunk for chunk in selected if chunk.markdown is None]
+        if pending:
+            if header_ref is None:
+                raise ValueError("A header reference is required to load chunked thought documents")
+            references = [section_reference(header_ref, chunk) for chunk in pending]
+            if client is not None:
+                snapshots: Iterable[Any] = client.get_all(references)
+            else:
+                snapshots = (reference.get() for reference in references)
+            fill_chunks(pending, snapshots)
+        markdown = "".join(chunk.markdown or "" for chunk in selected)
+    if not markdown.strip():
+        return None
+    return ThoughtDocument(markdown_body=markdown, outline=header.outline)
+
+
+def selected_chunks(header: ThoughtHeader, anchors: Iterable[str] | None = None) -> list[ThoughtChunk]:
+    """The chunks of ``header`` matching ``anchors`` (or chunk IDs for the preamble), in order."""
+
+    wanted = set(anchors) if anchors is not None else None
+    return [
+        chunk
+        for chunk in header.chunks
+        if wanted is None or chunk.anchor in wanted or (chunk.anchor is None and chunk.id in wanted)
+    ]
+
+
+def section_reference(header_ref: Any, chunk: ThoughtChunk) -> Any:
+    return header_ref.collection(SECTION_COLLECTION).document(chunk.id)
+
+
+def fill_chunks(chunks: Iterable[ThoughtChunk], snapshots: Iterable[Any]) -> None:
+    """Set each chunk's Markdown from the section snapshots, which may arrive in any order."""
+
+    by_id = {snapshot.id: snapshot for snapshot in snapshots}
+    for chunk in chunks:
+        snapshot = by_id.get(chunk.id)
+        if snapshot is None or not snapshot.exists:
+            chunk.markdown = ""
+            continue
+        chunk.markdown = decode_markdown(snapshot.to_dict() or {}, snapshot.reference.path) or ""
+
+
+def parse_thought_document(
+    data: Mapping[str, Any], header_ref: Any = None, *, client: Any = None
+) -> ThoughtDocument | None:
+    """Parse a stored thought document in either layout."""
+
+    header = parse_thought_header(data, header_ref.path if header_ref is not None else None)
+    if header is None:
+        return None
+    return load_thought_document(header, header_ref, client=client)
+
+
+__all__ = [
+    "ENCODINGS",
+    "ENCODING_PLAIN",
+    "ENCODING_ZLIB",
+    "ENCODING_ZSTD",
+    "LAYOUTS",
+    "LAYOUT_CHUNKED",
+    "LAYOUT_INLINE",
+    "SECTION_COLLECTION",
+    "THOUGHT_DOCUMENT_ID",
+    "THOUGHT_DOCUMENT_TYPE",
+    "ThoughtChunk",
+    "ThoughtDocumentError",
+    "ThoughtHeader",
+    "ThoughtWrite",
+    "apply_thought_writes",
+    "content_hash",
+    "decode_markdown",
+    "default_anchor",
+    "document_for_path",
+    "encode_markdown",
+    "encoding_available",
+    "fill_chunks",
+    "load_thought_document",
+    "outline_section_to_map",
+    "parse_outline_sections",
+    "parse_thought_document",
+    "parse_thought_header",
+    "plan_thought_document_writes",
+    "section_reference",
+    "selected_chunks",
+    "split_sections",
+    "thought_document_to_map",
+    "without_blob",
+]
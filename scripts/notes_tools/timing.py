@@ -0,0 +1,185 @@
+"""Wall-clock timing of named phases that may overlap on several threads.
+
+Library code marks phases with the module-level :func:`phase`, which records
+into the timer installed by :func:`activate` (``--profile`` installs one) and
+otherwise returns a shared no-op context manager.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+
+@dataclass(slots=True)
+class Phase:
+    name: str
+    start: float
+    end: float
+    thread: str
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def to_map(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "start_ms": round(self.start * 1000, 1),
+            "duration_ms": round(self.duration * 1000, 1),
+            "thread": self.thread,
+        }
+
+
+class PhaseTimer:
+    """Records phases relative to the moment the timer was created.
+
+    Phases are top-level spans (do not nest them); :meth:`critical_path`
+    infers the chain that determined the total time from their start and end
+    times, since phases do not declare dependencies.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        self._clock = clock
+        self._origin = clock()
+        self._phases: list[Phase] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        names = _running()
+        names.append(name)
+        start = self._clock() - self._origin
+        try:
+            yield
+        finally:
+            end = self._clock() - self._origin
+            names.pop()
+            with self._lock:
+                self._phases.append(Phase(name, start, end, threading.current_thread().name))
+
+    def wrap(self, name: str, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Callable[[], Any]:
+        """Return a callable running ``function(*args, **kwargs)`` as phase ``name``, e.g. for ``submit``."""
+
+        def run() -> Any:
+            with self.phase(name):
+                return function(*args, **kwargs)
+
+        return run
+
+    @property
+    def phases(self) -> list[Phase]:
+        with self._lock:
+            return sorted(self._phases, key=lambda phase: (phase.start, phase.end))
+
+    def first(self, name: str) -> Phase | None:
+        return next((phase for phase in self.phases if phase.name == name), None)
+
+    def critical_path(self) -> list[Phase]:
+        """Walk back from the last phase to finish, each step to the latest phase that ended before it began."""
+
+        phases = self.phases
+        if not phases:
+            return []
+        current = max(phases, key=lambda phase: phase.end)
+        path = [current]
+        while True:
+            earlier = [phase for phase in phases if phase.end <= current.start + 1e-6 and phase is not current]
+            if not earlier:
+                break
+            current = max(earlier, key=lambda phase: phase.end)
+            path.append(current)
+        return path[::-1]
+
+    def totals(self) -> list[tuple[str, int, float]]:
+        """``(name, count, seconds)`` per phase name, slowest first; overlapping phases add up."""
+
+        totals: dict[str, list[Any]] = {}
+        for phase in self.phases:
+            entry = totals.setdefault(phase.name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += phase.duration
+        return sorted(((name, count, seconds) for name, (count, seconds) in totals.items()), key=lambda t: -t[2])
+
+    def to_map(self) -> dict[str, Any]:
+        phases = self.phases
+        total = max((phase.end for phase in phases), default=0.0)
+        return {
+            "total_ms": round(total * 1000, 1),
+            "phases": [phase.to_map() for phase in phases],
+            "critical_path": [phase.name for phase in self.critical_path()],
+        }
+
+    def format_totals(self) -> str:
+        lines = [f"{'phase':<20}{'count':>8}{'total ms':>12}{'mean ms':>10}"]
+        for name, count, seconds in self.totals():
+            lines.append(f"{name:<20}{count:>8}{seconds * 1000:>12.1f}{seconds * 1000 / count:>10.2f}")
+        return "\n".join(lines)
+
+    def format(self) -> str:
+        """Render the phases as a text table with a timeline bar per phase."""
+
+        phases = self.phases
+        total = max((phase.end for phase in phases), default=0.0)
+        width = 40
+        lines = [f"{'phase':<16}{'start ms':>10}{'ms':>10}  {'thread':<12}timeline"]
+        for phase in phases:
+            begin = int(phase.start / total * width) if total else 0
+            length = max(1, int(phase.duration / total * width)) if total else 1
+            bar = " " * begin + "#" * min(length, width - begin)
+            lines.append(
+                f"{phase.name:<16}{phase.start * 1000:>10.1f}{phase.duration * 1000:>10.1f}  "
+                f"{phase.thread[:11]:<12}{bar}"
+            )
+        lines.append(f"{'total':<16}{'':>10}{total * 1000:>10.1f}")
+        lines.append("critical path: " + " -> ".join(phase.name for phase in self.critical_path()))
+        return "\n".join(lines)
+
+
+_active: PhaseTimer | None = None
+_DISABLED = nullcontext()
+_local = threading.local()
+
+
+def _running() -> list[str]:
+    try:
+        return _local.names
+    except AttributeError:
+        _local.names = []
+        return _local.names
+
+
+def current_phase() -> str | None:
+    """The innermost phase this thread is timing, if any."""
+
+    names = getattr(_local, "names", None)
+    return names[-1] if names else None
+
+
+def phase(name: str) -> Any:
+    """A phase of the active timer, or a no-op when none is active."""
+
+    timer = _active
+    return _DISABLED if timer is None else timer.phase(name)
+
+
+def active_timer() -> PhaseTimer | None:
+    return _active
+
+
+@contextmanager
+def activate(timer: PhaseTimer) -> Iterator[PhaseTimer]:
+    """Make ``timer`` the process-wide target of :func:`phase` (every thread records into it)."""
+
+    global _active
+    previous, _active = _active, timer
+    try:
+        yield timer
+    finally:
+        _active = previous
+
+
+__all__ = ["Phase", "PhaseTimer", "activate", "active_timer", "current_phase", "phase"]
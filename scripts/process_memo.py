@@ -6,42 +6,59 @@ from __future__ import annotations
 import argparse
 import json
 import os
+import sqlite3
 import sys
 import time
-from dataclasses import asdict, is_dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import is_dataclass
 from pathlib import Path
-from typing import Any, Iterable, Iterator, Mapping, MutableMapping
-
-from google.api_core.exceptions import GoogleAPIError
-from google.api_core.retry import Retry
-from google.cloud import firestore
-
-from notes_tools.notes import (
-    Appointment,
-    MemoSummary,
-    NotesTagCatalog,
-    Session,
-    TagMappingContext,
-    Thought,
-    ThoughtDocument,
-    ThoughtOutline,
-    ThoughtOutlineSection,
-    TodoItem,
-    parse_remote_note,
-    parse_remote_session,
-    structured_note_to_map,
-    summary_to_notes,
+from typing import TYPE_CHECKING, Any, Iterable, Mapping, TextIO
+
+from notes_tools.codec import JSON, to_plain
+from notes_tools.defaults import (
+    DEFAULT_ADDRESS,
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_MAX_FAILURES,
+    DEFAULT_MAX_SESSIONS,
+    DEFAULT_QUEUE_PATH,
+    DEFAULT_SESSION_LEASE,
+    DEFAULT_TTL,
+    DEFAULT_VISIBILITY_TIMEOUT,
+    DEFAULT_WORKERS,
 )
-from notes_tools.memo_processing import (
-    MemoProcessor,
-    load_resource,
-    LlmLogger
+from notes_tools.journal import DEFAULT_JOURNAL_PATH, JournalFlusher, JournalLocked, WriteJournal
+from notes_tools.memo_processing import LlmLogger, load_resource, preload_resources
+from notes_tools.metrics import FORMATS, LlmMetrics
+from notes_tools.notes import MemoSummary
+from notes_tools.openrouter import LlmRequestError, OpenRouterSession
+from notes_tools.pipeline import (
+    DEFAULT_MAX_ATTEMPTS,
+    MemoPipeline,
+    MemoRequest,
+    PipelineError,
+    SessionState,
+    WriteOptions,
+    load_session_state,
 )
-from notes_tools.firebase import initialize_firestore
+from notes_tools.profiling import add_profile_arguments, profiled
+from notes_tools.session_writes import apply_writes
+from notes_tools.thought_history import DEFAULT_SNAPSHOT_INTERVAL
+from notes_tools.timing import PhaseTimer
+from notes_tools.thought_store import (
+    ENCODING_ZLIB,
+    ENCODINGS,
+    LAYOUT_INLINE,
+    LAYOUTS,
+    ThoughtDocumentError,
+    encoding_available,
+)
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
 
-THOUGHT_DOCUMENT_ID = "__thought_document__"
-THOUGHT_DOCUMENT_TYPE = "thought_document"
-DEFAULT_LOCALE = "en"
+    from notes_tools.batch import BatchOutcome, BatchStats
+    from notes_tools.session_cache import SessionStateCache
 
 
 class ScriptError(RuntimeError):
@@ -66,239 +83,54 @@ def _memo_text(args: argparse.Namespace) -> str:
 
 
 def _load_firestore(args: argparse.Namespace) -> firestore.Client:
+    from notes_tools.firebase import initialize_firestore
+
     try:
         return initialize_firestore(args.service_account, args.project_id)
     except FileNotFoundError as exc:  # service account missing
         raise ScriptError(str(exc)) from exc
 
 
-def _load_session(
-    client: firestore.Client, session_id: str
-) -> tuple[Session, MemoSummary, NotesTagCatalog | None, str]:
-    document = client.collection("sessions").document(session_id).get()
-    if not document.exists:
-        raise ScriptError(f"Session '{session_id}' not found")
-    session = parse_remote_session(document)
-    if session is None:
-        raise ScriptError(f"Session '{session_id}' is missing required fields")
-    session_data = document.to_dict() or {}
-    settings = session_data.get("settings") if isinstance(session_data.get("settings"), Mapping) else {}
-    locale = str(settings.get("locale", DEFAULT_LOCALE)).strip() or DEFAULT_LOCALE
-    catalog_data = settings.get("tagCatalog") if isinstance(settings.get("tagCatalog"), Mapping) else None
-    tag_catalog = NotesTagCatalog.from_map(catalog_data)
-    tag_context = TagMappingContext(catalog=tag_catalog, locale=locale)
-
-    notes_ref = document.reference.collection("notes")
-    notes: list[Any] = []
-    thought_document: ThoughtDocument | None = None
-    retry = Retry(deadline=30.0)
-    try:
-        iterator: Iterator[firestore.DocumentSnapshot] = notes_ref.stream(retry=retry)
-    except GoogleAPIError as exc:  # pragma: no cover - network failure
-        raise ScriptError(f"Failed to stream notes: {exc}") from exc
-
-    for snapshot in iterator:
-        if snapshot.id == THOUGHT_DOCUMENT_ID:
-            thought_document = _parse_thought_document(snapshot.to_dict() or {})
-            continue
-        parsed = parse_remote_note(snapshot, tag_context)
-        if parsed is not None:
-            notes.append(parsed)
-
-    todo_items = [note for note in notes if isinstance(note, TodoItem)]
-    appointment_items = [note for note in notes if isinstance(note, Appointment)]
-    thought_items = [note for note in notes if isinstance(note, Thought)]
-
-    summary = MemoSummary(
-        todo="\n".join(item.text for item in todo_items if item.text),
-        appointments="\n".join(item.text for item in appointment_items if item.text),
-        thoughts=(
-            thought_document.markdown_body
-            if thought_document is not None
-            else "\n".join(item.text for item in thought_items if item.text)
-        ),
-        todo_items=list(todo_items),
-        appointment_items=list(appointment_items),
-        thought_items=list(thought_items),
-        thought_document=thought_document,
-    )
-    return session, summary, tag_catalog, locale
-
-
-def _parse_thought_document(data: Mapping[str, Any]) -> ThoughtDocument | None:
-    doc_type = str(data.get("type", "")).strip()
-    if doc_type != THOUGHT_DOCUMENT_TYPE:
-        return None
-    markdown = data.get("markdown")
-    if not isinstance(markdown, str) or not markdown.strip():
-        return None
-    outline_sections = _parse_outline_sections(data.get("outline"))
-    return ThoughtDocument(markdown_body=markdown, outline=ThoughtOutline(outline_sections))
-
+def _start_flusher(client: firestore.Client, args: argparse.Namespace) -> JournalFlusher:
+    """Open the journal and start draining it, replaying entries left by earlier runs."""
 
-def _parse_outline_sections(value: Any) -> list[ThoughtOutlineSection]:
-    if not isinstance(value, Iterable):
-        return []
-    sections: list[ThoughtOutlineSection] = []
-    for entry in value:
-        if not isinstance(entry, Mapping):
-            continue
-        title = str(entry.get("title", "")).strip()
-        if not title:
-            continue
-        level = int(entry.get("level", 1) or 1)
-        anchor = str(entry.get("anchor", "")).strip() or _default_anchor(title)
-        children = _parse_outline_sections(entry.get("children"))
-        sections.append(ThoughtOutlineSection(title=title, level=level, anchor=anchor, children=children))
-    return sections
-
-
-def _default_anchor(title: str) -> str:
-    slug = "".join(ch for ch in title.lower() if ch.isalnum() or ch.isspace()).strip().replace(" ", "-")
-    return slug or f"section-{abs(hash(title)) & 0xFFFF:x}"
-
-
-def _call_openrouter(
-    *,
-    url: str,
-    payload: Mapping[str, Any],
-    api_key: str,
-    timeout: float = 60.0,
-) -> Mapping[str, Any]:
-    import urllib.error
-    import urllib.request
-
-    data = json.dumps(payload).encode("utf-8")
-    request = urllib.request.Request(
-        url,
-        data=data,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-        },
-        method="POST",
-    )
-
-    last_error: Exception | None = None
-    for attempt in range(3):
-        try:
-            with urllib.request.urlopen(request, timeout=timeout) as response:
-                body = response.read()
-                text = body.decode("utf-8", errors="replace")
-                return json.loads(text)
-        except (urllib.error.HTTPError, urllib.error.URLError, TimeoutError, json.JSONDecodeError) as exc:
-            last_error = exc
-            if attempt == 2:
-                break
-            time.sleep(2 ** attempt)
-    if last_error is None:
-        raise ScriptError("OpenRouter request failed")
-    raise ScriptError(f"OpenRouter request failed: {last_error}")
-
-
-def _extract_structured_json(response: Mapping[str, Any]) -> Mapping[str, Any]:
-    choices = response.get("choices")
-    if not isinstance(choices, list) or not choices:
-        raise ScriptError("LLM response missing choices")
-    message = choices[0].get("message")
-    content: Any
-    if isinstance(message, Mapping):
-        content = message.get("content")
-    else:
-        content = None
-    if isinstance(content, list):
-        text = "".join(
-            part.get("text", "")
-            for part in content
-            if isinstance(part, Mapping) and isinstance(part.get("text"), str)
-        )
-    elif isinstance(content, str):
-        text = content
-    else:
-        raise ScriptError("LLM response missing content")
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1 or end <= start:
-        raise ScriptError("LLM content did not include JSON object")
     try:
-        return json.loads(text[start : end + 1])
-    except json.JSONDecodeError as exc:
-        raise ScriptError(f"Invalid JSON from model: {exc}") from exc
-
-
-def _thought_document_to_map(document: ThoughtDocument) -> Mapping[str, Any]:
-    return {
-        "type": THOUGHT_DOCUMENT_TYPE,
-        "markdown": document.markdown_body,
-        "outline": [_outline_section_to_map(section) for section in document.outline.sections],
-    }
-
-
-def _outline_section_to_map(section: ThoughtOutlineSection) -> MutableMapping[str, Any]:
-    return {
-        "title": section.title,
-        "level": section.level,
-        "anchor": section.anchor,
-        "children": [_outline_section_to_map(child) for child in section.children],
-    }
-
-
-def _write_summary(
-    client: firestore.Client,
-    session_id: str,
-    summary: MemoSummary,
-    *,
-    save_todos: bool,
-    save_appointments: bool,
-    save_thoughts: bool,
-) -> MemoSummary:
-    collection = client.collection("sessions").document(session_id).collection("notes")
-    saved_todos: list[TodoItem] = []
-    for note in summary_to_notes(summary, save_todos, save_appointments, save_thoughts):
-        payload = structured_note_to_map(note)
-        if isinstance(note, TodoItem):
-            note_id = note.note_id.strip()
-            if note_id:
-                collection.document(note_id).set(payload)
-                saved_todos.append(note)
-            else:
-                doc_ref, _ = collection.add(payload)
-                saved_todos.append(
-                    TodoItem(
-                        text=note.text,
-                        status=note.status,
-                        tag_ids=list(note.tag_ids),
-                        tag_labels=list(note.tag_labels),
-                        due_date=note.due_date,
-                        event_date=note.event_date,
-                        note_id=doc_ref.id,
-                        created_at=note.created_at,
-                    )
-                )
-        else:
-            collection.add(payload)
-
-    if save_thoughts and summary.thought_document is not None:
-        collection.document(THOUGHT_DOCUMENT_ID).set(
-            _thought_document_to_map(summary.thought_document)
+        journal = WriteJournal(args.journal)
+    except JournalLocked as exc:
+        raise ScriptError(f"{exc}; wait for it to finish or pass a different --journal") from exc
+    except (OSError, sqlite3.Error) as exc:
+        raise ScriptError(f"Unable to open write-behind journal {args.journal}: {exc}") from exc
+    flusher = JournalFlusher(journal, lambda ops: apply_writes(client, ops))
+    flusher.start()
+    return flusher
+
+
+def _stop_flusher(flusher: JournalFlusher, timeout: float, *, out: TextIO | None = None) -> None:
+    if flusher.wait_until_drained(timeout):
+        print("Journal flushed to Firestore.", file=out or sys.stdout)
+    else:
+        reason = flusher.last_error or "timed out"
+        print(
+            f"warning: {len(flusher.journal)} journal entries not flushed yet ({reason}); "
+            "they will be retried on the next --write-behind run.",
+            file=sys.stderr,
         )
-
-    if save_todos:
-        return MemoSummary(
-            todo=summary.todo,
-            appointments=summary.appointments,
-            thoughts=summary.thoughts,
-            todo_items=saved_todos,
-            appointment_items=summary.appointment_items,
-            thought_items=summary.thought_items,
-            thought_document=summary.thought_document,
+    flusher.stop()
+    flusher.join(timeout=1.0)
+    dead = flusher.journal.dead_count()
+    if dead:
+        print(
+            f"warning: {dead} journal entries failed permanently and were set aside; "
+            f"inspect them with 'diana.py journal --journal {flusher.journal.path} list --dead'.",
+            file=sys.stderr,
         )
-    return summary
+    if not flusher.is_alive():
+        flusher.journal.close()
 
 
 def _summary_to_serializable(summary: MemoSummary) -> Mapping[str, Any]:
     if is_dataclass(summary):
-        return asdict(summary)
+        return to_plain(summary)
     return {
         "todo": summary.todo,
         "appointments": summary.appointments,
@@ -313,7 +145,11 @@ def _summary_to_serializable(summary: MemoSummary) -> Mapping[str, Any]:
 def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("service_account", help="Path to the Firebase service account JSON key")
-    parser.add_argument("session_id", help="Target session identifier")
+    parser.add_argument(
+        "session_id",
+        nargs="?",
+        help="Target session identifier (omit with --batch, --serve, --watch or --work-queue)",
+    )
     parser.add_argument(
         "--project-id",
         dest="project_id",
@@ -322,6 +158,143 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
     memo_group = parser.add_mutually_exclusive_group()
     memo_group.add_argument("--memo", help="Memo text to process")
     memo_group.add_argument("--memo-file", help="Path to a file containing memo text")
+    memo_group.add_argument(
+        "--batch",
+        dest="batch",
+        metavar="FILE",
+        help=(
+            "Process a JSONL stream of {session_id, memo, aspects?, model?} records from FILE "
+            "('-' for stdin) and print one JSON result per record; aspect and model options "
+            "act as defaults for records that omit them"
+        ),
+    )
+    memo_group.add_argument(
+        "--serve",
+        dest="serve",
+        nargs="?",
+        const=DEFAULT_ADDRESS,
+        metavar="ADDRESS",
+        help=(
+            "Run as a long-lived service accepting POST /memos requests on HOST:PORT or "
+            "unix:PATH (default: %(const)s); the options below apply to every memo"
+        ),
+    )
+    memo_group.add_argument(
+        "--watch",
+        dest="watch",
+        nargs="*",
+        metavar="SESSION_ID",
+        help=(
+            "Listen for pending memos in the 'memos' inbox of the given sessions (or of every "
+            "session when none are listed) and process them as they arrive; requires --update"
+        ),
+    )
+    memo_group.add_argument(
+        "--work-queue",
+        dest="work_queue",
+        nargs="?",
+        type=Path,
+        const=DEFAULT_QUEUE_PATH,
+        metavar="PATH",
+        help=(
+            "Process jobs from the local memo queue filled by memo_queue.py "
+            "(default queue: %(const)s)"
+        ),
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help=(
+            "With --batch, process records on one asyncio event loop using the async Firestore "
+            "client; --workers then bounds the memos in flight"
+        ),
+    )
+    parser.add_argument(
+        "--drain",
+        dest="drain",
+        action="store_true",
+        help="With --work-queue, exit once the queue is empty instead of waiting for new jobs",
+    )
+    parser.add_argument(
+        "--visibility-timeout",
+        dest="visibility_timeout",
+        type=float,
+        default=DEFAULT_VISIBILITY_TIMEOUT,
+        help=(
+            "Seconds a claimed queue job stays invisible to other workers if this worker stops "
+            "renewing it (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        dest="lease_seconds",
+        type=float,
+        default=DEFAULT_LEASE_SECONDS,
+        help="How long a claimed inbox memo stays reserved for this watcher (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-failures",
+        dest="max_failures",
+        type=int,
+        default=DEFAULT_MAX_FAILURES,
+        help="Attempts before an inbox memo is marked failed with --watch (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--fleet",
+        dest="fleet",
+        metavar="NAME",
+        help=(
+            "With --watch, join the named worker fleet and only process the sessions this worker "
+            "owns on the fleet's consistent-hash ring"
+        ),
+    )
+    parser.add_argument(
+        "--session-lease",
+        dest="session_lease",
+        type=float,
+        default=DEFAULT_SESSION_LEASE,
+        help="Seconds a fleet session lease survives without renewal (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--worker-id",
+        dest="worker_id",
+        help="Identifier recorded on claimed inbox memos and queue jobs (default: HOST:PID)",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        dest="metrics_interval",
+        type=float,
+        default=60.0,
+        help="Seconds between inbox metrics reports on stderr with --watch (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--session-cache-size",
+        dest="session_cache_size",
+        type=int,
+        default=DEFAULT_MAX_SESSIONS,
+        help="Sessions kept loaded in memory with --serve or --watch (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--session-cache-ttl",
+        dest="session_cache_ttl",
+        type=float,
+        default=DEFAULT_TTL,
+        help=(
+            "Seconds a cached session is trusted with --serve or --watch; edits from other clients that do not "
+            "bump notesVersion are picked up after this delay (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=(
+            "Number of sessions processed in parallel with --batch, --watch or --work-queue "
+            "(default: %(default)s)"
+        ),
+    )
     parser.add_argument(
         "--todos",
         dest="process_todos",
@@ -353,6 +326,48 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
         dest="api_key",
         help="Explicit OpenRouter API key (defaults to OPENROUTER_API_KEY)",
     )
+    parser.add_argument(
+        "--thought-layout",
+        dest="thought_layout",
+        choices=LAYOUTS,
+        default=LAYOUT_INLINE,
+        help=(
+            "Storage layout for the thought document: 'inline' keeps the single document read by "
+            "the Android app, 'chunked' stores one document per top-level section (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--compress-thoughts-above",
+        dest="compress_threshold",
+        type=int,
+        default=None,
+        metavar="BYTES",
+        help=(
+            "Store thought Markdown bodies of at least BYTES compressed in a blob field "
+            "(default: always plain text, as read by the Android app)"
+        ),
+    )
+    parser.add_argument(
+        "--thought-encoding",
+        dest="thought_encoding",
+        choices=ENCODINGS,
+        default=ENCODING_ZLIB,
+        help="Compression used with --compress-thoughts-above; zstd needs the zstandard package (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--history",
+        dest="history",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Record thought document versions in the thought_history collection (default: enabled)",
+    )
+    parser.add_argument(
+        "--history-snapshot-interval",
+        dest="history_snapshot_interval",
+        type=int,
+        default=DEFAULT_SNAPSHOT_INTERVAL,
+        help="Store a full thought document snapshot every N versions (default: %(default)s)",
+    )
     update_group = parser.add_mutually_exclusive_group()
     update_group.add_argument(
         "--update",
@@ -366,12 +381,100 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
         action="store_true",
         help="Force dry-run mode without saving changes",
     )
+    parser.add_argument(
+        "--max-attempts",
+        dest="max_attempts",
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS,
+        help=(
+            "How many times to reload and rebase (or reprocess) the memo when another writer "
+            "updates the session first (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--write-behind",
+        dest="write_behind",
+        action="store_true",
+        help=(
+            "With --update, append the computed writes to a local journal and flush them to "
+            "Firestore in the background, retrying failures on later runs"
+        ),
+    )
+    parser.add_argument(
+        "--journal",
+        dest="journal",
+        type=Path,
+        default=DEFAULT_JOURNAL_PATH,
+        help="Location of the write-behind journal (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--flush-timeout",
+        dest="flush_timeout",
+        type=float,
+        default=30.0,
+        help="Seconds to wait for the write-behind journal to drain before exiting (default: %(default)s)",
+    )
     parser.add_argument(
         "--show-logs",
         action="store_true",
-        help="Print the captured LLM request/response logs",
+        help=(
+            "Print the captured LLM request/response logs of this run; read back an --llm-log file, "
+            "rotated backups included, with 'diana.py llm-log PATH'"
+        ),
+    )
+    parser.add_argument(
+        "--llm-log",
+        dest="llm_log",
+        type=Path,
+        default=None,
+        help=(
+            "Also append LLM request records and bodies to this gzip-compressed JSONL file, "
+            "rotated as it grows"
+        ),
+    )
+    parser.add_argument(
+        "--metrics",
+        dest="metrics",
+        type=Path,
+        default=None,
+        help=(
+            "Write per-model/aspect LLM latency, token, retry, error and cost metrics to this file "
+            "when the run ends (Prometheus textfile format, or JSON for a .json path); "
+            "--serve always exposes them on GET /metrics"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-format",
+        dest="metrics_format",
+        choices=FORMATS,
+        default=None,
+        help="Format of the --metrics file (default: from its extension)",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print a per-phase timing breakdown with its critical path to stderr",
     )
-    return parser.parse_args(argv)
+    add_profile_arguments(parser)
+    # Intermixed parsing keeps "KEY --api-key K SESSION" working now that session_id is optional.
+    args = parser.parse_intermixed_args(argv)
+    multi = any(mode is not None for mode in (args.batch, args.serve, args.watch, args.work_queue))
+    if not multi and not args.session_id:
+        parser.error("session_id is required unless --batch, --serve, --watch or --work-queue is given")
+    if multi and args.session_id:
+        parser.error(
+            "session_id cannot be combined with --batch, --serve, --watch or --work-queue; "
+            "send it with each memo"
+        )
+    if args.watch is not None and not args.update:
+        parser.error("--watch marks inbox memos as processed and therefore requires --update")
+    if args.use_async and args.batch is None:
+        parser.error("--async only applies to --batch")
+    if args.use_async and args.write_behind:
+        parser.error("--async cannot be combined with --write-behind")
+    if args.fleet is not None and args.watch is None:
+        parser.error("--fleet only applies to --watch")
+    return args
 
 
 def _load_local_properties() -> Mapping[str, str]:
@@ -421,79 +524,432 @@ def _resolve_openrouter_api_key(args: argparse.Namespace) -> str:
     )
 
 
-def main(argv: Iterable[str] | None = None) -> int:
-    args = parse_args(argv)
+def _write_options(args: argparse.Namespace) -> WriteOptions:
+    return WriteOptions(
+        thought_layout=args.thought_layout,
+        history_interval=args.history_snapshot_interval if args.history else None,
+        compress_threshold=args.compress_threshold,
+        thought_encoding=args.thought_encoding,
+    )
+
+
+def _llm_logger(args: argparse.Namespace) -> LlmLogger | None:
+    """The logger shared by every memo when ``--llm-log`` is given; otherwise each memo keeps its own."""
+
+    if args.llm_log is None:
+        return None
+    return LlmLogger(path=args.llm_log)
+
+
+def _write_metrics(args: argparse.Namespace, metrics: LlmMetrics | None) -> None:
+    if metrics is None or args.metrics is None:
+        return
     try:
-        memo_text = _memo_text(args)
-        api_key = _resolve_openrouter_api_key(args)
-        client = _load_firestore(args)
-        session, summary, tag_catalog, locale = _load_session(client, args.session_id)
+        metrics.write(args.metrics, args.metrics_format)
+    except OSError as exc:
+        print(f"warning: unable to write metrics to {args.metrics}: {exc}", file=sys.stderr)
+
+
+def _print_logs(logger: LlmLogger, llm_log: Path | None = None) -> None:
+    entries = getattr(logger, "entries", None)
+    if callable(entries):
+        print("\n=== LLM Logs ===")
+        for entry in entries():
+            print(entry)
+    if llm_log is not None:
+        print(f"Earlier runs are in {llm_log}; read them with 'diana.py llm-log {llm_log}'.")
+
+
+def _memo_request(args: argparse.Namespace, session_id: str = "", memo: str = "") -> MemoRequest:
+    return MemoRequest(
+        session_id=session_id,
+        memo=memo,
+        process_todos=args.process_todos,
+        process_appointments=args.process_appointments,
+        process_thoughts=args.process_thoughts,
+        model=args.model,
+    )
 
-        process_todos = args.process_todos if args.process_todos is not None else session.settings.process_todos
-        process_appointments = (
-            args.process_appointments if args.process_appointments is not None else session.settings.process_appointments
-        )
-        process_thoughts = (
-            args.process_thoughts if args.process_thoughts is not None else session.settings.process_thoughts
-        )
 
-        logger = LlmLogger()
-        processor = MemoProcessor(
+def _open_batch(path: str, stack: ExitStack) -> TextIO:
+    if path == "-":
+        return sys.stdin
+    source = Path(path).expanduser()
+    try:
+        return stack.enter_context(source.open(encoding="utf-8"))
+    except OSError as exc:
+        raise ScriptError(f"Unable to read batch file {source}: {exc}") from exc
+
+
+def _emit_outcome(outcome: BatchOutcome) -> None:
+    payload = outcome.to_map(_summary_to_serializable)
+    print(JSON.dumps(payload, default=str), flush=True)
+
+
+def _run_batch(args: argparse.Namespace, pipeline: MemoPipeline, should_update: bool) -> int:
+    # Each mode imports its own modules so the others cost nothing at startup.
+    from notes_tools.batch import BatchRunner, read_batch
+
+    with ExitStack() as stack:
+        source = _open_batch(args.batch, stack)
+        runner = BatchRunner(pipeline, emit=_emit_outcome, update=should_update, workers=args.workers)
+        stats = runner.run(read_batch(source, defaults=_memo_request(args)))
+    return _report_batch(stats)
+
+
+def _run_batch_async(args: argparse.Namespace, api_key: str, should_update: bool) -> int:
+    # asyncio alone costs tens of milliseconds to import, so only --async pays for it.
+    import asyncio
+
+    from notes_tools.async_pipeline import AsyncMemoPipeline, run_batch_async
+    from notes_tools.batch import read_batch
+    from notes_tools.firebase import initialize_async_firestore
+
+    try:
+        client = initialize_async_firestore(args.service_account, args.project_id)
+    except FileNotFoundError as exc:
+        raise ScriptError(str(exc)) from exc
+
+    logger = _llm_logger(args)
+    metrics = LlmMetrics() if args.metrics is not None else None
+
+    async def run() -> BatchStats:
+        async with AsyncMemoPipeline(
+            client,
             api_key=api_key,
-            locale=locale,
-            tag_catalog=tag_catalog,
+            write_options=_write_options(args),
+            max_attempts=args.max_attempts,
+            concurrency=args.workers,
             logger=logger,
-        )
-        model_override = args.model or session.settings.model
-        if model_override:
-            processor.model = model_override
-        processor.initialize(summary)
-
-        base_url = load_resource("llm/base_url.txt").strip()
-
-        requests = processor.prepare_requests(
-            memo_text,
-            process_todos=process_todos,
-            process_appointments=process_appointments,
-            process_thoughts=process_thoughts,
-        )
+            metrics=metrics,
+        ) as pipeline:
+            with ExitStack() as stack:
+                source = _open_batch(args.batch, stack)
+                records = read_batch(source, defaults=_memo_request(args))
+                return await run_batch_async(pipeline, records, emit=_emit_outcome, update=should_update)
+
+    try:
+        return _report_batch(asyncio.run(run()))
+    finally:
+        if logger is not None:
+            logger.close()
+        _write_metrics(args, metrics)
+
+
+def _report_batch(stats: BatchStats) -> int:
+    print(
+        f"Processed {stats.records} records for {len(stats.sessions)} sessions in "
+        f"{stats.elapsed_s:.1f}s ({stats.failed} failed).",
+        file=sys.stderr,
+    )
+    return 1 if stats.failed else 0
 
-        for aspect, payload in requests.items():
-            response = _call_openrouter(url=base_url, payload=payload, api_key=api_key)
-            structured = _extract_structured_json(response)
-            processor.ingest_response(aspect, json.dumps(structured))
 
-        updated_summary = processor.summary()
+def _run_service(args: argparse.Namespace, pipeline: MemoPipeline, should_update: bool) -> int:
+    from notes_tools.service import MemoService, make_server
+
+    service = MemoService(
+        pipeline,
+        update=should_update,
+        defaults=_memo_request(args),
+        serialize=_summary_to_serializable,
+    )
+    try:
+        server = make_server(args.serve, service)
+    except (OSError, ValueError) as exc:
+        raise ScriptError(f"Unable to listen on {args.serve}: {exc}") from exc
+    mode = "updating Firestore" if should_update else "dry run"
+    print(f"Serving memos on {args.serve} ({mode}); press Ctrl+C to stop.", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def _run_watcher(
+    args: argparse.Namespace,
+    client: firestore.Client,
+    pipeline: MemoPipeline,
+    state_cache: SessionStateCache | None,
+) -> int:
+    from notes_tools.fleet import FleetCoordinator
+    from notes_tools.inbox import InboxWatcher, default_worker_id
+
+    def emit(payload: dict[str, Any]) -> None:
+        print(JSON.dumps(payload, default=str), flush=True)
+
+    def metrics() -> str:
+        report: dict[str, Any] = {"inbox_metrics": watcher.metrics.to_map()}
+        if fleet is not None:
+            report["fleet"] = {**fleet.stats.to_map(), "members": len(fleet.ring), "held": len(fleet.held())}
+        return json.dumps(report)
+
+    worker_id = args.worker_id or default_worker_id()
+    fleet: FleetCoordinator | None = None
+    if args.fleet is not None:
+        fleet = FleetCoordinator(client, worker_id, fleet=args.fleet, lease_seconds=args.session_lease)
+        if state_cache is not None:
+            # Sessions moved to another worker would only ever be revalidated, never used.
+            fleet.subscribe(lambda ring: state_cache.retain(fleet.owns))
+    watcher = InboxWatcher(
+        client,
+        pipeline,
+        session_ids=args.watch or None,
+        worker_id=worker_id,
+        workers=args.workers,
+        lease_seconds=args.lease_seconds,
+        max_failures=args.max_failures,
+        defaults=_memo_request(args),
+        on_result=emit,
+        fleet=fleet,
+    )
+    scope = ", ".join(args.watch) if args.watch else "all sessions"
+    member = f" in fleet {args.fleet}" if fleet is not None else ""
+    print(
+        f"Watching memo inboxes for {scope} as {watcher.worker_id}{member}; press Ctrl+C to stop.",
+        file=sys.stderr,
+    )
+    if fleet is not None:
+        fleet.start()
+    watcher.start()
+    try:
+        while True:
+            time.sleep(max(1.0, args.metrics_interval))
+            print(metrics(), file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        if fleet is not None:
+            fleet.stop()
+        print(metrics(), file=sys.stderr, flush=True)
+    return 0
+
+
+def _run_queue_worker(args: argparse.Namespace, pipeline: MemoPipeline, should_update: bool) -> int:
+    from notes_tools.inbox import default_worker_id
+    from notes_tools.job_queue import JobQueue, QueueWorker
+
+    def emit(payload: dict[str, Any]) -> None:
+        print(JSON.dumps(payload, default=str), flush=True)
+
+    try:
+        queue = JobQueue(args.work_queue)
+    except (OSError, sqlite3.Error) as exc:
+        raise ScriptError(f"Unable to open memo queue {args.work_queue}: {exc}") from exc
+    worker = QueueWorker(
+        queue,
+        pipeline,
+        worker_id=args.worker_id or default_worker_id(),
+        concurrency=args.workers,
+        update=should_update,
+        visibility_timeout=args.visibility_timeout,
+        defaults=_memo_request(args),
+        on_result=emit,
+    )
+    started = time.perf_counter()
+    try:
+        worker.run(drain=args.drain)
+    except KeyboardInterrupt:
+        worker.stop()
+    finally:
+        stats = queue.stats()
+        queue.close()
+    print(
+        f"Processed {worker.processed} jobs ({worker.failed} failed) in {time.perf_counter() - started:.1f}s; "
+        f"{stats.depth} left in the queue, {stats.counts['dead']} dead-lettered.",
+        file=sys.stderr,
+    )
+    return 1 if worker.failed else 0
 
-        should_update = args.update and not args.dry_run
-        if should_update:
-            updated_summary = _write_summary(
-                client,
-                args.session_id,
-                updated_summary,
-                save_todos=process_todos,
-                save_appointments=process_appointments,
-                save_thoughts=process_thoughts,
-            )
 
-        serializable = _summary_to_serializable(updated_summary)
-        print(json.dumps(serializable, indent=2, ensure_ascii=False))
+def _connect_llm(api_key: str) -> OpenRouterSession:
+    transport = OpenRouterSession(load_resource("llm/base_url.txt").strip(), api_key)
+    transport.warm()  # best effort: the first request connects by itself if this failed
+    return transport
 
-        if args.show_logs:
-            entries = getattr(logger, "entries", None)
-            if callable(entries):
-                print("\n=== LLM Logs ===")
-                for entry in entries():
-                    print(entry)
 
-        if should_update:
-            print("\nSummary saved to Firestore.")
+def _open_session(
+    args: argparse.Namespace, timer: PhaseTimer
+) -> tuple[firestore.Client, JournalFlusher | None, SessionState]:
+    """Connect to Firestore and load the session once its journaled writes are flushed.
+
+    With ``--write-behind`` the journal may still hold entries for this
+    session from an earlier run; they are replayed before the session is read
+    so the memo is not planned against stale notes.
+    """
+
+    with timer.phase("firestore_init"):
+        client = _load_firestore(args)
+    flusher = None
+    if args.update and not args.dry_run and args.write_behind:
+        flusher = _start_flusher(client, args)
+    try:
+        if flusher is not None:
+            with timer.phase("journal_replay"):
+                if not flusher.wait_for_session(args.session_id, args.flush_timeout):
+                    reason = flusher.last_error or "timed out"
+                    raise ScriptError(
+                        f"Journaled writes for session '{args.session_id}' are not flushed yet ({reason})"
+                    )
+        with timer.phase("session_load"):
+            return client, flusher, load_session_state(client, args.session_id)
+    except BaseException:
+        if flusher is not None:
+            _stop_flusher(flusher, 0, out=sys.stderr)
+        raise
+
+
+def _abandon_session(session: Future[tuple[firestore.Client, JournalFlusher | None, SessionState]]) -> None:
+    if not session.cancelled() and session.exception() is None:
+        flusher = session.result()[1]
+        if flusher is not None:
+            _stop_flusher(flusher, 0, out=sys.stderr)
+
+
+def _start_single(
+    args: argparse.Namespace, api_key: str, timer: PhaseTimer
+) -> tuple[firestore.Client, JournalFlusher | None, SessionState, OpenRouterSession, str]:
+    """Run the independent start-up phases of a single-memo run concurrently.
+
+    Parsing prompts and schemas, the TLS handshake with the LLM host and
+    Firestore initialisation followed by the journal replay and the session
+    read do not depend on each other, so they run on helper threads while the
+    memo is read here.
+    """
+
+    startup = ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup")
+    session = None
+    try:
+        resources = startup.submit(timer.wrap("resources", preload_resources))
+        transport = startup.submit(timer.wrap("llm_connect", _connect_llm, api_key))
+        session = startup.submit(_open_session, args, timer)
+        with timer.phase("memo_read"):
+            memo_text = _memo_text(args)
+        resources.result()
+        llm = transport.result()
+        client, flusher, state = session.result()
+        return client, flusher, state, llm, memo_text
+    except BaseException:
+        if session is not None:
+            session.add_done_callback(_abandon_session)
+        raise
+    finally:
+        startup.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_single(
+    args: argparse.Namespace,
+    pipeline: MemoPipeline,
+    memo_text: str,
+    should_update: bool,
+    state: SessionState | None = None,
+) -> int:
+    result = pipeline.process(
+        _memo_request(args, args.session_id, memo_text), update=should_update, initial_state=state
+    )
+
+    serializable = _summary_to_serializable(result.summary)
+    print(JSON.dumps(serializable, indent=True))
+
+    if args.show_logs:
+        _print_logs(result.logger, args.llm_log)
+
+    if result.attempts > 1:
+        print(f"\nSession changed concurrently; succeeded after {result.attempts} attempts.")
+    if result.journaled:
+        print("\nSummary journaled; flushing to Firestore in the background.", flush=True)
+    elif result.written:
+        print("\nSummary saved to Firestore.")
+    else:
+        print("\nDry run complete – no changes written.")
+    return 0
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    with profiled(args) as profile_timer:
+        return _run(args, profile_timer)
+
+
+def _run(args: argparse.Namespace, profile_timer: PhaseTimer | None) -> int:
+    flusher: JournalFlusher | None = None
+    pipeline: MemoPipeline | None = None
+    state_cache: SessionStateCache | None = None
+    logger: LlmLogger | None = None
+    metrics: LlmMetrics | None = None
+    timer = profile_timer or PhaseTimer()
+    try:
+        if args.compress_threshold is not None and not encoding_available(args.thought_encoding):
+            raise ScriptError(f"Thought encoding '{args.thought_encoding}' is not available in this environment")
+        with timer.phase("api_key"):
+            api_key = _resolve_openrouter_api_key(args)
+        should_update = args.update and not args.dry_run
+        if args.use_async:
+            return _run_batch_async(args, api_key, should_update)
+        memo_text = ""
+        state: SessionState | None = None
+        transport: OpenRouterSession | None = None
+        if args.session_id:
+            client, flusher, state, transport, memo_text = _start_single(args, api_key, timer)
         else:
-            print("\nDry run complete – no changes written.")
-        return 0
-    except ScriptError as exc:
+            # Long-running and batch modes build a processor per memo; load every locale up front.
+            with timer.phase("resources"):
+                preload_resources()
+            with timer.phase("firestore_init"):
+                client = _load_firestore(args)
+        if should_update and args.write_behind and flusher is None:
+            flusher = _start_flusher(client, args)
+        logger = _llm_logger(args)
+        if args.metrics is not None or args.serve is not None:
+            metrics = LlmMetrics()
+        if args.serve is not None or args.watch is not None or args.work_queue is not None:
+            from notes_tools.session_cache import SessionStateCache
+
+            state_cache = SessionStateCache(
+                client, max_sessions=args.session_cache_size, ttl=args.session_cache_ttl
+            )
+        pipeline = MemoPipeline(
+            client,
+            api_key=api_key,
+            write_options=_write_options(args),
+            max_attempts=args.max_attempts,
+            flusher=flusher,
+            flush_timeout=args.flush_timeout,
+            state_cache=state_cache,
+            transport=transport,
+            timer=timer if args.session_id else None,
+            logger=logger,
+            metrics=metrics,
+        )
+        if args.serve is not None:
+            return _run_service(args, pipeline, should_update)
+        if args.watch is not None:
+            return _run_watcher(args, client, pipeline, state_cache)
+        if args.work_queue is not None:
+            return _run_queue_worker(args, pipeline, should_update)
+        if args.batch is not None:
+            return _run_batch(args, pipeline, should_update)
+        return _run_single(args, pipeline, memo_text, should_update, state)
+    except (ScriptError, PipelineError, LlmRequestError, ThoughtDocumentError) as exc:
         print(f"error: {exc}", file=sys.stderr)
         return 1
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+        if logger is not None:
+            logger.close()
+        _write_metrics(args, metrics)
+        if state_cache is not None:
+            state_cache.close()
+        if flusher is not None:
+            # Batch mode keeps stdout for JSONL results.
+            _stop_flusher(flusher, args.flush_timeout, out=sys.stderr if args.session_id is None else None)
+        if args.timings:
+            print(timer.format(), file=sys.stderr)
 
 
 if __name__ == "__main__":
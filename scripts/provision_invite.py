@@ -14,20 +14,26 @@ from __future__ import annotations
 import argparse
 import base64
 import hashlib
+import importlib.util
 import json
 import secrets
 import sys
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
-try:
+from notes_tools.firestore_usage import metered
+from notes_tools.profiling import add_profile_arguments, profiled
+from notes_tools.timing import phase
+
+if TYPE_CHECKING:
     import firebase_admin
-    from firebase_admin import auth, credentials, firestore
-except ImportError as exc:  # pragma: no cover - defensive import guard
-    raise SystemExit(
-        "firebase_admin is required. Install it with 'pip install firebase-admin'."
-    ) from exc
+
+
+def _require_firebase_admin() -> None:
+    """Check for the Admin SDK on first use so ``--help`` and parsing stay fast."""
+    if importlib.util.find_spec("firebase_admin") is None:  # pragma: no cover - defensive import guard
+        raise SystemExit("firebase_admin is required. Install it with 'pip install firebase-admin'.")
 
 
 @dataclass
@@ -61,6 +67,10 @@ class InvitePayload:
 
 def initialize_firebase(service_account: Optional[str], project: Optional[str]) -> firebase_admin.App:
     """Initialize the Firebase Admin SDK using the provided credentials."""
+    _require_firebase_admin()
+    import firebase_admin
+    from firebase_admin import credentials
+
     if firebase_admin._apps:  # pragma: no cover - avoid double init in tests
         return firebase_admin.get_app()
 
@@ -76,12 +86,16 @@ def initialize_firebase(service_account: Optional[str], project: Optional[str])
 
 def mint_custom_token(uid: str, claims: Dict[str, Any]) -> str:
     """Mint a Firebase custom token for the specified UID."""
+    from firebase_admin import auth
+
     return auth.create_custom_token(uid, claims).decode("utf-8")
 
 
 def store_invite(invite_id: str, payload: InvitePayload, include_payload: bool) -> None:
     """Persist the invite metadata in Firestore under pending_invites/{invite_id}."""
-    client = firestore.client()
+    from firebase_admin import firestore
+
+    client = metered(firestore.client())
     doc_ref = client.collection("pending_invites").document(invite_id)
     doc_data: Dict[str, Any] = {
         "payload_hash": payload.hash(),
@@ -156,6 +170,7 @@ def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
         action="store_true",
         help="Print an ASCII QR code representation if the 'qrcode' package is available.",
     )
+    add_profile_arguments(parser)
     return parser.parse_args(argv)
 
 
@@ -178,15 +193,23 @@ def maybe_render_ascii_qr(data: str) -> Optional[str]:
 
 def main(argv: Optional[list[str]] = None) -> int:
     args = parse_args(argv)
+    with profiled(args):
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
     claims = parse_claims(args.claims)
     invite_id = args.invite_id or secrets.token_urlsafe(8)
 
-    initialize_firebase(args.service_account, args.project)
+    with phase("firebase_init"):
+        initialize_firebase(args.service_account, args.project)
 
-    token = mint_custom_token(args.uid, claims)
+    with phase("mint_token"):
+        token = mint_custom_token(args.uid, claims)
     payload = build_payload(args.uid, token, claims, args.ttl_minutes)
 
-    store_invite(invite_id, payload, include_payload=args.include_payload)
+    with phase("store_invite"):
+        store_invite(invite_id, payload, include_payload=args.include_payload)
 
     encoded_payload = payload.encode_for_qr()
 
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Read back the LLM log written by ``process_memo.py --llm-log PATH``.
+
+The file and its rotated backups (``PATH.1``, ``PATH.2``...) are read oldest
+first. A file cut short by a crash is read up to its last complete record.
+
+Usage examples::
+
+    python scripts/show_llm_log.py llm.jsonl.gz
+    python scripts/show_llm_log.py llm.jsonl.gz --limit 5 --bodies
+    python scripts/show_llm_log.py llm.jsonl.gz --aspect todo --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from collections import deque
+from pathlib import Path
+from typing import Iterable
+
+from notes_tools.codec import JSON
+from notes_tools.llm_log import log_files, read_llm_logs
+from notes_tools.profiling import add_profile_arguments, profiled
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path, help="The --llm-log file")
+    parser.add_argument("--no-backups", action="store_true", help="Skip the rotated backups of PATH")
+    parser.add_argument("--aspect", help="Only show records of this aspect")
+    parser.add_argument("--limit", type=int, default=None, help="Only show the newest N records")
+    parser.add_argument("--bodies", action="store_true", help="Print request and response bodies")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per record")
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    with profiled(args):
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
+    files = [args.path.expanduser()] if args.no_backups else log_files(args.path)
+    files = [path for path in files if path.is_file()]
+    if not files:
+        print(f"error: no LLM log at {args.path}", file=sys.stderr)
+        return 1
+    entries = read_llm_logs(files)
+    if args.aspect is not None:
+        entries = (entry for entry in entries if entry[0].aspect == args.aspect)
+    try:
+        # The newest records are at the end of the newest file, so the whole log is read either way.
+        for record, request, response in deque(entries, maxlen=args.limit) if args.limit else entries:
+            if args.json:
+                data = record.to_map()
+                if args.bodies:
+                    data.update(request=request, response=response)
+                print(JSON.dumps(data))
+            elif args.bodies:
+                print(f"{record.describe()}\nREQUEST: {_body(request)}\nRESPONSE: {_body(response)}\n")
+            else:
+                print(record.describe())
+    except OSError as exc:
+        print(f"error: unable to read {args.path}: {exc}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+def _body(text: str | None) -> str:
+    return text if text is not None else "<missing from this file>"
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,13 @@
+"""Helpers shared by the test modules."""
+
+from __future__ import annotations
+
+
+class FakeClock:
+    """A clock for ``clock=`` parameters that only moves when a test sets ``now``."""
+
+    def __init__(self, now: float = 1_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
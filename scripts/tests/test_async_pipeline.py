@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import http.server
+import json
+import threading
+import unittest
+
+from scripts.notes_tools.async_pipeline import AsyncMemoPipeline, is_async_client, load_session_state_async
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.notes import ThoughtDocument
+from scripts.notes_tools.openrouter import AsyncOpenRouterSession
+from scripts.notes_tools.pipeline import MemoRequest
+from scripts.notes_tools.thought_store import LAYOUT_CHUNKED, apply_thought_writes, plan_thought_document_writes
+
+
+class AsyncDocument:
+    """Async-client shaped view of a memory document reference."""
+
+    def __init__(self, reference) -> None:
+        self._reference = reference
+        self.id = reference.id
+        self.path = reference.path
+
+    def collection(self, name: str) -> "AsyncCollection":
+        return AsyncCollection(self._reference.collection(name))
+
+    async def get(self, **_):
+        return dataclasses.replace(self._reference.get(), reference=self)
+
+
+class AsyncCollection:
+    def __init__(self, query) -> None:
+        self._query = query
+
+    def document(self, document_id: str | None = None) -> AsyncDocument:
+        return AsyncDocument(self._query.document(document_id))
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "AsyncCollection":
+        return AsyncCollection(self._query.order_by(field, direction=direction))
+
+    def limit(self, count: int) -> "AsyncCollection":
+        return AsyncCollection(self._query.limit(count))
+
+    async def stream(self, **_):
+        for snapshot in self._query.stream():
+            yield dataclasses.replace(snapshot, reference=AsyncDocument(snapshot.reference))
+
+
+class AsyncBatch:
+    def __init__(self, batch) -> None:
+        self._batch = batch
+
+    def set(self, reference: AsyncDocument, data, merge: bool = False) -> None:
+        self._batch.set(reference._reference, data, merge=merge)
+
+    def update(self, reference: AsyncDocument, data, option=None) -> None:
+        self._batch.update(reference._reference, data, option=option)
+
+    def delete(self, reference: AsyncDocument) -> None:
+        self._batch.delete(reference._reference)
+
+    async def commit(self):
+        return self._batch.commit()
+
+
+class AsyncMemoryFirestore:
+    def __init__(self, client: MemoryFirestore) -> None:
+        self._client = client
+        self.get_all_calls = 0
+
+    def collection(self, name: str) -> AsyncCollection:
+        return AsyncCollection(self._client.collection(name))
+
+    def document(self, path: str) -> AsyncDocument:
+        return AsyncDocument(self._client.document(path))
+
+    def batch(self) -> AsyncBatch:
+        return AsyncBatch(self._client.batch())
+
+    def write_option(self, **kwargs):
+        return self._client.write_option(**kwargs)
+
+    async def get_all(self, references):
+        self.get_all_calls += 1
+        for reference in references:
+            yield await reference.get()
+
+
+class AsyncMemoPipelineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = MemoryFirestore()
+        for session_id in ("a", "b", "c"):
+            self.client.collection("sessions").document(session_id).set({"name": session_id})
+
+    def test_process_many_orders_sessions_and_bounds_fan_out(self) -> None:
+        calls: list[str] = []
+        in_flight = peak = 0
+
+        async def llm(payload):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            calls.append(payload["messages"][1]["content"].rsplit("\n", 1)[-1])
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {"items": [{"text": calls[-1], "status": "open", "tags": []}]}
+
+        requests = [
+            MemoRequest(session_id, f"{session_id}{index}", process_appointments=False, process_thoughts=False)
+            for index in range(3)
+            for session_id in ("a", "b", "c")
+        ]
+
+        async def run():
+            async with AsyncMemoPipeline(self.client, api_key="k", llm=llm, concurrency=2) as pipeline:
+                self.assertFalse(is_async_client(self.client))
+                return await pipeline.process_many(requests, update=True)
+
+        results = asyncio.run(run())
+        self.assertEqual(9, sum(1 for result in results if not isinstance(result, Exception)))
+        self.assertEqual(2, peak)
+        for session_id in ("a", "b", "c"):
+            self.assertEqual([f"{session_id}{i}" for i in range(3)], [c for c in calls if c[0] == session_id])
+            notes = self.client.collection("sessions").document(session_id).collection("notes").stream()
+            self.assertEqual(3, len(list(notes)))
+
+    def test_async_client_path_fans_out_aspects_and_writes(self) -> None:
+        started: list[str] = []
+
+        async def run():
+            gate = asyncio.Event()
+
+            async def llm(payload):
+                started.append(payload["messages"][0]["content"])
+                if len(started) == 2:
+                    gate.set()
+                await asyncio.wait_for(gate.wait(), 1)  # only returns if both aspects are in flight
+                return {
+                    "items": [{"text": "Ship it", "status": "open", "tags": []}],
+                    "updated_markdown": "# Ideas\n\n- ship it\n",
+                }
+
+            client = AsyncMemoryFirestore(self.client)
+            self.assertTrue(is_async_client(client))
+            async with AsyncMemoPipeline(client, api_key="k", llm=llm) as pipeline:
+                return await pipeline.process(
+                    MemoRequest("a", "ship it", process_appointments=False), update=True
+                )
+
+        result = asyncio.run(run())
+        self.assertEqual((1, 2), (result.attempts, result.llm_calls))
+        self.assertTrue(result.written)
+        session = self.client.collection("sessions").document("a")
+        self.assertEqual(1, session.get().get("notesVersion"))
+        self.assertEqual(["Ship it"], [item.text for item in result.summary.todo_items])
+        self.assertIn("ship it", result.summary.thought_document.markdown_body)
+        self.assertEqual(1, len(list(session.collection("thought_history").stream())))
+
+    def test_async_client_loads_chunked_thought_documents(self) -> None:
+        markdown = "Preamble.\n\n# Work\n\nShip the release.\n\n# Home\n\nFix the sink.\n"
+        notes = self.client.collection("sessions").document("a").collection("notes")
+        apply_thought_writes(notes, plan_thought_document_writes(ThoughtDocument(markdown), layout=LAYOUT_CHUNKED))
+        client = AsyncMemoryFirestore(self.client)
+
+        async def llm(payload):
+            return {"updated_markdown": markdown + "\n# Ideas\n\nShip it.\n"}
+
+        async def run():
+            state = await load_session_state_async(client, "a")
+            async with AsyncMemoPipeline(client, api_key="k", llm=llm) as pipeline:
+                result = await pipeline.process(
+                    MemoRequest("a", "ship it", process_todos=False, process_appointments=False), update=True
+                )
+            return state, result
+
+        state, result = asyncio.run(run())
+        self.assertEqual(markdown, state.summary.thought_document.markdown_body)
+        self.assertEqual(2, client.get_all_calls)  # one batched read of the sections per load
+        self.assertTrue(result.written)
+        self.assertIn("# Ideas", result.summary.thought_document.markdown_body)
+
+
+class AsyncOpenRouterSessionTest(unittest.TestCase):
+    def test_reuses_connections_and_reads_chunked_bodies(self) -> None:
+        peers: set[int] = set()
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:
+                peers.add(self.client_address[1])
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                body = json.dumps({"echo": payload["n"]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                if payload["n"] % 2:
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(body), body))
+                else:
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        async def run():
+            session = AsyncOpenRouterSession(f"http://127.0.0.1:{server.server_address[1]}/v1/chat", "k")
+            try:
+                return [await session.post({"n": n}) for n in range(4)]
+            finally:
+                await session.aclose()
+
+        try:
+            self.assertEqual([{"echo": n} for n in range(4)], asyncio.run(run()))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(1, len(peers))
+
+    def test_idle_connection_closed_by_the_server_is_replaced_without_backoff(self) -> None:
+        peers: list[int] = []
+        closed = threading.Event()
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:
+                peers.append(self.client_address[1])
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if payload.get("hang"):
+                    self.connection.settimeout(5)
+                    if self.rfile.read(1) == b"":  # the client gave up and closed its end
+                        closed.set()
+                    self.close_connection = True
+                    return
+                body = json.dumps({"echo": payload["n"]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                self.close_connection = True  # without saying so, like an idle timeout on the server
+
+            def log_message(self, *args) -> None:
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        async def run():
+            session = AsyncOpenRouterSession(f"http://127.0.0.1:{server.server_address[1]}/v1/chat", "k")
+            try:
+                first = await session._send({"n": 0})
+                await asyncio.sleep(0.05)  # let the server's close arrive
+                started = loop.time()
+                second = await session._send({"n": 1})
+                elapsed = loop.time() - started
+                task = asyncio.ensure_future(session.post({"hang": True}))
+                await asyncio.sleep(0.1)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+                return first[:2], second[:2], elapsed, await asyncio.to_thread(closed.wait, 5)
+            finally:
+                await session.aclose()
+
+        loop = asyncio.new_event_loop()
+        try:
+            first, second, elapsed, released = loop.run_until_complete(run())
+        finally:
+            loop.close()
+            server.shutdown()
+            server.server_close()
+        self.assertEqual([({"echo": 0}, 1), ({"echo": 1}, 1)], [first, second])
+        self.assertLess(elapsed, 0.5)  # no backoff sleep before the fresh connection
+        self.assertEqual(3, len(set(peers)))
+        self.assertTrue(released)  # the cancelled request's connection was closed, not leaked
+
+
+if __name__ == "__main__":
+    unittest.main()
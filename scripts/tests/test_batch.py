@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+
+from scripts.notes_tools.batch import BatchOutcome, BatchRecord, BatchRunner, SessionLocks, read_batch
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.pipeline import MemoPipeline, MemoRequest
+
+
+class ReadBatchTest(unittest.TestCase):
+    def test_records_inherit_defaults_and_report_invalid_lines(self) -> None:
+        lines = [
+            '{"session_id": "s1", "memo": "one", "aspects": ["todos"]}',
+            "",
+            '{"session_id": "s2", "memo": "two", "aspects": {"thoughts": false}, "model": "m"}',
+            '{"memo": "missing session"}',
+            "not json",
+        ]
+        defaults = MemoRequest("", "", process_appointments=True, model="default")
+        items = list(read_batch(lines, defaults=defaults))
+
+        first, second, missing, invalid = items
+        self.assertIsInstance(first, BatchRecord)
+        self.assertEqual((True, False, False), (
+            first.request.process_todos,
+            first.request.process_appointments,
+            first.request.process_thoughts,
+        ))
+        self.assertEqual("default", first.request.model)
+        self.assertEqual(3, second.line)
+        self.assertEqual((None, True, False), (
+            second.request.process_todos,
+            second.request.process_appointments,
+            second.request.process_thoughts,
+        ))
+        self.assertEqual("m", second.request.model)
+        self.assertIsInstance(missing, BatchOutcome)
+        self.assertIn("session_id", missing.error)
+        self.assertEqual(5, invalid.line)
+
+
+class BatchRunnerTest(unittest.TestCase):
+    def test_sessions_run_in_parallel_but_keep_memo_order(self) -> None:
+        client = MemoryFirestore()
+        for session_id in ("a", "b", "c"):
+            client.collection("sessions").document(session_id).set({"name": session_id})
+        seen: dict[str, list[str]] = {}
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def llm(payload):
+            user = payload["messages"][1]["content"]
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            memo = next(line for line in user.splitlines() if line.startswith("memo-"))
+            session_id, _, index = memo.partition(":")
+            with lock:
+                seen.setdefault(session_id, []).append(index)
+            return {"items": [{"text": memo, "status": "open", "tags": []}]}
+
+        pipeline = MemoPipeline(client, api_key="k", llm=llm)
+        lines = [
+            f'{{"session_id": "{session}", "memo": "memo-{session}:{index}", "aspects": ["todos"]}}'
+            for index in range(4)
+            for session in ("a", "b", "c")
+        ]
+        outcomes: list[BatchOutcome] = []
+        runner = BatchRunner(pipeline, emit=outcomes.append, update=True, workers=3)
+        stats = runner.run(read_batch(lines))
+
+        self.assertEqual((12, 0), (stats.records, stats.failed))
+        self.assertEqual({"a", "b", "c"}, stats.sessions)
+        for session in ("a", "b", "c"):
+            self.assertEqual(["0", "1", "2", "3"], seen[f"memo-{session}"])
+            notes = list(client.collection("sessions").document(session).collection("notes").stream())
+            self.assertEqual(4, len(notes))
+        self.assertGreater(active[1], 1)
+        self.assertEqual(0, sum(outcome.result.attempts - 1 for outcome in outcomes))
+
+
+class SessionLocksTest(unittest.TestCase):
+    def test_serializes_a_session_and_forgets_it_once_idle(self) -> None:
+        locks = SessionLocks()
+        active: dict[str, int] = {}
+        overlaps: list[str] = []
+        guard = threading.Lock()
+
+        def work(session_id: str) -> None:
+            with locks.hold(session_id):
+                with guard:
+                    active[session_id] = active.get(session_id, 0) + 1
+                    if active[session_id] > 1:
+                        overlaps.append(session_id)
+                time.sleep(0.01)
+                with guard:
+                    active[session_id] -= 1
+
+        threads = [threading.Thread(target=work, args=(f"s{index % 3}",)) for index in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], overlaps)
+        self.assertEqual(0, len(locks))
+        with locks.hold("s1"):
+            self.assertEqual(1, len(locks))
+        self.assertEqual(0, len(locks))
+
+
+if __name__ == "__main__":
+    unittest.main()
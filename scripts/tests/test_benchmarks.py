@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.notes_tools.benchmarks import (
+    BenchmarkResult,
+    compare,
+    load_baseline,
+    measure,
+    note_documents,
+    save_baseline,
+    suite,
+)
+
+
+class BenchmarksTest(unittest.TestCase):
+    def test_suite_runs_every_case_offline_on_seeded_data(self) -> None:
+        self.assertEqual(note_documents(50, 10), note_documents.__wrapped__(50, 10))
+        results = [measure(case, repeat=2, min_time=0) for case in suite((10,), (10, 100))]
+        names = {result.name.split("[")[0] for result in results}
+        self.assertEqual(
+            {
+                "parse_remote_note",
+                "parse_remote_todo_change_set",
+                "TagMappingContext",
+                "resolve_tag_data",
+                "MemoProcessor.prepare_requests",
+                "MemoProcessor._apply_todo_response",
+                "structured_note_to_map",
+                "to_plain",
+                "dataclasses.asdict",
+                "JSON.dumps",
+                "summary_dump",
+            },
+            names,
+        )
+        self.assertTrue(all(len(result.runs) == 2 and result.best > 0 for result in results))
+        selected = [case.name for case in suite((10,), (10, 100), ["resolve_tag_data*tags=100]"])]
+        self.assertEqual(["resolve_tag_data[notes=10,tags=100]"], selected)
+
+    def test_baseline_round_trip_and_thresholds(self) -> None:
+        old = [BenchmarkResult("a[notes=10]", 10, [1.0]), BenchmarkResult("b", 1, [1.0, 2.0])]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "baseline.json"
+            save_baseline(path, old)
+            save_baseline(path, [BenchmarkResult("c", 1, [1.0])])  # merged, not replaced
+            baseline = load_baseline(path)
+            self.assertEqual({"a[notes=10]", "b", "c"}, set(json.loads(path.read_text())["results"]))
+            path.write_text('{"version": 0}')
+            with self.assertRaises(ValueError):
+                load_baseline(path)
+
+        current = [
+            BenchmarkResult("a[notes=10]", 10, [1.4]),
+            BenchmarkResult("b", 1, [0.5]),
+            BenchmarkResult("c", 1, [1.1]),
+            BenchmarkResult("d", 1, [1.0]),
+        ]
+        statuses = {item.name: item.status for item in compare(current, baseline, threshold=0.25)}
+        self.assertEqual({"a[notes=10]": "regressed", "b": "improved", "c": "ok", "d": "new"}, statuses)
+        relaxed = compare(current, baseline, threshold=0.25, overrides={"a[[]*": 0.5})
+        self.assertEqual("ok", relaxed[0].status)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+import unittest
+from dataclasses import asdict
+
+from scripts.notes_tools.codec import JSON_CODECS, from_plain, to_plain
+from scripts.notes_tools.notes import (
+    Appointment,
+    FreeNote,
+    MemoSummary,
+    Thought,
+    ThoughtDocument,
+    ThoughtOutline,
+    ThoughtOutlineSection,
+    TodoAction,
+    TodoChangeSet,
+    TodoItem,
+    structured_note_to_map,
+)
+
+
+def _summary() -> MemoSummary:
+    outline = ThoughtOutline([ThoughtOutlineSection("Ideas", 1, "ideas", [ThoughtOutlineSection("More", 2, "more")])])
+    return MemoSummary(
+        todo="- buy milk",
+        appointments="",
+        thoughts="# Ideas",
+        todo_items=[TodoItem(text="buy milk", status="open", tag_ids=["home"], note_id="n1", created_at=3)],
+        appointment_items=[Appointment(text="dentist", datetime="2026-01-02T10:00", location="Roma")],
+        thought_items=[Thought(text="idea", tag_labels=["città"], section_anchor="ideas")],
+        thought_document=ThoughtDocument("# Ideas", outline),
+    )
+
+
+class CodecTest(unittest.TestCase):
+    def test_plain_data_matches_asdict_and_round_trips(self) -> None:
+        summary = _summary()
+        plain = to_plain(summary)
+        self.assertEqual(asdict(summary), plain)
+        self.assertIsNot(summary.todo_items[0].tag_ids, plain["todo_items"][0]["tag_ids"])
+        self.assertEqual(summary, from_plain(MemoSummary, plain))
+
+        change_set = TodoChangeSet("c1", "s1", "m1", 5, "model", "v1", [TodoAction("add", None, summary.todo_items[0])])
+        self.assertEqual(asdict(change_set), to_plain([change_set])[0])
+        self.assertEqual(change_set, from_plain(TodoChangeSet, json.loads(json.dumps(to_plain(change_set)))))
+
+    def test_note_maps_dispatch_on_type(self) -> None:
+        self.assertEqual("todo", structured_note_to_map(TodoItem(text="a", note_id="n1"))["type"])
+        self.assertNotIn("id", structured_note_to_map(TodoItem(text="a")))
+        self.assertEqual("free", structured_note_to_map(FreeNote(text="b"))["type"])
+        with self.assertRaises(TypeError):
+            structured_note_to_map("not a note")  # type: ignore[arg-type]
+
+    def test_backends_produce_identical_text(self) -> None:
+        value = {"b": [1, 2.5, None, {}], "a": "città", "big": 2**70, "nested": {"z": True, "y": []}}
+        outputs = set()
+        for codec in (factory() for factory in JSON_CODECS.values()):
+            compact = codec.dumps(value, sort_keys=True)
+            self.assertEqual(json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True), compact)
+            outputs.add((compact, codec.dumps(value, indent=True), codec.dumps({"when": object}, default=str)))
+            self.assertEqual(value, codec.loads(compact))
+        self.assertEqual(1, len(outputs))
+
+    def test_backends_agree_on_floats(self) -> None:
+        value = {"ratio": 0.1, "big": 1e16, "tiny": 5e-324, "bad": [float("nan"), float("inf"), -float("inf")]}
+        outputs = set()
+        for codec in (factory() for factory in JSON_CODECS.values()):
+            text = codec.dumps(value)
+            outputs.add(text.replace("e+", "e"))  # json spells exponents 1e+16, orjson 1e16
+            self.assertEqual({**value, "bad": [None, None, None]}, json.loads(text))
+            self.assertEqual([None], json.loads(codec.dumps([object()], default=lambda _: float("nan"))))
+        self.assertEqual(1, len(outputs))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.notes_tools.firestore_usage import (
+    FirestorePrices,
+    FirestoreUsage,
+    MeteredFirestore,
+    activate_usage,
+    document_size,
+    metered,
+)
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.pipeline import MemoPipeline, MemoRequest
+from scripts.notes_tools.timing import PhaseTimer
+
+
+class FirestoreUsageTest(unittest.TestCase):
+    def test_operations_are_billed_like_firestore(self) -> None:
+        # The storage-size example from the Firestore documentation.
+        task = {"type": "Personal", "done": False, "priority": 1, "description": "Learn Cloud Firestore"}
+        self.assertEqual(147, document_size("users/jeff/tasks/my_task_id", task))
+
+        usage = FirestoreUsage(FirestorePrices(read=1.0, write=2.0, delete=3.0))
+        client = MeteredFirestore(MemoryFirestore(), usage)
+        sessions = client.collection("sessions")
+        for index in range(5):
+            sessions.document(f"s{index}").set({"name": f"n{index}"})
+        session = sessions.document("s1").get()
+        self.assertEqual("n1", session.get("name"))
+        session.reference.collection("notes").document("a").set({"text": "x"})
+        sessions.document("missing").get()
+        self.assertEqual(["n3", "n4"], [s.get("name") for s in sessions.order_by("name").offset(3).limit(2).stream()])
+        self.assertEqual([], list(client.collection("empty").stream()))
+        batch = client.batch()
+        batch.set(sessions.document("s0").collection("notes").document("b"), {"text": "y"})
+        batch.delete(sessions.document("s4"))
+        batch.commit()
+
+        by_collection = usage.by_collection()
+        # Two gets, then two results plus three skipped by the offset; the batch RPC goes to its first write.
+        counts = by_collection["sessions"]
+        self.assertEqual((2 + 5, 5, 1, 5 + 2 + 1), (counts.reads, counts.writes, counts.deletes, counts.rpcs))
+        counts = by_collection["notes"]
+        self.assertEqual((0, 2, 2), (counts.reads, counts.writes, counts.rpcs))
+        self.assertEqual(1, by_collection["empty"].reads)
+        total = usage.total()
+        self.assertEqual((8, 7, 1), (total.reads, total.writes, total.deletes))
+        self.assertAlmostEqual((8 * 1.0 + 7 * 2.0 + 1 * 3.0) / 100_000, total.cost(usage.prices))
+        read = sum(document_size(f"sessions/s{index}", {"name": f"n{index}"}) for index in (1, 3, 4))
+        self.assertEqual(read, by_collection["sessions"].bytes_read)
+
+    def test_pipeline_usage_by_phase_and_reports(self) -> None:
+        memory = MemoryFirestore()
+        memory.collection("sessions").document("s1").set({"name": "Inbox"})
+        memory.collection("sessions").document("s1").collection("notes").document("n1").set(
+            {"type": "todo", "text": "Old"}
+        )
+        usage = FirestoreUsage()
+        with activate_usage(usage):
+            client = metered(memory)
+        self.assertIs(client, metered(client))
+        self.assertIs(memory, metered(memory))  # accounting is off again
+
+        pipeline = MemoPipeline(
+            client,
+            api_key="k",
+            llm=lambda payload: {"items": [{"text": "Call Ann", "status": "open", "tags": []}]},
+            timer=PhaseTimer(),
+        )
+        pipeline.process(MemoRequest("s1", "call ann", process_appointments=False, process_thoughts=False), update=True)
+        by_phase = usage.by_phase()
+        self.assertEqual({"session_load", "write"}, set(by_phase))
+        self.assertEqual((0, 0), (by_phase["session_load"].writes, by_phase["write"].reads))
+        self.assertGreaterEqual(by_phase["session_load"].reads, 2)  # session document and its notes
+        self.assertEqual(1, by_phase["write"].rpcs)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "usage.json"
+            usage.report(path)
+            report = json.loads(path.read_text())
+        self.assertEqual(usage.total().writes, report["total"]["writes"])
+        self.assertEqual(set(by_phase), set(report["by_phase"]))
+        self.assertIn("session_load", usage.format())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import multiprocessing
+import time
+import unittest
+
+from scripts.notes_tools.fleet import FleetCoordinator, HashRing
+from scripts.notes_tools.inbox import STATUS_DONE, InboxWatcher, enqueue_memo
+from scripts.notes_tools.memory_store import MemoryFirestore, shared_memory_firestore
+from scripts.notes_tools.pipeline import MemoPipeline
+from scripts.tests.helpers import FakeClock
+
+SESSIONS = [f"session-{index}" for index in range(40)]
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def _fleet_member(client, worker_id: str, expected: int, results) -> None:
+    coordinator = FleetCoordinator(client, worker_id, fleet="test")
+    coordinator.join()
+    _wait_for(lambda: len(coordinator.members()) == expected, timeout=20)
+    coordinator.refresh()
+    results.put((worker_id, [session_id for session_id in SESSIONS if coordinator.acquire(session_id)]))
+
+
+class HashRingTest(unittest.TestCase):
+    def test_balances_and_moves_only_the_departed_members_keys(self) -> None:
+        keys = [f"s{index}" for index in range(4000)]
+        ring = HashRing(["a", "b", "c", "d"])
+        shares = {member: len(owned) for member, owned in ring.assignments(keys).items()}
+        self.assertTrue(all(600 < share < 1400 for share in shares.values()), shares)
+
+        smaller = HashRing(["a", "b", "c"])
+        moved = [key for key in keys if ring.owner(key) != smaller.owner(key)]
+        self.assertTrue(moved)
+        self.assertTrue(all(ring.owner(key) == "d" for key in moved))
+        self.assertIsNone(HashRing().owner("s1"))
+
+
+class FleetCoordinatorTest(unittest.TestCase):
+    def test_leases_hand_over_after_work_and_expire_with_dead_workers(self) -> None:
+        client = MemoryFirestore()
+        clock = FakeClock()
+        first = FleetCoordinator(client, "w1", fleet="f", member_ttl=10, lease_seconds=20, clock=clock)
+        first.join()
+        self.assertTrue(all(first.acquire(session_id) for session_id in SESSIONS[:10]))
+
+        second = FleetCoordinator(client, "w2", fleet="f", member_ttl=10, lease_seconds=20, clock=clock)
+        second.join()
+        first.refresh()
+        moved = [session_id for session_id in SESSIONS[:10] if second.owns(session_id)]
+        self.assertGreaterEqual(len(moved), 2)
+        session_id, idle = moved[0], moved[1]
+        first.done(idle)
+        # first is still working on session_id, so its lease is only released by done().
+        self.assertNotIn(idle, first.held())
+        self.assertIn(session_id, first.held())
+        self.assertTrue(second.acquire(idle))
+        self.assertFalse(second.acquire(session_id))
+        first.done(session_id)
+        self.assertTrue(second.acquire(session_id))
+        second.done(session_id)
+
+        clock.now += 11
+        first.heartbeat()
+        self.assertEqual(["w1"], first.members())
+        self.assertFalse(first.acquire(session_id))
+        clock.now += 10
+        self.assertTrue(first.acquire(session_id))
+        self.assertEqual(1, first.stats.taken_over)
+
+    def test_processes_share_a_store_and_partition_sessions(self) -> None:
+        context = multiprocessing.get_context("spawn")
+        with context.Manager() as manager:
+            client = shared_memory_firestore(manager)
+            results = context.Queue()
+            workers = [
+                context.Process(target=_fleet_member, args=(client, f"w{index}", 3, results)) for index in range(3)
+            ]
+            for worker in workers:
+                worker.start()
+            owned = dict(results.get(timeout=60) for _ in workers)
+            for worker in workers:
+                worker.join(timeout=10)
+
+            claimed = [session_id for sessions in owned.values() for session_id in sessions]
+            self.assertEqual(sorted(SESSIONS), sorted(claimed))
+            self.assertTrue(all(owned.values()))
+            leases = client.collection("fleets").document("test").collection("leases")
+            owners = {snapshot.id: snapshot.get("owner") for snapshot in leases.stream()}
+            self.assertTrue(all(session_id in owned[owner] for session_id, owner in owners.items()))
+
+
+class FleetWatcherTest(unittest.TestCase):
+    def test_each_session_is_processed_by_its_owner(self) -> None:
+        client = MemoryFirestore()
+
+        def llm(payload):
+            memo = payload["messages"][1]["content"].rsplit("\n", 1)[-1]
+            return {"items": [{"text": memo, "status": "open", "tags": []}]}
+
+        fleets = [FleetCoordinator(client, f"w{index}", fleet="f") for index in range(2)]
+        for fleet in fleets:
+            fleet.join()
+        for fleet in fleets:
+            fleet.refresh()
+        pipeline = MemoPipeline(client, api_key="k", llm=llm)
+        watchers = [InboxWatcher(client, pipeline, worker_id=fleet.worker_id, fleet=fleet) for fleet in fleets]
+        for watcher in watchers:
+            watcher.start()
+        sessions = SESSIONS[:6]
+        for session_id in sessions:
+            client.collection("sessions").document(session_id).set({"name": session_id})
+            for index in range(2):
+                enqueue_memo(client, session_id, f"{session_id} memo {index}", aspects=["todos"])
+
+        memos = client.collection_group("memos")
+        self.assertTrue(_wait_for(lambda: all(m.get("status") == STATUS_DONE for m in memos.stream())))
+        for watcher in watchers:
+            watcher.wait_idle(5)
+            watcher.stop()
+        for snapshot in memos.stream():
+            session_id = snapshot.reference.parent.parent.id
+            self.assertEqual(fleets[0].ring.owner(session_id), snapshot.get("processedBy"))
+        self.assertEqual(12, sum(watcher.metrics.processed for watcher in watchers))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import unittest
+from pathlib import Path
+
+from scripts.notes_tools.importtime import measure_imports, parse_importtime
+
+SCRIPTS_DIR = Path(__file__).resolve().parents[1]
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _heapq
+import time:       300 |        420 |   heapq
+import time:      1500 |       1920 | tool
+something else on stderr
+"""
+
+
+class ParseImporttimeTest(unittest.TestCase):
+    def test_reads_depth_and_times(self) -> None:
+        records = parse_importtime(SAMPLE)
+        self.assertEqual(["_heapq", "heapq", "tool"], [record.module for record in records])
+        self.assertEqual([2, 1, 0], [record.depth for record in records])
+        self.assertEqual(1920, records[-1].cumulative_us)
+
+
+class CommandImportsTest(unittest.TestCase):
+    def test_commands_do_not_import_firebase_at_load_time(self) -> None:
+        from scripts.diana import COMMANDS, RESOURCE_COMMANDS
+
+        modules = [module for module, _ in COMMANDS.values()] + list(RESOURCE_COMMANDS.values())
+        for module in ["diana", *modules]:
+            with self.subTest(module=module):
+                report = measure_imports(module, path=[SCRIPTS_DIR], baseline=False)
+                self.assertEqual([], report.heavy())
+                self.assertIn(module, [record.module for record in report.records if record.depth == 0])
+
+        diana = measure_imports("diana", path=[SCRIPTS_DIR])
+        self.assertNotIn("notes_tools", [record.module for record in diana.records])
+
+    def test_process_memo_imports_only_the_mode_it_runs(self) -> None:
+        report = measure_imports("process_memo", path=[SCRIPTS_DIR], baseline=False)
+        loaded = {record.module for record in report.records}
+        for mode in ("batch", "fleet", "inbox", "job_queue", "service", "session_cache"):
+            self.assertNotIn(f"notes_tools.{mode}", loaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
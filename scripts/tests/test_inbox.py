@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+
+from scripts.notes_tools.inbox import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_PROCESSING,
+    InboxWatcher,
+    enqueue_memo,
+)
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.pipeline import MemoPipeline
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class MemoryWatchTest(unittest.TestCase):
+    def test_on_snapshot_reports_query_changes(self) -> None:
+        client = MemoryFirestore()
+        events: list[tuple[str, str]] = []
+        inbox = client.collection("sessions").document("s1").collection("memos")
+        watch = client.collection_group("memos").where("status", "==", "pending").on_snapshot(
+            lambda docs, changes, read_time: events.extend((c.type.name, c.document.id) for c in changes)
+        )
+        inbox.document("m1").set({"status": "pending"})
+        self.assertTrue(_wait_for(lambda: ("ADDED", "m1") in events))
+        inbox.document("m1").update({"status": "pending", "attempts": 1})
+        self.assertTrue(_wait_for(lambda: ("MODIFIED", "m1") in events))
+        inbox.document("m1").update({"status": "done"})
+        self.assertTrue(_wait_for(lambda: ("REMOVED", "m1") in events))
+        watch.unsubscribe()
+
+
+class InboxWatcherTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = MemoryFirestore()
+        self.client.collection("sessions").document("s1").set({"name": "Inbox"})
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _llm(self, payload):
+        with self.lock:
+            self.calls += 1
+        memo = payload["messages"][1]["content"].rsplit("\n", 1)[-1]
+        return {"items": [{"text": memo, "status": "open", "tags": []}]}
+
+    def _memos(self) -> dict[str, dict]:
+        inbox = self.client.collection("sessions").document("s1").collection("memos")
+        return {snapshot.id: snapshot.to_dict() for snapshot in inbox.stream()}
+
+    def test_competing_watchers_process_each_memo_once(self) -> None:
+        # Without a fleet, up to four memos of the one session commit at once and all but one lose the
+        # session guard and replay. The default budget can run out under that contention, which puts the
+        # memo back to pending and calls the model again; the exact call count below would flake.
+        pipeline = MemoPipeline(self.client, api_key="k", llm=self._llm, max_attempts=20)
+        results: list[dict] = []
+        watchers = [
+            InboxWatcher(self.client, pipeline, worker_id=f"w{index}", workers=2, on_result=results.append)
+            for index in range(2)
+        ]
+        for watcher in watchers:
+            watcher.start()
+        for index in range(6):
+            enqueue_memo(self.client, "s1", f"memo {index}", aspects=["todos"])
+        self.assertTrue(_wait_for(lambda: all(m["status"] == STATUS_DONE for m in self._memos().values())))
+        for watcher in watchers:
+            watcher.wait_idle(5)
+            watcher.stop()
+
+        self.assertEqual(6, self.calls)
+        self.assertEqual(6, len(results))
+        self.assertEqual(6, sum(watcher.metrics.processed for watcher in watchers))
+        self.assertEqual(6, sum(watcher.metrics.end_to_end_lag.to_map()["count"] for watcher in watchers))
+        self.assertTrue(all("lagMs" in memo and memo["processedBy"] in {"w0", "w1"} for memo in self._memos().values()))
+        notes = list(self.client.collection("sessions").document("s1").collection("notes").stream())
+        self.assertEqual(6, len(notes))
+
+    def test_failures_retry_then_fail_and_expired_leases_are_reclaimed(self) -> None:
+        def broken(payload):
+            raise RuntimeError("model offline")
+
+        watcher = InboxWatcher(
+            self.client, MemoPipeline(self.client, api_key="k", llm=broken), max_failures=2
+        )
+        watcher.start()
+        memo_id = enqueue_memo(self.client, "s1", "memo", aspects=["todos"])
+        self.assertTrue(_wait_for(lambda: self._memos()[memo_id]["status"] == STATUS_FAILED))
+        watcher.wait_idle(5)
+        watcher.stop()
+        memo = self._memos()[memo_id]
+        self.assertEqual(2, memo["attempts"])
+        self.assertIn("model offline", memo["error"])
+        self.assertEqual((1, 1), (watcher.metrics.retried, watcher.metrics.failed))
+
+        inbox = self.client.collection("sessions").document("s1").collection("memos")
+        inbox.document("stale").set({"text": "x", "status": STATUS_PROCESSING, "leaseExpiresAt": 1})
+        inbox.document("live").set(
+            {"text": "y", "status": STATUS_PROCESSING, "leaseExpiresAt": int(time.time() * 1000) + 60_000}
+        )
+        self.assertEqual(1, watcher.sweep_expired_leases())
+        self.assertEqual(STATUS_PENDING, self._memos()["stale"]["status"])
+        self.assertEqual(STATUS_PROCESSING, self._memos()["live"]["status"])
+
+    def test_leases_are_renewed_while_a_memo_runs(self) -> None:
+        released = threading.Event()
+        renewals: list[int] = []
+
+        def slow(payload):
+            memo = next(iter(self._memos().values()))
+            renewals.append(memo["leaseExpiresAt"])
+            _wait_for(lambda: self._memos()[memo_id]["leaseExpiresAt"] > renewals[0], timeout=2)
+            # Well past the original lease: the sweep must not hand the memo to anyone else.
+            time.sleep(0.3)
+            renewals.append(self._memos()[memo_id]["leaseExpiresAt"])
+            renewals.append(watcher.sweep_expired_leases())
+            released.set()
+            return self._llm(payload)
+
+        watcher = InboxWatcher(self.client, MemoPipeline(self.client, api_key="k", llm=slow), lease_seconds=0.2)
+        watcher.start()
+        memo_id = enqueue_memo(self.client, "s1", "memo", aspects=["todos"])
+        self.assertTrue(released.wait(5))
+        self.assertTrue(_wait_for(lambda: self._memos()[memo_id]["status"] == STATUS_DONE))
+        watcher.wait_idle(5)
+        watcher.stop()
+        self.assertGreater(renewals[1], renewals[0])
+        self.assertEqual(0, renewals[2])
+        self.assertIsNone(self._memos()[memo_id]["leaseExpiresAt"])
+
+    def test_failed_attempt_leaves_a_taken_over_memo_alone(self) -> None:
+        def lapsed(payload):
+            # Our lease lapsed and another watcher claimed the memo before the model failed.
+            self.client.document(f"sessions/s1/memos/{memo_id}").update(
+                {"claimedBy": "other", "leaseExpiresAt": int(time.time() * 1000) + 60_000}
+            )
+            raise RuntimeError("model offline")
+
+        watcher = InboxWatcher(self.client, MemoPipeline(self.client, api_key="k", llm=lapsed), worker_id="w0")
+        watcher.start()
+        memo_id = enqueue_memo(self.client, "s1", "memo", aspects=["todos"])
+        self.assertTrue(_wait_for(lambda: watcher.metrics.lost_claims == 1))
+        watcher.wait_idle(5)
+        watcher.stop()
+        memo = self._memos()[memo_id]
+        self.assertEqual((STATUS_PROCESSING, "other"), (memo["status"], memo["claimedBy"]))
+        self.assertNotIn("error", memo)
+
+    def test_taken_over_memo_commits_nothing(self) -> None:
+        def lapsed(payload):
+            # Our lease lapsed and another watcher claimed the memo while the model was answering.
+            self.client.document(f"sessions/s1/memos/{memo_id}").update(
+                {"claimedBy": "other", "leaseExpiresAt": int(time.time() * 1000) + 60_000}
+            )
+            return self._llm(payload)
+
+        watcher = InboxWatcher(self.client, MemoPipeline(self.client, api_key="k", llm=lapsed), worker_id="w0")
+        watcher.start()
+        memo_id = enqueue_memo(self.client, "s1", "memo", aspects=["todos"])
+        self.assertTrue(_wait_for(lambda: watcher.metrics.lost_claims == 1))
+        watcher.wait_idle(5)
+        watcher.stop()
+        memo = self._memos()[memo_id]
+        self.assertEqual((STATUS_PROCESSING, "other"), (memo["status"], memo["claimedBy"]))
+        self.assertEqual((0, 0, 1), (watcher.metrics.processed, watcher.metrics.retried, self.calls))
+        notes = list(self.client.collection("sessions").document("s1").collection("notes").stream())
+        self.assertEqual([], notes)
+
+
+if __name__ == "__main__":
+    unittest.main()
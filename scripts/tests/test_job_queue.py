@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.notes_tools.job_queue import (
+    STATUS_DEAD,
+    STATUS_DONE,
+    STATUS_READY,
+    JobQueue,
+    QueueWorker,
+    completion_marker,
+)
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.pipeline import MemoPipeline
+from scripts.tests.helpers import FakeClock
+
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = FakeClock()
+        self.queue = JobQueue(Path(self.directory.name) / "queue.sqlite3", max_attempts=2, clock=self.clock)
+
+    def tearDown(self) -> None:
+        self.queue.close()
+        self.directory.cleanup()
+
+    def test_claims_keep_session_order_and_expire(self) -> None:
+        first = self.queue.enqueue("s1", "one")
+        self.queue.enqueue("s1", "two")
+        other = self.queue.enqueue("s2", "three")
+        self.assertEqual(0, self.queue.enqueue_many([{"session_id": "s1", "memo": "dup", "key": first.key}]))
+
+        claimed = self.queue.claim("w1", limit=10, visibility_timeout=30)
+        self.assertEqual([first.id, other.id], [job.id for job in claimed])
+        self.assertEqual([], self.queue.claim("w2", limit=10))
+
+        self.clock.now += 31
+        stolen = self.queue.claim("w2", limit=10)
+        self.assertEqual({first.id, other.id}, {job.id for job in stolen})
+        self.assertFalse(self.queue.ack(claimed[0]))
+        self.assertTrue(self.queue.ack(stolen[0]))
+        self.assertEqual("two", self.queue.claim("w2")[0].payload["memo"])
+
+    def test_failures_back_off_then_dead_letter(self) -> None:
+        job = self.queue.enqueue("s1", "memo")
+        self.assertEqual(STATUS_READY, self.queue.nack(self.queue.claim("w")[0], "boom"))
+        self.assertEqual([], self.queue.claim("w"))
+        self.clock.now += 10
+        retry = self.queue.claim("w")[0]
+        self.assertEqual(2, retry.attempts)
+        self.assertEqual(STATUS_DEAD, self.queue.nack(retry, "boom again"))
+
+        stats = self.queue.stats()
+        self.assertEqual((0, 1), (stats.depth, stats.counts[STATUS_DEAD]))
+        self.assertEqual("boom again", self.queue.get(job.id).last_error)
+        self.assertEqual(1, self.queue.requeue_dead())
+        self.assertEqual(0, self.queue.get(job.id).attempts)
+        self.assertEqual(1, self.queue.stats().depth)
+
+
+class QueueWorkerTest(unittest.TestCase):
+    def test_drains_queue_and_skips_already_applied_redelivery(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            queue = JobQueue(Path(directory) / "queue.sqlite3")
+            client = MemoryFirestore()
+            for session_id in ("a", "b"):
+                client.collection("sessions").document(session_id).set({"name": session_id})
+            calls: list[str] = []
+
+            def llm(payload):
+                calls.append(payload["messages"][1]["content"].rsplit("\n", 1)[-1])
+                return {"items": [{"text": calls[-1], "status": "open", "tags": []}]}
+
+            for index in range(3):
+                queue.enqueue("a", f"a{index}", aspects=["todos"])
+                queue.enqueue("b", f"b{index}", aspects=["todos"])
+            applied = queue.enqueue("b", "already applied", aspects=["todos"])
+            marker = completion_marker(applied)
+            client.document(marker.document_path).set(marker.data)
+            with queue._lock:
+                queue._connection.execute("UPDATE jobs SET attempts = 1 WHERE id = ?", (applied.id,))
+
+            results: list[dict] = []
+            worker = QueueWorker(
+                queue,
+                MemoPipeline(client, api_key="k", llm=llm),
+                worker_id="w",
+                concurrency=2,
+                poll_interval=0.01,
+                on_result=results.append,
+            )
+            worker.run(drain=True)
+
+            self.assertEqual(7, worker.processed)
+            self.assertEqual(["a0", "a1", "a2"], [call for call in calls if call.startswith("a")])
+            self.assertNotIn("already applied", calls)
+            self.assertEqual(7, queue.stats().counts[STATUS_DONE])
+            markers = list(client.collection("sessions").document("a").collection("memos").stream())
+            self.assertEqual(3, len(markers))
+            queue.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
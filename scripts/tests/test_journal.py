@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.notes_tools.journal import JournalFlusher, JournalLocked, WriteJournal
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.notes import MemoSummary, ThoughtDocument, ThoughtOutline, TodoItem
+from scripts.notes_tools.session_writes import (
+    SessionGuard,
+    WriteConflict,
+    WriteOp,
+    WriteTooLarge,
+    apply_writes,
+    plan_summary_writes,
+)
+
+
+def _summary() -> MemoSummary:
+    return MemoSummary(
+        todo="",
+        appointments="",
+        thoughts="# Ideas\n",
+        todo_items=[TodoItem(text="Existing", note_id="t1"), TodoItem(text="New")],
+        appointment_items=[],
+        thought_items=[],
+        thought_document=ThoughtDocument("# Ideas\n", ThoughtOutline.empty()),
+    )
+
+
+class WriteJournalTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "journal.sqlite3"
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_planned_writes_are_idempotent(self) -> None:
+        client = MemoryFirestore()
+        session_ref = client.collection("sessions").document("s1")
+        ops, saved = plan_summary_writes(
+            session_ref, _summary(), save_todos=True, save_appointments=True, save_thoughts=True
+        )
+        self.assertTrue(all(item.note_id for item in saved.todo_items))
+        apply_writes(client, ops)
+        apply_writes(client, ops)
+        notes = list(session_ref.collection("notes").stream())
+        self.assertEqual(3, len(notes))
+        self.assertEqual(1, len(list(session_ref.collection("thought_history").stream())))
+
+    def test_entries_survive_restart_and_flush_in_order(self) -> None:
+        journal = WriteJournal(self.path)
+        journal.append("s1", [WriteOp(("sessions", "s1", "notes", "a"), {"text": "first", "blob": b"\x00"})])
+        journal.append("s1", [WriteOp(("sessions", "s1", "notes", "a"), {"text": "second"})])
+        journal.close()
+
+        reopened = WriteJournal(self.path)
+        self.assertEqual(2, len(reopened))
+        self.assertEqual(b"\x00", reopened.pending()[0].ops[0].data["blob"])
+
+        client = MemoryFirestore()
+        failures = [RuntimeError("unavailable")]
+
+        def apply(ops):
+            if failures:
+                raise failures.pop()
+            apply_writes(client, ops)
+
+        flusher = JournalFlusher(reopened, apply, initial_backoff=0.01)
+        flusher.start()
+        self.assertTrue(flusher.wait_until_drained(5))
+        flusher.stop()
+        flusher.join(1)
+        self.assertEqual(0, len(reopened))
+        self.assertEqual("second", client.document("sessions/s1/notes/a").get().to_dict()["text"])
+        self.assertEqual("RuntimeError: unavailable", flusher.last_error)
+        reopened.close()
+
+    def test_failing_entries_hold_back_only_their_session_until_dead_lettered(self) -> None:
+        journal = WriteJournal(self.path, max_attempts=2)
+        with self.assertRaises(JournalLocked):
+            WriteJournal(self.path)  # one process owns a journal at a time
+        journal.append("a", [WriteOp(("sessions", "a", "notes", "x"), {"text": "rejected"})])
+        journal.append("b", [WriteOp(("sessions", "b", "notes", "y"), {"text": "first"})])
+        journal.append("a", [WriteOp(("sessions", "a", "notes", "z"), {"text": "after"})])
+        journal.append("b", [WriteOp(("sessions", "b", "notes", "y"), {"text": "second"})])
+        client = MemoryFirestore()
+
+        def apply(ops):
+            if ops[0].data["text"] == "rejected":
+                raise ValueError("document too large")
+            apply_writes(client, ops)
+
+        flusher = JournalFlusher(journal, apply)
+        self.assertFalse(flusher.flush_once())
+        self.assertEqual("second", client.document("sessions/b/notes/y").get().get("text"))
+        self.assertFalse(client.document("sessions/a/notes/z").get().exists)  # still behind the failure
+        self.assertTrue(journal.has_pending("a"))
+
+        self.assertTrue(flusher.flush_once())  # the second failure dead-letters the entry
+        self.assertTrue(client.document("sessions/a/notes/z").get().exists)
+        self.assertFalse(journal.has_pending("a"))
+        self.assertEqual((0, 1), (len(journal), journal.dead_count()))
+        (dead,) = journal.entries(dead=True)
+        self.assertEqual((2, "ValueError: document too large"), (dead.attempts, dead.last_error))
+
+        self.assertEqual(1, journal.requeue_dead())
+        self.assertEqual([0], [entry.attempts for entry in journal.pending()])
+        flusher.flush_once()
+        flusher.flush_once()
+        self.assertEqual(1, journal.drop([dead.id]))
+        self.assertEqual([], journal.entries())
+        journal.close()
+        WriteJournal(self.path).close()  # closing releases the lock
+
+    def test_journaled_version_bumps_accumulate(self) -> None:
+        client = MemoryFirestore()
+        client.document("sessions/s1").set({"name": "Inbox", "notesVersion": 3})
+        journal = WriteJournal(self.path)
+        # Two memos planned from the same loaded version.
+        for _ in range(2):
+            journal.append("s1", [SessionGuard("s1", 3).bump_op()])
+        for entry in journal.pending():
+            apply_writes(client, entry.ops)
+        journal.close()
+        self.assertEqual({"name": "Inbox", "notesVersion": 5}, client.document("sessions/s1").get().to_dict())
+
+    def test_guarded_writes_commit_in_one_batch_or_not_at_all(self) -> None:
+        client = MemoryFirestore()
+        session = client.document("sessions/s1")
+        session.set({"notesVersion": 1})
+        ops = [WriteOp(("sessions", "s1", "notes", f"n{index}"), {"text": str(index)}) for index in range(5)]
+
+        guard = SessionGuard("s1", 1, session.get().update_time)
+        with self.assertRaises(WriteTooLarge):
+            apply_writes(client, ops, guard=guard, batch_size=5)
+        self.assertEqual([], list(session.collection("notes").stream()))
+        self.assertEqual(3, apply_writes(client, ops, batch_size=2))  # unguarded writes may span batches
+
+        self.assertEqual(1, apply_writes(client, ops, guard=guard, batch_size=6))
+        self.assertEqual(2, session.get().get("notesVersion"))
+        self.assertEqual(1, guard.version)  # the caller's guard is left alone
+        with self.assertRaises(WriteConflict):
+            apply_writes(client, ops, guard=guard, batch_size=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
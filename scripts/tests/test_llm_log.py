@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from scripts.notes_tools.llm_log import LlmLogger, log_files, read_llm_log, read_llm_logs
+
+
+class LlmLoggerTest(unittest.TestCase):
+    def test_ring_buffer_keeps_records_and_dedups_bodies(self) -> None:
+        logger = LlmLogger(3, max_body_bytes=40, clock=lambda: 1.0)
+        for index in range(5):
+            logger.log("R" * 10, f"response {index}", aspect="todo", model="m", latency=0.25, usage={"tokens": 7})
+        records = logger.records()
+        self.assertEqual(3, len(records))
+        self.assertEqual(["response 2", "response 3", "response 4"], [logger.body(r.response_hash) for r in records])
+        self.assertEqual({records[0].request_hash}, {record.request_hash for record in records})
+        self.assertEqual((10, 250.0, {"tokens": 7}), (records[0].request_bytes, records[0].latency_ms, records[0].usage))
+
+        logger.log("x" * 41, "too big to keep")
+        self.assertIsNone(logger.body(logger.records()[-1].request_hash))
+        self.assertIn("no longer kept", logger.entries()[-1])
+        self.assertIsNone(logger.body(records[0].response_hash))  # evicted to stay within 40 bytes
+
+    def test_persisted_log_rotates_and_reads_back(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "llm.jsonl.gz"
+            logger = LlmLogger(path=path, max_file_bytes=1, backups=2)
+
+            def worker(name: str) -> None:
+                for index in range(5):
+                    logger.log(f"request {name}", f"response {name}{index}", aspect=name)
+
+            threads = [threading.Thread(target=worker, args=(name,)) for name in ("todo", "thoughts")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            logger.log("last request", "last response", aspect="todo")
+            logger.close()
+
+            self.assertEqual(11, len(logger))
+            self.assertEqual(["llm.jsonl.gz.1", "llm.jsonl.gz.2"], sorted(p.name for p in Path(directory).iterdir()))
+            # Every file repeats the bodies its records need.
+            (record, request, response), = read_llm_log(path.with_name("llm.jsonl.gz.1"))
+            self.assertEqual(("todo", "last request", "last response"), (record.aspect, request, response))
+            self.assertEqual([path.with_name("llm.jsonl.gz.2"), path.with_name("llm.jsonl.gz.1")], log_files(path))
+            self.assertEqual("last response", list(read_llm_logs(path))[-1][2])
+
+    def test_log_left_behind_by_a_crash_is_rotated_on_open(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "llm.jsonl.gz"
+            crashed = LlmLogger(path=path)
+            crashed.log("request 1", "response 1")
+            flushed = path.read_bytes()  # what a crash leaves: no gzip trailer
+            crashed.close()
+            path.write_bytes(flushed + b"\x1f\x8b\x08")  # and a partial write
+
+            logger = LlmLogger(path=path)
+            logger.log("request 2", "response 2")
+            logger.close()
+            self.assertEqual([path.with_name("llm.jsonl.gz.1"), path], log_files(path))
+            self.assertEqual(["response 2"], [response for _, _, response in read_llm_log(path)])
+            self.assertEqual(["response 1", "response 2"], [response for _, _, response in read_llm_logs(path)])
+
+
+if __name__ == "__main__":
+    unittest.main()
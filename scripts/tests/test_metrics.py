@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import threading
+import unittest
+import urllib.request
+from pathlib import Path
+
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.metrics import Histogram, LlmMetrics
+from scripts.notes_tools.openrouter import LlmReply, LlmRequestError
+from scripts.notes_tools.pipeline import MemoPipeline, MemoRequest
+from scripts.notes_tools.service import MemoService, make_server
+
+
+class LlmMetricsTest(unittest.TestCase):
+    def test_counts_usage_and_estimates_percentiles(self) -> None:
+        histogram = Histogram((1.0, 2.0, 4.0))
+        for value in (0.5, 1.5, 1.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual([1, 2, 1, 0], histogram.counts)
+        self.assertEqual(1.5, histogram.quantile(0.5))
+        self.assertIsNone(Histogram((1.0,)).quantile(0.5))
+
+        metrics = LlmMetrics()
+        usage = {"prompt_tokens": 100, "completion_tokens": 20, "cost": 0.002, "prompt_tokens_details": {"cached_tokens": 64}}
+        metrics.observe("m", "todo", 0.3, usage=usage, attempts=2, response_bytes=900)
+        metrics.observe("m", "todo", 0.7, usage={"prompt_tokens": "7"})
+        metrics.observe_error("m", "thoughts", 5.0, attempts=3)
+        todo, thoughts = sorted(metrics.to_map()["series"], key=lambda series: series["aspect"], reverse=True)
+        self.assertEqual((2, 0, 1, 107, 20, 64, 0.002), tuple(todo[key] for key in (
+            "requests", "errors", "retries", "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd"
+        )))
+        self.assertEqual((2, 0.5), (todo["latency_s"]["count"], todo["latency_s"]["p50"]))
+        self.assertEqual(1, todo["response_bytes"]["count"])
+        self.assertEqual((1, 1, 2), (thoughts["requests"], thoughts["errors"], thoughts["retries"]))
+
+    def test_prometheus_text_and_files(self) -> None:
+        metrics = LlmMetrics()
+        metrics.observe('odd"model', "todo", 1.5, usage={"completion_tokens": 3}, response_bytes=300)
+        text = metrics.to_prometheus()
+        labels = 'model="odd\\"model",aspect="todo"'
+        self.assertIn("# TYPE diana_llm_latency_seconds histogram", text)
+        self.assertIn(f"diana_llm_requests_total{{{labels}}} 1", text)
+        self.assertIn(f'diana_llm_tokens_total{{{labels},kind="completion"}} 3', text)
+        self.assertIn(f'diana_llm_latency_seconds_bucket{{{labels},le="1"}} 0', text)
+        self.assertIn(f'diana_llm_latency_seconds_bucket{{{labels},le="2"}} 1', text)
+        self.assertIn(f'diana_llm_latency_seconds_bucket{{{labels},le="+Inf"}} 1', text)
+        with tempfile.TemporaryDirectory() as directory:
+            metrics.write(Path(directory) / "llm.prom")
+            metrics.write(Path(directory) / "llm.json")
+            self.assertEqual(text, (Path(directory) / "llm.prom").read_text())
+            self.assertEqual(metrics.to_map(), json.loads((Path(directory) / "llm.json").read_text()))
+            self.assertEqual(["llm.json", "llm.prom"], sorted(p.name for p in Path(directory).iterdir()))
+            self.assertEqual(0o644, (Path(directory) / "llm.prom").stat().st_mode & 0o777)  # node_exporter reads it
+        with self.assertRaises(ValueError):
+            metrics.render("xml")
+
+    def test_pipeline_records_calls_and_service_exposes_them(self) -> None:
+        client = MemoryFirestore()
+        client.collection("sessions").document("s1").set({"name": "Inbox"})
+
+        def llm(payload):
+            if "updated_markdown" in json.dumps(payload["response_format"]):
+                raise LlmRequestError("upstream down", attempts=2)
+            return LlmReply({"items": []}, usage={"prompt_tokens": 10, "completion_tokens": 2}, response_bytes=50)
+
+        metrics = LlmMetrics()
+        pipeline = MemoPipeline(client, api_key="k", llm=llm, metrics=metrics)
+        pipeline.process(MemoRequest("s1", "memo", process_appointments=False, process_thoughts=False))
+        with self.assertRaises(LlmRequestError):
+            pipeline.process(MemoRequest("s1", "memo", process_todos=False, process_appointments=False))
+        series = {entry["aspect"]: entry for entry in metrics.to_map()["series"]}
+        self.assertEqual((1, 0, 10), (series["todo"]["requests"], series["todo"]["errors"], series["todo"]["prompt_tokens"]))
+        self.assertEqual((1, 1, 1), (series["thoughts"]["requests"], series["thoughts"]["errors"], series["thoughts"]["retries"]))
+
+        server = make_server("127.0.0.1:0", MemoService(pipeline))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            base = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(base) as response:
+                self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+                self.assertIn('aspect="thoughts"} 1', response.read().decode())
+            with urllib.request.urlopen(f"{base}?format=json") as response:
+                self.assertEqual(metrics.to_map(), json.loads(response.read()))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import unittest
+
+from scripts.notes_tools.note_table import INT64_MAX, INT64_MIN, NoteTable, parse_remote_notes
+from scripts.notes_tools.notes import (
+    LocalizedLabel,
+    NotesTagCatalog,
+    NotesTagDefinition,
+    TagMappingContext,
+    parse_remote_note,
+)
+
+DOCUMENTS = [
+    {"id": "t1", "type": "todo", "text": " Pay rent ", "status": "open", "tags": ["Home", "Home"], "createdAt": 30},
+    {"id": "t2", "type": "TODO", "text": "Ship it", "status": "done", "tagIds": ["work"], "tags": ["Misc"], "createdAt": 10},
+    {"id": "m1", "type": "memo", "text": "Idea", "sectionAnchor": "ideas", "tags": ["work"], "createdAt": 20},
+    {"id": "e1", "type": "event", "text": "Dentist", "datetime": "2026-01-02T10:00", "location": "Via Roma", "createdAt": 40},
+    {"id": "f1", "type": "free", "text": "Scratch", "tagLabels": ["loose"], "createdAt": "15"},
+    {"id": "x1", "type": "todo", "text": "   "},
+    {"id": "x2", "type": "unknown", "text": "Skipped"},
+    {"id": "t3", "type": "todo", "text": "Water plants", "status": "open", "tags": ["home"], "createdAt": 50},
+]
+
+
+def _context() -> TagMappingContext:
+    catalog = NotesTagCatalog(
+        tags=[
+            NotesTagDefinition(id="home", labels=[LocalizedLabel(locale_tag=None, value="Home")]),
+            NotesTagDefinition(id="work", labels=[LocalizedLabel(locale_tag=None, value="Work")]),
+        ]
+    )
+    return TagMappingContext(catalog=catalog, locale="en")
+
+
+class NoteTableTest(unittest.TestCase):
+    def test_rows_match_per_document_parsing(self) -> None:
+        context = _context()
+        expected = [note for note in (parse_remote_note(doc, context) for doc in DOCUMENTS) if note is not None]
+        table = parse_remote_notes(DOCUMENTS, context)
+        self.assertIsInstance(table, NoteTable)
+        self.assertEqual(expected, list(table))
+        self.assertEqual({"todo": 3, "memo": 1, "event": 1, "free": 1}, table.type_counts())
+        self.assertEqual(table.detail[0], table.detail[5])  # both open, no dates: one pool entry
+        self.assertEqual(table.tag_set[0], table.tag_set[5])  # "Home" and "home" resolve to one tag set
+        first = table.of_type("todo")[0]
+        first.tag_ids.append("changed")
+        self.assertEqual(["home"], table.of_type("todo")[0].tag_ids)
+
+    def test_filters_compose_into_views(self) -> None:
+        table = parse_remote_notes(DOCUMENTS, _context())
+        open_home = table.of_type("todo").with_status("open").with_tag("home")
+        self.assertEqual(["Pay rent", "Water plants"], list(open_home.texts()))
+        self.assertIs(table, open_home.table)
+        self.assertEqual(["Ship it", "Idea"], list(table.with_tag("work").texts()))
+        self.assertEqual(["Pay rent", "Idea"], list(table.created_between(16, 40).texts()))
+        self.assertEqual(["Dentist", "Water plants"], list(table.created_between(start=40).texts()))
+        self.assertEqual(0, len(table.with_status("missing")))
+        self.assertEqual("Via Roma", table.of_type("event")[0].location)
+
+    def test_out_of_range_timestamps_do_not_abort_parsing(self) -> None:
+        documents = [
+            {"id": f"n{index}", "type": "free", "text": f"Note {index}", "createdAt": created_at}
+            for index, created_at in enumerate([2**70, -(2**70), "1e30", float("inf"), "-inf", float("nan"), 5])
+        ]
+        table = parse_remote_notes(documents, _context())
+        self.assertEqual([INT64_MAX, INT64_MIN, INT64_MAX, 0, 0, 0, 5], list(table.created_at))
+        self.assertEqual(["Note 0", "Note 2"], list(table.created_between(start=2**62).texts()))
+        self.assertEqual(0, parse_remote_note(documents[3], _context()).created_at)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,7 @@ import unittest
 from datetime import date
 from dataclasses import dataclass
 
-from scripts.notes_tools.memo_processing import MemoProcessor
+from scripts.notes_tools.memo_processing import MemoProcessor, TagCatalogSnapshot
 from scripts.notes_tools.notes import (
     LocalizedLabel,
     NotesTagCatalog,
@@ -13,6 +13,7 @@ from scripts.notes_tools.notes import (
     Session,
     TagMappingContext,
     MemoSummary,
+    compile_tag_catalog,
     parse_remote_note,
     parse_remote_session,
 )
@@ -80,6 +81,27 @@ class NotesToolsTest(unittest.TestCase):
         self.assertIn("Personal", getattr(note, "tag_labels"))
         self.assertEqual(getattr(note, "created_at"), 123)
 
+    def test_compiled_tag_catalog_is_shared_and_locale_aware(self) -> None:
+        data = {
+            "tags": [
+                {"id": "home", "labels": {"default": "Home", "it": "Casa", "it-CH": "Ca"}},
+                {"id": "work", "labels": {"en": "Work", "it": "Lavoro"}},
+            ]
+        }
+        compiled = compile_tag_catalog(NotesTagCatalog.from_map(data), "it_IT")
+        self.assertIs(compiled, compile_tag_catalog(NotesTagCatalog.from_map(data), "it-it"))
+        self.assertEqual({"home": "Casa", "work": "Lavoro"}, dict(compiled.labels))
+        self.assertEqual("Ca", compile_tag_catalog(NotesTagCatalog.from_map(data), "it-CH").labels["home"])
+        self.assertEqual(compiled.fingerprint, compile_tag_catalog(NotesTagCatalog.from_map(data), "en").fingerprint)
+        self.assertEqual(["work", "home"], TagMappingContext(NotesTagCatalog.from_map(data), "it").map_legacy(
+            ["lavoro", "HOME", "work"]
+        ).tag_ids)
+        snapshot = TagCatalogSnapshot.from_compiled(compiled)
+        self.assertEqual("- home: Casa\n- work: Lavoro", snapshot.prompt_text)
+        self.assertEqual("home", snapshot.primary_tag_id)
+        with self.assertRaises(TypeError):
+            compiled.labels["home"] = "Maison"  # type: ignore[index]
+
     def test_parse_remote_note_handles_non_numeric_created_at(self) -> None:
         context = TagMappingContext(catalog=None, locale="en")
         snapshot = DummySnapshot(
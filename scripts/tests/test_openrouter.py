@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import http.server
+import json
+import threading
+import unittest
+
+from scripts.notes_tools.openrouter import LlmRequestError, OpenRouterSession, is_retryable_status
+
+
+class OpenRouterSessionTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.peers: set[int] = set()
+        self.requests = 0
+        peers = self.peers
+        test = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:
+                test.requests += 1
+                peers.add(self.client_address[1])
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status = payload.get("status", 200)
+                body = json.dumps({"echo": payload.get("n")}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if payload.get("close"):
+                    self.send_header("Connection", "close")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.session = OpenRouterSession(f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat", "k")
+
+    def tearDown(self) -> None:
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_short_lived_threads_share_pooled_connections(self) -> None:
+        self.assertTrue(self.session.warm())
+        results = []
+        for n in range(4):  # like serve mode: a new thread per request
+            thread = threading.Thread(target=lambda n=n: results.append(self.session.post({"n": n})))
+            thread.start()
+            thread.join()
+        self.assertEqual([{"echo": n} for n in range(4)], results)
+        self.assertEqual(1, len(self.peers))
+        self.assertEqual(1, len(self.session._connections))
+
+        self.session.post({"n": 4, "close": True})
+        self.assertEqual(0, len(self.session._connections))  # closed by the server, so dropped
+
+    def test_client_errors_are_not_retried(self) -> None:
+        with self.assertRaises(LlmRequestError) as caught:
+            self.session.post({"status": 400})
+        self.assertEqual((1, 1), (caught.exception.attempts, self.requests))
+        self.assertEqual({"echo": 1}, self.session.post({"n": 1}))
+        self.assertEqual(1, len(self.peers))  # the connection survived the error response
+        self.assertEqual(
+            [False, True, True, True],
+            [is_retryable_status(status) for status in (404, 429, 500, 503)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from scripts.notes_tools.journal import JournalFlusher, WriteJournal
+from scripts.notes_tools.memory_store import MemoryFirestore, MemoryWriteBatch
+from scripts.notes_tools.pipeline import MemoPipeline, MemoRequest, PipelineError, load_session_state
+from scripts.notes_tools.session_writes import WriteOp, apply_writes
+from scripts.notes_tools.timing import PhaseTimer
+
+
+class MemoPipelineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = MemoryFirestore()
+        self.session_ref = self.client.collection("sessions").document("s1")
+        self.session_ref.set({"name": "Inbox", "settings": {"locale": "en"}})
+        self.calls = 0
+
+    def _concurrent_write(self, note_id: str, data: dict) -> None:
+        state = load_session_state(self.client, "s1")
+        apply_writes(self.client, [WriteOp(("sessions", "s1", "notes", note_id), data)], guard=state.guard())
+
+    def _pipeline(self, llm, max_attempts: int = 3) -> MemoPipeline:
+        return MemoPipeline(self.client, api_key="secret", llm=llm, max_attempts=max_attempts)
+
+    def test_todo_conflict_is_rebased_without_new_llm_call(self) -> None:
+        def llm(payload):
+            self.calls += 1
+            self._concurrent_write("other", {"type": "todo", "text": "From another worker"})
+            return {"items": [{"text": "Buy milk", "status": "open", "tags": []}]}
+
+        result = self._pipeline(llm).process(
+            MemoRequest("s1", "buy milk", process_appointments=False, process_thoughts=False),
+            update=True,
+        )
+        self.assertEqual(2, result.attempts)
+        self.assertEqual(1, self.calls)
+        texts = sorted(item.text for item in result.summary.todo_items)
+        self.assertEqual(["Buy milk", "From another worker"], texts)
+        stored = sorted(snapshot.get("text") for snapshot in self.session_ref.collection("notes").stream())
+        self.assertEqual(["Buy milk", "From another worker"], stored)
+        self.assertEqual(2, self.session_ref.get().get("notesVersion"))
+
+    def test_thought_conflict_triggers_reprocessing(self) -> None:
+        def llm(payload):
+            self.calls += 1
+            if self.calls == 1:
+                self._concurrent_write(
+                    "__thought_document__", {"type": "thought_document", "markdown": "# Theirs\n"}
+                )
+            prior = payload["messages"][1]["content"]
+            suffix = "with theirs" if "Theirs" in prior else "alone"
+            return {"updated_markdown": f"# Mine {suffix}\n"}
+
+        result = self._pipeline(llm).process(
+            MemoRequest("s1", "idea", process_todos=False, process_appointments=False),
+            update=True,
+        )
+        self.assertEqual(2, self.calls)
+        self.assertEqual("# Mine with theirs\n", result.summary.thought_document.markdown_body)
+
+    def test_gives_up_after_max_attempts(self) -> None:
+        def llm(payload):
+            self.calls += 1
+            self._concurrent_write(
+                "__thought_document__", {"type": "thought_document", "markdown": f"# Edit {self.calls}\n"}
+            )
+            return {"updated_markdown": "# Mine\n"}
+
+        with self.assertRaises(PipelineError):
+            self._pipeline(llm, max_attempts=2).process(
+                MemoRequest("s1", "memo", process_todos=False, process_appointments=False),
+                update=True,
+            )
+        self.assertEqual(2, self.calls)
+
+    def test_oversized_guarded_writes_fail_without_partial_commits(self) -> None:
+        for index in range(5):
+            self.session_ref.collection("notes").document(f"t{index}").set({"type": "todo", "text": f"Old {index}"})
+        client = self.client
+        commit = MemoryWriteBatch.commit
+        commits = 0
+
+        def commit_then_bump(batch):
+            nonlocal commits
+            results = commit(batch)
+            commits += 1
+            if commits == 1:  # another writer lands between the first and second batch
+                client.document("sessions/s1").set({"notesVersion": 99}, merge=True)
+            return results
+
+        def llm(payload):
+            items = [{"text": f"Old {index}", "status": "open", "tags": []} for index in range(5)]
+            items += [{"text": f"New {index}", "status": "open", "tags": []} for index in range(450)]
+            return {"items": items}
+
+        MemoryWriteBatch.commit = commit_then_bump
+        try:
+            with self.assertRaises(PipelineError):
+                self._pipeline(llm).process(
+                    MemoRequest("s1", "many", process_appointments=False, process_thoughts=False), update=True
+                )
+        finally:
+            MemoryWriteBatch.commit = commit
+        self.assertEqual(0, commits)
+        self.assertEqual(5, len(list(self.session_ref.collection("notes").stream())))
+
+    def test_initial_state_skips_the_first_load_and_phases_are_timed(self) -> None:
+        state = load_session_state(self.client, "s1")
+        self.session_ref.set({"name": "Renamed"}, merge=True)
+        timer = PhaseTimer()
+        pipeline = MemoPipeline(
+            self.client,
+            api_key="secret",
+            llm=lambda payload: {"items": [{"text": "Call Ann", "status": "open", "tags": []}]},
+            timer=timer,
+        )
+        request = MemoRequest("s1", "call ann", process_appointments=False, process_thoughts=False)
+
+        result = pipeline.process(request, update=True, initial_state=state)
+        # The session document changed after the preloaded read, so the guarded write retried once.
+        self.assertEqual(2, result.attempts)
+        self.assertEqual(
+            ["prompt", "llm", "parse", "write", "session_load", "prompt", "parse", "write"],
+            [phase.name for phase in timer.phases],
+        )
+
+    def test_journaled_writes_from_a_crashed_run_are_flushed_before_the_next_memo(self) -> None:
+        prompts: list[str] = []
+
+        def llm(payload):
+            prompts.append(payload["messages"][1]["content"])
+            return {"items": [{"text": f"Memo {len(prompts)}", "status": "open", "tags": []}]}
+
+        def slow_apply(ops):
+            time.sleep(0.05)  # a session read racing the replay would win
+            apply_writes(self.client, ops)
+
+        request = MemoRequest("s1", "memo", process_appointments=False, process_thoughts=False)
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "journal.sqlite3"
+            crashed = WriteJournal(path)
+            # The flusher never starts: the run dies with its write still journaled.
+            MemoPipeline(self.client, api_key="k", llm=llm, flusher=JournalFlusher(crashed, slow_apply)).process(
+                request, update=True
+            )
+            crashed.close()
+            self.assertEqual([], list(self.session_ref.collection("notes").stream()))
+
+            flusher = JournalFlusher(WriteJournal(path), slow_apply)
+            flusher.start()
+            try:
+                pipeline = MemoPipeline(self.client, api_key="k", llm=llm, flusher=flusher, flush_timeout=5)
+                result = pipeline.process(request, update=True)
+                self.assertEqual(1, result.attempts)
+                self.assertTrue(flusher.wait_until_drained(5))
+            finally:
+                flusher.stop()
+                flusher.join(1)
+                flusher.journal.close()
+
+        self.assertIn("Memo 1", prompts[1])
+        stored = sorted(snapshot.get("text") for snapshot in self.session_ref.collection("notes").stream())
+        self.assertEqual(["Memo 1", "Memo 2"], stored)
+        self.assertEqual(2, self.session_ref.get().get("notesVersion"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import argparse
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from scripts.notes_tools.profiling import StackSampler, add_profile_arguments, profiled
+from scripts.notes_tools.timing import active_timer, phase
+
+
+def _busy(seconds: float) -> int:
+    total = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+class ProfilingTest(unittest.TestCase):
+    def _args(self, *argv: str) -> argparse.Namespace:
+        parser = argparse.ArgumentParser()
+        add_profile_arguments(parser)
+        return parser.parse_args(argv)
+
+    def test_disabled_profile_records_nothing(self) -> None:
+        with profiled(self._args()) as timer:
+            self.assertIsNone(timer)
+            self.assertIsNone(active_timer())
+            self.assertIs(phase("a"), phase("b"))  # one shared no-op
+
+    def test_cprofile_writes_phases_stats_and_collapsed_stacks(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            prefix = Path(directory) / "run"
+            with profiled(self._args("--profile", str(prefix))) as timer:
+                self.assertIs(timer, active_timer())
+                for _ in range(2):
+                    with phase("parse"):
+                        _busy(0.01)
+            self.assertIsNone(active_timer())
+            self.assertEqual([("parse", 2)], [(name, count) for name, count, _ in timer.totals()])
+            self.assertIn('"totals"', Path(f"{prefix}.phases.json").read_text())
+            self.assertIn("_busy", str(pstats.Stats(f"{prefix}.pstats").stats))
+            lines = Path(f"{prefix}.collapsed").read_text().splitlines()
+            busy = [line for line in lines if "_busy (test_profiling.py" in line.rsplit(" ", 1)[0].split(";")[-1]]
+            self.assertTrue(busy)
+            self.assertTrue(all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines))
+
+    def test_sampler_sees_other_threads(self) -> None:
+        sampler = StackSampler(0.001)
+        sampler.start()
+        worker = threading.Thread(target=_busy, args=(0.2,), name="busy-worker")
+        worker.start()
+        worker.join()
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        stacks = [line for line in sampler.collapsed() if line.startswith("busy-worker;")]
+        self.assertTrue(any("_busy (test_profiling.py" in line for line in stacks))
+
+
+if __name__ == "__main__":
+    unittest.main()
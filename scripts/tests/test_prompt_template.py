@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import unittest
+
+from scripts.notes_tools.memo_processing import MemoProcessor, Prompts
+from scripts.notes_tools.prompt_template import PromptTemplate, PromptTemplateError
+
+
+class PromptTemplateTest(unittest.TestCase):
+    def test_renders_in_one_pass_and_keeps_literal_braces(self) -> None:
+        template = PromptTemplate.compile('{"date": "{today}"} for {aspect}', {"today", "aspect"})
+        self.assertEqual(("today", "aspect"), template.fields)
+        rendered = template.render({"today": "2026-01-02", "aspect": "{today}"})
+        self.assertEqual('{"date": "2026-01-02"} for {today}', rendered)
+        with self.assertRaises(PromptTemplateError):
+            template.render({"today": "2026-01-02"})
+
+    def test_unknown_placeholders_fail_at_load_time(self) -> None:
+        with self.assertRaisesRegex(PromptTemplateError, r"\{tomorow\}"):
+            Prompts("todo", "appointments", "thoughts", "For {aspect}", "Due {tomorow}")
+
+    def test_memo_placeholders_are_not_substituted(self) -> None:
+        processor = MemoProcessor("key")
+        requests = processor.prepare_requests(
+            "literally type {today} and {prior}", process_appointments=False, process_thoughts=False
+        )
+        user = requests[processor.prompts.todo]["messages"][1]["content"]
+        self.assertIn("literally type {today} and {prior}", user)
+        self.assertNotIn("{aspect}", user)
+
+
+if __name__ == "__main__":
+    unittest.main()
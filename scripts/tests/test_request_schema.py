@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import json
+import unittest
+
+from scripts.notes_tools.memo_processing import MemoProcessor
+from scripts.notes_tools.notes import LocalizedLabel, NotesTagCatalog, NotesTagDefinition
+from scripts.notes_tools.request_schema import CompiledSchema, encode_payload
+
+
+def _catalog(*tag_ids: str) -> NotesTagCatalog:
+    return NotesTagCatalog(
+        tags=[NotesTagDefinition(id=tag_id, labels=[LocalizedLabel(locale_tag=None, value=tag_id)]) for tag_id in tag_ids]
+    )
+
+
+class CompiledSchemaTest(unittest.TestCase):
+    def test_schemas_are_shared_per_catalog_and_read_only(self) -> None:
+        first = MemoProcessor("key", tag_catalog=_catalog("home", "work"))
+        second = MemoProcessor("key", locale="it", tag_catalog=_catalog("home", "work"))
+        other = MemoProcessor("key", tag_catalog=_catalog("home"))
+
+        schema = first._compiled_schema(first.prompts.todo)
+        self.assertIsInstance(schema, CompiledSchema)
+        self.assertIs(schema, second._compiled_schema(second.prompts.todo))
+        self.assertIsNot(schema, other._compiled_schema(other.prompts.todo))
+        self.assertIs(first._compiled_schema(first.prompts.appointments), other._compiled_schema(other.prompts.appointments))
+        tags = schema["schema"]["properties"]["items"]["items"]["properties"]["tags"]["items"]
+        self.assertEqual(["home", "work"], tags["enum"])
+        with self.assertRaises(TypeError):
+            tags["enum"].append("leisure")
+        with self.assertRaises(TypeError):
+            schema["name"] = "changed"
+
+    def test_encoded_payload_matches_plain_json(self) -> None:
+        processor = MemoProcessor("key", tag_catalog=_catalog("casa", "città"))
+        requests = processor.prepare_requests("compra il latte entro venerdì")
+        self.assertEqual(3, len(requests))
+        for payload in requests.values():
+            self.assertEqual(json.dumps(payload), encode_payload(payload))
+            self.assertEqual(json.dumps(payload, ensure_ascii=False), encode_payload(payload, ensure_ascii=False))
+        self.assertEqual('{"a": 1}', encode_payload({"a": 1}))
+
+
+if __name__ == "__main__":
+    unittest.main()
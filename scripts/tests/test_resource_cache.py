@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.notes_tools.memo_processing import MemoProcessor, Prompts
+from scripts.notes_tools.resource_cache import ResourceCache
+from scripts.tests.helpers import FakeClock
+
+
+class ResourceCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._directory = tempfile.TemporaryDirectory()
+        self.root = Path(self._directory.name)
+        self.clock = FakeClock(0.0)
+        self.cache = ResourceCache(check_interval=1.0, clock=self.clock)
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def _write(self, name: str, text: str, mtime_ns: int) -> None:
+        path = self.root / name
+        path.write_text(text, encoding="utf-8")
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_derived_values_follow_content_not_mtime(self) -> None:
+        self._write("models.json", '[{"id": "a"}]', 1_000_000_000)
+        parse = lambda raw: [entry["id"] for entry in json.loads(raw)]  # noqa: E731
+        first = self.cache.derive("ids", ("llm/models.json",), parse, self.root)
+        self.assertEqual(["a"], first)
+
+        self._write("models.json", '[{"id": "b"}]', 2_000_000_000)
+        # Within check_interval the cached value is served without touching the file.
+        self.assertIs(first, self.cache.derive("ids", ("llm/models.json",), parse, self.root))
+
+        self.clock.now += 2
+        second = self.cache.derive("ids", ("llm/models.json",), parse, self.root)
+        self.assertEqual(["b"], second)
+
+        self._write("models.json", '[{"id": "b"}]', 3_000_000_000)  # touched, same content
+        self.clock.now += 2
+        self.assertIs(second, self.cache.derive("ids", ("llm/models.json",), parse, self.root))
+        self.assertEqual((3, 1, 2), (self.cache.stats.reads, self.cache.stats.reloads, self.cache.stats.builds))
+
+    def test_missing_files_are_noticed_once_created(self) -> None:
+        with self.assertRaises(FileNotFoundError):
+            self.cache.load("base_url.txt", self.root)
+        self._write("base_url.txt", "https://example.test\n", 1_000_000_000)
+        with self.assertRaises(FileNotFoundError):
+            self.cache.load("base_url.txt", self.root)
+        self.clock.now += 2
+        self.assertEqual("https://example.test\n", self.cache.load("base_url.txt", self.root))
+        with self.assertRaises(ValueError):
+            self.cache.load("../secrets.txt", self.root)
+
+
+class SharedResourcesTest(unittest.TestCase):
+    def test_processors_share_prompts_and_schemas(self) -> None:
+        first = MemoProcessor("key", locale="it-IT")
+        second = MemoProcessor("key", locale="it")
+        self.assertIs(first.prompts, second.prompts)
+        self.assertIs(first.todo_schema, second.todo_schema)
+        self.assertIs(Prompts.for_locale("de"), Prompts.for_locale("en"))
+
+
+if __name__ == "__main__":
+    unittest.main()
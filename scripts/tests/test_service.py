@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import threading
+import unittest
+import urllib.request
+from pathlib import Path
+
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.pipeline import MemoPipeline
+from scripts.notes_tools.service import MemoService, make_server
+from scripts.notes_tools.session_cache import SessionStateCache
+
+
+def _todo_llm(payload):
+    return {"items": [{"text": "Call Bob", "status": "open", "tags": []}]}
+
+
+class SessionStateCacheTest(unittest.TestCase):
+    def test_revalidates_with_session_version(self) -> None:
+        client = MemoryFirestore()
+        session_ref = client.collection("sessions").document("s1")
+        session_ref.set({"name": "Inbox"})
+        cache = SessionStateCache(client, ttl=60)
+
+        first = cache.get("s1")
+        self.assertIs(first, cache.get("s1"))
+        self.assertEqual((1, 1), (cache.stats.hits, cache.stats.misses))
+
+        session_ref.collection("notes").document("n1").set({"type": "todo", "text": "Hidden"})
+        self.assertEqual([], cache.get("s1").summary.todo_items)
+
+        session_ref.set({"notesVersion": 1}, merge=True)
+        self.assertEqual(["Hidden"], [item.text for item in cache.get("s1").summary.todo_items])
+        cache.ttl = 0
+        self.assertIsNot(cache.get("s1"), cache.get("s1"))
+        cache.close()
+
+
+class MemoServiceTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = MemoryFirestore()
+        self.client.collection("sessions").document("s1").set({"name": "Inbox"})
+        self.cache = SessionStateCache(self.client, ttl=60)
+        self.pipeline = MemoPipeline(self.client, api_key="k", llm=_todo_llm, state_cache=self.cache)
+
+    def tearDown(self) -> None:
+        self.cache.close()
+
+    def test_http_round_trip_uses_warm_session(self) -> None:
+        service = MemoService(self.pipeline, update=True)
+        server = make_server("127.0.0.1:0", service)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            for memo in ("call bob", "call bob again"):
+                body = json.dumps({"session_id": "s1", "memo": memo, "aspects": ["todos"]}).encode()
+                request = urllib.request.Request(f"{base}/memos", data=body, method="POST")
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    payload = json.loads(response.read())
+                self.assertEqual("ok", payload["status"])
+                self.assertTrue(payload["written"])
+                self.cache.close()  # wait for the post-write refresh
+            with urllib.request.urlopen(f"{base}/healthz", timeout=5) as response:
+                health = json.loads(response.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(2, health["processed"])
+        self.assertEqual(1, health["session_cache"]["hits"])
+        self.assertEqual(2, self.client.collection("sessions").document("s1").get().get("notesVersion"))
+
+    def test_invalid_record_and_resource_reload(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            prompt = Path(directory) / "system.txt"
+            prompt.write_text("v1", encoding="utf-8")
+            service = MemoService(self.pipeline, resource_root=Path(directory), resource_check_interval=0)
+            code, payload = service.submit(b'{"memo": "no session"}')
+            self.assertEqual(400, code)
+            self.assertIn("session_id", payload["error"])
+            self.assertFalse(service.reload_resources_if_changed())
+            prompt.write_text("version two", encoding="utf-8")
+            self.assertTrue(service.reload_resources_if_changed())
+            self.assertEqual(1, service.health()["resource_reloads"])
+
+
+if __name__ == "__main__":
+    unittest.main()
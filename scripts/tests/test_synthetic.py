@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import io
+import unittest
+from collections import Counter
+
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.notes import (
+    NotesTagCatalog,
+    TagMappingContext,
+    TodoItem,
+    parse_remote_note,
+    parse_remote_session,
+    parse_remote_todo_change_set,
+)
+from scripts.notes_tools.synthetic import (
+    DatasetSpec,
+    bulk_load,
+    dataset_ops,
+    generate_session,
+    load_ops,
+    read_jsonl,
+    write_jsonl,
+)
+from scripts.notes_tools.thought_history import ThoughtHistory
+from scripts.notes_tools.thought_store import (
+    LAYOUT_CHUNKED,
+    THOUGHT_DOCUMENT_ID,
+    load_thought_document,
+    parse_thought_header,
+)
+
+
+class _BulkWriter:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def set(self, reference, data, merge=False) -> None:
+        reference.set(data, merge=merge)
+
+    def delete(self, reference) -> None:
+        reference.delete()
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class _BulkFirestore(MemoryFirestore):
+    writer = None
+
+    def bulk_writer(self) -> _BulkWriter:
+        self.writer = _BulkWriter()
+        return self.writer
+
+
+class SyntheticTest(unittest.TestCase):
+    def test_datasets_are_reproducible_and_round_trip_as_jsonl(self) -> None:
+        spec = DatasetSpec(seed=7, sessions=3, todos=5, memos=3, change_sets=2)
+        ops = list(dataset_ops(spec))
+        self.assertEqual(ops, list(dataset_ops(spec)))
+        self.assertNotEqual(ops, list(dataset_ops(DatasetSpec(seed=8, sessions=3, todos=5, memos=3, change_sets=2))))
+        # Sessions draw from their own streams, so a larger dataset starts with the same sessions.
+        larger = DatasetSpec(seed=7, sessions=5, todos=5, memos=3, change_sets=2)
+        self.assertEqual(generate_session(spec, 1), generate_session(larger, 1))
+        self.assertEqual(["en", "it", "fr"], [generate_session(spec, index).locale for index in range(3)])
+
+        stream = io.StringIO()
+        self.assertEqual(len(ops), write_jsonl(ops, stream))
+        self.assertEqual(ops, list(read_jsonl(stream.getvalue().splitlines())))
+        with self.assertRaises(ValueError):
+            DatasetSpec(locales=("de",))
+
+    def test_loaded_sessions_parse_like_app_data(self) -> None:
+        spec = DatasetSpec(
+            seed=1,
+            locales=("it",),
+            todos=40,
+            appointments=5,
+            thoughts=5,
+            free_notes=5,
+            tags=12,
+            legacy_tags=0.5,
+            thought_bytes=3000,
+            outline_depth=3,
+            thought_versions=3,
+            thought_layout=LAYOUT_CHUNKED,
+            change_sets=6,
+            memos=4,
+            pending_memos=1,
+        )
+        session = generate_session(spec, 0)
+        client = MemoryFirestore()
+        self.assertEqual(len(session.ops), load_ops(client, session.ops, batch_size=25))
+        session_ref = client.collection("sessions").document(session.id)
+
+        self.assertIsNotNone(parse_remote_session(session_ref.get()))
+        settings = session_ref.get().to_dict()["settings"]
+        self.assertEqual(("it", 12), (settings["locale"], len(settings["tagCatalog"]["tags"])))
+        context = TagMappingContext(NotesTagCatalog.from_map(settings["tagCatalog"]), settings["locale"])
+        documents = [doc for doc in session_ref.collection("notes").stream() if doc.id != THOUGHT_DOCUMENT_ID]
+        notes = [parse_remote_note(doc, context) for doc in documents]
+        self.assertEqual(55, len(notes))
+        self.assertEqual(40, sum(isinstance(note, TodoItem) for note in notes))
+        legacy = [doc for doc in documents if "tags" in doc.to_dict()]
+        self.assertTrue(legacy)
+        self.assertTrue(any(note.tag_ids for note in notes if isinstance(note, TodoItem)))
+
+        header_ref = session_ref.collection("notes").document(THOUGHT_DOCUMENT_ID)
+        document = load_thought_document(parse_thought_header(header_ref.get().to_dict()), header_ref)
+        self.assertGreaterEqual(len(document.markdown_body.encode("utf-8")), 3000)
+        self.assertTrue(any(section.children for section in document.outline.sections))
+        history = ThoughtHistory(session_ref)
+        self.assertEqual(document.markdown_body, history.reconstruct(history.head().version))
+
+        change_sets = [parse_remote_todo_change_set(doc) for doc in session_ref.collection("todo_change_sets").stream()]
+        self.assertEqual(6, len([change_set for change_set in change_sets if change_set is not None]))
+        statuses = Counter(doc.to_dict()["status"] for doc in session_ref.collection("memos").stream())
+        self.assertEqual({"done": 3, "pending": 1}, dict(statuses))
+
+        bulk = _BulkFirestore()
+        self.assertEqual(len(session.ops), bulk_load(bulk, session.ops))
+        self.assertTrue(bulk.writer.closed)
+        self.assertEqual(client._documents.keys(), bulk._documents.keys())
+
+
+if __name__ == "__main__":
+    unittest.main()
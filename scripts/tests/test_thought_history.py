@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import unittest
+
+from scripts.notes_tools.firestore_usage import FirestoreUsage, MeteredFirestore
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.session_writes import WriteConflict
+from scripts.notes_tools.thought_history import (
+    KIND_DELTA,
+    KIND_SNAPSHOT,
+    ThoughtHistory,
+    apply_delta,
+    line_delta,
+)
+
+
+class ThoughtHistoryTest(unittest.TestCase):
+    def test_delta_round_trip(self) -> None:
+        old = "# Work\n- a\n- b\n- c\nno newline"
+        new = "# Work\n- a\n- b2\n- c\n- d\nno newline\n"
+        self.assertEqual(new, apply_delta(old, line_delta(old, new)))
+
+    def test_record_and_reconstruct_versions(self) -> None:
+        session_ref = MemoryFirestore().collection("sessions").document("s1")
+        history = ThoughtHistory(session_ref, snapshot_interval=3)
+        body = "".join(f"line {index}\n" for index in range(200))
+        versions = [body]
+        previous = None
+        for index in range(6):
+            history.record(versions[-1], previous_markdown=previous)
+            previous = versions[-1]
+            versions.append(previous.replace(f"line {index * 10}\n", f"edited {index}\n"))
+
+        entries = list(history.entries())
+        self.assertEqual([1, 2, 3, 4, 5, 6], [entry.version for entry in entries])
+        self.assertEqual(
+            [KIND_SNAPSHOT, KIND_DELTA, KIND_DELTA, KIND_SNAPSHOT, KIND_DELTA, KIND_DELTA],
+            [entry.kind for entry in entries],
+        )
+        self.assertLess(entries[1].stored_size, len(body) // 20)
+        for version in range(1, 7):
+            self.assertEqual(versions[version - 1], history.reconstruct(version))
+
+        usage = FirestoreUsage()
+        metered = ThoughtHistory(MeteredFirestore(session_ref._client, usage).document("sessions/s1"))
+        self.assertEqual(versions[5], metered.reconstruct(6))
+        self.assertEqual(2, usage.total().rpcs)  # the target entry, then one query for its chain
+
+    def test_record_does_not_overwrite_a_concurrent_version(self) -> None:
+        history = ThoughtHistory(MemoryFirestore().collection("sessions").document("s1"))
+        history.record("one\n")
+        stale = history.head()
+        history.record("two\n", previous_markdown="one\n")
+        history.head = lambda: stale  # another writer appended since this head was read
+        with self.assertRaises(WriteConflict):
+            history.record("three\n", previous_markdown="one\n")
+        self.assertEqual("two\n", history.reconstruct(2))
+
+    def test_unchanged_and_unknown_prior_text(self) -> None:
+        history = ThoughtHistory(MemoryFirestore().collection("sessions").document("s1"))
+        history.record("one\n")
+        self.assertIsNone(history.record("one\n", previous_markdown="one\n"))
+        entry = history.record("two\n", previous_markdown="edited elsewhere\n")
+        self.assertEqual(KIND_SNAPSHOT, entry.kind)
+        self.assertEqual("two\n", history.reconstruct(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import unittest
+
+from scripts.notes_tools.memory_store import MemoryFirestore
+from scripts.notes_tools.notes import ThoughtDocument, ThoughtOutline
+from scripts.notes_tools.thought_store import (
+    LAYOUT_CHUNKED,
+    LAYOUT_INLINE,
+    MARKDOWN_BLOB_FIELD,
+    SECTION_COLLECTION,
+    THOUGHT_DOCUMENT_ID,
+    ThoughtDocumentError,
+    apply_thought_writes,
+    content_hash,
+    decode_markdown,
+    default_anchor,
+    encode_markdown,
+    load_thought_document,
+    parse_thought_document,
+    parse_thought_header,
+    plan_thought_document_writes,
+    split_sections,
+)
+
+MARKDOWN = (
+    "Intro line\n"
+    "# Work\n"
+    "- ship release\n"
+    "## Details\n"
+    "```\n"
+    "# not a heading\n"
+    "```\n"
+    "# Home\n"
+    "- fix sink\n"
+)
+
+
+class ThoughtStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = MemoryFirestore()
+        self.notes = self.client.collection("sessions").document("s1").collection("notes")
+
+    def _store(self, markdown: str, layout: str = LAYOUT_CHUNKED, compress_threshold: int | None = None) -> list:
+        previous = self.notes.document(THOUGHT_DOCUMENT_ID).get()
+        writes = plan_thought_document_writes(
+            ThoughtDocument(markdown, ThoughtOutline.empty()),
+            layout=layout,
+            previous=previous.to_dict() if previous.exists else None,
+            compress_threshold=compress_threshold,
+        )
+        apply_thought_writes(self.notes, writes)
+        return writes
+
+    def test_split_sections_is_lossless(self) -> None:
+        chunks = split_sections(MARKDOWN)
+        self.assertEqual(["_preamble", "work", "home"], [chunk.id for chunk in chunks])
+        self.assertEqual(MARKDOWN, "".join(chunk.markdown for chunk in chunks))
+
+    def test_chunked_round_trip_and_lazy_sections(self) -> None:
+        self._store(MARKDOWN)
+        header_ref = self.notes.document(THOUGHT_DOCUMENT_ID)
+        header_data = header_ref.get().to_dict()
+        self.assertNotIn("markdown", header_data)
+        self.assertEqual(3, len(list(header_ref.collection(SECTION_COLLECTION).stream())))
+
+        document = parse_thought_document(header_data, header_ref)
+        self.assertEqual(MARKDOWN, document.markdown_body)
+
+        header = parse_thought_header(header_data)
+        partial = load_thought_document(header, header_ref, anchors=["home"])
+        self.assertEqual("# Home\n- fix sink\n", partial.markdown_body)
+
+    def test_sections_are_fetched_in_one_batched_read(self) -> None:
+        self._store(MARKDOWN)
+        header_ref = self.notes.document(THOUGHT_DOCUMENT_ID)
+        batches: list[list[str]] = []
+        client = self.client
+
+        class BatchRecorder:
+            def get_all(self, references):
+                batches.append([reference.id for reference in references])
+                return client.get_all(references)
+
+        document = parse_thought_document(header_ref.get().to_dict(), header_ref, client=BatchRecorder())
+        self.assertEqual(MARKDOWN, document.markdown_body)
+        self.assertEqual([["_preamble", "work", "home"]], batches)
+
+    def test_fallback_anchor_is_independent_of_hash_seed(self) -> None:
+        self.assertEqual("ship-it", default_anchor("Ship it!"))
+        self.assertEqual(f"section-{content_hash('???')[:8]}", default_anchor("???"))
+
+    def test_only_changed_sections_are_written(self) -> None:
+        self._store(MARKDOWN)
+        writes = self._store(MARKDOWN.replace("fix sink", "fix sink and tap").replace("Intro line\n", ""))
+        written = [write.path[-1] for write in writes if write.data is not None]
+        deleted = [write.path[-1] for write in writes if write.data is None]
+        self.assertEqual(["home", THOUGHT_DOCUMENT_ID], written)
+        self.assertEqual(["_preamble"], deleted)
+
+    def test_switching_back_to_inline_removes_sections(self) -> None:
+        self._store(MARKDOWN)
+        self._store(MARKDOWN, layout=LAYOUT_INLINE)
+        header_ref = self.notes.document(THOUGHT_DOCUMENT_ID)
+        self.assertEqual([], list(header_ref.collection(SECTION_COLLECTION).stream()))
+        self.assertEqual(MARKDOWN, header_ref.get().to_dict()["markdown"])
+
+    def test_encode_markdown_respects_threshold(self) -> None:
+        body = "- repeated thought line\n" * 200
+        self.assertEqual({"markdown": "short"}, encode_markdown("short", threshold=1024))
+        encoded = encode_markdown(body, threshold=1024)
+        self.assertEqual("zlib", encoded["encoding"])
+        self.assertLess(len(encoded[MARKDOWN_BLOB_FIELD]), len(body) // 3)
+        self.assertEqual(body, decode_markdown(encoded))
+
+    def test_compressed_documents_are_read_transparently(self) -> None:
+        body = "# Big\n" + "- repeated thought line\n" * 200
+        header_ref = self.notes.document(THOUGHT_DOCUMENT_ID)
+        for layout in (LAYOUT_INLINE, LAYOUT_CHUNKED):
+            self._store(body, layout=layout, compress_threshold=1024)
+            document = parse_thought_document(header_ref.get().to_dict(), header_ref)
+            self.assertEqual(body, document.markdown_body)
+        section = header_ref.collection(SECTION_COLLECTION).document("big").get().to_dict()
+        self.assertNotIn("markdown", section)
+
+    def test_corrupt_blobs_raise_with_the_document_path(self) -> None:
+        body = "# Big\n" + "- repeated thought line\n" * 200
+        header_ref = self.notes.document(THOUGHT_DOCUMENT_ID)
+        for layout in (LAYOUT_INLINE, LAYOUT_CHUNKED):
+            self._store(body, layout=layout, compress_threshold=1024)
+            target = header_ref
+            if layout == LAYOUT_CHUNKED:
+                target = header_ref.collection(SECTION_COLLECTION).document("big")
+            data = target.get().to_dict()
+            target.set({**data, MARKDOWN_BLOB_FIELD: data[MARKDOWN_BLOB_FIELD][:-8]})  # truncated
+            with self.subTest(layout=layout), self.assertRaises(ThoughtDocumentError) as caught:
+                parse_thought_document(header_ref.get().to_dict(), header_ref)
+            self.assertIn(target.path, str(caught.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import unittest
+
+from scripts.notes_tools.timing import PhaseTimer
+
+
+class PhaseTimerTest(unittest.TestCase):
+    def test_reports_overlapping_phases_and_critical_path(self) -> None:
+        # Start and end times as if resources, llm_connect and session_load ran on helper threads.
+        ticks = iter([0.0, 0.0, 0.001, 0.001, 0.020, 0.001, 0.080, 0.001, 0.150, 0.150, 0.200])
+        timer = PhaseTimer(lambda: next(ticks))
+        for name in ("api_key", "resources", "llm_connect", "session_load"):
+            with timer.phase(name):
+                pass
+        self.assertEqual(42, timer.wrap("llm", lambda value: value * 2, 21)())
+
+        self.assertEqual(["api_key", "session_load", "llm"], [phase.name for phase in timer.critical_path()])
+        report = timer.to_map()
+        self.assertEqual(200.0, report["total_ms"])
+        self.assertEqual(
+            {"name": "llm_connect", "start_ms": 1.0, "duration_ms": 79.0, "thread": "MainThread"},
+            report["phases"][2],
+        )
+        self.assertEqual(0.150, timer.first("llm").start)
+        self.assertIn("critical path: api_key -> session_load -> llm", timer.format())
+
+
+if __name__ == "__main__":
+    unittest.main()
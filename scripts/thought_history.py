@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Inspect the version history of a session's thought document in Firestore.
+
+Usage examples::
+
+    python scripts/thought_history.py service_account.json SESSION list
+    python scripts/thought_history.py service_account.json SESSION show 12
+    python scripts/thought_history.py service_account.json SESSION diff 10 12
+"""
+
+from __future__ import annotations
+
+import argparse
+import difflib
+import json
+import sys
+from typing import TYPE_CHECKING, Iterable
+
+from notes_tools.thought_history import ThoughtHistory
+from notes_tools.profiling import add_profile_arguments, profiled
+from notes_tools.timing import phase
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "service_account",
+        help="Path to the Firebase service account JSON key",
+    )
+    parser.add_argument(
+        "session_id",
+        help="Session ID whose thought document history should be read",
+    )
+    parser.add_argument(
+        "--project-id",
+        dest="project_id",
+        help="Override the Firebase project ID if the key omits it",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="List recorded versions")
+    list_parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Emit machine-readable JSON instead of formatted text",
+    )
+    show_parser = commands.add_parser("show", help="Print the Markdown of a version")
+    show_parser.add_argument("version", type=int, help="Version number to reconstruct")
+    diff_parser = commands.add_parser("diff", help="Show a unified diff between two versions")
+    diff_parser.add_argument("base", type=int, help="Older version number")
+    diff_parser.add_argument("target", type=int, help="Newer version number")
+    diff_parser.add_argument(
+        "--context",
+        type=int,
+        default=3,
+        help="Number of context lines in the diff (default: %(default)s)",
+    )
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def _firestore_client(args: argparse.Namespace) -> firestore.Client:
+    from notes_tools.firebase import initialize_firestore
+
+    return initialize_firestore(args.service_account, args.project_id)
+
+
+def _list_versions(history: ThoughtHistory, as_json: bool) -> None:
+    entries = list(history.entries())
+    if as_json:
+        payload = [
+            {
+                "version": entry.version,
+                "kind": entry.kind,
+                "snapshot": entry.snapshot,
+                "timestamp": entry.timestamp,
+                "size": entry.size,
+                "stored_size": entry.stored_size,
+            }
+            for entry in entries
+        ]
+        print(json.dumps(payload, indent=2, sort_keys=True))
+        return
+    if not entries:
+        print("No thought document history found.")
+        return
+    for entry in entries:
+        print(
+            f"{entry.version:>6} | {entry.timestamp} | {entry.kind:<8} | "
+            f"size={entry.size} | stored={entry.stored_size}"
+        )
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    with profiled(args):
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
+    with phase("firestore_init"):
+        client = _firestore_client(args)
+    history = ThoughtHistory(client.collection("sessions").document(args.session_id))
+    try:
+        if args.command == "list":
+            _list_versions(history, args.json)
+        elif args.command == "show":
+            sys.stdout.write(history.reconstruct(args.version))
+        else:
+            base = history.reconstruct(args.base)
+            target = history.reconstruct(args.target)
+            sys.stdout.writelines(
+                difflib.unified_diff(
+                    base.splitlines(keepends=True),
+                    target.splitlines(keepends=True),
+                    fromfile=f"v{args.base}",
+                    tofile=f"v{args.target}",
+                    n=args.context,
+                )
+            )
+    except (KeyError, ValueError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
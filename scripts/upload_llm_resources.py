@@ -14,10 +14,14 @@ import logging
 import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable
+from typing import TYPE_CHECKING, Iterable
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+from notes_tools.firestore_usage import metered
+from notes_tools.profiling import add_profile_arguments, profiled
+from notes_tools.timing import phase
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
 
 
 DEFAULT_SOURCE = Path("app/src/main/resources/llm")
@@ -61,6 +65,7 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
         action="store_true",
         help="Preview the changes without writing to Firestore",
     )
+    add_profile_arguments(parser)
     return parser.parse_args(list(argv))
 
 
@@ -117,6 +122,9 @@ def load_local_resources(source_dir: Path) -> dict[str, str]:
 
 
 def init_firestore(service_account: Path, project_id: str | None) -> firestore.Client:
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     if not service_account.is_file():
         raise FileNotFoundError(f"Service account key not found: {service_account}")
 
@@ -125,7 +133,7 @@ def init_firestore(service_account: Path, project_id: str | None) -> firestore.C
         firebase_admin.initialize_app(cred, {"projectId": project_id})
     else:
         firebase_admin.initialize_app(cred)
-    return firestore.client()
+    return metered(firestore.client())
 
 
 def fetch_remote_resources(collection_ref: firestore.CollectionReference) -> dict[str, RemoteResource]:
@@ -241,7 +249,11 @@ def sync_resources(
 def main(argv: Iterable[str]) -> int:
     configure_logging()
     args = parse_args(argv)
+    with profiled(args):
+        return _run(args)
+
 
+def _run(args: argparse.Namespace) -> int:
     try:
         local_resources = load_local_resources(args.source)
     except FileNotFoundError as exc:
@@ -251,7 +263,8 @@ def main(argv: Iterable[str]) -> int:
     logging.info("Loaded %d local resources from %s", len(local_resources), args.source)
 
     try:
-        firestore_client = init_firestore(args.service_account, args.project)
+        with phase("firestore_init"):
+            firestore_client = init_firestore(args.service_account, args.project)
     except FileNotFoundError as exc:
         logging.error(str(exc))
         return 1
@@ -260,11 +273,13 @@ def main(argv: Iterable[str]) -> int:
         return 1
 
     collection_ref = firestore_client.collection(args.collection)
-    remote_resources = fetch_remote_resources(collection_ref)
+    with phase("fetch"):
+        remote_resources = fetch_remote_resources(collection_ref)
     logging.info("Fetched %d remote resources from collection '%s'", len(remote_resources), args.collection)
 
     try:
-        sync_resources(firestore_client, collection_ref, local_resources, remote_resources, args.dry_run)
+        with phase("sync"):
+            sync_resources(firestore_client, collection_ref, local_resources, remote_resources, args.dry_run)
     except Exception as exc:  # pragma: no cover - propagate unexpected errors gracefully
         logging.error("Failed to synchronize resources: %s", exc)
         return 1